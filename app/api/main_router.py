@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import stylegan2ada, stylegan_models, user
+from app.api.routes import images, stylegan2ada, stylegan_models, user, videos
 
 router = APIRouter()
 router.include_router(user.router, prefix="/user", tags=["User"])
@@ -8,3 +8,5 @@ router.include_router(stylegan_models.router, tags=["StyleGan"])
 router.include_router(
     stylegan2ada.router, prefix="/stylegan2ada", tags=["StyleGan2 ADA"]
 )
+router.include_router(images.router, prefix="/images", tags=["Images"])
+router.include_router(videos.router, prefix="/videos", tags=["Videos"])
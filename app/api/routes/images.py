@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from app.core.config import IMAGE_BUCKET
+from app.db.storage import storage_backend
+
+router = APIRouter()
+
+
+@router.get("/{image_key}")
+async def get_image(image_key: str, request: Request) -> Response:
+    """Get an image from the storage backend (e.g. for local storage, which has no public bucket).
+
+    Image keys are content hashes, so images are public like the image bucket and cached forever.
+
+    Args:
+        image_key (str): the name of the image in the image bucket
+        request (Request): the request (for its Range header)
+
+    Raises:
+        HTTPException: 404 if there is no image with this key
+
+    Returns:
+        Response: the JPEG image (or the requested byte range of it)
+    """
+    try:
+        return await storage_backend.response(request, IMAGE_BUCKET, image_key, "image/jpeg")
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="There is no image with this key.")
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.metrics import CONTENT_TYPE, registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Get all metrics of this process (or of all workers, see Registry) in the Prometheus text format.
+
+    Returns:
+        Response: the rendered metrics
+    """
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,20 +1,32 @@
 from aioredis import Redis
-from fastapi import APIRouter, Depends, HTTPException, Security
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Security
 from fastapi_auth0 import Auth0User
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from app.core.admission import run_inference
 from app.core.auth0 import auth
-from app.core.config import IMAGE_STORAGE_BASE_URL, REDIS_RATELIMIT_PERIOD, REDIS_RATELIMIT_REQUESTS
+from app.core.config import (
+    IMAGE_STORAGE_BASE_URL,
+    REDIS_RATELIMIT_PERIOD,
+    REDIS_RATELIMIT_REQUESTS,
+    VIDEO_STORAGE_BASE_URL,
+)
+from app.core.model_catalog import stylegan2ada_catalog
 from app.db.mongodb import mongodb
 from app.db.redisdb import check_user_ratelimit
 from app.schemas.stylegan2ada import (
+    Edit,
     Generation,
+    Interpolation,
+    Profiling,
+    SimilaritySearch,
     StyleGan2ADA,
     StyleMix,
-    generation_method,
-    stylemix_method,
+    StyleMixGrid,
+    TruncationSweep,
 )
 from app.schemas.stylegan_user import StyleGanUser
+from app.stylegan.profiler import profile_synthesis_with_trace
 
 router = APIRouter()
 
@@ -44,9 +56,42 @@ async def style_mix_images_stylegan2ada(
 
     stylegan_user = stylegan_user_class(user, mongodb, StyleGan2ADA, style_mix_options)
 
-    stylegan_user.style_mix_images()
+    await stylegan_user.style_mix_images()
+
+    image_ids = await stylegan_user.save_user_images()
+    image_ids["url_prefix"] = IMAGE_STORAGE_BASE_URL
+    return image_ids
+
+
+@router.post("/stylemix/grid")
+async def style_mix_grid_stylegan2ada(
+    style_mix_grid_options: StyleMixGrid,
+    mongodb: AsyncIOMotorClient = Depends(mongodb.get_client),
+    ratelimited_user: tuple = Depends(check_user_ratelimit),
+    stylegan_user_class=Depends(StyleGanUser.get_class),
+) -> dict:
+    """Style mix every row image with every column image based on style mix grid options.
+
+    Args:
+        style_mix_grid_options (StyleMixGrid): a pydantic model that validates POST data
+        mongodb (AsyncIOMotorClient, optional): the mongodb database connection. Defaults to Depends(mongodb.get_client).
+        ratelimited_user (tuple, optional): a tuple with user object and if they should be ratelimited. Defaults to Depends(check_user_ratelimit).
+        stylegan_user_class ([type], optional): the stylegan user class. Defaults to Depends(StyleGanUser.get_class).
+
+    Returns:
+        dict: a dict that includes the urls to the result image of every mix and to the grid image
+    """
+    user = ratelimited_user[0]
+    is_ratelimited = ratelimited_user[1]
+    if is_ratelimited:
+        raise HTTPException(status_code=401, detail="You exceeded your rate limit of " + str(REDIS_RATELIMIT_REQUESTS) + " style mix requests per " + str(REDIS_RATELIMIT_PERIOD) + ".")
+
+    stylegan_user = stylegan_user_class(user, mongodb, StyleGan2ADA, style_mix_grid_options)
+
+    grid_key = await stylegan_user.style_mix_grid()
 
     image_ids = await stylegan_user.save_user_images()
+    image_ids["image_keys"]["grid_image"] = grid_key
     image_ids["url_prefix"] = IMAGE_STORAGE_BASE_URL
     return image_ids
 
@@ -76,7 +121,7 @@ async def generate_image_stylegan2ada(
 
     stylegan_user = stylegan_user_class(user, mongodb, StyleGan2ADA, generation_options)
 
-    stylegan_user.generate_image()
+    await stylegan_user.generate_image()
 
     image_id = await stylegan_user.save_user_images()
     image_id["url_prefix"] = IMAGE_STORAGE_BASE_URL
@@ -84,20 +129,177 @@ async def generate_image_stylegan2ada(
     return image_id
 
 
+@router.post("/truncation")
+async def truncation_sweep_stylegan2ada(
+    sweep_options: TruncationSweep,
+    mongodb: AsyncIOMotorClient = Depends(mongodb.get_client),
+    user: Auth0User = Security(auth.get_user, scopes=["use:all"]),
+    stylegan_user_class=Depends(StyleGanUser.get_class),
+) -> dict:
+    """Generate the preview images of a seed for many truncation values (e.g. for a truncation slider).
+
+    The previews are returned inline and not saved, so they do not count toward the rate limit. A chosen
+    truncation value is saved with the generate route, which renders the same image.
+
+    Args:
+        sweep_options (TruncationSweep): a pydantic model that validates POST data
+        mongodb (AsyncIOMotorClient, optional): the mongodb database connection. Defaults to Depends(mongodb.get_client).
+        user (Auth0User, optional): the current user object (decoded JWT). Defaults to Security(auth.get_user, scopes=["use:all"]).
+        stylegan_user_class ([type], optional): the stylegan user class. Defaults to Depends(StyleGanUser.get_class).
+
+    Returns:
+        dict: a dict with the JPEG data URL of the preview image of every truncation value
+    """
+    stylegan_user = stylegan_user_class(user, mongodb, StyleGan2ADA, sweep_options)
+    return await stylegan_user.truncation_sweep()
+
+
+async def get_edit_user(
+    edit_options: Edit,
+    mongodb: AsyncIOMotorClient = Depends(mongodb.get_client),
+    user: Auth0User = Security(auth.get_user, scopes=["use:all"]),
+    stylegan_user_class=Depends(StyleGanUser.get_class),
+) -> StyleGanUser:
+    """Return the stylegan user of an edit if the model has the chosen edit direction.
+
+    The edit route depends on this before the rate limit, so edits that cannot be rendered are not charged.
+
+    Args:
+        edit_options (Edit): a pydantic model that validates POST data
+        mongodb (AsyncIOMotorClient, optional): the mongodb database connection. Defaults to Depends(mongodb.get_client).
+        user (Auth0User, optional): the current user object (decoded JWT). Defaults to Security(auth.get_user, scopes=["use:all"]).
+        stylegan_user_class ([type], optional): the stylegan user class. Defaults to Depends(StyleGanUser.get_class).
+
+    Returns:
+        StyleGanUser: the stylegan user
+    """
+    stylegan_user = stylegan_user_class(user, mongodb, StyleGan2ADA, edit_options)
+    await stylegan_user.check_edit_directions()
+    return stylegan_user
+
+
+@router.post("/edit")
+async def edit_image_stylegan2ada(
+    stylegan_user: StyleGanUser = Depends(get_edit_user),
+    ratelimited_user: tuple = Depends(check_user_ratelimit),
+) -> dict:
+    """Edit an image along a precomputed direction with one or more strengths.
+
+    Args:
+        stylegan_user (StyleGanUser, optional): the stylegan user with the edit options. Defaults to Depends(get_edit_user).
+        ratelimited_user (tuple, optional): a tuple with user object and if they should be ratelimited. Defaults to Depends(check_user_ratelimit).
+
+    Returns:
+        dict: a dict that includes the urls to the result image of every strength
+    """
+    is_ratelimited = ratelimited_user[1]
+    if is_ratelimited:
+        raise HTTPException(status_code=401, detail="You exceeded your rate limit of " + str(REDIS_RATELIMIT_REQUESTS) + " edit requests per " + str(REDIS_RATELIMIT_PERIOD) + ".")
+
+    await stylegan_user.edit_image()
+
+    image_ids = await stylegan_user.save_user_images()
+    image_ids["url_prefix"] = IMAGE_STORAGE_BASE_URL
+    return image_ids
+
+
+@router.post("/interpolate")
+async def interpolate_stylegan2ada(
+    interpolation_options: Interpolation,
+    mongodb: AsyncIOMotorClient = Depends(mongodb.get_client),
+    ratelimited_user: tuple = Depends(check_user_ratelimit),
+    stylegan_user_class=Depends(StyleGanUser.get_class),
+) -> dict:
+    """Render a video that interpolates between seeds or images.
+
+    Args:
+        interpolation_options (Interpolation): a pydantic model that validates POST data
+        mongodb (AsyncIOMotorClient, optional): the mongodb database connection. Defaults to Depends(mongodb.get_client).
+        ratelimited_user (tuple, optional): a tuple with user object and if they should be ratelimited. Defaults to Depends(check_user_ratelimit).
+        stylegan_user_class ([type], optional): the stylegan user class. Defaults to Depends(StyleGanUser.get_class).
+
+    Returns:
+        dict: a dict that includes the url to the video and its number of frames
+    """
+    user = ratelimited_user[0]
+    is_ratelimited = ratelimited_user[1]
+    if is_ratelimited:
+        raise HTTPException(status_code=401, detail="You exceeded your rate limit of " + str(REDIS_RATELIMIT_REQUESTS) + " interpolation requests per " + str(REDIS_RATELIMIT_PERIOD) + ".")
+
+    stylegan_user = stylegan_user_class(user, mongodb, StyleGan2ADA, interpolation_options)
+
+    video = await stylegan_user.render_interpolation_video()
+    video["url_prefix"] = VIDEO_STORAGE_BASE_URL
+    return video
+
+
+@router.post("/similar")
+async def find_similar_images_stylegan2ada(
+    search_options: SimilaritySearch,
+    mongodb: AsyncIOMotorClient = Depends(mongodb.get_client),
+    user: Auth0User = Security(auth.get_user, scopes=["use:all"]),
+    stylegan_user_class=Depends(StyleGanUser.get_class),
+) -> dict:
+    """Find the saved images of the user that are most similar to an image or a seed.
+
+    Searches create no images, so they do not count toward the rate limit of the user (seeds are
+    mapped behind the admission controller).
+
+    Args:
+        search_options (SimilaritySearch): a pydantic model that validates POST data
+        mongodb (AsyncIOMotorClient, optional): the mongodb database connection. Defaults to Depends(mongodb.get_client).
+        user (Auth0User, optional): the current user object (decoded JWT). Defaults to Security(auth.get_user, scopes=["use:all"]).
+        stylegan_user_class ([type], optional): the stylegan user class. Defaults to Depends(StyleGanUser.get_class).
+
+    Returns:
+        dict: a dict that includes the ids, the image keys and the similarity of the most similar images
+    """
+    stylegan_user = stylegan_user_class(user, mongodb, StyleGan2ADA, search_options)
+
+    images = await stylegan_user.find_similar_images()
+    return {"images": images, "url_prefix": IMAGE_STORAGE_BASE_URL}
+
+
 @router.get("/methods")
 async def get_methods_stylegan2ada(
-    generation_method: dict = Depends(generation_method),
-    stylemix_method: dict = Depends(stylemix_method),
+    request: Request,
     user: Auth0User = Security(auth.get_user, scopes=["use:all"]),
-) -> dict:
+) -> Response:
     """Get all supported methods of the StyleGan2ADA version.
 
     Args:
-        generation_method (dict, optional): a dict that contains information about the generation method. Defaults to Depends(generation_method).
-        stylemix_method (dict, optional): a dict that contains information about the style mix method. Defaults to Depends(stylemix_method).
+        request (Request): the request (for the ETag of the catalog version)
         user (Auth0User, optional): the current user object (decoded JWT). Defaults to Security(auth.get_user, scopes=["use:all"]).
 
     Returns:
-        dict: a dict with all methods and their information
+        Response: a JSON response with all methods and their information (or 304 if they did not change)
+    """
+    snapshot = stylegan2ada_catalog.snapshot
+    return snapshot.response(request, snapshot.methods_body)
+
+
+@router.post("/profile")
+async def profile_stylegan2ada(
+    profiling_options: Profiling,
+    user: Auth0User = Security(auth.get_user, scopes=["admin:profile"]),
+) -> dict:
+    """Profile the synthesis of a model per block and op (admin only).
+
+    The model is loaded and profiled behind the admission controller, so profiling takes an inference
+    slot like other requests and never blocks the event loop.
+
+    Args:
+        profiling_options (Profiling): a pydantic model that validates POST data
+        user (Auth0User, optional): the current user object (decoded JWT). Defaults to Security(auth.get_user, scopes=["admin:profile"]).
+
+    Returns:
+        dict: a dict with the time, FLOPs and allocations per block and op, and the Chrome trace
     """
-    return {"generation_method": generation_method, "stylemix_method": stylemix_method}
+
+    def profile() -> dict:
+        stylegan2ada = StyleGan2ADA(profiling_options.model, profiling_options)
+        return profile_synthesis_with_trace(
+            stylegan2ada.model, profiling_options.batch_size, profiling_options.runs
+        )
+
+    return await run_inference(profile)
@@ -1,11 +1,10 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Query, Security
+from fastapi import APIRouter, Depends, Query, Response, Security
 from fastapi_auth0 import Auth0User
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from app.core.auth0 import auth
-from app.core.config import IMAGE_STORAGE_BASE_URL
 from app.db.mongodb import mongodb
 from app.schemas.mongodb import DeletionOptions
 from app.schemas.stylegan_user import StyleGanUser
@@ -15,25 +14,30 @@ router = APIRouter()
 
 @router.get("/images")
 async def get_user_images(
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
     mongodb: AsyncIOMotorClient = Depends(mongodb.get_client),
     user: Auth0User = Security(auth.get_user, scopes=["use:all"]),
     stylegan_user_class=Depends(StyleGanUser.get_class),
-) -> dict:
-    """Get all images of the user.
+) -> Response:
+    """Get all images of the user or a page of them (in the order they were saved).
 
     Args:
+        offset (int, optional): the number of skipped images. Defaults to Query(0, ge=0).
+        limit (Optional[int], optional): the maximum number of images. Defaults to Query(None, ge=1) (all images).
         mongodb (AsyncIOMotorClient, optional): the mongodb database connection. Defaults to Depends(mongodb.get_client).
         user (Auth0User, optional): [description]. Defaults to Security(auth.get_user, scopes=["use:all"]).
         stylegan_user_class ([type], optional): the current user object (decoded JWT). Defaults to Depends(StyleGanUser.get_class).
 
     Returns:
-        dict: a dict with the image url prefix and a list with all image ids
+        Response: a JSON response with the image url prefix and a list with all image data
     """
     stylegan_user = stylegan_user_class(user, mongodb)
 
-    all_image_ids = await stylegan_user.get_user_images()
+    # The page is cached as JSON, so it is not validated and serialized again.
+    page = await stylegan_user.get_user_images_json(offset, limit)
 
-    return {"image_url_prefix": IMAGE_STORAGE_BASE_URL, "image_ids": all_image_ids}
+    return Response(content=page, media_type="application/json")
 
 
 @router.delete("/images")
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from app.core.config import VIDEO_BUCKET
+from app.db.storage import storage_backend
+from app.stylegan.interpolation import VIDEO_FORMATS
+
+router = APIRouter()
+
+
+@router.get("/{video_key}")
+async def get_video(video_key: str, request: Request) -> Response:
+    """Get an interpolation video from the storage backend (with byte ranges for local storage, so it can be seeked).
+
+    Args:
+        video_key (str): the name of the video in the video bucket (its format is the suffix, e.g. ..._mp4)
+        request (Request): the request (for its Range header)
+
+    Raises:
+        HTTPException: 404 if there is no video with this key
+
+    Returns:
+        Response: the video (or the requested byte range of it)
+    """
+    video_format = video_key.rsplit("_", 1)[-1]
+    try:
+        if video_format not in VIDEO_FORMATS:
+            raise ValueError(f"Unknown video format: {video_format}")
+        return await storage_backend.response(
+            request, VIDEO_BUCKET, video_key, VIDEO_FORMATS[video_format][1]
+        )
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=404, detail="There is no video with this key.")
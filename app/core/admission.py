@@ -0,0 +1,160 @@
+import asyncio
+import math
+import time
+from typing import Any, Callable, Hashable
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import (
+    ADMISSION_MAX_WAIT,
+    INFERENCE_CONCURRENCY,
+    VIDEO_ADMISSION_MAX_WAIT,
+    VIDEO_CONCURRENCY,
+)
+from app.core.metrics import Counter, Gauge
+from app.core.singleflight import SingleFlight
+
+
+class AdmissionController:
+    """An admission controller that sheds inference work which would wait longer than a budget.
+
+    At most `concurrency` calls run at the same time, the others are queued. The wait of a new call is
+    predicted from the queue and a moving average of the recent service times. Calls whose predicted
+    wait exceeds the budget are rejected right away with 503 and Retry-After, instead of queueing
+    until the client gives up (and the CPU works for nobody).
+    """
+
+    def __init__(self, concurrency: int, max_wait: float, smoothing: float = 0.2) -> None:
+        """Init a new admission controller.
+
+        Args:
+            concurrency (int): the number of calls that run at the same time
+            max_wait (float): the longest predicted wait in seconds that is admitted
+            smoothing (float, optional): the weight of the latest service time in the moving average. Defaults to 0.2.
+        """
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.smoothing = smoothing
+        self.running = 0
+        self.queued = 0
+        self.rejected = 0
+        # The moving average of the service times in seconds (None until the first call finished).
+        self.service_time = None
+        self._semaphore = None
+        self._loop = None
+
+    def estimated_wait(self) -> float:
+        """Return the predicted seconds until a new call would start running."""
+        if self.running < self.concurrency or self.service_time is None:
+            return 0.0
+        return (self.queued + 1) / self.concurrency * self.service_time
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Return the semaphore of the running event loop."""
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run a blocking function in the threadpool once it is admitted.
+
+        Args:
+            fn (Callable): the blocking function (e.g. an inference method)
+            *args: the arguments of the function
+
+        Raises:
+            HTTPException: 503 with Retry-After if the predicted wait exceeds the budget
+
+        Returns:
+            Any: the result of the function
+        """
+        wait = self.estimated_wait()
+        if wait > self.max_wait:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="The server is busy. Please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+
+        semaphore = self._get_semaphore()
+        self.queued += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            return await run_in_threadpool(fn, *args)
+        finally:
+            duration = time.perf_counter() - start
+            self.running -= 1
+            semaphore.release()
+            if self.service_time is None:
+                self.service_time = duration
+            else:
+                self.service_time += self.smoothing * (duration - self.service_time)
+
+
+inference_admission = AdmissionController(INFERENCE_CONCURRENCY, ADMISSION_MAX_WAIT)
+inference_flights = SingleFlight()
+# Video renders take minutes, so their service times are predicted separately from the ones of images.
+video_admission = AdmissionController(VIDEO_CONCURRENCY, VIDEO_ADMISSION_MAX_WAIT)
+
+
+async def run_inference(fn: Callable, *args, key: Hashable = None) -> Any:
+    """Run an inference function in the threadpool behind the admission controller (see AdmissionController.run).
+
+    Args:
+        fn (Callable): the blocking inference function
+        *args: the arguments of the function
+        key (Hashable, optional): a key of the normalised inputs, calls with the same key that overlap share one run. Defaults to None (never shared).
+
+    Returns:
+        Any: the result of the function (shared between coalesced calls, so it must not be modified)
+    """
+    if key is None:
+        return await inference_admission.run(fn, *args)
+    return await inference_flights.do(key, lambda: inference_admission.run(fn, *args))
+
+
+# The state of the admission controller (read when the metrics are scraped).
+Gauge(
+    "cp_inference_queue_depth",
+    "The number of requests that are waiting for or running inference.",
+    function=lambda: {(): inference_admission.running + inference_admission.queued},
+)
+Gauge(
+    "cp_inference_queued",
+    "The number of requests that are waiting for inference.",
+    function=lambda: {(): inference_admission.queued},
+)
+Gauge(
+    "cp_inference_estimated_wait_seconds",
+    "The predicted wait of a new inference request.",
+    function=lambda: {(): inference_admission.estimated_wait()},
+)
+Counter(
+    "cp_inference_rejected_total",
+    "The number of inference requests that were rejected with 503.",
+    function=lambda: {(): inference_admission.rejected},
+)
+Gauge(
+    "cp_video_queue_depth",
+    "The number of video renders that are waiting or running.",
+    function=lambda: {(): video_admission.running + video_admission.queued},
+)
+Counter(
+    "cp_video_rejected_total",
+    "The number of video requests that were rejected with 503.",
+    function=lambda: {(): video_admission.rejected},
+)
+Counter(
+    "cp_inference_coalesced_total",
+    "The number of inference calls that shared the run of an identical call.",
+    function=lambda: {(): inference_flights.coalesced},
+)
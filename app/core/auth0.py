@@ -1,7 +1,131 @@
-from fastapi_auth0 import Auth0
+import asyncio
+import hashlib
+import logging
+import time
+from typing import List, Optional
 
-from app.core.config import AUTH0_API, AUTH0_DOMAIN
+import requests
+from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials, SecurityScopes
+from fastapi_auth0 import Auth0, Auth0User
+from fastapi_auth0.auth import Auth0HTTPBearer, Auth0UnauthorizedException
+from jose import jwt
 
-auth = Auth0(
-    domain=AUTH0_DOMAIN, api_audience=AUTH0_API, scopes={"use:all": "Use all models"}
+from app.core.cache import LRUCache
+from app.core.config import (
+    AUTH0_API,
+    AUTH0_DOMAIN,
+    AUTH0_JWKS_MAX_AGE,
+    AUTH0_JWKS_MIN_REFRESH_INTERVAL,
+    AUTH0_TOKEN_CACHE_MAX_ENTRIES,
+)
+from app.core.metrics import stage_latency
+
+
+class CachedAuth0(Auth0):
+    """An Auth0 client that caches verified tokens until they expire and keeps its JWKS fresh.
+
+    The frontend reuses one access token for its whole lifetime, so only the first request with a
+    token verifies its signature. Later requests only check the scopes of the cached token.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Init a new Auth0 client (see Auth0), which fetches the JWKS once."""
+        super().__init__(*args, **kwargs)
+        # The expiration time, the scopes and the user of verified tokens by the token hash.
+        self.token_cache = LRUCache(max_entries=AUTH0_TOKEN_CACHE_MAX_ENTRIES, name="auth0_token")
+        self.jwks_fetched_at = self.jwks_attempted_at = time.monotonic()
+        self._jwks_refresh = None
+
+    def _fetch_jwks(self) -> None:
+        """Fetch the JWKS of the Auth0 domain."""
+        response = requests.get(f"https://{self.domain}/.well-known/jwks.json", timeout=10)
+        response.raise_for_status()
+        self.jwks = response.json()
+        self.jwks_fetched_at = time.monotonic()
+
+    async def _refresh_jwks_task(self) -> None:
+        """Fetch the JWKS in the threadpool and keep the old keys if the fetch fails."""
+        try:
+            await run_in_threadpool(self._fetch_jwks)
+        except Exception as e:
+            logging.error(f"Could not refresh the Auth0 JWKS: {e}")
+
+    def refresh_jwks(self) -> Optional[asyncio.Future]:
+        """Start a JWKS refresh, unless one is already running (single flight) or the last one was too recent.
+
+        Returns:
+            Optional[asyncio.Future]: the running refresh or None
+        """
+        if self._jwks_refresh is not None and not self._jwks_refresh.done():
+            return self._jwks_refresh
+        if time.monotonic() - self.jwks_attempted_at < AUTH0_JWKS_MIN_REFRESH_INTERVAL:
+            return None
+        self.jwks_attempted_at = time.monotonic()
+        self._jwks_refresh = asyncio.ensure_future(self._refresh_jwks_task())
+        return self._jwks_refresh
+
+    async def _ensure_signing_key(self, token: str) -> None:
+        """Refresh the JWKS if a token is signed with an unknown key (key rotation) or the JWKS is old."""
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.JWTError:
+            # Malformed tokens are rejected by the verification.
+            return
+        if kid in {key.get("kid") for key in self.jwks.get("keys", [])}:
+            if time.monotonic() - self.jwks_fetched_at > AUTH0_JWKS_MAX_AGE:
+                # Refresh in the background, the current keys are still valid.
+                self.refresh_jwks()
+            return
+        refresh = self.refresh_jwks()
+        if refresh is not None:
+            await asyncio.shield(refresh)
+
+    def _check_scopes(self, security_scopes: SecurityScopes, token_scopes: List[str]) -> None:
+        """Raise an Auth0UnauthorizedException if a token is missing a required scope (like Auth0.get_user)."""
+        if not self.scope_auto_error:
+            return
+        for scope in security_scopes.scopes:
+            if scope not in token_scopes:
+                raise Auth0UnauthorizedException(
+                    detail=f'Missing "{scope}" scope',
+                    headers={"WWW-Authenticate": f'Bearer scope="{security_scopes.scope_str}"'},
+                )
+
+    async def get_user(
+        self,
+        security_scopes: SecurityScopes,
+        creds: Optional[HTTPAuthorizationCredentials] = Depends(
+            Auth0HTTPBearer(auto_error=False)
+        ),
+    ) -> Optional[Auth0User]:
+        """Return the user of a bearer token, which is only verified if it is not cached (see Auth0.get_user)."""
+        with stage_latency.time("auth0_verify"):
+            if creds is None:
+                return await super().get_user(security_scopes, creds)
+
+            token = creds.credentials
+            key = hashlib.sha256(token.encode()).hexdigest()
+            cached = self.token_cache.get(key)
+            if cached is not None and cached[0] > time.time():
+                expires_at, token_scopes, user = cached
+                self._check_scopes(security_scopes, token_scopes)
+                return user
+
+            await self._ensure_signing_key(token)
+            user = await super().get_user(security_scopes, creds)
+            if user is not None:
+                # The claims were verified by Auth0.get_user.
+                claims = jwt.get_unverified_claims(token)
+                scope = claims.get("scope", "")
+                if isinstance(claims.get("exp"), (int, float)) and isinstance(scope, str):
+                    self.token_cache.set(key, (claims["exp"], scope.split(), user))
+            return user
+
+
+auth = CachedAuth0(
+    domain=AUTH0_DOMAIN,
+    api_audience=AUTH0_API,
+    scopes={"use:all": "Use all models", "admin:profile": "Profile the models"},
 )
@@ -0,0 +1,322 @@
+import json
+import math
+import os
+import platform
+import time
+from typing import List, Optional
+
+import click
+from pydantic import BaseModel
+
+from app.core.config import AUTOTUNE_CONFIG_PATH, AUTOTUNE_PIN_CORES
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+SYSFS_CPU_ROOT = "/sys/devices/system/cpu"
+# Synthesis of single images stops scaling at about 4 threads, more cores are better used by more workers.
+MAX_THREADS_PER_WORKER = 4
+
+
+class CpuTopology(BaseModel):
+    """The CPUs that this process may use.
+
+    Attributes:
+        cpus (List[int]): the logical CPUs in the affinity mask of the process
+        cores (List[List[int]]): the physical cores as lists of their logical CPUs (hyperthreads)
+        quota (Optional[float]): the cgroup CPU quota in cores. Defaults to None (no quota).
+    """
+
+    cpus: List[int]
+    cores: List[List[int]]
+    quota: Optional[float] = None
+
+    @property
+    def usable_cores(self) -> int:
+        """Return the number of physical cores that can be used at the same time."""
+        cores = len(self.cores)
+        if self.quota is not None:
+            cores = min(cores, math.floor(self.quota))
+        return max(cores, 1)
+
+    @property
+    def shape(self) -> str:
+        """Return a key of the machine shape (the CPU model and the usable cores) for calibrations."""
+        return f"{cpu_model()}|cores={self.usable_cores}|cpus={len(self.cpus)}"
+
+
+class WorkerConfig(BaseModel):
+    """The number of workers and the torch threads per worker.
+
+    Attributes:
+        workers (int): the number of gunicorn workers
+        threads (int): the intra-op threads per worker (torch.set_num_threads)
+        interop_threads (int): the inter-op threads per worker (torch.set_num_interop_threads)
+        pin (bool): whether every worker is pinned to its own physical cores
+        images_per_sec (Optional[float]): the calibrated synthesis throughput. Defaults to None (not calibrated).
+    """
+
+    workers: int
+    threads: int
+    interop_threads: int = 1
+    pin: bool = False
+    images_per_sec: Optional[float] = None
+
+
+def cpu_model() -> str:
+    """Return the model name of the CPU."""
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    return platform.processor() or platform.machine()
+
+
+def cpu_quota(cgroup_root: str = CGROUP_ROOT) -> Optional[float]:
+    """Return the cgroup CPU quota in cores (cgroup v2 or v1).
+
+    Args:
+        cgroup_root (str, optional): the cgroup mount point. Defaults to CGROUP_ROOT.
+
+    Returns:
+        Optional[float]: the quota or None if there is none
+    """
+    try:
+        with open(os.path.join(cgroup_root, "cpu.max")) as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_quota_us")) as f:
+            quota = int(f.read())
+        with open(os.path.join(cgroup_root, "cpu", "cpu.cfs_period_us")) as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def physical_cores(cpus: List[int], sysfs_root: str = SYSFS_CPU_ROOT) -> List[List[int]]:
+    """Group logical CPUs by their physical core.
+
+    Args:
+        cpus (List[int]): the logical CPUs
+        sysfs_root (str, optional): the sysfs CPU directory. Defaults to SYSFS_CPU_ROOT.
+
+    Returns:
+        List[List[int]]: the logical CPUs of every physical core (every CPU is its own core if the topology is unknown)
+    """
+    cores = {}
+    for cpu in cpus:
+        topology = os.path.join(sysfs_root, f"cpu{cpu}", "topology")
+        try:
+            with open(os.path.join(topology, "physical_package_id")) as f:
+                package = int(f.read())
+            with open(os.path.join(topology, "core_id")) as f:
+                core = int(f.read())
+        except (OSError, ValueError):
+            package, core = None, cpu
+        cores.setdefault((package, core), []).append(cpu)
+    return sorted(cores.values())
+
+
+def detect_topology() -> CpuTopology:
+    """Return the CPU topology of this process."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    return CpuTopology(cpus=cpus, cores=physical_cores(cpus), quota=cpu_quota())
+
+
+def default_config(topology: CpuTopology, threads: int = None) -> WorkerConfig:
+    """Return a worker config that uses every usable core once.
+
+    Args:
+        topology (CpuTopology): the CPU topology
+        threads (int, optional): the threads per worker. Defaults to None (up to MAX_THREADS_PER_WORKER).
+
+    Returns:
+        WorkerConfig: the worker config
+    """
+    cores = topology.usable_cores
+    threads = min(threads or MAX_THREADS_PER_WORKER, cores)
+    # Pinning needs whole cores per worker, which a quota does not guarantee.
+    pin = AUTOTUNE_PIN_CORES and topology.quota is None
+    return WorkerConfig(workers=max(cores // threads, 1), threads=threads, pin=pin)
+
+
+def override_config(
+    topology: CpuTopology, config: WorkerConfig, workers: int = None, threads: int = None
+) -> WorkerConfig:
+    """Return a worker config with a fixed number of workers and/or threads that still uses every usable core once.
+
+    Args:
+        topology (CpuTopology): the CPU topology
+        config (WorkerConfig): the calibrated or default worker config
+        workers (int, optional): the number of workers. Defaults to None (split the cores by the threads).
+        threads (int, optional): the threads per worker. Defaults to None (split the cores by the workers).
+
+    Returns:
+        WorkerConfig: the worker config
+    """
+    if not workers and not threads:
+        return config
+    cores = topology.usable_cores
+    threads = threads or max(cores // workers, 1)
+    workers = workers or max(cores // threads, 1)
+    # Pinned workers must not share cores.
+    pin = config.pin and workers * threads <= len(topology.cores)
+    return WorkerConfig(
+        workers=workers, threads=threads, interop_threads=config.interop_threads, pin=pin
+    )
+
+
+def worker_cpus(topology: CpuTopology, config: WorkerConfig, worker_index: int) -> List[int]:
+    """Return the logical CPUs of the physical cores that a worker is pinned to."""
+    index = worker_index % config.workers
+    cores = topology.cores[index * config.threads : (index + 1) * config.threads]
+    return [cpu for core in cores for cpu in core] or topology.cpus
+
+
+def load_config(topology: CpuTopology, path: str = AUTOTUNE_CONFIG_PATH) -> WorkerConfig:
+    """Return the calibrated worker config of the machine shape or the default config.
+
+    Args:
+        topology (CpuTopology): the CPU topology
+        path (str, optional): the calibration file. Defaults to AUTOTUNE_CONFIG_PATH.
+
+    Returns:
+        WorkerConfig: the worker config
+    """
+    if os.path.exists(path):
+        with open(path) as f:
+            calibrations = json.load(f)
+        if topology.shape in calibrations:
+            return WorkerConfig(**calibrations[topology.shape])
+    return default_config(topology)
+
+
+def save_config(topology: CpuTopology, config: WorkerConfig, path: str = AUTOTUNE_CONFIG_PATH) -> None:
+    """Save the calibrated worker config of the machine shape (next to the ones of other shapes)."""
+    calibrations = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            calibrations = json.load(f)
+    calibrations[topology.shape] = config.dict()
+    with open(path, "w") as f:
+        json.dump(calibrations, f, indent=2)
+
+
+def apply_worker_config(config: WorkerConfig, cpus: List[int] = None) -> None:
+    """Set the torch threads of this process and optionally pin it to CPUs.
+
+    Call this in a new worker before the model runs (the thread pools cannot be resized later).
+
+    Args:
+        config (WorkerConfig): the worker config
+        cpus (List[int], optional): the CPUs this process is pinned to. Defaults to None (no pinning).
+    """
+    # The OpenMP and MKL pools read the environment when they start.
+    os.environ["OMP_NUM_THREADS"] = str(config.threads)
+    os.environ["MKL_NUM_THREADS"] = str(config.threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+    import torch
+
+    torch.set_num_threads(config.threads)
+    torch.set_num_interop_threads(config.interop_threads)
+
+
+def _calibration_worker(config: dict, cpus: List[int], duration: float, barrier, results) -> None:
+    """Run the synthesis of random feature vectors for a duration and report the number of images."""
+    apply_worker_config(WorkerConfig(**config), cpus)
+
+    import torch
+
+    from app.schemas.stylegan_models import stylegan2ada_models
+    from app.stylegan.backends import load_inference_model
+    from app.stylegan.load_model import load_model_from_pkl_stylegan2ada
+
+    model = stylegan2ada_models.models[0]
+    G = load_model_from_pkl_stylegan2ada(stylegan2ada_models.path, model)
+    G = load_inference_model(stylegan2ada_models.path, model, G)
+
+    def synthesize():
+        with torch.no_grad():
+            w = G.mapping(torch.randn(1, G.z_dim), None, truncation_psi=1)
+            G.synthesis(w, noise_mode="const", force_fp32=True)
+
+    synthesize()
+    barrier.wait()
+    images = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        synthesize()
+        images += 1
+    results.put(images)
+
+
+def calibrate(topology: CpuTopology, duration: float = 20) -> List[WorkerConfig]:
+    """Measure the synthesis throughput of all worker configs that use every usable core once.
+
+    Args:
+        topology (CpuTopology): the CPU topology
+        duration (float, optional): the measured seconds per config. Defaults to 20.
+
+    Returns:
+        List[WorkerConfig]: the configs with their throughput, the fastest first
+    """
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    candidates = []
+    threads = 1
+    while threads <= topology.usable_cores:
+        candidates.append(default_config(topology, threads))
+        threads *= 2
+
+    for config in candidates:
+        barrier = context.Barrier(config.workers)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_calibration_worker,
+                args=(
+                    config.dict(),
+                    worker_cpus(topology, config, index) if config.pin else None,
+                    duration,
+                    barrier,
+                    results,
+                ),
+            )
+            for index in range(config.workers)
+        ]
+        for process in processes:
+            process.start()
+        images = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        config.images_per_sec = images / duration
+    return sorted(candidates, key=lambda config: -config.images_per_sec)
+
+
+@click.command()
+@click.option("--duration", default=20.0, show_default=True, help="Measured seconds per config.")
+@click.option("--path", default=AUTOTUNE_CONFIG_PATH, show_default=True, help="The calibration file.")
+def autotune(duration: float, path: str) -> None:
+    """Calibrate the gunicorn workers and torch threads for this machine shape and save the fastest config."""
+    topology = detect_topology()
+    click.echo(f"{topology.shape}: {len(topology.cores)} cores, quota {topology.quota}")
+    configs = calibrate(topology, duration)
+    for config in configs:
+        click.echo(
+            f"{config.workers} workers x {config.threads} threads: {config.images_per_sec:.2f} images/s"
+        )
+    save_config(topology, configs[0], path)
+    click.echo(f"Saved {configs[0].workers} workers x {configs[0].threads} threads to {path}")
+
+
+if __name__ == "__main__":
+    autotune()
@@ -0,0 +1,129 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from app.core.metrics import Counter, Gauge
+
+# All caches with a name by their name (for the cache metrics).
+named_caches = {}
+
+
+class LRUCache:
+    """A thread-safe least recently used cache that is bounded by its number of entries and/or their total size."""
+
+    def __init__(
+        self,
+        max_entries: int = None,
+        max_size: int = None,
+        sizeof: Callable[[Any], int] = None,
+        name: str = None,
+    ) -> None:
+        """Init a new LRU cache.
+
+        Args:
+            max_entries (int, optional): the maximum number of entries. Defaults to None (unbounded).
+            max_size (int, optional): the maximum total size of all entries (measured by sizeof). Defaults to None (unbounded).
+            sizeof (Callable[[Any], int], optional): a function that returns the size of a value. Defaults to None (every entry has size 1).
+            name (str, optional): the name of the cache in the cache metrics. Defaults to None (not in the metrics).
+        """
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.sizeof = sizeof or (lambda value: 1)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if name is not None:
+            named_caches[name] = self
+
+    def __len__(self) -> int:
+        """Return the number of entries."""
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Return whether a key is cached (without counting it as a use)."""
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value and mark it as recently used.
+
+        Args:
+            key (Hashable): the key of the value
+            default (Any, optional): the value that is returned if the key is not cached. Defaults to None.
+
+        Returns:
+            Any: the cached value or the default
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Cache a value and evict the least recently used entries if the cache is full.
+
+        Values that are larger than the maximum size on their own are not cached.
+
+        Args:
+            key (Hashable): the key of the value
+            value (Any): the value
+        """
+        size = self.sizeof(value)
+        if self.max_size is not None and size > self.max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while (self.max_entries is not None and len(self._entries) > self.max_entries) or (
+                self.max_size is not None and self.size > self.max_size
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove a key and return its value (or the default if it is not cached)."""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value, size = self._entries.pop(key)
+            self.size -= size
+            return value
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Remove all entries whose key matches a predicate."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self.size -= self._entries.pop(key)[1]
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+# The statistics of the named caches (read from the caches when the metrics are scraped).
+Counter(
+    "cp_cache_hits_total",
+    "The number of cache hits by cache.",
+    ("cache",),
+    function=lambda: {(name,): cache.hits for name, cache in list(named_caches.items())},
+)
+Counter(
+    "cp_cache_misses_total",
+    "The number of cache misses by cache.",
+    ("cache",),
+    function=lambda: {(name,): cache.misses for name, cache in list(named_caches.items())},
+)
+Gauge(
+    "cp_cache_entries",
+    "The number of cache entries by cache.",
+    ("cache",),
+    function=lambda: {(name,): len(cache) for name, cache in list(named_caches.items())},
+)
@@ -5,7 +5,10 @@ API_NAME = "CP_API"
 VERSION = "0.0.1"
 API_PREFIX = "/api/v1"
 DEBUG = bool(os.getenv("FASTAPI_DEBUG"))
-IMAGE_STORAGE_BASE_URL = "https://images.webdesigan.com/"
+# The URL prefix of the image keys, e.g. the CDN of the image bucket or {API_PREFIX}/images/ for local storage.
+IMAGE_STORAGE_BASE_URL = os.getenv("IMAGE_STORAGE_BASE_URL", "https://images.webdesigan.com/")
+# The URL prefix of the video keys (the videos route of the API serves them from every storage backend).
+VIDEO_STORAGE_BASE_URL = os.getenv("VIDEO_STORAGE_BASE_URL", f"{API_PREFIX}/videos/")
 # Auth0
 AUTH0_DOMAIN = os.getenv("AUTH0_DOMAIN")
 AUTH0_API = os.getenv("AUTH0_API")
@@ -15,7 +18,80 @@ REDIS_RATELIMIT_REQUESTS = int(os.getenv("REDIS_RATELIMIT_REQUESTS"))
 REDIS_RATELIMIT_PERIOD = timedelta(
     minutes=int(os.getenv("REDIS_RATELIMIT_PERIOD_MINUTES"))
 )
+# The seconds that the image listing of a user is cached (it is invalidated when the images change).
+USER_IMAGES_CACHE_TTL = int(os.getenv("USER_IMAGES_CACHE_TTL", "3600"))
+# Storage
+# One of "gcs", "local" (blobs in LOCAL_STORAGE_PATH) or "s3" (AWS S3 or the S3 compatible storage at S3_ENDPOINT_URL).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs")
+LOCAL_STORAGE_PATH = os.getenv("LOCAL_STORAGE_PATH", "storage")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+IMAGE_BUCKET = os.getenv("IMAGE_BUCKET", "stylegan-images")
+VECTOR_BUCKET = os.getenv("VECTOR_BUCKET", "stylegan-images-vectors")
+VIDEO_BUCKET = os.getenv("VIDEO_BUCKET", "stylegan-videos")
+# The seconds that a blob deletion may take before saves of the same content stop waiting for it.
+BLOB_DELETION_TIMEOUT = float(os.getenv("BLOB_DELETION_TIMEOUT", "60"))
+# The bytes of downloaded feature vectors that every worker caches (0 disables it), and the seconds
+# that they are also cached in redis for the other workers (0 disables it).
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(64 * 2 ** 20)))
+BLOB_CACHE_REDIS_TTL = int(os.getenv("BLOB_CACHE_REDIS_TTL", "0"))
+# Where the feature vectors of new images are saved: "bucket" (VECTOR_BUCKET) or "mongodb" (in the
+# document of the image, so style mixing by id does not read from the storage).
+LATENT_STORE = os.getenv("LATENT_STORE", "bucket")
+# The number of similarity search indexes (one per user and model) that every worker keeps in memory.
+LATENT_INDEX_MAX_PARTITIONS = int(os.getenv("LATENT_INDEX_MAX_PARTITIONS", "1024"))
 # MongoDB
 MONGO_URL = str(os.getenv("MONGO_URL"))
 MONGO_DB_NAME = str(os.getenv("MONGO_DB_NAME"))
 MONGO_COLLECTION_NAME = str(os.getenv("MONGO_COLLECTION_NAME"))
+# The collection of the reference counts of content addressed blobs.
+MONGO_BLOB_COLLECTION_NAME = str(os.getenv("MONGO_BLOB_COLLECTION_NAME", "blobs"))
+# The collection of the blobs of a user that are not in the gallery (e.g. style mix grids).
+MONGO_ASSET_COLLECTION_NAME = str(os.getenv("MONGO_ASSET_COLLECTION_NAME", "assets"))
+# Inference
+# One of "eager", "torchscript", "onnxruntime" or "int8". Falls back to eager if a model has not been
+# exported or its int8 version exceeds the drift budget.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torchscript")
+# 0 uses the torch threads of the worker (see gunicorn_conf.py).
+ONNXRUNTIME_INTRA_OP_THREADS = int(os.getenv("ONNXRUNTIME_INTRA_OP_THREADS", "0"))
+ONNXRUNTIME_INTER_OP_THREADS = int(os.getenv("ONNXRUNTIME_INTER_OP_THREADS", "0"))
+# The drift budget of int8 models against their fp32 version (over fixed seeds), which is measured with the
+# LPIPS features of the VGG16 network at VGG16_PATH (also used by the projection).
+QUANTIZATION_MIN_PSNR = float(os.getenv("QUANTIZATION_MIN_PSNR", "30"))
+QUANTIZATION_MAX_LPIPS = float(os.getenv("QUANTIZATION_MAX_LPIPS", "0.05"))
+VGG16_PATH = os.getenv(
+    "VGG16_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "vgg16.pt"),
+)
+# The cache of synthesis block outputs (0 disables it) and the highest block resolution it stores.
+BLOCK_CACHE_MAX_BYTES = int(os.getenv("BLOCK_CACHE_MAX_BYTES", str(256 * 2 ** 20)))
+BLOCK_CACHE_MAX_RESOLUTION = int(os.getenv("BLOCK_CACHE_MAX_RESOLUTION", "64"))
+# The number of cached untruncated feature vectors (per model and seed).
+LATENT_CACHE_MAX_ENTRIES = int(os.getenv("LATENT_CACHE_MAX_ENTRIES", "4096"))
+# The number of cached verified access tokens (0 disables the cache) and the minimum seconds between
+# JWKS fetches, which are refreshed in the background after AUTH0_JWKS_MAX_AGE seconds.
+AUTH0_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH0_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+AUTH0_JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("AUTH0_JWKS_MIN_REFRESH_INTERVAL", "30"))
+AUTH0_JWKS_MAX_AGE = float(os.getenv("AUTH0_JWKS_MAX_AGE", "3600"))
+# The calibrated gunicorn workers and torch threads per machine shape (python -m app.core.autotune),
+# and whether every worker is pinned to its own physical cores.
+AUTOTUNE_CONFIG_PATH = os.getenv("AUTOTUNE_CONFIG_PATH", "autotune.json")
+AUTOTUNE_PIN_CORES = os.getenv("AUTOTUNE_PIN_CORES", "").lower() in ("1", "true")
+# The number of inference calls that run at the same time per worker, and the longest predicted
+# queueing time in seconds before inference requests are rejected with 503.
+INFERENCE_CONCURRENCY = int(os.getenv("INFERENCE_CONCURRENCY", "1"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "10"))
+# Interpolation videos are admitted separately (their long renders would inflate the predicted waits
+# of images): the renders per worker, the longest predicted wait, the frames per synthesis batch and
+# the most frames of a video.
+VIDEO_CONCURRENCY = int(os.getenv("VIDEO_CONCURRENCY", "1"))
+VIDEO_ADMISSION_MAX_WAIT = float(os.getenv("VIDEO_ADMISSION_MAX_WAIT", "60"))
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "8"))
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "900"))
+# The images of a style mix grid (its row and column images and their mixes) that are synthesized at once.
+STYLE_MIX_GRID_BATCH_SIZE = int(os.getenv("STYLE_MIX_GRID_BATCH_SIZE", "8"))
+# A directory shared by the gunicorn workers for their metrics (unset serves the metrics of the scraped
+# process only), and the seconds between the snapshots that every worker writes into it.
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+# Whether every worker watches the model directory, warms new models and then adds them to the catalog.
+MODEL_WATCH = os.getenv("MODEL_WATCH", "1").lower() in ("1", "true")
@@ -0,0 +1,120 @@
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.cache import LRUCache
+from app.core.config import LATENT_INDEX_MAX_PARTITIONS
+from app.core.singleflight import SingleFlight
+
+
+class LatentIndex:
+    """A nearest neighbour index of feature vectors by the cosine similarity.
+
+    The vectors are normalised and kept in one contiguous matrix, so a query is a single
+    matrix-vector product and a partial sort. Rows are appended in place (the matrix grows by
+    doubling) and removed by moving the last row into the gap.
+    """
+
+    def __init__(self, dim: int = 512) -> None:
+        """Init a new empty index.
+
+        Args:
+            dim (int, optional): the dimension of the vectors. Defaults to 512 (the w_dim of stylegan2ada).
+        """
+        self.dim = dim
+        self.ids = []
+        self.positions = {}
+        self._vectors = np.empty((16, dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        """Return the number of vectors."""
+        return len(self.ids)
+
+    def __contains__(self, vector_id: str) -> bool:
+        """Return whether a vector id is in the index."""
+        return vector_id in self.positions
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Return the normalised vectors [len(self), dim] in the order of self.ids (must not be modified)."""
+        return self._vectors[: len(self.ids)]
+
+    def vector(self, vector_id: str) -> Optional[np.ndarray]:
+        """Return the normalised vector of an id or None if it is not in the index."""
+        position = self.positions.get(vector_id)
+        return None if position is None else self._vectors[position].copy()
+
+    def add(self, vector_ids: List[str], vectors: np.ndarray) -> None:
+        """Add vectors (ids that are already in the index are skipped).
+
+        Args:
+            vector_ids (List[str]): the ids of the vectors
+            vectors (np.ndarray): the vectors [len(vector_ids), dim]
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        new, seen = [], set()
+        for i, vector_id in enumerate(vector_ids):
+            # Ids that are repeated within a call keep their first vector.
+            if vector_id not in self.positions and vector_id not in seen:
+                seen.add(vector_id)
+                new.append(i)
+        if not new:
+            return
+        size = len(self.ids)
+        if size + len(new) > len(self._vectors):
+            capacity = max(2 * len(self._vectors), size + len(new))
+            grown = np.empty((capacity, self.dim), dtype=np.float32)
+            grown[:size] = self._vectors[:size]
+            self._vectors = grown
+        self._vectors[size : size + len(new)] = normalise(vectors[new])
+        for position, i in enumerate(new, size):
+            self.positions[vector_ids[i]] = position
+            self.ids.append(vector_ids[i])
+
+    def remove(self, vector_ids: Iterable[str]) -> None:
+        """Remove vectors by their ids (ids that are not in the index are skipped)."""
+        for vector_id in vector_ids:
+            position = self.positions.pop(vector_id, None)
+            if position is None:
+                continue
+            last_id = self.ids.pop()
+            if last_id != vector_id:
+                self._vectors[position] = self._vectors[len(self.ids)]
+                self.ids[position] = last_id
+                self.positions[last_id] = position
+
+    def search(
+        self, query: np.ndarray, k: int, exclude: str = None
+    ) -> List[Tuple[str, float]]:
+        """Return the ids of the vectors that are most similar to a query.
+
+        Args:
+            query (np.ndarray): the query vector [dim]
+            k (int): the number of results
+            exclude (str, optional): an id that is not returned (e.g. the one of the query). Defaults to None.
+
+        Returns:
+            List[Tuple[str, float]]: the ids and their cosine similarity, the most similar first
+        """
+        if not self.ids or k <= 0:
+            return []
+        scores = self.vectors @ normalise(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        if exclude in self.positions:
+            scores[self.positions[exclude]] = -np.inf
+        k = min(k, len(self.ids) - (exclude in self.positions))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+
+def normalise(vectors: np.ndarray) -> np.ndarray:
+    """Return vectors [n, dim] scaled to unit length (zero vectors stay zero)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# The indexes of the saved images by the user and the model (the least recently searched are rebuilt).
+latent_indexes = LRUCache(max_entries=LATENT_INDEX_MAX_PARTITIONS, name="latent_index")
+latent_index_syncs = SingleFlight()
@@ -0,0 +1,401 @@
+import asyncio
+import bisect
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import METRICS_FLUSH_INTERVAL, METRICS_MULTIPROC_DIR
+
+# The default latency buckets in seconds (from a cached mapping call up to a cold projection).
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value in the Prometheus text format."""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _format_labels(labelnames: Iterable[str], labelvalues: Iterable) -> str:
+    """Format a label set in the Prometheus text format, e.g. {stage="mapping"}."""
+    pairs = [
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\""),
+        )
+        for name, value in zip(labelnames, labelvalues)
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _write_snapshot(multiprocess_dir: str, pid: int, snapshot: list) -> None:
+    """Replace the snapshot of a process in the multiprocess directory (readers never see a partial snapshot)."""
+    fd, tmp_path = tempfile.mkstemp(dir=multiprocess_dir, prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, os.path.join(multiprocess_dir, f"{pid}.json"))
+
+
+class Registry:
+    """A collection of metrics that can be rendered in the Prometheus text format.
+
+    With a multiprocess directory, every process (e.g. gunicorn worker) writes snapshots of its
+    samples into the directory and the scraped process renders the samples of all processes.
+    Counters and histograms are summed (including the last snapshots of exited processes, so
+    they never decrease), gauges get a `worker` label with the pid of their process.
+    """
+
+    def __init__(self, multiprocess_dir: Optional[str] = None) -> None:
+        """Init a new empty registry.
+
+        Args:
+            multiprocess_dir (Optional[str], optional): the directory of the snapshots of all processes. Defaults to None (only this process).
+        """
+        self.metrics = {}
+        self.multiprocess_dir = multiprocess_dir
+
+    def register(self, metric: "Metric") -> None:
+        """Add a metric to the registry. Every metric name must be unique."""
+        if metric.name in self.metrics:
+            raise ValueError(f"The metric {metric.name} is already registered.")
+        self.metrics[metric.name] = metric
+
+    def collect(self) -> list:
+        """Return the metrics of this process as (name, documentation, type, samples)."""
+        return [
+            (metric.name, metric.documentation, metric.type, metric.samples())
+            for metric in self.metrics.values()
+        ]
+
+    def write_snapshot(self, pid: int = None) -> None:
+        """Write the samples of this process into the multiprocess directory (replacing its last snapshot).
+
+        Args:
+            pid (int, optional): the pid of the snapshot. Defaults to None (this process).
+        """
+        _write_snapshot(self.multiprocess_dir, pid or os.getpid(), self.collect())
+
+    def collect_all(self) -> list:
+        """Return the merged metrics of all processes of the multiprocess directory (see Registry)."""
+        self.write_snapshot()
+        families = {}
+        for filename in sorted(os.listdir(self.multiprocess_dir)):
+            if filename.startswith(".") or not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.multiprocess_dir, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pid = filename[: -len(".json")]
+            for name, documentation, metric_type, samples in snapshot:
+                values = families.setdefault(name, (documentation, metric_type, {}))[2]
+                for sample_name, labelnames, labelvalues, value in samples:
+                    if metric_type == "gauge":
+                        labelnames, labelvalues = labelnames + ["worker"], labelvalues + [pid]
+                    key = (sample_name, tuple(labelnames), tuple(labelvalues))
+                    values[key] = values.get(key, 0) + value
+        return [
+            (name, documentation, metric_type, [key + (value,) for key, value in values.items()])
+            for name, (documentation, metric_type, values) in families.items()
+        ]
+
+    async def flush_periodically(self) -> None:
+        """Write a snapshot of this process every METRICS_FLUSH_INTERVAL seconds (for the scrapes of the other processes)."""
+        loop = asyncio.get_event_loop()
+        while True:
+            await loop.run_in_executor(None, self.write_snapshot)
+            await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        families = self.collect_all() if self.multiprocess_dir else self.collect()
+        lines = []
+        for name, documentation, metric_type, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for sample_name, labelnames, labelvalues, value in samples:
+                lines.append(
+                    f"{sample_name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+def mark_process_dead(pid: int, multiprocess_dir: str = METRICS_MULTIPROC_DIR) -> None:
+    """Remove the gauges of an exited process from its last snapshot (its counters and histograms are kept).
+
+    Args:
+        pid (int): the pid of the process
+        multiprocess_dir (str, optional): the multiprocess directory. Defaults to METRICS_MULTIPROC_DIR.
+    """
+    path = os.path.join(multiprocess_dir, f"{pid}.json")
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return
+    _write_snapshot(multiprocess_dir, pid, [family for family in snapshot if family[2] != "gauge"])
+
+
+registry = Registry(METRICS_MULTIPROC_DIR)
+
+
+class Metric:
+    """The base class of all metrics. A metric has a value per label set.
+
+    The hot path only updates plain Python numbers under a lock. Everything else (cumulative
+    buckets, formatting) happens when the metrics are scraped.
+    """
+
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        registry: Registry = registry,
+    ) -> None:
+        """Init a new metric and register it.
+
+        Args:
+            name (str): the metric name
+            documentation (str): the help text of the metric
+            labelnames (Tuple[str, ...], optional): the label names. Defaults to ().
+            registry (Registry, optional): the registry of the metric. Defaults to the global registry.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def samples(self) -> List[Tuple[str, tuple, tuple, float]]:
+        """Return the samples of the metric as (name, label names, label values, value)."""
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, self.labelnames, labels, value) for labels, value in values]
+
+
+class Counter(Metric):
+    """A value that only increases, e.g. the number of generated images.
+
+    Counters can also read their values from a function when they are scraped (e.g. the hits of a
+    cache that counts them itself), which costs nothing on the hot path.
+    """
+
+    type = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        function: Callable[[], Dict[tuple, float]] = None,
+        registry: Registry = registry,
+    ) -> None:
+        """Init a new counter.
+
+        Args:
+            name (str): the metric name (should end with _total)
+            documentation (str): the help text of the metric
+            labelnames (Tuple[str, ...], optional): the label names. Defaults to ().
+            function (Callable[[], Dict[tuple, float]], optional): a function that returns the values by label values. Defaults to None.
+            registry (Registry, optional): the registry of the metric. Defaults to the global registry.
+        """
+        super().__init__(name, documentation, labelnames, registry)
+        self.function = function
+
+    def inc(self, amount: float = 1, *labelvalues) -> None:
+        """Increase the counter of a label set by an amount."""
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self) -> List[Tuple[str, tuple, tuple, float]]:
+        if self.function is not None:
+            return [
+                (self.name, self.labelnames, labels, value)
+                for labels, value in self.function().items()
+            ]
+        return super().samples()
+
+
+class Gauge(Counter):
+    """A value that can go up and down, e.g. the number of queued requests or the memory of the loaded models."""
+
+    type = "gauge"
+
+    def set(self, value: float, *labelvalues) -> None:
+        """Set the gauge of a label set."""
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def dec(self, amount: float = 1, *labelvalues) -> None:
+        """Decrease the gauge of a label set by an amount."""
+        self.inc(-amount, *labelvalues)
+
+    def track_inprogress(self, *labelvalues) -> "_InProgress":
+        """Return a context manager that increases the gauge while its block runs."""
+        return _InProgress(self, labelvalues)
+
+
+class _InProgress:
+    """A context manager that increases a gauge while its block runs."""
+
+    __slots__ = ("gauge", "labelvalues")
+
+    def __init__(self, gauge: Gauge, labelvalues: tuple) -> None:
+        self.gauge = gauge
+        self.labelvalues = labelvalues
+
+    def __enter__(self) -> None:
+        self.gauge.inc(1, *self.labelvalues)
+
+    def __exit__(self, *exc_info) -> None:
+        self.gauge.inc(-1, *self.labelvalues)
+
+
+class Histogram(Metric):
+    """Observations counted in buckets, e.g. the latency of a pipeline stage."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        registry: Registry = registry,
+    ) -> None:
+        """Init a new histogram.
+
+        Args:
+            name (str): the metric name
+            documentation (str): the help text of the metric
+            labelnames (Tuple[str, ...], optional): the label names. Defaults to ().
+            buckets (Tuple[float, ...], optional): the sorted upper bounds of the buckets (without +Inf). Defaults to DEFAULT_BUCKETS.
+            registry (Registry, optional): the registry of the metric. Defaults to the global registry.
+        """
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues) -> None:
+        """Count an observation of a label set."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # The bucket counts (not cumulative, the last one is +Inf), the sum and the count.
+            counts = self._values.get(labelvalues)
+            if counts is None:
+                counts = self._values[labelvalues] = [0] * (len(self.buckets) + 3)
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def time(self, *labelvalues) -> "_Timer":
+        """Return a context manager that observes the duration of its block in seconds."""
+        return _Timer(self, labelvalues)
+
+    def samples(self) -> List[Tuple[str, tuple, tuple, float]]:
+        with self._lock:
+            values = [(labels, list(counts)) for labels, counts in self._values.items()]
+        labelnames = self.labelnames + ("le",)
+        samples = []
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(
+                    (
+                        self.name + "_bucket",
+                        labelnames,
+                        labels + (_format_value(bound),),
+                        cumulative,
+                    )
+                )
+            samples.append((self.name + "_sum", self.labelnames, labels, counts[-2]))
+            samples.append((self.name + "_count", self.labelnames, labels, counts[-1]))
+        return samples
+
+
+class _Timer:
+    """A context manager that observes the duration of its block in a histogram."""
+
+    __slots__ = ("histogram", "labelvalues", "start")
+
+    def __init__(self, histogram: Histogram, labelvalues: tuple) -> None:
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+class RequestLatencyMiddleware:
+    """An ASGI middleware that observes the latency of every HTTP request by its method and endpoint."""
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # The router adds the endpoint function to the scope (unmatched paths have none).
+            endpoint = scope.get("endpoint")
+            request_latency.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                getattr(endpoint, "__name__", "unmatched"),
+            )
+
+
+# The metrics of the serving pipeline. Other metrics are registered next to the state they read.
+stage_latency = Histogram(
+    "cp_stage_latency_seconds",
+    "The latency of the stages of the serving pipeline.",
+    ("stage",),
+)
+request_latency = Histogram(
+    "cp_request_latency_seconds",
+    "The latency of the API requests by their endpoint.",
+    ("method", "endpoint"),
+)
+images_generated = Counter(
+    "cp_images_generated_total",
+    "The number of generated images by model (rate() gives the images per second).",
+    ("model",),
+)
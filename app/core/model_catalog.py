@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, List, Optional, Set
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from watchgod import RegExpWatcher, awatch
+
+from app.schemas.stylegan2ada import StyleGan2ADA, create_generation_method, create_stylemix_method
+from app.schemas.stylegan_models import Model, ModelCollection, stylegan2ada_models
+from app.stylegan.backends import load_inference_model
+from app.stylegan.editing import unload_edit_directions
+from app.stylegan.load_model import load_model_from_pkl_stylegan2ada, pkl_digest
+from app.stylegan.utils import clear_model_caches
+
+
+class CatalogSnapshot:
+    """The advertised models of a catalog version and its precomputed metadata responses."""
+
+    def __init__(self, models: List[Model]) -> None:
+        """Init a new catalog snapshot and render its responses.
+
+        Args:
+            models (List[Model]): the advertised models
+        """
+        self.models = models
+        self.models_body = json.dumps(
+            jsonable_encoder({"stylegan_models": [{"version": "StyleGan2ADA", "models": models}]})
+        ).encode()
+        self.methods_body = json.dumps(
+            jsonable_encoder(
+                {
+                    "generation_method": create_generation_method(models)(),
+                    "stylemix_method": create_stylemix_method(models)(),
+                }
+            )
+        ).encode()
+        # The version depends only on the responses, so every worker has the same ETag.
+        self.version = hashlib.sha256(self.models_body + self.methods_body).hexdigest()[:16]
+        self.etag = f'"{self.version}"'
+
+    def response(self, request: Request, body: bytes) -> Response:
+        """Return a response body, or 304 if the client already has this catalog version.
+
+        Args:
+            request (Request): the request (for its If-None-Match header)
+            body (bytes): the JSON body of this version
+
+        Returns:
+            Response: the response with the ETag of this version
+        """
+        # The metadata is user specific (authenticated), so it is only cached by the client.
+        headers = {"ETag": self.etag, "Cache-Control": "private, no-cache"}
+        if_none_match = [etag.strip() for etag in request.headers.get("if-none-match", "").split(",")]
+        if self.etag in if_none_match or "*" in if_none_match:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def load_replaced_model(folder_path: str, model: Model, loaded: Any) -> Optional[Any]:
+    """Load the new weights of a loaded model if its pkl file was replaced under the same name.
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model
+        loaded (Any): the loaded model (its cache key holds the digest of the loaded pkl file)
+
+    Returns:
+        Optional[Any]: the model with the new weights or None if the weights did not change
+    """
+    if loaded.cache_key[1] == pkl_digest(folder_path, model):
+        return None
+    G = load_model_from_pkl_stylegan2ada(folder_path, model)
+    return load_inference_model(folder_path, model, G)
+
+
+class ModelCatalog:
+    """A catalog of the models in a watched directory.
+
+    New models are loaded before they are advertised, so the first request does not wait for them.
+    Models whose pkl file is replaced under the same name are loaded again and then swapped.
+    Removed models are no longer advertised and are then dropped from memory.
+    """
+
+    def __init__(self, collection: ModelCollection) -> None:
+        """Init a new model catalog.
+
+        Args:
+            collection (ModelCollection): the model collection (its models are swapped on changes)
+        """
+        self.collection = collection
+        self.snapshot = CatalogSnapshot(collection.models)
+
+    async def reload(self, changed_files: Set[str] = None) -> None:
+        """Warm the new and replaced models of the directory, swap the catalog and retire the removed models.
+
+        Args:
+            changed_files (Set[str], optional): the changed filenames, whose loaded weights are compared with the files. Defaults to None (all files).
+        """
+        models = self.collection.create_models()
+        advertised = set(self.collection.models)
+        removed = advertised - set(models)
+        for model in models:
+            if model in advertised:
+                if changed_files is None or model.filename in changed_files:
+                    await self._swap_replaced_model(model)
+                continue
+            try:
+                # Loads the model into StyleGan2ADA.loaded_models (a copy, because the version is overwritten).
+                await run_in_threadpool(StyleGan2ADA, model.copy(), None)
+                advertised.add(model)
+            except Exception as e:
+                # E.g. a file that is still being copied, which is retried on its next change.
+                logging.error(f"Could not load the new model {model.filename}: {e}")
+        models = [model for model in models if model in advertised]
+        if models == self.collection.models:
+            return
+
+        # Both are swapped without an await in between, so requests always see one catalog version.
+        self.collection.models = models
+        self.snapshot = CatalogSnapshot(models)
+        logging.info(f"Model catalog {self.snapshot.version}: {[model.filename for model in models]}")
+        for model in removed:
+            # Running requests keep their reference to the model.
+            StyleGan2ADA.loaded_models.pop(model.copy(update={"version": StyleGan2ADA.__name__}), None)
+            clear_model_caches(model.filename)
+            unload_edit_directions(model.filename)
+
+    async def _swap_replaced_model(self, model: Model) -> None:
+        """Swap a loaded model for its new weights if its pkl file was replaced, and retire the old weights."""
+        key = model.copy(update={"version": StyleGan2ADA.__name__})
+        loaded = StyleGan2ADA.loaded_models.get(key)
+        if loaded is None:
+            return
+        try:
+            G = await run_in_threadpool(load_replaced_model, StyleGan2ADA.folder_path, model, loaded)
+        except Exception as e:
+            # E.g. a file that is still being copied, which is retried on its next change.
+            logging.error(f"Could not load the replaced model {model.filename}: {e}")
+            return
+        if G is None:
+            return
+        # Running requests keep their reference to the old weights.
+        StyleGan2ADA.loaded_models[key] = G
+        logging.info(f"Model {model.filename} was replaced with new weights")
+        clear_model_caches(model.filename)
+        unload_edit_directions(model.filename)
+
+    async def watch(self) -> None:
+        """Reload the catalog whenever a model file in the directory changes."""
+        async for changes in awatch(
+            self.collection.path,
+            watcher_cls=RegExpWatcher,
+            watcher_kwargs={"re_files": r"^.*\.pkl$"},
+        ):
+            try:
+                await self.reload({os.path.basename(path) for _, path in changes})
+            except Exception as e:
+                logging.error(f"Could not reload the model catalog: {e}")
+
+
+stylegan2ada_catalog = ModelCatalog(stylegan2ada_models)
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one call whose result all callers share."""
+
+    def __init__(self) -> None:
+        """Init a new single flight group."""
+        self._calls = {}
+        # The number of calls that awaited the result of another call.
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        """Return the number of running calls."""
+        return len(self._calls)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        """Remove a finished call (unless a new call with the same key already replaced it)."""
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Any:
+        """Await a call or join the running call with the same key.
+
+        Args:
+            key (Hashable): the key of identical calls
+            fn (Callable[[], Awaitable]): a function that starts the call
+
+        Returns:
+            Any: the shared result of the call (callers must not modify it)
+        """
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda future: self._forget(key, future))
+        else:
+            self.coalesced += 1
+        # A caller that disconnects must not cancel the call of the others.
+        return await asyncio.shield(future)
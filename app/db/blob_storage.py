@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Callable, List
+
+import aioredis
+from fastapi.concurrency import run_in_threadpool
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.cache import LRUCache
+from app.core.config import BLOB_CACHE_MAX_BYTES, BLOB_CACHE_REDIS_TTL, BLOB_DELETION_TIMEOUT
+from app.core.singleflight import SingleFlight
+from app.db.mongodb import (
+    decrement_blob_references_in_mongodb,
+    delete_unreferenced_blob_from_mongodb,
+    end_blob_deletion_in_mongodb,
+    get_blob_reference_from_mongodb,
+    increment_blob_references_in_mongodb,
+    mark_blob_uploaded_in_mongodb,
+    start_blob_deletion_in_mongodb,
+)
+from app.db.redisdb import (
+    delete_blobs_from_redisdb,
+    get_blob_from_redisdb,
+    redisdb,
+    save_blob_in_redisdb,
+)
+from app.db.storage import storage_backend
+
+# Recently downloaded blobs (e.g. the feature vectors of favourite style mix images) by bucket and key.
+blob_cache = LRUCache(max_size=BLOB_CACHE_MAX_BYTES, sizeof=len, name="blob")
+blob_downloads = SingleFlight()
+
+
+def content_key(blob: bytes) -> str:
+    """Return the name of a blob in its bucket (the SHA-256 of its content)."""
+    return hashlib.sha256(blob).hexdigest()
+
+
+async def _save_counted_blob(
+    mongodb: AsyncIOMotorClient, bucket_name: str, key: str, upload: Callable[[], None]
+) -> str:
+    """Add a reference to a content addressed blob and upload it if needed (see save_blob).
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection (for the reference counts)
+        bucket_name (str): the name of the bucket
+        key (str): the name of the blob in the bucket (derived from its content)
+        upload (Callable[[], None]): uploads the blob under its key (run in the threadpool)
+
+    Returns:
+        str: the name of the blob in the bucket
+    """
+    reference = await increment_blob_references_in_mongodb(mongodb, bucket_name, key)
+    try:
+        # The new reference stops the deletion from removing the count, so it ends soon.
+        deadline = time.monotonic() + BLOB_DELETION_TIMEOUT
+        while reference and reference.get("deleting") and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            reference = await get_blob_reference_from_mongodb(mongodb, bucket_name, key)
+        # Counts from before uploads were tracked have no uploaded field, their blobs exist.
+        if reference is None or not reference.get("uploaded", True):
+            await run_in_threadpool(upload)
+            await mark_blob_uploaded_in_mongodb(mongodb, bucket_name, key)
+    except:
+        # Do not count a reference to a blob that may not exist.
+        await release_blobs(mongodb, bucket_name, [key])
+        raise
+    return key
+
+
+async def save_blob(
+    mongodb: AsyncIOMotorClient, bucket_name: str, blob: bytes, content_type: str
+) -> str:
+    """Save a blob by its content hash and add a reference to it.
+
+    Identical blobs (e.g. the same seed generated by many users) are only uploaded once. Until an
+    upload is marked as done, every new reference uploads the blob itself (the content is the same),
+    so a slow or failed first upload never leaves a reference to a missing blob. A blob that is being
+    deleted is uploaded again after its deletion (see release_blobs).
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection (for the reference counts)
+        bucket_name (str): the name of the bucket
+        blob (bytes): the blob
+        content_type (str): the content type of the blob
+
+    Returns:
+        str: the name of the blob in the bucket
+    """
+    key = content_key(blob)
+    return await _save_counted_blob(
+        mongodb,
+        bucket_name,
+        key,
+        lambda: storage_backend.upload(bucket_name, key, blob, content_type),
+    )
+
+
+def file_content_key(path: str) -> str:
+    """Return the SHA-256 of the content of a file (read in chunks, see content_key)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def save_file_blob(
+    mongodb: AsyncIOMotorClient, bucket_name: str, path: str, content_type: str, suffix: str = ""
+) -> str:
+    """Save a file by its content hash and add a reference to it, without reading it into memory (see save_blob).
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection (for the reference counts)
+        bucket_name (str): the name of the bucket
+        path (str): the path of the file
+        content_type (str): the content type of the file
+        suffix (str, optional): a suffix of the name (e.g. the video format). Defaults to "".
+
+    Returns:
+        str: the name of the blob in the bucket
+    """
+    key = await run_in_threadpool(file_content_key, path) + suffix
+    return await _save_counted_blob(
+        mongodb,
+        bucket_name,
+        key,
+        lambda: storage_backend.upload_file(bucket_name, key, path, content_type),
+    )
+
+
+async def release_blobs(mongodb: AsyncIOMotorClient, bucket_name: str, keys: List[str]) -> None:
+    """Remove a reference to each blob and delete the blobs that are no longer referenced.
+
+    Blobs without a reference count (saved by their id before content addressing) are deleted right away.
+    The others are marked as deleted (and not uploaded) before they are deleted from the storage, and
+    their count is only removed if it is still 0 afterwards. So a blob that is saved again in the
+    meantime is uploaded again by its new reference instead of pointing at the deleted object.
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection (for the reference counts)
+        bucket_name (str): the name of the bucket
+        keys (List[str]): the names of the blobs in the bucket
+    """
+    unreferenced = []
+    counted = []
+    for key in keys:
+        refs = await decrement_blob_references_in_mongodb(mongodb, bucket_name, key)
+        if refs is None:
+            unreferenced.append(key)
+        elif refs <= 0 and await start_blob_deletion_in_mongodb(mongodb, bucket_name, key):
+            counted.append(key)
+    if not unreferenced and not counted:
+        return
+    try:
+        await run_in_threadpool(storage_backend.delete, bucket_name, unreferenced + counted)
+    finally:
+        for key in counted:
+            if not await delete_unreferenced_blob_from_mongodb(mongodb, bucket_name, key):
+                await end_blob_deletion_in_mongodb(mongodb, bucket_name, key)
+    for key in unreferenced + counted:
+        blob_cache.pop((bucket_name, key))
+    redis_client = redisdb.get_client() if BLOB_CACHE_REDIS_TTL else None
+    if redis_client is not None:
+        try:
+            await delete_blobs_from_redisdb(redis_client, bucket_name, unreferenced + counted)
+        except aioredis.RedisError as e:
+            # The blobs expire after BLOB_CACHE_REDIS_TTL.
+            logging.error(f"Could not delete the cached blobs: {e}")
+
+
+async def _download_blob(bucket_name: str, key: str) -> bytes:
+    """Download a blob from the redis cache (if it is enabled) or the storage backend."""
+    redis_client = redisdb.get_client() if BLOB_CACHE_REDIS_TTL else None
+    if redis_client is not None:
+        try:
+            blob = await get_blob_from_redisdb(redis_client, bucket_name, key)
+            if blob is not None:
+                return blob
+        except aioredis.RedisError as e:
+            logging.warning(f"Could not use the cached blob: {e}")
+            redis_client = None
+    blob = await run_in_threadpool(storage_backend.download, bucket_name, key)
+    if redis_client is not None:
+        try:
+            await save_blob_in_redisdb(redis_client, bucket_name, key, blob)
+        except aioredis.RedisError as e:
+            logging.warning(f"Could not cache the blob: {e}")
+    return blob
+
+
+async def load_blob(bucket_name: str, key: str) -> bytes:
+    """Get a blob from the cache of this worker or download it.
+
+    Blobs never change once they are written (their name is their content hash or a new id), so
+    cached blobs are only removed when they are deleted. Concurrent downloads of a blob are shared.
+
+    Args:
+        bucket_name (str): the name of the bucket
+        key (str): the name of the blob in the bucket
+
+    Returns:
+        bytes: the blob
+    """
+    blob = blob_cache.get((bucket_name, key))
+    if blob is None:
+        blob = await blob_downloads.do((bucket_name, key), lambda: _download_blob(bucket_name, key))
+        blob_cache.set((bucket_name, key), blob)
+    return blob
@@ -1,10 +1,26 @@
+import threading
 import uuid
 
+from google.api_core.exceptions import NotFound
 from google.cloud import storage
 
+from app.core.metrics import stage_latency
+
+_local = threading.local()
+
+
+def get_storage_client() -> storage.Client:
+    """Return the google cloud storage client of the current thread.
+
+    A new client loads the credentials and opens new connections, so every threadpool thread keeps its client.
+    """
+    if getattr(_local, "client", None) is None:
+        _local.client = storage.Client()
+    return _local.client
+
 
 def upload_blob_to_gcs(
-    bucket_name: str, image_blob: bytes, image_id: str = None
+    bucket_name: str, image_blob: bytes, image_id: str = None, content_type: str = None
 ) -> str:
     """Upload a byte object to a google cloud stroage bucket.
 
@@ -12,24 +28,42 @@ def upload_blob_to_gcs(
         bucket_name (str): the name of the gcs bucket
         image_blob (bytes): the image bytes object
         image_id (str, optional): the id, which will be the name in the bucket (creates a new one if None). Defaults to None.
+        content_type (str, optional): the content type of the blob. Defaults to None (image/jpeg for new ids, else application/octet-stream).
 
     Returns:
         str: the id of the blob
     """
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     bucket = storage_client.bucket(bucket_name)
     if not image_id:
         image_id = uuid.uuid4().hex
-        content_type = "image/jpeg"
+        content_type = content_type or "image/jpeg"
     else:
-        content_type = "application/octet-stream"
+        content_type = content_type or "application/octet-stream"
     blob = bucket.blob(image_id)
 
-    blob.upload_from_string(image_blob, content_type=content_type)
+    with stage_latency.time("gcs_upload"):
+        blob.upload_from_string(image_blob, content_type=content_type)
 
     return image_id
 
 
+def upload_file_to_gcs(bucket_name: str, path: str, image_id: str, content_type: str) -> None:
+    """Upload a file to a google cloud storage bucket without reading it into memory.
+
+    Args:
+        bucket_name (str): the name of the gcs bucket
+        path (str): the path of the file
+        image_id (str): the id, which will be the name in the bucket
+        content_type (str): the content type of the file
+    """
+    storage_client = get_storage_client()
+    blob = storage_client.bucket(bucket_name).blob(image_id)
+
+    with stage_latency.time("gcs_upload"):
+        blob.upload_from_filename(path, content_type=content_type)
+
+
 def download_blob_from_gcs(bucket_name: str, image_id: str) -> bytes:
     """Download a byte object from a google cloud storage bucket.
 
@@ -40,25 +74,29 @@ def download_blob_from_gcs(bucket_name: str, image_id: str) -> bytes:
     Returns:
         bytes: the downloaded byte object
     """
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     bucket = storage_client.bucket(bucket_name)
 
     blob = bucket.blob(image_id)
-    image_blob = blob.download_as_bytes()
+    with stage_latency.time("gcs_download"):
+        image_blob = blob.download_as_bytes()
 
     return image_blob
 
 
 def delete_blob_from_gcs(bucket_name: str, image_id_list: list) -> None:
-    """Deletes multiple byte objects from a google cloud storage bucket.
+    """Deletes multiple byte objects from a google cloud storage bucket (missing objects are skipped).
 
     Args:
         bucket_name (str): the name of the gcs bucket
         image_id_list (list): a list of ids that should be deleted
     """
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
 
     bucket = storage_client.bucket(bucket_name)
     for image_id in image_id_list:
         blob = bucket.blob(image_id)
-        blob.delete()
+        try:
+            blob.delete()
+        except NotFound:
+            pass
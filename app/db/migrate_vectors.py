@@ -0,0 +1,90 @@
+import asyncio
+import logging
+
+import click
+from fastapi.concurrency import run_in_threadpool
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import MONGO_COLLECTION_NAME, MONGO_DB_NAME, MONGO_URL, VECTOR_BUCKET
+from app.db.blob_storage import release_blobs
+from app.db.mongodb import create_image_indexes_in_mongodb, save_vector_in_mongodb
+from app.db.storage import storage_backend
+from app.schemas.mongodb import ImageData
+
+
+async def migrate_vector(mongodb: AsyncIOMotorClient, image_data: ImageData, release: bool) -> bool:
+    """Copy the feature vector of an image from its bucket into its document.
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        image_data (ImageData): the image data
+        release (bool): whether the reference of the image to the vector blob is released
+
+    Returns:
+        bool: whether the vector was moved (False if the blob or the image do not exist anymore)
+    """
+    key = image_data.blob_keys[1]
+    try:
+        vector = await run_in_threadpool(storage_backend.download, VECTOR_BUCKET, key)
+    except FileNotFoundError:
+        logging.warning(f"The vector {key} of the image {image_data.url} does not exist.")
+        return False
+    # The image may have been deleted in the meantime, which released the blob itself.
+    if not await save_vector_in_mongodb(mongodb, image_data.url, vector):
+        return False
+    if release:
+        await release_blobs(mongodb, VECTOR_BUCKET, [key])
+    return True
+
+
+async def migrate_vectors(
+    mongodb: AsyncIOMotorClient, concurrency: int = 8, release: bool = True
+) -> int:
+    """Copy the feature vectors of all images from their bucket into their documents.
+
+    The migration can be stopped and run again, images whose vector was moved are skipped.
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        concurrency (int, optional): the number of vectors that are moved at the same time. Defaults to 8.
+        release (bool, optional): whether the vector blobs are released (and deleted without other references). Defaults to True.
+
+    Returns:
+        int: the number of moved vectors
+    """
+    await create_image_indexes_in_mongodb(mongodb)
+    cursor = mongodb[MONGO_DB_NAME][MONGO_COLLECTION_NAME].find(
+        {"vector_in_document": {"$ne": True}}, {"vector": 0}
+    )
+
+    async def migrate_batch(images: list) -> int:
+        return sum(await asyncio.gather(*[migrate_vector(mongodb, image, release) for image in images]))
+
+    migrated = 0
+    batch = []
+    async for image_data in cursor:
+        batch.append(ImageData(**image_data))
+        if len(batch) == concurrency:
+            migrated += await migrate_batch(batch)
+            batch = []
+    return migrated + await migrate_batch(batch)
+
+
+@click.command()
+@click.option(
+    "--concurrency", default=8, show_default=True, help="Vectors that are moved at the same time."
+)
+@click.option(
+    "--keep-blobs", is_flag=True, help="Keep the references to the vector blobs (e.g. for a rollback)."
+)
+def migrate(concurrency: int, keep_blobs: bool) -> None:
+    """Move the feature vectors of all images from the vector bucket into their MongoDB documents."""
+    mongodb = AsyncIOMotorClient(MONGO_URL)
+    migrated = asyncio.get_event_loop().run_until_complete(
+        migrate_vectors(mongodb, concurrency, not keep_blobs)
+    )
+    click.echo(f"Moved {migrated} vectors into their image documents.")
+
+
+if __name__ == "__main__":
+    migrate()
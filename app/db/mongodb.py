@@ -1,27 +1,48 @@
+import datetime
 import os
+from typing import Dict, List, Optional, Tuple
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from pymongo.results import DeleteResult, InsertOneResult
 
-from app.core.config import MONGO_COLLECTION_NAME, MONGO_DB_NAME
+from app.core.config import (
+    BLOB_DELETION_TIMEOUT,
+    MONGO_ASSET_COLLECTION_NAME,
+    MONGO_BLOB_COLLECTION_NAME,
+    MONGO_COLLECTION_NAME,
+    MONGO_DB_NAME,
+)
+from app.core.metrics import stage_latency
 from app.schemas.mongodb import ImageData, MongoClient
+from app.schemas.stylegan_models import Model
 
 mongodb = MongoClient()
+# Feature vectors saved in the image documents are only read when they are needed.
+WITHOUT_VECTOR = {"vector": 0}
 
 
 async def get_user_images_from_mongodb(
-    mongodb: AsyncIOMotorClient, auth0_id: str
+    mongodb: AsyncIOMotorClient, auth0_id: str, offset: int = 0, limit: int = None
 ) -> list:
-    """Get all images of a user from mongodb.
+    """Get all images of a user or a page of them (in the order they were saved) from mongodb.
 
     Args:
         mongodb (AsyncIOMotorClient): the mongodb database connection
         auth0_id (str): the user auth0 id
+        offset (int, optional): the number of skipped images. Defaults to 0.
+        limit (int, optional): the maximum number of images. Defaults to None (all images).
 
     Returns:
         list: a list with all image ids
     """
-    cursor = mongodb[MONGO_DB_NAME][MONGO_COLLECTION_NAME].find({"auth0_id": auth0_id})
+    cursor = (
+        mongodb[MONGO_DB_NAME][MONGO_COLLECTION_NAME]
+        .find({"auth0_id": auth0_id}, WITHOUT_VECTOR)
+        .sort("_id", 1)
+        .skip(offset)
+        .limit(limit or 0)
+    )
     all_user_images = []
     async for image_data in cursor:
         image = ImageData(**image_data)
@@ -30,21 +51,53 @@ async def get_user_images_from_mongodb(
     return all_user_images
 
 
+async def get_user_image_keys_from_mongodb(
+    mongodb: AsyncIOMotorClient, auth0_id: str, model: Model
+) -> Dict[str, str]:
+    """Get the ids of the images that a user created with a model from mongodb (only the ids and keys are read).
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        auth0_id (str): the user auth0 id
+        model (Model): the model of the images
+
+    Returns:
+        Dict[str, str]: the names of the images in the image bucket by their ids
+    """
+    cursor = mongodb[MONGO_DB_NAME][MONGO_COLLECTION_NAME].find(
+        {
+            "auth0_id": auth0_id,
+            "method.model.img": model.img,
+            "method.model.res": model.res,
+            "method.model.fid": model.fid,
+        },
+        {"_id": 0, "url": 1, "image_key": 1},
+    )
+    image_keys = {}
+    async for image_data in cursor:
+        # Images that were saved before content addressing are named by their id.
+        image_keys[image_data["url"]] = image_data.get("image_key") or image_data["url"]
+    return image_keys
+
+
 async def save_user_image_in_mongodb(
-    mongodb: AsyncIOMotorClient, image_data: ImageData
+    mongodb: AsyncIOMotorClient, image_data: ImageData, vector: bytes = None
 ) -> InsertOneResult:
     """Save an image and its data in mongodb.
 
     Args:
         mongodb (AsyncIOMotorClient): the mongodb database connection
         image_data (ImageData): a pydantic model object containing the image data
+        vector (bytes, optional): the feature vector of the image, if it is saved in the document (see ImageData.vector_in_document). Defaults to None.
 
     Returns:
         InsertOneResult: a mongodb result
     """
-    return await mongodb[MONGO_DB_NAME][MONGO_COLLECTION_NAME].insert_one(
-        image_data.dict()
-    )
+    document = image_data.dict()
+    if vector is not None:
+        document["vector"] = vector
+    with stage_latency.time("mongo_insert"):
+        return await mongodb[MONGO_DB_NAME][MONGO_COLLECTION_NAME].insert_one(document)
 
 
 async def delete_user_images_from_mongodb(
@@ -80,3 +133,241 @@ async def delete_all_user_images_from_mongodb(
     return await mongodb[MONGO_DB_NAME][MONGO_COLLECTION_NAME].delete_many(
         {"auth0_id": auth0_id}
     )
+
+
+async def save_user_asset_in_mongodb(
+    mongodb: AsyncIOMotorClient, auth0_id: str, bucket_name: str, key: str
+) -> InsertOneResult:
+    """Save a reference of a user to a blob that is not in the gallery (e.g. a style mix grid).
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        auth0_id (str): the user auth0 id
+        bucket_name (str): the name of the bucket
+        key (str): the name of the blob in the bucket
+
+    Returns:
+        InsertOneResult: a mongodb result
+    """
+    document = {
+        "auth0_id": auth0_id,
+        "bucket": bucket_name,
+        "key": key,
+        "creation_date": datetime.datetime.utcnow(),
+    }
+    return await mongodb[MONGO_DB_NAME][MONGO_ASSET_COLLECTION_NAME].insert_one(document)
+
+
+async def delete_all_user_assets_from_mongodb(
+    mongodb: AsyncIOMotorClient, auth0_id: str
+) -> Dict[str, List[str]]:
+    """Delete all blob references of a user that are not in the gallery from mongodb.
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        auth0_id (str): the user auth0 id
+
+    Returns:
+        Dict[str, List[str]]: the names of the deleted blobs by their bucket
+    """
+    collection = mongodb[MONGO_DB_NAME][MONGO_ASSET_COLLECTION_NAME]
+    asset_ids = []
+    keys = {}
+    async for asset in collection.find({"auth0_id": auth0_id}):
+        asset_ids.append(asset["_id"])
+        keys.setdefault(asset["bucket"], []).append(asset["key"])
+    # Only the listed references are deleted, so assets that are saved in the meantime are kept.
+    await collection.delete_many({"_id": {"$in": asset_ids}})
+    return keys
+
+
+async def get_images_with_vectors_from_mongodb(
+    mongodb: AsyncIOMotorClient, auth0_id: str, image_ids: List[str]
+) -> Dict[str, Tuple[ImageData, Optional[bytes]]]:
+    """Get the data and the saved feature vectors of images of a user by their ids from mongodb (in one query).
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        auth0_id (str): the user auth0 id (the images of other users are not returned)
+        image_ids (List[str]): the image ids
+
+    Returns:
+        Dict[str, Tuple[ImageData, Optional[bytes]]]: the image data and the feature vector (None if it is saved in its bucket) by the ids of the existing images of the user
+    """
+    cursor = mongodb[MONGO_DB_NAME][MONGO_COLLECTION_NAME].find(
+        {"auth0_id": auth0_id, "url": {"$in": image_ids}}
+    )
+    images = {}
+    async for image_data in cursor:
+        images[image_data["url"]] = (ImageData(**image_data), image_data.get("vector"))
+    return images
+
+
+async def save_vector_in_mongodb(mongodb: AsyncIOMotorClient, image_id: str, vector: bytes) -> bool:
+    """Move the feature vector of an image into its document (see ImageData.vector_in_document).
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        image_id (str): the image id
+        vector (bytes): the feature vector
+
+    Returns:
+        bool: whether it was saved (False if the image was deleted or its vector was already moved)
+    """
+    result = await mongodb[MONGO_DB_NAME][MONGO_COLLECTION_NAME].update_one(
+        {"url": image_id, "vector_in_document": {"$ne": True}},
+        {"$set": {"vector": vector, "vector_in_document": True}},
+    )
+    return result.modified_count == 1
+
+
+async def create_image_indexes_in_mongodb(mongodb: AsyncIOMotorClient) -> None:
+    """Create the indexes of the image lookups by id, by user and by user and model (and of the assets by user) in mongodb."""
+    collection = mongodb[MONGO_DB_NAME][MONGO_COLLECTION_NAME]
+    await collection.create_index("url")
+    await collection.create_index("auth0_id")
+    await collection.create_index(
+        [("auth0_id", 1), ("method.model.img", 1), ("method.model.res", 1), ("method.model.fid", 1)]
+    )
+    await mongodb[MONGO_DB_NAME][MONGO_ASSET_COLLECTION_NAME].create_index("auth0_id")
+
+
+async def increment_blob_references_in_mongodb(
+    mongodb: AsyncIOMotorClient, bucket_name: str, key: str
+) -> dict:
+    """Add a reference to a content addressed blob in mongodb.
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        bucket_name (str): the name of the bucket of the blob
+        key (str): the content hash of the blob
+
+    Returns:
+        dict: the reference count after (refs), whether the blob was uploaded (uploaded, missing for counts from before it was tracked) and since when it is deleted (deleting, if it is)
+    """
+    return await mongodb[MONGO_DB_NAME][MONGO_BLOB_COLLECTION_NAME].find_one_and_update(
+        {"_id": f"{bucket_name}/{key}"},
+        {
+            "$inc": {"refs": 1},
+            "$setOnInsert": {"bucket": bucket_name, "key": key, "uploaded": False},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def get_blob_reference_from_mongodb(
+    mongodb: AsyncIOMotorClient, bucket_name: str, key: str
+) -> Optional[dict]:
+    """Get the reference count of a content addressed blob from mongodb (see increment_blob_references_in_mongodb).
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        bucket_name (str): the name of the bucket of the blob
+        key (str): the content hash of the blob
+
+    Returns:
+        Optional[dict]: the reference count or None if the blob has none
+    """
+    return await mongodb[MONGO_DB_NAME][MONGO_BLOB_COLLECTION_NAME].find_one(
+        {"_id": f"{bucket_name}/{key}"}
+    )
+
+
+async def mark_blob_uploaded_in_mongodb(
+    mongodb: AsyncIOMotorClient, bucket_name: str, key: str
+) -> None:
+    """Mark a content addressed blob as uploaded in mongodb.
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        bucket_name (str): the name of the bucket of the blob
+        key (str): the content hash of the blob
+    """
+    await mongodb[MONGO_DB_NAME][MONGO_BLOB_COLLECTION_NAME].update_one(
+        {"_id": f"{bucket_name}/{key}"}, {"$set": {"uploaded": True}}
+    )
+
+
+async def start_blob_deletion_in_mongodb(
+    mongodb: AsyncIOMotorClient, bucket_name: str, key: str
+) -> bool:
+    """Mark a content addressed blob without references as deleted and not uploaded in mongodb.
+
+    Only one caller starts the deletion of a blob. A deletion that did not end within
+    BLOB_DELETION_TIMEOUT seconds (e.g. its worker was killed) can be started again.
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        bucket_name (str): the name of the bucket of the blob
+        key (str): the content hash of the blob
+
+    Returns:
+        bool: whether the deletion was started (False if a new reference was added or it is deleted by another caller)
+    """
+    now = datetime.datetime.utcnow()
+    stale = now - datetime.timedelta(seconds=BLOB_DELETION_TIMEOUT)
+    result = await mongodb[MONGO_DB_NAME][MONGO_BLOB_COLLECTION_NAME].update_one(
+        {
+            "_id": f"{bucket_name}/{key}",
+            "refs": {"$lte": 0},
+            "$or": [{"deleting": {"$exists": False}}, {"deleting": {"$lt": stale}}],
+        },
+        {"$set": {"deleting": now, "uploaded": False}},
+    )
+    return result.modified_count == 1
+
+
+async def end_blob_deletion_in_mongodb(
+    mongodb: AsyncIOMotorClient, bucket_name: str, key: str
+) -> None:
+    """Remove the deletion mark of a blob that was referenced again while it was deleted.
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        bucket_name (str): the name of the bucket of the blob
+        key (str): the content hash of the blob
+    """
+    await mongodb[MONGO_DB_NAME][MONGO_BLOB_COLLECTION_NAME].update_one(
+        {"_id": f"{bucket_name}/{key}"}, {"$unset": {"deleting": ""}}
+    )
+
+
+async def decrement_blob_references_in_mongodb(
+    mongodb: AsyncIOMotorClient, bucket_name: str, key: str
+) -> Optional[int]:
+    """Remove a reference to a content addressed blob in mongodb.
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        bucket_name (str): the name of the bucket of the blob
+        key (str): the content hash of the blob
+
+    Returns:
+        Optional[int]: the number of references after or None if the blob has no reference count
+    """
+    blob = await mongodb[MONGO_DB_NAME][MONGO_BLOB_COLLECTION_NAME].find_one_and_update(
+        {"_id": f"{bucket_name}/{key}"},
+        {"$inc": {"refs": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    return blob["refs"] if blob else None
+
+
+async def delete_unreferenced_blob_from_mongodb(
+    mongodb: AsyncIOMotorClient, bucket_name: str, key: str
+) -> bool:
+    """Delete the reference count of a blob from mongodb if it has no references.
+
+    Args:
+        mongodb (AsyncIOMotorClient): the mongodb database connection
+        bucket_name (str): the name of the bucket of the blob
+        key (str): the content hash of the blob
+
+    Returns:
+        bool: whether it was deleted (False if a new reference was added in the meantime)
+    """
+    result = await mongodb[MONGO_DB_NAME][MONGO_BLOB_COLLECTION_NAME].delete_one(
+        {"_id": f"{bucket_name}/{key}", "refs": {"$lte": 0}}
+    )
+    return result.deleted_count == 1
@@ -1,11 +1,19 @@
 from datetime import timedelta
+from typing import Awaitable, Callable, List, Optional
 
 import aioredis
 from fastapi import Depends, Security
 from fastapi_auth0 import Auth0User
 
 from app.core.auth0 import auth
-from app.core.config import REDIS_RATELIMIT_PERIOD, REDIS_RATELIMIT_REQUESTS, REDIS_URL
+from app.core.config import (
+    BLOB_CACHE_REDIS_TTL,
+    REDIS_RATELIMIT_PERIOD,
+    REDIS_RATELIMIT_REQUESTS,
+    REDIS_URL,
+    USER_IMAGES_CACHE_TTL,
+)
+from app.core.metrics import stage_latency
 from app.schemas.redisdb import RedisClient
 
 redisdb = RedisClient()
@@ -59,7 +67,139 @@ async def check_user_ratelimit(
     Returns:
         tuple: a tuple with the user object and the bool is a ratelimit applies
     """
-    is_ratelimited = await is_ratelimited_redisdb(
-        redisdb, user.id, redis_ratelimit_config[0], redis_ratelimit_config[1]
-    )
+    with stage_latency.time("redis_ratelimit"):
+        is_ratelimited = await is_ratelimited_redisdb(
+            redisdb, user.id, redis_ratelimit_config[0], redis_ratelimit_config[1]
+        )
     return (user, is_ratelimited)
+
+
+def _user_images_key(auth0_id: str) -> str:
+    """Return the key of the cached image listing pages of a user (a hash of the pages)."""
+    return f"user_images:{auth0_id}"
+
+
+def _user_images_page(offset: int, limit: Optional[int]) -> str:
+    """Return the field of a cached image listing page."""
+    return f"{offset}:{limit or 'all'}"
+
+
+async def get_user_images_from_redisdb(
+    redisdb: aioredis.Redis, auth0_id: str, offset: int = 0, limit: int = None
+) -> Optional[str]:
+    """Get a cached image listing page of a user from redis.
+
+    Args:
+        redisdb (aioredis.Redis): the redisdb database connection
+        auth0_id (str): the user auth0 id
+        offset (int, optional): the number of skipped images. Defaults to 0.
+        limit (int, optional): the maximum number of images. Defaults to None (all images).
+
+    Returns:
+        Optional[str]: the JSON page of the user images or None if it is not cached
+    """
+    listing = await redisdb.hget(_user_images_key(auth0_id), _user_images_page(offset, limit))
+    return listing.decode() if listing is not None else None
+
+
+async def save_user_images_in_redisdb(
+    redisdb: aioredis.Redis,
+    auth0_id: str,
+    get_listing: Callable[[], Awaitable[str]],
+    offset: int = 0,
+    limit: int = None,
+    ttl: int = USER_IMAGES_CACHE_TTL,
+) -> str:
+    """Get an image listing page of a user and cache it in redis, unless the images change in the meantime.
+
+    Args:
+        redisdb (aioredis.Redis): the redisdb database connection
+        auth0_id (str): the user auth0 id
+        get_listing (Callable[[], Awaitable[str]]): a function that returns the JSON page of the user images
+        offset (int, optional): the number of skipped images. Defaults to 0.
+        limit (int, optional): the maximum number of images. Defaults to None (all images).
+        ttl (int, optional): the seconds until the pages expire. Defaults to USER_IMAGES_CACHE_TTL.
+
+    Returns:
+        str: the JSON page of the user images
+    """
+    key = _user_images_key(auth0_id)
+    async with redisdb.pipeline(transaction=True) as pipe:
+        # An invalidation while the page is read aborts the transaction.
+        await pipe.watch(key)
+        cached = await pipe.exists(key)
+        listing = await get_listing()
+        pipe.multi()
+        pipe.hset(key, _user_images_page(offset, limit), listing)
+        # The pages expire together, counted from the first page (or the last invalidation).
+        if not cached:
+            pipe.expire(key, ttl)
+        try:
+            await pipe.execute()
+        except aioredis.WatchError:
+            pass
+    return listing
+
+
+async def invalidate_user_images_in_redisdb(
+    redisdb: aioredis.Redis, auth0_id: str, ttl: int = USER_IMAGES_CACHE_TTL
+) -> None:
+    """Invalidate the cached image listing pages of a user in redis.
+
+    Args:
+        redisdb (aioredis.Redis): the redisdb database connection
+        auth0_id (str): the user auth0 id
+        ttl (int, optional): the seconds until the invalidation expires. Defaults to USER_IMAGES_CACHE_TTL.
+    """
+    key = _user_images_key(auth0_id)
+    # A marker (instead of only a deletion) also aborts pages that are cached at the same time.
+    async with redisdb.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.hset(key, "invalidated", "")
+        pipe.expire(key, ttl)
+        await pipe.execute()
+
+
+def _blob_key(bucket_name: str, key: str) -> str:
+    """Return the key of a cached blob."""
+    return f"blob:{bucket_name}/{key}"
+
+
+async def get_blob_from_redisdb(redisdb: aioredis.Redis, bucket_name: str, key: str) -> Optional[bytes]:
+    """Get a cached blob from redis.
+
+    Args:
+        redisdb (aioredis.Redis): the redisdb database connection
+        bucket_name (str): the name of the bucket of the blob
+        key (str): the name of the blob in the bucket
+
+    Returns:
+        Optional[bytes]: the blob or None if it is not cached
+    """
+    return await redisdb.get(_blob_key(bucket_name, key))
+
+
+async def save_blob_in_redisdb(
+    redisdb: aioredis.Redis, bucket_name: str, key: str, blob: bytes, ttl: int = BLOB_CACHE_REDIS_TTL
+) -> None:
+    """Cache a blob in redis.
+
+    Args:
+        redisdb (aioredis.Redis): the redisdb database connection
+        bucket_name (str): the name of the bucket of the blob
+        key (str): the name of the blob in the bucket
+        blob (bytes): the blob
+        ttl (int, optional): the seconds until the blob expires. Defaults to BLOB_CACHE_REDIS_TTL.
+    """
+    await redisdb.set(_blob_key(bucket_name, key), blob, ex=ttl)
+
+
+async def delete_blobs_from_redisdb(redisdb: aioredis.Redis, bucket_name: str, keys: List[str]) -> None:
+    """Remove cached blobs from redis.
+
+    Args:
+        redisdb (aioredis.Redis): the redisdb database connection
+        bucket_name (str): the name of the bucket of the blobs
+        keys (List[str]): the names of the blobs in the bucket
+    """
+    await redisdb.delete(*[_blob_key(bucket_name, key) for key in keys])
@@ -0,0 +1,313 @@
+import os
+import re
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from google.api_core.exceptions import NotFound
+
+from app.core.config import LOCAL_STORAGE_PATH, S3_ENDPOINT_URL, STORAGE_BACKEND
+from app.core.metrics import stage_latency
+from app.db.google_cloud_storage import (
+    delete_blob_from_gcs,
+    download_blob_from_gcs,
+    upload_blob_to_gcs,
+    upload_file_to_gcs,
+)
+
+# Blobs are named by content hashes (or uuids before content addressing), so they never change.
+BLOB_CACHE_CONTROL = "public, max-age=31536000, immutable"
+SAFE_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class StorageBackend(ABC):
+    """A class that describes where the blobs of a bucket are stored."""
+
+    @abstractmethod
+    def upload(self, bucket_name: str, key: str, blob: bytes, content_type: str) -> None:
+        """Save a blob under a key (an existing blob with the same key is replaced).
+
+        Args:
+            bucket_name (str): the name of the bucket
+            key (str): the name of the blob in the bucket
+            blob (bytes): the blob
+            content_type (str): the content type of the blob
+        """
+
+    @abstractmethod
+    def upload_file(self, bucket_name: str, key: str, path: str, content_type: str) -> None:
+        """Save a file under a key without reading it into memory (see upload)."""
+
+    @abstractmethod
+    def download(self, bucket_name: str, key: str) -> bytes:
+        """Return a blob (raises FileNotFoundError if it does not exist)."""
+
+    @abstractmethod
+    def delete(self, bucket_name: str, keys: List[str]) -> None:
+        """Delete blobs from a bucket."""
+
+    async def response(
+        self, request: Request, bucket_name: str, key: str, media_type: str
+    ) -> Response:
+        """Return a response that serves a blob (raises FileNotFoundError if it does not exist).
+
+        Args:
+            request (Request): the request (e.g. for its Range header)
+            bucket_name (str): the name of the bucket
+            key (str): the name of the blob in the bucket
+            media_type (str): the content type of the response
+
+        Returns:
+            Response: the response
+        """
+        blob = await run_in_threadpool(self.download, bucket_name, key)
+        return Response(
+            content=blob, media_type=media_type, headers={"Cache-Control": BLOB_CACHE_CONTROL}
+        )
+
+
+class GCSStorage(StorageBackend):
+    """Blobs in google cloud storage buckets."""
+
+    def upload(self, bucket_name: str, key: str, blob: bytes, content_type: str) -> None:
+        upload_blob_to_gcs(bucket_name, blob, key, content_type)
+
+    def upload_file(self, bucket_name: str, key: str, path: str, content_type: str) -> None:
+        upload_file_to_gcs(bucket_name, path, key, content_type)
+
+    def download(self, bucket_name: str, key: str) -> bytes:
+        try:
+            return download_blob_from_gcs(bucket_name, key)
+        except NotFound:
+            raise FileNotFoundError(f"{bucket_name}/{key}")
+
+    def delete(self, bucket_name: str, keys: List[str]) -> None:
+        delete_blob_from_gcs(bucket_name, keys)
+
+
+class S3Storage(StorageBackend):
+    """Blobs in the buckets of an S3 compatible object storage (e.g. MinIO).
+
+    The credentials are read by boto3, e.g. from AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY.
+    """
+
+    def __init__(self, endpoint_url: str = None) -> None:
+        """Init a new S3 storage.
+
+        Args:
+            endpoint_url (str, optional): the URL of the object storage. Defaults to None (AWS S3).
+        """
+        import boto3
+
+        # Clients are thread safe, so one is shared by the threadpool.
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def upload(self, bucket_name: str, key: str, blob: bytes, content_type: str) -> None:
+        with stage_latency.time("s3_upload"):
+            self.client.put_object(Bucket=bucket_name, Key=key, Body=blob, ContentType=content_type)
+
+    def upload_file(self, bucket_name: str, key: str, path: str, content_type: str) -> None:
+        # Large files are uploaded in parts.
+        with stage_latency.time("s3_upload"):
+            self.client.upload_file(path, bucket_name, key, ExtraArgs={"ContentType": content_type})
+
+    def download(self, bucket_name: str, key: str) -> bytes:
+        with stage_latency.time("s3_download"):
+            try:
+                return self.client.get_object(Bucket=bucket_name, Key=key)["Body"].read()
+            except self.client.exceptions.NoSuchKey:
+                raise FileNotFoundError(f"{bucket_name}/{key}")
+
+    def delete(self, bucket_name: str, keys: List[str]) -> None:
+        # A request deletes at most 1000 objects.
+        for i in range(0, len(keys), 1000):
+            self.client.delete_objects(
+                Bucket=bucket_name,
+                Delete={"Objects": [{"Key": key} for key in keys[i : i + 1000]], "Quiet": True},
+            )
+
+
+class LocalStorage(StorageBackend):
+    """Blobs in the directories of a local disk (e.g. the NVMe of an edge node).
+
+    Every bucket is a directory whose blobs are sharded by the first two byte pairs of their key
+    (bucket/ab/cd/abcd...), so no directory holds more than a few thousand files. Blobs are written
+    to a temporary file and renamed, so readers never see a partial blob.
+    """
+
+    def __init__(self, root: str) -> None:
+        """Init a new local storage.
+
+        Args:
+            root (str): the directory of the buckets
+        """
+        self.root = root
+
+    def path(self, bucket_name: str, key: str) -> str:
+        """Return the path of a blob (raises ValueError for names that are not plain file names)."""
+        if not (SAFE_NAME.fullmatch(bucket_name) and SAFE_NAME.fullmatch(key)):
+            raise ValueError(f"Invalid blob name: {bucket_name}/{key}")
+        return os.path.join(self.root, bucket_name, key[:2], key[2:4], key)
+
+    def _write(self, bucket_name: str, key: str, write: Callable[[BinaryIO], None]) -> None:
+        """Write a blob into a temporary file and rename it to the path of the blob."""
+        path = self.path(bucket_name, key)
+        directory = os.path.dirname(path)
+        with stage_latency.time("local_upload"):
+            os.makedirs(directory, exist_ok=True)
+            # The temporary file is in the same directory, so the rename is atomic.
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    write(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except:
+                os.unlink(tmp_path)
+                raise
+
+    def upload(self, bucket_name: str, key: str, blob: bytes, content_type: str) -> None:
+        self._write(bucket_name, key, lambda f: f.write(blob))
+
+    def upload_file(self, bucket_name: str, key: str, path: str, content_type: str) -> None:
+        def copy(f: BinaryIO) -> None:
+            with open(path, "rb") as source:
+                shutil.copyfileobj(source, f, 1 << 20)
+
+        self._write(bucket_name, key, copy)
+
+    def download(self, bucket_name: str, key: str) -> bytes:
+        with stage_latency.time("local_download"):
+            with open(self.path(bucket_name, key), "rb") as f:
+                return f.read()
+
+    def delete(self, bucket_name: str, keys: List[str]) -> None:
+        for key in keys:
+            try:
+                os.remove(self.path(bucket_name, key))
+            except FileNotFoundError:
+                pass
+
+    async def response(
+        self, request: Request, bucket_name: str, key: str, media_type: str
+    ) -> Response:
+        """Return a response that streams a blob from its file, with support for byte ranges (see StorageBackend.response)."""
+        path = self.path(bucket_name, key)
+        headers = {"Cache-Control": BLOB_CACHE_CONTROL, "ETag": f'"{key}"'}
+        range_header = request.headers.get("range")
+        if range_header is None:
+            # The whole file is streamed by Starlette (the stat raises FileNotFoundError for missing blobs).
+            return FileResponse(
+                path,
+                media_type=media_type,
+                headers={**headers, "Accept-Ranges": "bytes"},
+                stat_result=os.stat(path),
+            )
+        return FileRangeResponse(path, range_header, media_type, headers=headers)
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Return the first and last byte of a single byte range (RFC 7233).
+
+    Args:
+        range_header (Optional[str]): the Range header of the request
+        size (int): the size of the file
+
+    Raises:
+        ValueError: if the range is not satisfiable (416)
+
+    Returns:
+        Optional[Tuple[int, int]]: the first and last byte or None if the whole file is sent
+    """
+    # Malformed and multiple ranges are ignored, which serves the whole file.
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header or "")
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # A suffix range, e.g. the last 500 bytes.
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = size - 1 if last == "" else min(int(last), size - 1)
+    if first > last:
+        raise ValueError("Range not satisfiable")
+    return first, last
+
+
+class FileRangeResponse(Response):
+    """A response that streams a file or a byte range of it (read in chunks in the threadpool)."""
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self, path: str, range_header: Optional[str], media_type: str, headers: dict = None
+    ) -> None:
+        """Init a new file range response (raises FileNotFoundError if the file does not exist).
+
+        Args:
+            path (str): the path of the file
+            range_header (Optional[str]): the Range header of the request
+            media_type (str): the content type of the file
+            headers (dict, optional): additional headers. Defaults to None.
+        """
+        # The file stays readable while it is sent, even if it is deleted in the meantime.
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        headers = {**(headers or {}), "Accept-Ranges": "bytes"}
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            status_code, self.offset, self.count = 416, 0, 0
+            headers["Content-Range"] = f"bytes */{size}"
+        else:
+            if byte_range is None:
+                status_code, self.offset, self.count = 200, 0, size
+            else:
+                first, last = byte_range
+                status_code, self.offset, self.count = 206, first, last - first + 1
+                headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+        headers["Content-Length"] = str(self.count)
+        super().__init__(status_code=status_code, media_type=media_type, headers=headers)
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await send(
+                {"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers}
+            )
+            offset, remaining = self.offset, self.count
+            while remaining > 0:
+                chunk = await run_in_threadpool(
+                    os.pread, self.file.fileno(), min(self.chunk_size, remaining), offset
+                )
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self.file.close()
+            if self.background is not None:
+                await self.background()
+
+
+def create_storage_backend(name: str) -> StorageBackend:
+    """Create the storage backend of a name ("gcs", "local" or "s3")."""
+    if name == "gcs":
+        return GCSStorage()
+    if name == "local":
+        return LocalStorage(LOCAL_STORAGE_PATH)
+    if name == "s3":
+        return S3Storage(S3_ENDPOINT_URL)
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+storage_backend = create_storage_backend(STORAGE_BACKEND)
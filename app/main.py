@@ -1,11 +1,18 @@
+import asyncio
+import logging
+
 import aioredis
 from fastapi import APIRouter, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
 
 from app.api.main_router import router
-from app.core.config import API_NAME, API_PREFIX, DEBUG, MONGO_URL, REDIS_URL, VERSION
-from app.db.mongodb import mongodb
+from app.api.routes import metrics
+from app.core.config import API_NAME, API_PREFIX, DEBUG, MODEL_WATCH, MONGO_URL, REDIS_URL, VERSION
+from app.core.metrics import RequestLatencyMiddleware, registry
+from app.core.model_catalog import stylegan2ada_catalog
+from app.db.mongodb import create_image_indexes_in_mongodb, mongodb
 from app.db.redisdb import redisdb
 
 
@@ -14,6 +21,9 @@ def get_app() -> FastAPI:
     app = FastAPI(title=API_NAME, debug=DEBUG, version=VERSION)
 
     app.include_router(router, prefix=API_PREFIX)
+    # The Prometheus metrics are served without the prefix (the default scrape path).
+    app.include_router(metrics.router)
+    app.add_middleware(RequestLatencyMiddleware)
 
     # CORS config
     origins = ["http://localhost:3000", "https://webdesigan.com"]
@@ -36,10 +46,24 @@ async def startup_event():
     """Handle the startup event of the main application."""
     mongodb.client = AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=5000)
     redisdb.client = await aioredis.from_url(REDIS_URL)
+    # Creating existing indexes does nothing, so every worker makes sure that they exist.
+    try:
+        await create_image_indexes_in_mongodb(mongodb.client)
+    except PyMongoError as e:
+        logging.warning(f"The mongodb indexes could not be created: {e}")
+    if MODEL_WATCH:
+        app.state.model_watch = asyncio.ensure_future(stylegan2ada_catalog.watch())
+    if registry.multiprocess_dir:
+        app.state.metrics_flush = asyncio.ensure_future(registry.flush_periodically())
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Handle the shutdown event of the main application."""
+    if MODEL_WATCH:
+        app.state.model_watch.cancel()
+    if registry.multiprocess_dir:
+        app.state.metrics_flush.cancel()
+        registry.write_snapshot()
     await mongodb.client.close()
     await redisdb.client.close()
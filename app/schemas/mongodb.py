@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Tuple
 import uuid
 
 from pydantic import validator
@@ -28,12 +28,23 @@ class ImageData(BaseModel):
         auth0_id (str): the auth0 id of the user
         creation_date (datetime): the creation time. Defaults to datetime.now(pytz.timezone("Europe/Berlin").
         method (dict): the creation method of the image
+        image_key (Optional[str]): the content hash name of the image in its bucket. Defaults to None (named by the id).
+        vector_key (Optional[str]): the content hash name of the feature vector in its bucket. Defaults to None (named by the id).
+        vector_in_document (bool): whether the feature vector is saved in the document instead of its bucket. Defaults to False.
     """
 
     url: str
     auth0_id: str
     creation_date: datetime = datetime.now(pytz.timezone("Europe/Berlin"))
     method: dict
+    image_key: Optional[str] = None
+    vector_key: Optional[str] = None
+    vector_in_document: bool = False
+
+    @property
+    def blob_keys(self) -> Tuple[str, str]:
+        """Return the names of the image and its feature vector in their buckets (images saved before content addressing are named by their id)."""
+        return self.image_key or self.url, self.vector_key or self.url
 
 
 class DeletionOptions(BaseModel):
@@ -1,9 +1,13 @@
+import math
 import random
 import uuid
-from typing import Any, Union
+from typing import Any, List, Optional, Tuple, Union
 
+import numpy as np
 from pydantic import BaseModel, validator
 
+from app.core.config import VIDEO_MAX_FRAMES
+from app.core.metrics import Gauge, images_generated
 from app.schemas.stylegan_methods import (
     Dropdown,
     SeedOrImage,
@@ -12,10 +16,47 @@ from app.schemas.stylegan_methods import (
     Text,
 )
 from app.schemas.stylegan_models import Model, StyleGanModel, stylegan2ada_models
-from app.stylegan.generation import generate_image_stylegan2ada
+from app.stylegan.backends import load_inference_model
+from app.stylegan.editing import EditDirections, edit_image_stylegan2ada, load_edit_directions
+from app.stylegan.generation import (
+    generate_image_stylegan2ada,
+    truncation_sweep_stylegan2ada,
+)
+from app.stylegan.interpolation import (
+    VIDEO_FORMATS,
+    interpolation_frames,
+    render_interpolation_video,
+)
 from app.stylegan.load_model import load_model_from_pkl_stylegan2ada
 from app.stylegan.projection import project_image_stylegan2ada
-from app.stylegan.style_mixing import style_mix_two_images_stylegan2ada
+from app.stylegan.style_mixing import (
+    style_mix_grid_stylegan2ada,
+    style_mix_two_images_stylegan2ada,
+)
+from app.stylegan.utils import model_memory_bytes, seed_to_mean_w
+
+
+def resolution_validator(min_resolution: int = 4) -> classmethod:
+    """Return a validator of the resolution of preview images (None means the full model resolution).
+
+    Args:
+        min_resolution (int, optional): the smallest valid resolution. Defaults to 4 (the first synthesis block).
+
+    Returns:
+        classmethod: a validator that accepts powers of 2 between min_resolution and the model resolution
+    """
+
+    def resolution_is_valid(resolution, values):
+        if resolution is None:
+            return resolution
+        max_resolution = values["model"].res if "model" in values else resolution
+        if min_resolution <= resolution <= max_resolution and resolution & (resolution - 1) == 0:
+            return resolution
+        raise ValueError(
+            f"Resolution must be a power of 2 between {min_resolution} and {max_resolution}."
+        )
+
+    return validator("resolution", allow_reuse=True)(resolution_is_valid)
 
 
 class StyleGan2ADA(StyleGanModel):
@@ -32,6 +73,8 @@ class StyleGan2ADA(StyleGanModel):
             method_options (dict): a dict that contains option parameters for a stylegan method
         """
         model.version = self.__class__.__name__
+        self.model_filename = model.filename
+        self.model_resolution = model.res
         self.model = self._load_model(model)
         self.method_options = method_options
 
@@ -63,22 +106,127 @@ class StyleGan2ADA(StyleGanModel):
             return stylegan2ada_model
 
         stylegan2ada_model = load_model_from_pkl_stylegan2ada(self.folder_path, model)
+        # Run the model on the configured inference backend (e.g. TorchScript) if it was exported.
+        stylegan2ada_model = load_inference_model(
+            self.folder_path, model, stylegan2ada_model
+        )
         self.loaded_models[model] = stylegan2ada_model
 
         return stylegan2ada_model
 
-    def generate(self) -> dict:
-        """Generate a new image with the specified stylegan2ada model."""
-        return generate_image_stylegan2ada(self.model, self.method_options)
+    def _count_images(self, result: dict) -> dict:
+        """Count the new images of a method result for the images per second of the model."""
+        image_blobs = {image_blob for image_blob, _ in result.values() if image_blob}
+        images_generated.inc(len(image_blobs), self.model_filename)
+        return result
+
+    def generation_key(self, seed: Union[str, int]) -> Optional[tuple]:
+        """Return a key of the generated image of a seed under the truncation and resolution of the method options.
+
+        Args:
+            seed (Union[str, int]): the seed (blank for random)
+
+        Returns:
+            Optional[tuple]: the key or None for random seeds
+        """
+        if seed == "":
+            return None
+        return (
+            "generate",
+            self.model_filename,
+            int(seed),
+            float(self.method_options.truncation),
+            self.method_options.resolution or self.model_resolution,
+        )
+
+    def generate(self, seed: Union[str, int] = None) -> dict:
+        """Generate a new image with the specified stylegan2ada model.
+
+        Args:
+            seed (Union[str, int], optional): a seed instead of the one of the method options (e.g. a style mix partner). Defaults to None.
+        """
+        generation_options = self.method_options
+        if seed is not None:
+            generation_options = Generation.construct(
+                model=generation_options.model,
+                truncation=generation_options.truncation,
+                seed=str(seed),
+                resolution=generation_options.resolution,
+            )
+        return self._count_images(
+            generate_image_stylegan2ada(self.model, generation_options)
+        )
+
+    def truncation_sweep(self) -> dict:
+        """Generate the preview images of a seed for many truncation values in one batch with the specified stylegan2ada model."""
+        result = truncation_sweep_stylegan2ada(self.model, self.method_options)
+        images_generated.inc(len(result), self.model_filename)
+        return result
 
     def style_mix(
         self, row_image: Union[int, bytes], col_image: Union[int, bytes]
     ) -> dict:
         """Style mix two images with the specified stylegan2ada model."""
-        return style_mix_two_images_stylegan2ada(
-            self.model, self.method_options, row_image, col_image
+        return self._count_images(
+            style_mix_two_images_stylegan2ada(
+                self.model, self.method_options, row_image, col_image
+            )
         )
 
+    def style_mix_grid(
+        self, row_images: List[Union[int, bytes]], col_images: List[Union[int, bytes]]
+    ) -> Tuple[bytes, dict]:
+        """Style mix every row image with every column image with the specified stylegan2ada model (in batches).
+
+        Returns:
+            Tuple[bytes, dict]: the grid image byte object and the mixes (see style_mix_grid_stylegan2ada)
+        """
+        grid_image, result = style_mix_grid_stylegan2ada(
+            self.model, self.method_options, row_images, col_images
+        )
+        # The row and column images are synthesized for the grid as well.
+        images_generated.inc(len(row_images) + len(col_images) + len(result), self.model_filename)
+        return grid_image, result
+
+    def edit_directions(self) -> Optional[EditDirections]:
+        """Return the edit directions of the model of the method options (None if they were not exported)."""
+        # The cache key of a loaded model holds the digest of its pkl file.
+        return load_edit_directions(
+            self.folder_path, self.method_options.model, self.model.cache_key[1]
+        )
+
+    def edit(self, image: Union[int, bytes], directions: EditDirections) -> dict:
+        """Edit an image along a direction with the specified stylegan2ada model (all strengths in one batch)."""
+        return self._count_images(
+            edit_image_stylegan2ada(self.model, self.method_options, directions, image)
+        )
+
+    def interpolate(self, keyframes: List[Union[int, bytes]], path: str) -> int:
+        """Render an interpolation video between keyframes with the specified stylegan2ada model into a file.
+
+        Returns:
+            int: the number of frames
+        """
+        frames = render_interpolation_video(self.model, self.method_options, keyframes, path)
+        images_generated.inc(frames, self.model_filename)
+        return frames
+
+    def mean_w(self, seed: Union[str, int]) -> np.ndarray:
+        """Return the mean feature vector of a seed under the truncation of the method options (a similarity search query)."""
+        return seed_to_mean_w(self.model, int(seed), self.method_options.truncation)
+
+
+# The memory of the loaded models (measured when the metrics are scraped).
+Gauge(
+    "cp_loaded_model_bytes",
+    "The memory of the parameters and buffers of the loaded models.",
+    ("model",),
+    function=lambda: {
+        (model.filename,): model_memory_bytes(G)
+        for model, G in list(StyleGan2ADA.loaded_models.items())
+    },
+)
+
 
 class Generation(BaseModel):
     """The stylegan2ada generation method.
@@ -88,12 +236,14 @@ class Generation(BaseModel):
         model (Model): the model that should be used for the generation
         truncation (float): the truncation value for the generation
         seed (float): the seed for the generation (can be blank to be random)
+        resolution (Optional[int]): the resolution of a preview image (a power of 2 up to the model resolution). Defaults to None (full resolution).
     """
 
     name: str = "Generation"
     model: Model
     truncation: float
     seed: str
+    resolution: Optional[int] = None
 
     @validator("name")
     def name_is_default(cls, name):
@@ -126,6 +276,61 @@ class Generation(BaseModel):
             return truncation
         raise ValueError("Truncation must be between -2 and 2.")
 
+    resolution_is_valid = resolution_validator()
+
+
+class TruncationSweep(BaseModel):
+    """The stylegan2ada truncation sweep method, which renders a seed for many truncation values (e.g. a slider preview).
+
+    Attributes:
+        name (str): the name of the method. Defaults to TruncationSweep.
+        model (Model): the model that should be used for the sweep
+        seed (str): the seed for the sweep (can be blank to be random)
+        truncations (List[float]): the truncation values, one image per value
+        resolution (Optional[int]): the resolution of preview images (a power of 2 up to the model resolution). Defaults to None (full resolution).
+    """
+
+    name: str = "TruncationSweep"
+    model: Model
+    seed: str
+    truncations: List[float]
+    resolution: Optional[int] = None
+
+    @validator("name")
+    def name_is_default(cls, name):
+        """Return the default for unity."""
+        return "TruncationSweep"
+
+    @validator("model")
+    def model_is_valid(cls, model):
+        """Validate the given model."""
+        if model in stylegan2ada_models.models:
+            return model
+        raise ValueError("Please choose one of these models: " + str(stylegan2ada_models.models))
+
+    @validator("seed")
+    def seed_is_empty_or_int(cls, seed):
+        """Validate that the seed is either empty (a random seed is chosen) or a valid int."""
+        if seed == "":
+            return str(random.randint(0, 2 ** 32 - 1))
+        try:
+            if 0 <= int(seed) <= 4294967295:
+                return seed
+            raise ValueError("Seed must be between 0 and 4294967295, or blank for random.")
+        except:
+            raise ValueError("Seed must be between 0 and 4294967295, or blank for random.")
+
+    @validator("truncations")
+    def truncations_are_in_range(cls, truncations):
+        """Validate the number of truncation values and that they are in the correct range."""
+        if not 1 <= len(truncations) <= 16:
+            raise ValueError("Please give between 1 and 16 truncation values.")
+        if all(-2 <= truncation <= 2 for truncation in truncations):
+            return truncations
+        raise ValueError("Truncation values must be between -2 and 2.")
+
+    resolution_is_valid = resolution_validator()
+
 
 class StyleMix(BaseModel):
     """The stylegan2ada style mix method.
@@ -137,6 +342,7 @@ class StyleMix(BaseModel):
         column_image(str): a string that either is a seed (int) or an image id
         styles (str): a string that defines the styles that should be used for the style mix
         truncation (float): the truncation value for the style mix
+        resolution (Optional[int]): the resolution of a preview image (a power of 2 up to the model resolution). Defaults to None (full resolution).
     """
 
     name: str = "StyleMix"
@@ -145,6 +351,7 @@ class StyleMix(BaseModel):
     column_image: str
     styles: str
     truncation: float
+    resolution: Optional[int] = None
 
     @validator("name")
     def name_is_default(cls, name):
@@ -206,77 +413,464 @@ class StyleMix(BaseModel):
             return truncation
         raise ValueError("Truncation must be between -2 and 2.")
 
+    resolution_is_valid = resolution_validator()
 
-# The definiton method options of the generation method.
-# The definition allows to make this interface available via the API so that users or a frontend can know what inputs are allowed.
-generation_method = StyleGanMethod(
-    name="Generate",
-    description="Generate random images or from a certain seed.",
-    method_options=(
-        Dropdown(
-            place=1,
-            name="Model",
-            options=stylegan2ada_models.models,
-            default=0,
-            description="Choose your StyleGan2ADA model. The lower the FID value, the better the image quality.",
-        ),
-        Slider(
-            place=2,
-            name="Truncation",
-            max=2,
-            min=-2,
-            step=0.1,
-            default=1,
-            description="Truncation controls how close the image is to the overall average image of the model. For example, a truncation value of 0 will always generate the same image, the average of all images that were used to train the model. The higher or lower the value, the more diverse will the image be. Be aware that an increase in image diversity means a loss in image quality. This happens because a high or low truncation value tells the model to generate an image far away from the average, which essentially is less data that the model can use to generate your image.",
-        ),
-        Text(
-            place=3,
-            name="Seed",
-            default="",
-            description="You can either choose an empty seed for a random generation, a specific seed value",
-        ),
-    ),
-)
-# The definiton method options of the style mix method.
-# The definition allows to make this interface available via the API so that users or a frontend can know what inputs are allowed.
-stylemix_method = StyleGanMethod(
-    name="StyleMix",
-    description="Style mix two different images. The row image will adapt the styles of the column image.",
-    method_options=(
-        Dropdown(
-            place=1,
-            name="Model",
-            options=stylegan2ada_models.models,
-            default=0,
-            description="Choose your StyleGan2ADA model. The lower the FID value, the better the image quality.",
-        ),
-        SeedOrImage(
-            name="Row_Image",
-            place=2,
-            default="",
-            description="You can either choose an empty seed for a random generation, a specific seed value, or you can choose an image from your collection.",
-        ),
-        SeedOrImage(
-            name="Column_Image",
-            place=3,
-            default="",
-            description="You can either choose an empty seed for a random generation, a specific seed value, or you can choose an image from your collection.",
-        ),
-        Dropdown(
-            place=4,
-            name="Styles",
-            options=("Coarse", "Middle", "Fine"),
-            default=1,
-            description="This dropdown allows to choose what kind of styles the row image adapts from the column image. Coarse styles are styles such as the content width (wide or narrow). Middle styles are structural styles such as grids, images, or text. Fine styles are almost only the color of the image.",
+
+class StyleMixGrid(BaseModel):
+    """The stylegan2ada style mix grid method, which mixes every row image with every column image.
+
+    Attributes:
+        name (str): the name of the method. Defaults to StyleMixGrid.
+        model (Model): the model that should be used for the style mixes
+        row_images (List[str]): between 1 and 8 strings that either are seeds (int), image ids or empty for a random seed
+        column_images (List[str]): between 1 and 8 strings that either are seeds (int), image ids or empty for a random seed
+        styles (str): a string that defines the styles that the row images adapt from the column images
+        truncation (float): the truncation value of the seeds
+        resolution (Optional[int]): the resolution of preview images (a power of 2 up to the model resolution). Defaults to None (full resolution).
+    """
+
+    name: str = "StyleMixGrid"
+    model: Model
+    row_images: List[str]
+    column_images: List[str]
+    styles: str
+    truncation: float
+    resolution: Optional[int] = None
+
+    @validator("name")
+    def name_is_default(cls, name):
+        """Return the default for unity."""
+        return "StyleMixGrid"
+
+    @validator("model")
+    def model_is_valid(cls, model):
+        """Validate the given model."""
+        if model in stylegan2ada_models.models:
+            return model
+        raise ValueError("Please choose one of these models: " + str(stylegan2ada_models.models))
+
+    @validator("row_images", "column_images")
+    def images_ids_or_seeds(cls, images):
+        """Validate that there are 1 to 8 images that are either empty strings, valid seed ints or image ids."""
+        if not 1 <= len(images) <= 8:
+            raise ValueError("Please give between 1 and 8 row and column images.")
+        validated = []
+        for image in images:
+            if image == "":
+                validated.append(str(random.randint(0, 2 ** 32 - 1)))
+                continue
+            try:
+                if uuid.UUID(image, version=4):
+                    validated.append(str(image))
+                    continue
+            except:
+                pass
+            try:
+                if 0 <= int(image) <= 4294967295:
+                    validated.append(str(image))
+                    continue
+            except:
+                pass
+            raise ValueError("Images must be empty for a random seed, a seed between 0 and 4294967295, or a valid image id.")
+        return validated
+
+    @validator("styles")
+    def style_is_valid(cls, styles):
+        """Validate the styles string."""
+        if styles == "Coarse" or styles == "Middle" or styles == "Fine":
+            return styles
+        raise ValueError("Styles can either be 'Coarse', 'Middle' or 'Fine'.")
+
+    @validator("truncation")
+    def truncation_is_in_range(cls, truncation):
+        """Validate that the truncation value is in the correct range."""
+        if -2 <= truncation <= 2:
+            return truncation
+        raise ValueError("Truncation must be between -2 and 2.")
+
+    resolution_is_valid = resolution_validator()
+
+
+class Edit(BaseModel):
+    """The stylegan2ada edit method, which moves an image along a precomputed direction.
+
+    Attributes:
+        name (str): the name of the method. Defaults to Edit.
+        model (Model): the model that should be used for the edit
+        image (str): a string that either is a seed (int) or an image id
+        direction (int): the index of the direction (0 changes the most)
+        strengths (List[float]): the strengths in standard deviations, one image per strength
+        layers (Optional[Tuple[int, int]]): the first and the last (exclusive) edited rows of the feature vector. Defaults to None (all rows).
+        truncation (float): the truncation value of a seed. Defaults to 1.
+        resolution (Optional[int]): the resolution of preview images (a power of 2 up to the model resolution). Defaults to None (full resolution).
+    """
+
+    name: str = "Edit"
+    model: Model
+    image: str
+    direction: int
+    strengths: List[float]
+    layers: Optional[Tuple[int, int]] = None
+    truncation: float = 1
+    resolution: Optional[int] = None
+
+    @validator("name")
+    def name_is_default(cls, name):
+        """Return the default for unity."""
+        return "Edit"
+
+    @validator("model")
+    def model_is_valid(cls, model):
+        """Validate the given model."""
+        if model in stylegan2ada_models.models:
+            return model
+        raise ValueError("Please choose one of these models: " + str(stylegan2ada_models.models))
+
+    @validator("image")
+    def image_id_or_seed(cls, image):
+        """Validate that the image is either an empty string, a valid seed int or an image id."""
+        if image == "":
+            return str(random.randint(0, 2 ** 32 - 1))
+        try:
+            if uuid.UUID(image, version=4):
+                return str(image)
+        except:
+            pass
+        try:
+            if 0 <= int(image) <= 4294967295:
+                return str(image)
+        except:
+            pass
+        raise ValueError("Image must be empty for a random seed, a seed between 0 and 4294967295, or a valid image id.")
+
+    @validator("direction")
+    def direction_is_positive(cls, direction):
+        """Validate that the direction is a valid index."""
+        if direction >= 0:
+            return direction
+        raise ValueError("Direction must be 0 or larger.")
+
+    @validator("strengths")
+    def strengths_are_in_range(cls, strengths):
+        """Validate the number of strengths and that they are in the correct range."""
+        if not 1 <= len(strengths) <= 16:
+            raise ValueError("Please give between 1 and 16 strengths.")
+        if all(-10 <= strength <= 10 for strength in strengths):
+            return strengths
+        raise ValueError("Strengths must be between -10 and 10.")
+
+    @validator("layers")
+    def layers_are_valid(cls, layers, values):
+        """Validate that the layers are a range of the rows of the feature vectors of the model."""
+        if layers is None or "model" not in values:
+            return layers
+        # The synthesis network of stylegan2ada has two rows per resolution from 4 and one for the last ToRGB.
+        num_ws = 2 * int(math.log2(values["model"].res)) - 2
+        start, end = layers
+        if 0 <= start < end <= num_ws:
+            return layers
+        raise ValueError(f"Layers must be a range between 0 and {num_ws}.")
+
+    @validator("truncation")
+    def truncation_is_in_range(cls, truncation):
+        """Validate that the truncation value is in the correct range."""
+        if -2 <= truncation <= 2:
+            return truncation
+        raise ValueError("Truncation must be between -2 and 2.")
+
+    resolution_is_valid = resolution_validator()
+
+
+class Interpolation(BaseModel):
+    """The stylegan2ada interpolation method, which renders a video that walks through keyframes.
+
+    Attributes:
+        name (str): the name of the method. Defaults to Interpolation.
+        model (Model): the model that should be used for the video
+        keyframes (List[str]): between 2 and 16 strings that either are seeds (int) or image ids
+        space (str): "w" (linear between the feature vectors) or "z" (spherical between the latents, seeds only). Defaults to w.
+        frames_per_transition (int): the frames from one keyframe to the next. Defaults to 30.
+        fps (int): the frames per second. Defaults to 30.
+        format (str): the video format, "mp4" or "webm". Defaults to mp4.
+        truncation (float): the truncation value of the seeds. Defaults to 1.
+        resolution (Optional[int]): the resolution of a preview video (a power of 2 from 16 up to the model resolution). Defaults to None (full resolution).
+    """
+
+    name: str = "Interpolation"
+    model: Model
+    keyframes: List[str]
+    space: str = "w"
+    frames_per_transition: int = 30
+    fps: int = 30
+    format: str = "mp4"
+    truncation: float = 1
+    resolution: Optional[int] = None
+
+    @validator("name")
+    def name_is_default(cls, name):
+        """Return the default for unity."""
+        return "Interpolation"
+
+    @validator("model")
+    def model_is_valid(cls, model):
+        """Validate the given model."""
+        if model in stylegan2ada_models.models:
+            return model
+        raise ValueError("Please choose one of these models: " + str(stylegan2ada_models.models))
+
+    @validator("keyframes")
+    def keyframes_are_ids_or_seeds(cls, keyframes):
+        """Validate that there are 2 to 16 keyframes that are either valid seed ints or image ids."""
+        if not 2 <= len(keyframes) <= 16:
+            raise ValueError("Please give between 2 and 16 keyframes.")
+        for keyframe in keyframes:
+            try:
+                if uuid.UUID(keyframe, version=4):
+                    continue
+            except:
+                pass
+            try:
+                if 0 <= int(keyframe) <= 4294967295:
+                    continue
+            except:
+                pass
+            raise ValueError("Keyframes must be seeds between 0 and 4294967295 or valid image ids.")
+        return keyframes
+
+    @validator("space")
+    def space_is_valid(cls, space, values):
+        """Validate the space, only seeds have latents to interpolate in Z."""
+        if space not in ("w", "z"):
+            raise ValueError("Space can either be 'w' or 'z'.")
+        if space == "z" and not all(keyframe.isdigit() for keyframe in values.get("keyframes", [])):
+            raise ValueError("Only seeds can be interpolated in 'z'.")
+        return space
+
+    @validator("frames_per_transition")
+    def frames_are_in_range(cls, frames_per_transition, values):
+        """Validate that the video has at most VIDEO_MAX_FRAMES frames."""
+        frames = interpolation_frames(len(values.get("keyframes", [None, None])), frames_per_transition)
+        if 1 <= frames_per_transition and frames <= VIDEO_MAX_FRAMES:
+            return frames_per_transition
+        raise ValueError(f"Videos must have between 2 and {VIDEO_MAX_FRAMES} frames.")
+
+    @validator("fps")
+    def fps_is_in_range(cls, fps):
+        """Validate that the frames per second are in the correct range."""
+        if 1 <= fps <= 60:
+            return fps
+        raise ValueError("Fps must be between 1 and 60.")
+
+    @validator("format")
+    def format_is_valid(cls, video_format):
+        """Validate the video format."""
+        if video_format in VIDEO_FORMATS:
+            return video_format
+        raise ValueError("Format can either be 'mp4' or 'webm'.")
+
+    @validator("truncation")
+    def truncation_is_in_range(cls, truncation):
+        """Validate that the truncation value is in the correct range."""
+        if -2 <= truncation <= 2:
+            return truncation
+        raise ValueError("Truncation must be between -2 and 2.")
+
+    # 16 is the smallest video size.
+    resolution_is_valid = resolution_validator(min_resolution=16)
+
+
+class SimilaritySearch(BaseModel):
+    """The search for the saved images of a user that are most similar to an image or a seed.
+
+    Attributes:
+        model (Model): the model of the images
+        image (str): a string that either is a seed (int) or an image id
+        truncation (float): the truncation value of a seed. Defaults to 1.
+        k (int): the number of similar images. Defaults to 10.
+    """
+
+    model: Model
+    image: str
+    truncation: float = 1
+    k: int = 10
+
+    @validator("model")
+    def model_is_valid(cls, model):
+        """Validate the given model."""
+        if model in stylegan2ada_models.models:
+            return model
+        raise ValueError("Please choose one of these models: " + str(stylegan2ada_models.models))
+
+    @validator("image")
+    def image_id_or_seed(cls, image):
+        """Validate that the image is either a valid seed int or an image id."""
+        try:
+            if uuid.UUID(image, version=4):
+                return str(image)
+        except:
+            pass
+        try:
+            if 0 <= int(image) <= 4294967295:
+                return str(image)
+        except:
+            pass
+        raise ValueError("Image must be a seed between 0 and 4294967295 or a valid image id.")
+
+    @validator("truncation")
+    def truncation_is_in_range(cls, truncation):
+        """Validate that the truncation value is in the correct range."""
+        if -2 <= truncation <= 2:
+            return truncation
+        raise ValueError("Truncation must be between -2 and 2.")
+
+    @validator("k")
+    def k_is_in_range(cls, k):
+        """Validate that the number of similar images is in the correct range."""
+        if 1 <= k <= 100:
+            return k
+        raise ValueError("K must be between 1 and 100.")
+
+
+class Profiling(BaseModel):
+    """The options of a synthesis profiling run (admin only).
+
+    Attributes:
+        model (Model): the model that should be profiled
+        batch_size (int): the number of images per run. Defaults to 1.
+        runs (int): the number of profiled runs. Defaults to 3.
+    """
+
+    model: Model
+    batch_size: int = 1
+    runs: int = 3
+
+    @validator("model")
+    def model_is_valid(cls, model):
+        """Validate the given model."""
+        if model in stylegan2ada_models.models:
+            return model
+        raise ValueError("Please choose one of these models: " + str(stylegan2ada_models.models))
+
+    @validator("batch_size")
+    def batch_size_is_in_range(cls, batch_size):
+        """Validate that the batch size is in the correct range."""
+        if 1 <= batch_size <= 16:
+            return batch_size
+        raise ValueError("Batch size must be between 1 and 16.")
+
+    @validator("runs")
+    def runs_is_in_range(cls, runs):
+        """Validate that the number of runs is in the correct range."""
+        if 1 <= runs <= 10:
+            return runs
+        raise ValueError("Runs must be between 1 and 10.")
+
+
+def create_resolution_option(models: list, place: int) -> Dropdown:
+    """Return the method option of the resolution, the model resolution (None) or a power of 2 up to the highest model resolution.
+
+    Args:
+        models (list): the models that can be chosen
+        place (int): the place alongside other method options
+    """
+    max_resolution = max((model.res for model in models), default=4)
+    resolutions = tuple(2 ** i for i in range(2, int(math.log2(max_resolution)) + 1))
+    # The model resolution is the default, because a fixed resolution can exceed the chosen model.
+    return Dropdown(
+        place=place,
+        name="Resolution",
+        options=(None,) + resolutions,
+        default=0,
+        description="Lower resolutions render faster previews. By default (none) images have the resolution of the model, which a lower resolution must not exceed.",
+    )
+
+
+def create_generation_method(models: list) -> StyleGanMethod:
+    """Return the definition of the method options of the generation method.
+
+    The definition allows to make this interface available via the API so that users or a frontend can know what inputs are allowed.
+
+    Args:
+        models (list): the models that can be chosen
+    """
+    return StyleGanMethod(
+        name="Generate",
+        description="Generate random images or from a certain seed.",
+        method_options=(
+            Dropdown(
+                place=1,
+                name="Model",
+                options=tuple(models),
+                default=0,
+                description="Choose your StyleGan2ADA model. The lower the FID value, the better the image quality.",
+            ),
+            Slider(
+                place=2,
+                name="Truncation",
+                max=2,
+                min=-2,
+                step=0.1,
+                default=1,
+                description="Truncation controls how close the image is to the overall average image of the model. For example, a truncation value of 0 will always generate the same image, the average of all images that were used to train the model. The higher or lower the value, the more diverse will the image be. Be aware that an increase in image diversity means a loss in image quality. This happens because a high or low truncation value tells the model to generate an image far away from the average, which essentially is less data that the model can use to generate your image.",
+            ),
+            Text(
+                place=3,
+                name="Seed",
+                default="",
+                description="You can either choose an empty seed for a random generation, a specific seed value",
+            ),
+            create_resolution_option(models, place=4),
         ),
-        Slider(
-            place=5,
-            name="Truncation",
-            max=2,
-            min=-2,
-            step=0.1,
-            default=1,
-            description="If you decide to generate a seed, the truncation controls how close the image is to the overall average image of the model. For example, a truncation value of 0 will always generate the same image, the average of all images that were used to train the model. The higher or lower the value, the more diverse will the image be. Be aware that an increase in image diversity means a loss in image quality. This happens because a high or low truncation value tells the model to generate an image far away from the average, which essentially is less data that the model can use to generate your image.",
+    )
+
+
+def create_stylemix_method(models: list) -> StyleGanMethod:
+    """Return the definition of the method options of the style mix method.
+
+    The definition allows to make this interface available via the API so that users or a frontend can know what inputs are allowed.
+
+    Args:
+        models (list): the models that can be chosen
+    """
+    return StyleGanMethod(
+        name="StyleMix",
+        description="Style mix two different images. The row image will adapt the styles of the column image.",
+        method_options=(
+            Dropdown(
+                place=1,
+                name="Model",
+                options=tuple(models),
+                default=0,
+                description="Choose your StyleGan2ADA model. The lower the FID value, the better the image quality.",
+            ),
+            SeedOrImage(
+                name="Row_Image",
+                place=2,
+                default="",
+                description="You can either choose an empty seed for a random generation, a specific seed value, or you can choose an image from your collection.",
+            ),
+            SeedOrImage(
+                name="Column_Image",
+                place=3,
+                default="",
+                description="You can either choose an empty seed for a random generation, a specific seed value, or you can choose an image from your collection.",
+            ),
+            Dropdown(
+                place=4,
+                name="Styles",
+                options=("Coarse", "Middle", "Fine"),
+                default=1,
+                description="This dropdown allows to choose what kind of styles the row image adapts from the column image. Coarse styles are styles such as the content width (wide or narrow). Middle styles are structural styles such as grids, images, or text. Fine styles are almost only the color of the image.",
+            ),
+            Slider(
+                place=5,
+                name="Truncation",
+                max=2,
+                min=-2,
+                step=0.1,
+                default=1,
+                description="If you decide to generate a seed, the truncation controls how close the image is to the overall average image of the model. For example, a truncation value of 0 will always generate the same image, the average of all images that were used to train the model. The higher or lower the value, the more diverse will the image be. Be aware that an increase in image diversity means a loss in image quality. This happens because a high or low truncation value tells the model to generate an image far away from the average, which essentially is less data that the model can use to generate your image.",
+            ),
+            create_resolution_option(models, place=6),
         ),
-    ),
-)
+    )
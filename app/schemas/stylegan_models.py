@@ -4,7 +4,7 @@ import os
 import re
 from abc import ABC
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Union
 
 from pydantic import BaseModel
 
@@ -12,7 +12,16 @@ from pydantic import BaseModel
 class StyleGanModel(ABC):
     """An abstract base class for stylegan models (for type hiting)."""
 
-    pass
+    def generation_key(self, seed: Union[str, int]) -> Optional[tuple]:
+        """Return a key of the generated image of a seed, which identical requests share.
+
+        Args:
+            seed (Union[str, int]): the seed (blank for random)
+
+        Returns:
+            Optional[tuple]: the key or None if the image should not be shared
+        """
+        return None
 
 
 class Model(BaseModel):
@@ -79,10 +88,11 @@ class ModelCollection:
         return self.models
 
     def create_models(self) -> list:
-        """Create list of models from the collection path."""
+        """Create list of models from the collection path (other files such as traced graphs are ignored)."""
         return [
             Model.from_filename(filename, self.path)
-            for filename in os.listdir(self.path)
+            for filename in sorted(os.listdir(self.path))
+            if filename.endswith(".pkl")
         ]
 
 
@@ -1,24 +1,64 @@
 from __future__ import annotations
 
-from typing import Type, Union
+import asyncio
+import base64
+import json
+import logging
+import os
+import tempfile
+import uuid
+from typing import Dict, List, Optional, Tuple, Type, Union
 
+import aioredis
+import numpy as np
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi_auth0 import Auth0User
 from motor.motor_asyncio import AsyncIOMotorClient
 
-from app.db.google_cloud_storage import (
-    delete_blob_from_gcs,
-    download_blob_from_gcs,
-    upload_blob_to_gcs,
+from app.core.admission import run_inference, video_admission
+from app.core.config import (
+    IMAGE_BUCKET,
+    IMAGE_STORAGE_BASE_URL,
+    LATENT_STORE,
+    VECTOR_BUCKET,
+    VIDEO_BUCKET,
 )
+from app.core.latent_index import LatentIndex, latent_index_syncs, latent_indexes
+from app.db.blob_storage import load_blob, release_blobs, save_blob, save_file_blob
 from app.db.mongodb import (
+    delete_all_user_assets_from_mongodb,
     delete_all_user_images_from_mongodb,
     delete_user_images_from_mongodb,
+    get_images_with_vectors_from_mongodb,
+    get_user_image_keys_from_mongodb,
     get_user_images_from_mongodb,
+    save_user_asset_in_mongodb,
     save_user_image_in_mongodb,
 )
+from app.db.redisdb import (
+    get_user_images_from_redisdb,
+    invalidate_user_images_in_redisdb,
+    redisdb,
+    save_user_images_in_redisdb,
+)
 from app.schemas.mongodb import DeletionOptions, ImageData
-from app.schemas.stylegan_models import StyleGanModel
+from app.schemas.stylegan_models import Model, StyleGanModel
+from app.stylegan.editing import EditDirections
+from app.stylegan.interpolation import VIDEO_FORMATS
+from app.stylegan.utils import load_vector_from_bytes, mean_w
+
+
+def image_model_filename(image_data: ImageData) -> Optional[str]:
+    """Return the filename of the model that created an image (None if it is unknown)."""
+    model = image_data.method.get("model")
+    return Model(**model).filename if isinstance(model, dict) else None
+
+
+def vectors_to_mean_ws(vectors: List[bytes]) -> np.ndarray:
+    """Decode feature vector blobs into their mean vectors [len(vectors), w_dim] (see mean_w)."""
+    return np.stack([mean_w(load_vector_from_bytes(vector)) for vector in vectors])
 
 
 class StyleGanUser:
@@ -43,6 +83,8 @@ class StyleGanUser:
         self.stylegan_method_options = stylegan_method_options
         self.stylegan_class = stylegan_class
         self.mongodb = mongodb
+        # The data of the images that are style mixed by their id.
+        self.partner_images = {}
         if self.stylegan_class:
             self.stylegan_model = self._load_stylegan_model()
 
@@ -52,73 +94,443 @@ class StyleGanUser:
             self.stylegan_method_options.model, self.stylegan_method_options
         )
 
-    async def get_user_images(self) -> list:
-        """Get a all images of a user from mongodb."""
-        return await get_user_images_from_mongodb(self.mongodb, self.user.id)
+    async def get_user_images(self, offset: int = 0, limit: int = None) -> list:
+        """Get all images of a user or a page of them from mongodb."""
+        return await get_user_images_from_mongodb(self.mongodb, self.user.id, offset, limit)
+
+    async def get_user_images_json(self, offset: int = 0, limit: int = None) -> str:
+        """Get a page of the images of a user as a JSON response, which is cached in redis until the images change.
+
+        Args:
+            offset (int, optional): the number of skipped images. Defaults to 0.
+            limit (int, optional): the maximum number of images. Defaults to None (all images).
+
+        Returns:
+            str: a JSON object with the image url prefix and the list of the image data
+        """
+
+        async def get_listing():
+            images = await self.get_user_images(offset, limit)
+            return json.dumps(
+                {"image_url_prefix": IMAGE_STORAGE_BASE_URL, "image_ids": jsonable_encoder(images)}
+            )
+
+        redis_client = redisdb.get_client()
+        if redis_client is None:
+            return await get_listing()
+        try:
+            listing = await get_user_images_from_redisdb(redis_client, self.user.id, offset, limit)
+            if listing is None:
+                listing = await save_user_images_in_redisdb(
+                    redis_client, self.user.id, get_listing, offset, limit
+                )
+            return listing
+        except aioredis.RedisError as e:
+            logging.warning(f"Could not use the cached image listing: {e}")
+            return await get_listing()
+
+    async def _invalidate_user_images(self) -> None:
+        """Invalidate the cached image listing of the user after its images changed."""
+        redis_client = redisdb.get_client()
+        if redis_client is None:
+            return
+        try:
+            await invalidate_user_images_in_redisdb(redis_client, self.user.id)
+        except aioredis.RedisError as e:
+            # The listing expires after USER_IMAGES_CACHE_TTL.
+            logging.error(f"Could not invalidate the cached image listing: {e}")
 
     async def delete_user_images(self, deletion_options: DeletionOptions) -> None:
-        """Delete user images from mongodb and google cloud storage.
+        """Delete user images from mongodb and the storage backend.
+
+        Deleting all images also releases the other blobs of the user (e.g. style mix grids).
 
         Args:
             deletion_options (DeletionOptions): an object that contains the options for deletion (a list of ids or a specifier for all images)
         """
+        images = await self.get_user_images()
+        assets = {}
         if deletion_options.all_documents:
-            # Delete all user image data from mongodb and gcs
-            image_id_list = [image.url for image in await self.get_user_images()]
-            delete_blob_from_gcs("stylegan-images", image_id_list)
-            delete_blob_from_gcs("stylegan-images-vectors", image_id_list)
+            # Delete all user image data from mongodb
             await delete_all_user_images_from_mongodb(self.mongodb, self.user.id)
+            assets = await delete_all_user_assets_from_mongodb(self.mongodb, self.user.id)
         else:
-            try:
-                # Delete a list of user image data from mongodb and gcs
-                delete_blob_from_gcs("stylegan-images", deletion_options.id_list)
-                delete_blob_from_gcs("stylegan-images-vectors", deletion_options.id_list)
-                await delete_user_images_from_mongodb(
-                    self.mongodb, self.user.id, deletion_options.id_list
-                )
-            except:
+            # Delete a list of user image data from mongodb
+            images = [image for image in images if image.url in deletion_options.id_list]
+            if len(images) < len(set(deletion_options.id_list)):
                 raise HTTPException(status_code=404, detail="The list contains not existing image ids.")
+            await delete_user_images_from_mongodb(
+                self.mongodb, self.user.id, deletion_options.id_list
+            )
+        await self._invalidate_user_images()
+        self._remove_from_latent_indexes(images)
+        # The blobs are shared by identical images, so they are only deleted from the storage without references.
+        await release_blobs(self.mongodb, IMAGE_BUCKET, [image.blob_keys[0] for image in images])
+        await release_blobs(
+            self.mongodb,
+            VECTOR_BUCKET,
+            [image.blob_keys[1] for image in images if not image.vector_in_document],
+        )
+        for bucket_name, keys in assets.items():
+            await release_blobs(self.mongodb, bucket_name, keys)
+
+    async def generate_image(self) -> None:
+        """Generate a new image with the specified stylegan version and model.
+
+        Concurrent requests for the same image share one inference run, only the images are saved per user.
+        """
+        self.result_images_dict = await run_inference(
+            self.stylegan_model.generate,
+            key=self.stylegan_model.generation_key(self.stylegan_method_options.seed),
+        )
+
+    async def truncation_sweep(self) -> Dict[str, str]:
+        """Generate the preview images of a seed for many truncation values with the specified stylegan version and model.
+
+        All truncation values are rendered in one batched inference run. The previews are not saved, the
+        chosen truncation value is saved by generating it (see generate_image).
+
+        Returns:
+            Dict[str, str]: the JPEG data URL of every truncation value (result_image_0, ...)
+        """
+        previews = await run_inference(self.stylegan_model.truncation_sweep)
+        return {
+            name: "data:image/jpeg;base64," + base64.b64encode(image_blob).decode()
+            for name, image_blob in previews.items()
+        }
+
+    async def _generate_seed_image(self, seed: int) -> tuple:
+        """Generate the image of a style mix seed like generate_image (shared with identical requests).
+
+        Args:
+            seed (int): the seed
+
+        Returns:
+            tuple: the image byte object and the feature vector byte object
+        """
+        result = await run_inference(
+            self.stylegan_model.generate, seed, key=self.stylegan_model.generation_key(seed)
+        )
+        return result["result_image"]
+
+    async def _get_seeds_or_image_vectors(self, image_strings: List[str]) -> List[Union[int, bytes]]:
+        """Validate input image strings as ints or load the vectors of the images with these ids.
+
+        The images are looked up in one query, which also returns the vectors that are saved in their
+        documents. The other vectors are loaded concurrently from their bucket (see load_blob). Only the
+        images of the user are found, so the ids of other users raise a KeyError like missing ids (404).
+        """
+        image_ids = [image_string for image_string in image_strings if not image_string.isdigit()]
+        images = (
+            await get_images_with_vectors_from_mongodb(self.mongodb, self.user.id, image_ids)
+            if image_ids
+            else {}
+        )
+
+        async def get_seed_or_image_vector(image_string: str) -> Union[int, bytes]:
+            if image_string.isdigit():
+                return self.get_seed(image_string)
+            image_data, vector = images[image_string]
+            self.partner_images[image_string] = image_data
+            if vector is not None:
+                return vector
+            return await load_blob(VECTOR_BUCKET, image_data.blob_keys[1])
+
+        return await asyncio.gather(*map(get_seed_or_image_vector, image_strings))
+
+    async def style_mix_images(self) -> None:
+        """Style mix two images with the specified stylegan version and model.
+
+        The vectors of both images are loaded at once (see _get_seeds_or_image_vectors). Seeds are
+        generated first (see _generate_seed_image) and mixed by their feature vectors.
+        """
+        try:
+            row_image, column_image = await self._get_seeds_or_image_vectors(
+                [self.stylegan_method_options.row_image, self.stylegan_method_options.column_image]
+            )
+        except:
+            raise HTTPException(status_code=404, detail="There is no image with this id.")
+
+        seeds = {
+            image_name: image
+            for image_name, image in (("row_image", row_image), ("col_image", column_image))
+            if isinstance(image, int)
+        }
+        seed_images = dict(
+            zip(seeds, await asyncio.gather(*map(self._generate_seed_image, seeds.values())))
+        )
+        if "row_image" in seed_images:
+            row_image = seed_images["row_image"][1]
+        if "col_image" in seed_images:
+            column_image = seed_images["col_image"][1]
+
+        self.result_images_dict = await run_inference(
+            self.stylegan_model.style_mix, row_image, column_image
+        )
+        if seed_images:
+            # The mix of two feature vectors returns no seed images, so the generated ones are added.
+            self.result_images_dict = {**self.result_images_dict, **seed_images}
+
+    async def style_mix_grid(self) -> str:
+        """Style mix every row image with every column image with the specified stylegan version and model.
 
-    def generate_image(self) -> None:
-        """Generate a new image with the specified stylegan version and model."""
-        self.result_images_dict = self.stylegan_model.generate()
+        All vectors are loaded at once (see _get_seeds_or_image_vectors) and the grid is rendered in one
+        inference run. The mixes are saved like other results (result_image_<row>_<column>). The tiled
+        grid image is saved by its content in the image bucket and referenced by the user (it is
+        released when all images of the user are deleted), but it is not part of the gallery.
 
-    def style_mix_images(self) -> None:
-        """Style mix two images with the specified stylegan version and model."""
+        Returns:
+            str: the name of the grid image in the image bucket
+        """
+        grid_options = self.stylegan_method_options
         try:
-            row_image = self.get_seed_or_image_vector(
-                self.stylegan_method_options.row_image
+            images = await self._get_seeds_or_image_vectors(
+                grid_options.row_images + grid_options.column_images
             )
-            column_image = self.get_seed_or_image_vector(
-                self.stylegan_method_options.column_image
+        except:
+            raise HTTPException(status_code=404, detail="There is no image with this id.")
+        rows = len(grid_options.row_images)
+        grid_image, self.result_images_dict = await run_inference(
+            self.stylegan_model.style_mix_grid, images[:rows], images[rows:]
+        )
+        grid_key = await save_blob(self.mongodb, IMAGE_BUCKET, grid_image, "image/jpeg")
+        try:
+            await save_user_asset_in_mongodb(self.mongodb, self.user.id, IMAGE_BUCKET, grid_key)
+        except:
+            # Do not keep a reference that no user can release.
+            await release_blobs(self.mongodb, IMAGE_BUCKET, [grid_key])
+            raise
+        return grid_key
+
+    async def check_edit_directions(self) -> EditDirections:
+        """Return the edit directions of the model if it has the direction of the edit options.
+
+        The edit route checks this before the rate limit of the user is charged.
+
+        Returns:
+            EditDirections: the edit directions of the model
+        """
+        edit_options = self.stylegan_method_options
+        directions = await run_in_threadpool(self.stylegan_model.edit_directions)
+        if directions is None:
+            raise HTTPException(status_code=404, detail="There are no edit directions for this model.")
+        if edit_options.direction >= len(directions):
+            raise HTTPException(
+                status_code=422, detail=f"Direction must be between 0 and {len(directions) - 1}."
             )
+        return directions
+
+    async def edit_image(self) -> None:
+        """Edit an image along a precomputed direction with the specified stylegan version and model.
+
+        All strengths are rendered in one batched inference run, one result image per strength.
+        """
+        edit_options = self.stylegan_method_options
+        directions = await self.check_edit_directions()
+        try:
+            (image,) = await self._get_seeds_or_image_vectors([edit_options.image])
         except:
             raise HTTPException(status_code=404, detail="There is no image with this id.")
+        self.result_images_dict = await run_inference(self.stylegan_model.edit, image, directions)
 
-        self.result_images_dict = self.stylegan_model.style_mix(row_image, column_image)
+    async def render_interpolation_video(self) -> dict:
+        """Render an interpolation video between seeds or images and save it in the video bucket.
+
+        The video is encoded into a temporary file while it is rendered (see render_interpolation_video
+        of the stylegan version), so its frames are never held in memory at once, and it is uploaded
+        from the file. It is saved by its content and referenced by the user like a style mix grid
+        (see style_mix_grid). Renders are admitted separately from the image methods (see video_admission).
+
+        Returns:
+            dict: the name of the video in the video bucket (video_key) and its number of frames
+        """
+        interpolation_options = self.stylegan_method_options
+        try:
+            keyframes = await self._get_seeds_or_image_vectors(interpolation_options.keyframes)
+        except:
+            raise HTTPException(status_code=404, detail="There is no image with this id.")
+
+        content_type = VIDEO_FORMATS[interpolation_options.format][1]
+        fd, path = tempfile.mkstemp(suffix=f".{interpolation_options.format}")
+        os.close(fd)
+        try:
+            frames = await video_admission.run(self.stylegan_model.interpolate, keyframes, path)
+            # The format is part of the key, so the video is served with its content type.
+            video_key = await save_file_blob(
+                self.mongodb, VIDEO_BUCKET, path, content_type, suffix=f"_{interpolation_options.format}"
+            )
+        finally:
+            os.remove(path)
+        try:
+            await save_user_asset_in_mongodb(self.mongodb, self.user.id, VIDEO_BUCKET, video_key)
+        except:
+            # Do not keep a reference that no user can release.
+            await release_blobs(self.mongodb, VIDEO_BUCKET, [video_key])
+            raise
+        return {"video_key": video_key, "frames": frames}
 
     async def save_user_images(self) -> dict:
-        """Save user image data in mongodb and google cloud storage."""
+        """Save user image data in mongodb and the storage backend.
+
+        Returns:
+            dict: the ids of the images by their name, and their names in the image bucket (image_keys)
+        """
+        image_ids = {}
+        image_keys = {}
+        new_vectors = {}
         for image_name, image_blobs in self.result_images_dict.items():
             image_blob, w_vector_blob = image_blobs
-            # If image_blob and w_vector_blob are None, both have been passed in as already created (pulled from GCS with their id).
+            # If image_blob and w_vector_blob are None, both have been passed in as already created (pulled from the storage with their id).
             # Therefore, the result dict can be set to the initial id (either row or column image id).
             if not (image_blob and w_vector_blob):
-                self.result_images_dict[image_name] = (
+                image_id = (
                     self.stylegan_method_options.row_image
                     if image_name == "row_image"
                     else self.stylegan_method_options.column_image
                 )
+                partner_image = self.partner_images.get(image_id)
+                image_ids[image_name] = image_id
+                image_keys[image_name] = partner_image.blob_keys[0] if partner_image else image_id
                 continue
-            # If not, the image needs to be uploaded to GCS and its data saved to mongodb
-            image_id = upload_blob_to_gcs("stylegan-images", image_blob)
-            upload_blob_to_gcs("stylegan-images-vectors", w_vector_blob, image_id)
+            # If not, the blobs are saved by their content (only uploaded if they are new) and the image data is saved to mongodb
+            vector_in_document = LATENT_STORE == "mongodb"
+            if vector_in_document:
+                # The vector is saved in the document of the image.
+                image_key = await save_blob(self.mongodb, IMAGE_BUCKET, image_blob, "image/jpeg")
+                vector_key = None
+            else:
+                image_key, vector_key = await asyncio.gather(
+                    save_blob(self.mongodb, IMAGE_BUCKET, image_blob, "image/jpeg"),
+                    save_blob(
+                        self.mongodb, VECTOR_BUCKET, w_vector_blob, "application/octet-stream"
+                    ),
+                )
+            image_id = uuid.uuid4().hex
             image_data = ImageData(
-                url=image_id, auth0_id=self.user.id, method=self.stylegan_method_options
+                url=image_id,
+                auth0_id=self.user.id,
+                method=self.stylegan_method_options,
+                image_key=image_key,
+                vector_key=vector_key,
+                vector_in_document=vector_in_document,
+            )
+            await save_user_image_in_mongodb(
+                self.mongodb, image_data, w_vector_blob if vector_in_document else None
             )
-            await save_user_image_in_mongodb(self.mongodb, image_data)
-            self.result_images_dict[image_name] = image_id
-        return self.result_images_dict
+            image_ids[image_name] = image_id
+            image_keys[image_name] = image_key
+            new_vectors[image_id] = w_vector_blob
+        await self._invalidate_user_images()
+        await self._add_to_latent_index(new_vectors)
+        # The result dict may be shared with coalesced requests, so it is not modified.
+        image_ids["image_keys"] = image_keys
+        return image_ids
+
+    def _latent_index_key(self) -> tuple:
+        """Return the key of the similarity search index of the user and the model."""
+        return self.user.id, self.stylegan_method_options.model.filename
+
+    async def _load_vectors(self, image_ids: List[str]) -> Dict[str, bytes]:
+        """Load the feature vectors of images (see _get_seeds_or_image_vectors).
+
+        Args:
+            image_ids (List[str]): the image ids
+
+        Returns:
+            Dict[str, bytes]: the feature vectors by the ids of the images whose vector exists
+        """
+        images = await get_images_with_vectors_from_mongodb(self.mongodb, self.user.id, image_ids)
+
+        async def load_vector(image_data: ImageData, vector: Optional[bytes]) -> Optional[bytes]:
+            if vector is not None:
+                return vector
+            try:
+                return await load_blob(VECTOR_BUCKET, image_data.blob_keys[1])
+            except FileNotFoundError:
+                logging.warning(f"The vector of the image {image_data.url} does not exist.")
+                return None
+
+        vectors = await asyncio.gather(*[load_vector(*image) for image in images.values()])
+        return {
+            image_id: vector for image_id, vector in zip(images, vectors) if vector is not None
+        }
+
+    @staticmethod
+    async def _add_to_index(index: LatentIndex, vectors: Dict[str, bytes]) -> None:
+        """Decode feature vectors in the threadpool and add them to a similarity search index."""
+        if vectors:
+            mean_ws = await run_in_threadpool(vectors_to_mean_ws, list(vectors.values()))
+            index.add(list(vectors), mean_ws)
+
+    async def _sync_latent_index(self) -> Tuple[LatentIndex, Dict[str, str]]:
+        """Bring the similarity search index of the user and the model up to date with mongodb.
+
+        The index is kept in memory per worker and updated on save and delete, but another worker may
+        have changed the images. So the image ids of the user and the model are listed on every search
+        (an indexed query that only reads the ids and keys): vectors of new images are loaded (all of
+        them on the first search) and the ones of deleted images are removed.
+
+        Returns:
+            Tuple[LatentIndex, Dict[str, str]]: the index and the names of the images in the image bucket by their ids
+        """
+        key = self._latent_index_key()
+        index = latent_indexes.get(key)
+        if index is None:
+            index = LatentIndex()
+            latent_indexes.set(key, index)
+        image_keys = await get_user_image_keys_from_mongodb(
+            self.mongodb, self.user.id, self.stylegan_method_options.model
+        )
+        index.remove([image_id for image_id in index.ids if image_id not in image_keys])
+        missing = [image_id for image_id in image_keys if image_id not in index]
+        # The vectors are loaded in batches, so a large gallery does not load all blobs at once.
+        for i in range(0, len(missing), 256):
+            await self._add_to_index(index, await self._load_vectors(missing[i : i + 256]))
+        return index, image_keys
+
+    async def _add_to_latent_index(self, vectors: Dict[str, bytes]) -> None:
+        """Add the vectors of new images to the similarity search index of the user and the model (if it is loaded)."""
+        index = latent_indexes.get(self._latent_index_key()) if vectors else None
+        if index is not None:
+            await self._add_to_index(index, vectors)
+
+    def _remove_from_latent_indexes(self, images: List[ImageData]) -> None:
+        """Remove deleted images from the similarity search indexes of the user."""
+        image_ids = {}
+        for image in images:
+            image_ids.setdefault(image_model_filename(image), []).append(image.url)
+        for model_filename, ids in image_ids.items():
+            index = latent_indexes.get((self.user.id, model_filename))
+            if index is not None:
+                index.remove(ids)
+
+    async def find_similar_images(self) -> List[dict]:
+        """Find the saved images of the user and the model that are most similar to an image or a seed.
+
+        Images are compared by the cosine similarity of their mean feature vectors (the mean of the rows
+        of W). A seed is mapped with the truncation of the search options.
+
+        Returns:
+            List[dict]: the ids, the names in the image bucket and the similarity of the images, the most similar first
+        """
+        search_options = self.stylegan_method_options
+        index, image_keys = await latent_index_syncs.do(
+            self._latent_index_key(), self._sync_latent_index
+        )
+        if search_options.image.isdigit():
+            query = await run_inference(self.stylegan_model.mean_w, search_options.image)
+            exclude = None
+        else:
+            query = index.vector(search_options.image)
+            if query is None:
+                raise HTTPException(status_code=404, detail="There is no image with this id.")
+            exclude = search_options.image
+        return [
+            {"id": image_id, "image_key": image_keys[image_id], "similarity": similarity}
+            for image_id, similarity in index.search(query, search_options.k, exclude)
+            # Images that were saved while a seed was mapped are found by the next search.
+            if image_id in image_keys
+        ]
 
     @classmethod
     def get_class(cls) -> StyleGanUser:
@@ -126,9 +538,6 @@ class StyleGanUser:
         return cls
 
     @staticmethod
-    def get_seed_or_image_vector(image_string: str) -> Union[int, bytes]:
-        """Validate an input image string as an int or download the corresponding vector from google cloud storage."""
-        if image_string.isdigit():
-            return int(image_string)
-        else:
-            return download_blob_from_gcs("stylegan-images-vectors", image_string)
+    def get_seed(image_string: str) -> int:
+        """Validate an input image string as a seed (image ids are looked up by _get_seeds_or_image_vectors)."""
+        return int(image_string)
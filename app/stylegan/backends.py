@@ -0,0 +1,40 @@
+from typing import Any
+
+from app.core.config import INFERENCE_BACKEND
+from app.schemas.stylegan_models import Model
+from app.stylegan.onnx_runtime import load_onnx_model
+from app.stylegan.quantization import load_quantized_model
+from app.stylegan.torchscript import load_traced_model
+
+# The loaders of the inference backends. Every loader returns the eager model if the
+# backend is not available for a model (or its int8 version is too inaccurate).
+inference_backends = {
+    "eager": lambda folder_path, model, G: G,
+    "torchscript": load_traced_model,
+    "onnxruntime": load_onnx_model,
+    "int8": load_quantized_model,
+}
+
+
+def load_inference_model(
+    folder_path: str, model: Model, G: Any, backend: str = None
+) -> Any:
+    """Wrap a loaded stylegan2ada model with the configured inference backend.
+
+    The result can be used like the eager model, e.g. by `seed_to_array_image` and `w_vector_to_image`.
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model
+        G (Any): the loaded eager stylegan2ada model
+        backend (str, optional): the inference backend. Defaults to INFERENCE_BACKEND.
+
+    Returns:
+        Any: the model that runs on the inference backend
+    """
+    backend = backend or INFERENCE_BACKEND
+    if backend not in inference_backends:
+        raise ValueError(
+            f"Unknown inference backend {backend}. Please choose one of these: {list(inference_backends)}"
+        )
+    return inference_backends[backend](folder_path, model, G)
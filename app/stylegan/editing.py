@@ -0,0 +1,213 @@
+import os
+from typing import Any, Optional, Sequence, Tuple, Union
+
+import click
+import numpy as np
+import torch
+
+from app.schemas.stylegan_models import Model, stylegan2ada_models
+from app.stylegan.load_model import load_model_from_pkl_stylegan2ada, pkl_digest
+from app.stylegan.utils import (
+    load_vector_from_bytes,
+    save_image_as_bytes,
+    save_vector_as_bytes,
+    seed_to_untruncated_w,
+    truncate_w,
+    ws_to_images,
+)
+
+
+class EditDirections:
+    """The principal directions of the W space of a model (GANSpace, https://arxiv.org/abs/2004.02546).
+
+    Moving a feature vector along a direction changes one attribute of the image (e.g. the layout or
+    the colors). Strengths are measured in standard deviations of W along the direction, so they mean
+    the same for all directions and models.
+    """
+
+    def __init__(self, mean: torch.Tensor, components: torch.Tensor, stds: torch.Tensor) -> None:
+        """Init new edit directions.
+
+        Args:
+            mean (torch.Tensor): the mean feature vector [w_dim]
+            components (torch.Tensor): the unit directions, the largest variance first [num_components, w_dim]
+            stds (torch.Tensor): the standard deviations of W along the directions [num_components]
+        """
+        self.mean = mean
+        self.components = components
+        self.stds = stds
+
+    def __len__(self) -> int:
+        """Return the number of directions."""
+        return len(self.components)
+
+
+def compute_edit_directions(
+    G: Any,
+    num_components: int = 32,
+    num_samples: int = 100000,
+    batch_size: int = 10000,
+    seed: int = 0,
+) -> EditDirections:
+    """Compute the principal directions of the untruncated feature vectors of random seeds.
+
+    The covariance of W is accumulated batch by batch, so the samples are never held in memory at once.
+
+    Args:
+        G (Any): a loaded stylegan model
+        num_components (int, optional): the number of directions. Defaults to 32.
+        num_samples (int, optional): the number of sampled feature vectors. Defaults to 100000.
+        batch_size (int, optional): the feature vectors that are mapped at once. Defaults to 10000.
+        seed (int, optional): the seed of the samples. Defaults to 0.
+
+    Returns:
+        EditDirections: the directions
+    """
+    generator = torch.Generator().manual_seed(seed)
+    w_dim = G.mapping.w_dim
+    total = torch.zeros(w_dim, dtype=torch.float64)
+    outer = torch.zeros(w_dim, w_dim, dtype=torch.float64)
+    with torch.no_grad():
+        for start in range(0, num_samples, batch_size):
+            z = torch.randn([min(batch_size, num_samples - start), G.z_dim], generator=generator)
+            # All rows of an untruncated feature vector are the same.
+            w = G.mapping(z, None, truncation_psi=1)[:, 0].to(torch.float64)
+            total += w.sum(0)
+            outer += w.t() @ w
+    mean = total / num_samples
+    covariance = (outer / num_samples - mean[:, None] * mean[None, :]).numpy()
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(eigenvalues)[::-1][:num_components]
+    return EditDirections(
+        mean.to(torch.float32),
+        torch.from_numpy(np.ascontiguousarray(eigenvectors[:, order].T)).to(torch.float32),
+        torch.from_numpy(np.sqrt(np.clip(eigenvalues[order], 0, None))).to(torch.float32),
+    )
+
+
+def directions_filename(model: Model, digest: str) -> str:
+    """Return the filename of the edit directions of a model, which are stored next to the model pkl file."""
+    stem = os.path.splitext(model.filename)[0]
+    return f"{stem}.directions.{digest}.pt"
+
+
+def export_edit_directions(folder_path: str, model: Model, **kwargs) -> str:
+    """Compute the edit directions of a model and save them next to it (see compute_edit_directions).
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model
+        **kwargs: the options of compute_edit_directions
+
+    Returns:
+        str: the path of the saved directions
+    """
+    G = load_model_from_pkl_stylegan2ada(folder_path, model)
+    directions = compute_edit_directions(G, **kwargs)
+    path = os.path.join(folder_path, directions_filename(model, pkl_digest(folder_path, model)))
+    torch.save(
+        {"mean": directions.mean, "components": directions.components, "stds": directions.stds}, path
+    )
+    return path
+
+
+# The loaded edit directions by the model filename and the digest of its pkl file.
+loaded_directions = {}
+
+
+def load_edit_directions(folder_path: str, model: Model, digest: str) -> Optional[EditDirections]:
+    """Load the edit directions of the weights of a model (once per process after they were exported).
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model
+        digest (str): the digest of the loaded pkl file (see pkl_digest)
+
+    Returns:
+        Optional[EditDirections]: the directions or None if they were not exported for these weights
+    """
+    key = (model.filename, digest)
+    if key not in loaded_directions:
+        path = os.path.join(folder_path, directions_filename(model, digest))
+        # Missing directions are not cached, so directions exported while the server runs are found.
+        if not os.path.exists(path):
+            return None
+        loaded_directions[key] = EditDirections(**torch.load(path, map_location="cpu"))
+    return loaded_directions[key]
+
+
+def unload_edit_directions(filename: str) -> None:
+    """Remove the loaded edit directions of all weights of a model file (e.g. when it is unloaded)."""
+    for key in [key for key in loaded_directions if key[0] == filename]:
+        del loaded_directions[key]
+
+
+def edit_w(
+    w: torch.Tensor,
+    directions: EditDirections,
+    direction: int,
+    strengths: Sequence[float],
+    layers: Tuple[int, int] = None,
+) -> torch.Tensor:
+    """Move a feature vector along a direction by many strengths at once.
+
+    Args:
+        w (torch.Tensor): a feature vector [1, num_ws, w_dim]
+        directions (EditDirections): the edit directions of the model
+        direction (int): the index of the direction
+        strengths (Sequence[float]): the strengths in standard deviations
+        layers (Tuple[int, int], optional): the first and the last (exclusive) edited rows of w. Defaults to None (all rows).
+
+    Returns:
+        torch.Tensor: the edited feature vectors [len(strengths), num_ws, w_dim]
+    """
+    start, end = layers or (0, w.shape[1])
+    offset = directions.stds[direction] * directions.components[direction].to(w.dtype)
+    ws = w.expand(len(strengths), *w.shape[1:]).clone()
+    ws[:, start:end] += torch.as_tensor(strengths, dtype=w.dtype).reshape(-1, 1, 1) * offset
+    return ws
+
+
+def edit_image_stylegan2ada(
+    model: Any, edit_options, directions: EditDirections, image: Union[int, bytes]
+) -> dict:
+    """Edit an image along a direction with a stylegan2ada model, all strengths in one batched synthesis.
+
+    Args:
+        model (Any): a loaded stylegan2ada model
+        edit_options (Edit): an object containing edit options
+        directions (EditDirections): the edit directions of the model
+        image (Union[int, bytes]): the image as a seed or as a feature vector bytes object
+
+    Returns:
+        dict: a dict with the image byte object and the feature vector byte object of every strength (result_image_0, ...)
+    """
+    G = model
+    with torch.no_grad():
+        if isinstance(image, bytes):
+            w = load_vector_from_bytes(image)
+        else:
+            w = truncate_w(G, seed_to_untruncated_w(G, image), edit_options.truncation)
+        ws = edit_w(w, directions, edit_options.direction, edit_options.strengths, edit_options.layers)
+        images = ws_to_images(G, ws, edit_options.resolution).cpu().numpy()
+    return {
+        # A slice is cloned, so only its own vector is saved (not the storage of the batch).
+        f"result_image_{i}": (save_image_as_bytes(array), save_vector_as_bytes(ws[i : i + 1].clone()))
+        for i, array in enumerate(images)
+    }
+
+
+@click.command()
+@click.option("--components", default=32, show_default=True, help="The number of directions.")
+@click.option("--samples", default=100000, show_default=True, help="The sampled feature vectors.")
+def export(components: int, samples: int) -> None:
+    """Compute the edit directions of all stylegan2ada models and save them next to the models."""
+    for model in stylegan2ada_models.models:
+        path = export_edit_directions(
+            stylegan2ada_models.path, model, num_components=components, num_samples=samples
+        )
+        click.echo(path)
+
+
+if __name__ == "__main__":
+    export()
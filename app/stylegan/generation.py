@@ -11,6 +11,7 @@ from app.stylegan.utils import (
     save_image_as_bytes,
     save_vector_as_bytes,
     seed_to_array_image,
+    seed_to_truncation_sweep,
 )
 
 
@@ -27,13 +28,31 @@ def generate_image_stylegan2ada(model: Any, generation_options) -> dict:
     G = model
     truncation_psi = generation_options.truncation
     seed = generation_options.seed
+    resolution = generation_options.resolution
 
     if not seed:
         seed = random.randint(0, 2 ** 32 - 1)  # 2**32-1 is the highest seed value
 
-    img, w = seed_to_array_image(G, seed, truncation_psi)
+    img, w = seed_to_array_image(G, seed, truncation_psi, resolution)
 
     image_blob = save_image_as_bytes(img)
     w_blob = save_vector_as_bytes(w)
 
     return {"result_image": (image_blob, w_blob)}
+
+
+def truncation_sweep_stylegan2ada(model: Any, sweep_options) -> dict:
+    """Generate the images of a seed for many truncation values in one batch with a stylegan2ada model.
+
+    Args:
+        model (Any): a loaded stylegan2ada model
+        sweep_options (TruncationSweep): an object containing truncation sweep options
+
+    Returns:
+        dict: a dict with the image byte object of every truncation value (result_image_0, ...)
+    """
+    with torch.no_grad():
+        images = seed_to_truncation_sweep(
+            model, int(sweep_options.seed), sweep_options.truncations, sweep_options.resolution
+        )
+    return {f"result_image_{i}": save_image_as_bytes(image) for i, image in enumerate(images)}
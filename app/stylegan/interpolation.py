@@ -0,0 +1,271 @@
+import queue
+import threading
+from types import SimpleNamespace
+from typing import Any, Iterator, List, Tuple, Union
+
+import click
+import imageio_ffmpeg
+import numpy as np
+import torch
+
+from app.core.config import VIDEO_BATCH_SIZE
+from app.core.metrics import stage_latency
+from app.schemas.stylegan_models import stylegan2ada_models
+from app.stylegan.backends import load_inference_model
+from app.stylegan.load_model import load_model_from_pkl_stylegan2ada
+from app.stylegan.utils import (
+    load_vector_from_bytes,
+    seed_to_untruncated_w,
+    truncate_w,
+    ws_to_images,
+)
+
+# The ffmpeg codecs and the content types of the video formats.
+VIDEO_FORMATS = {
+    "mp4": ("libx264", "video/mp4"),
+    "webm": ("libvpx-vp9", "video/webm"),
+}
+
+
+class FrameEncoder:
+    """An ffmpeg encoder that runs on its own thread and is fed with batches of frames.
+
+    At most `max_pending` batches wait for the encoder, so the synthesis of the next batches
+    overlaps with the encoding of the previous ones and the memory does not grow with the video.
+    """
+
+    def __init__(
+        self, path: str, size: Tuple[int, int], fps: int, video_format: str, max_pending: int = 2
+    ) -> None:
+        """Init a new encoder and start its thread.
+
+        Args:
+            path (str): the path of the video file (its extension must match the format)
+            size (Tuple[int, int]): the width and the height of the frames
+            fps (int): the frames per second
+            video_format (str): one of VIDEO_FORMATS
+            max_pending (int, optional): the batches that may wait for the encoder. Defaults to 2.
+        """
+        codec = VIDEO_FORMATS[video_format][0]
+        # The moov atom is moved to the front, so browsers start playing before the download finished.
+        output_params = ["-movflags", "+faststart"] if video_format == "mp4" else []
+        self.frames = 0
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._encode, args=(path, size, fps, codec, output_params), daemon=True
+        )
+        self._thread.start()
+
+    def _encode(self, path: str, size: Tuple[int, int], fps: int, codec: str, output_params: list) -> None:
+        """Pipe the queued frames into ffmpeg until the end of the video (None) is queued."""
+        end_received = False
+        try:
+            writer = imageio_ffmpeg.write_frames(
+                path, size, fps=fps, codec=codec, output_params=output_params
+            )
+            writer.send(None)
+            try:
+                for frames in iter(self._queue.get, None):
+                    with stage_latency.time("video_encode"):
+                        for frame in frames:
+                            writer.send(np.ascontiguousarray(frame))
+                end_received = True
+            finally:
+                # Finalizing the file can fail as well (e.g. ffmpeg exits with an error).
+                writer.close()
+        except Exception as e:
+            self._error = e
+            # The frames are dropped until the end, so the producer is never blocked.
+            while not end_received and self._queue.get() is not None:
+                pass
+
+    def write(self, frames: np.ndarray) -> None:
+        """Queue a batch of frames [batch_size, height, width, 3] (blocks while the encoder is behind).
+
+        Raises:
+            Exception: the error of the encoder if it failed
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put(frames)
+        self.frames += len(frames)
+
+    def close(self) -> None:
+        """Wait until all frames are encoded and the video file is complete (raises the error of the encoder)."""
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> "FrameEncoder":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # The error of the synthesis is raised, not a follow-up error of the encoder.
+            self._queue.put(None)
+            self._thread.join()
+
+
+def slerp(a: torch.Tensor, b: torch.Tensor, t: torch.Tensor) -> torch.Tensor:
+    """Interpolate between rows of vectors on the great circle (spherical linear interpolation).
+
+    Args:
+        a (torch.Tensor): the start vectors [n, dim]
+        b (torch.Tensor): the end vectors [n, dim]
+        t (torch.Tensor): the positions between 0 and 1 [n]
+
+    Returns:
+        torch.Tensor: the interpolated vectors [n, dim]
+    """
+    t = t.reshape(-1, 1)
+    cos_omega = (a * b).sum(1, keepdim=True) / (a.norm(dim=1, keepdim=True) * b.norm(dim=1, keepdim=True))
+    omega = torch.acos(cos_omega.clamp(-1, 1))
+    sin_omega = torch.sin(omega)
+    # Almost parallel vectors are interpolated linearly.
+    parallel = sin_omega.abs() < 1e-6
+    sin_omega = torch.where(parallel, torch.ones_like(sin_omega), sin_omega)
+    spherical = (torch.sin((1 - t) * omega) * a + torch.sin(t * omega) * b) / sin_omega
+    return torch.where(parallel, a + (b - a) * t, spherical)
+
+
+def interpolation_frames(num_keyframes: int, frames_per_transition: int) -> int:
+    """Return the number of frames of an interpolation (every transition and the last keyframe)."""
+    return (num_keyframes - 1) * frames_per_transition + 1
+
+
+def interpolation_ws(
+    G: Any,
+    keyframes: List[Union[int, bytes]],
+    frames_per_transition: int,
+    truncation_psi: float,
+    space: str = "w",
+    batch_size: int = VIDEO_BATCH_SIZE,
+) -> Iterator[torch.Tensor]:
+    """Yield the feature vectors of an interpolation between keyframes, one batch at a time.
+
+    Args:
+        G (Any): a loaded stylegan model
+        keyframes (List[Union[int, bytes]]): at least two seeds or feature vector bytes objects
+        frames_per_transition (int): the frames from one keyframe to the next
+        truncation_psi (float): the truncation value of the seeds
+        space (str, optional): "w" (linear between the feature vectors) or "z" (spherical between the latents of seeds, mapped per frame). Defaults to "w".
+        batch_size (int, optional): the frames per batch. Defaults to VIDEO_BATCH_SIZE.
+
+    Yields:
+        torch.Tensor: the feature vectors of the next frames [batch_size, num_ws, w_dim]
+    """
+    if space == "z":
+        if not all(isinstance(keyframe, int) for keyframe in keyframes):
+            raise ValueError("Only seeds can be interpolated in Z.")
+        # The latents are drawn like the ones of generated seeds (see seed_to_untruncated_w).
+        keys = torch.from_numpy(
+            np.concatenate([np.random.RandomState(seed).randn(1, G.z_dim) for seed in keyframes])
+        )
+    else:
+        keys = torch.cat(
+            [
+                load_vector_from_bytes(keyframe)
+                if isinstance(keyframe, bytes)
+                else truncate_w(G, seed_to_untruncated_w(G, keyframe), truncation_psi)
+                for keyframe in keyframes
+            ]
+        ).detach()
+
+    total = interpolation_frames(len(keyframes), frames_per_transition)
+    for start in range(0, total, batch_size):
+        frames = torch.arange(start, min(start + batch_size, total))
+        # The last frame is the end of the last transition.
+        transitions = (frames // frames_per_transition).clamp(max=len(keyframes) - 2)
+        t = (frames - transitions * frames_per_transition).to(torch.float64) / frames_per_transition
+        if space == "z":
+            z = slerp(keys[transitions], keys[transitions + 1], t)
+            with stage_latency.time("mapping"):
+                yield G.mapping(z.to(torch.float32), None, truncation_psi=truncation_psi)
+        else:
+            t = t.to(keys.dtype).reshape(-1, 1, 1)
+            yield keys[transitions] + (keys[transitions + 1] - keys[transitions]) * t
+
+
+def render_interpolation_video(
+    G: Any,
+    interpolation_options,
+    keyframes: List[Union[int, bytes]],
+    path: str,
+    batch_size: int = VIDEO_BATCH_SIZE,
+) -> int:
+    """Render an interpolation between keyframes into a video file.
+
+    The frames are synthesized in batches and piped into an ffmpeg encoder on another thread (see
+    FrameEncoder), so only a few batches are in memory, however long the video is.
+
+    Args:
+        G (Any): a loaded stylegan model
+        interpolation_options (Interpolation): an object containing interpolation options
+        keyframes (List[Union[int, bytes]]): the seeds or feature vector bytes objects
+        path (str): the path of the video file
+        batch_size (int, optional): the frames per synthesis batch. Defaults to VIDEO_BATCH_SIZE.
+
+    Returns:
+        int: the number of frames
+    """
+    resolution = interpolation_options.resolution
+    size = resolution or G.img_resolution
+    with torch.no_grad(), FrameEncoder(
+        path, (size, size), interpolation_options.fps, interpolation_options.format
+    ) as encoder:
+        for ws in interpolation_ws(
+            G,
+            keyframes,
+            interpolation_options.frames_per_transition,
+            interpolation_options.truncation,
+            interpolation_options.space,
+            batch_size,
+        ):
+            encoder.write(ws_to_images(G, ws, resolution).cpu().numpy())
+    return encoder.frames
+
+
+@click.command()
+@click.argument("output")
+@click.option("--model", "model_filename", required=True, help="The filename of the model.")
+@click.option("--seeds", required=True, help="Comma separated seeds of the keyframes.")
+@click.option("--frames", default=60, show_default=True, help="Frames per transition.")
+@click.option("--fps", default=30, show_default=True)
+@click.option("--space", type=click.Choice(["w", "z"]), default="z", show_default=True)
+@click.option("--truncation", default=1.0, show_default=True)
+@click.option("--resolution", type=int, default=None, help="A preview resolution.")
+def render(
+    output: str,
+    model_filename: str,
+    seeds: str,
+    frames: int,
+    fps: int,
+    space: str,
+    truncation: float,
+    resolution: int,
+) -> None:
+    """Render an interpolation video between seeds into OUTPUT (.mp4 or .webm), without a frame limit."""
+    models = [model for model in stylegan2ada_models.models if model.filename == model_filename]
+    if not models:
+        raise click.BadParameter(f"Please choose one of these models: {stylegan2ada_models.models}")
+    model = models[0]
+    G = load_model_from_pkl_stylegan2ada(stylegan2ada_models.path, model)
+    G = load_inference_model(stylegan2ada_models.path, model, G)
+    options = SimpleNamespace(
+        frames_per_transition=frames,
+        fps=fps,
+        space=space,
+        truncation=truncation,
+        resolution=resolution,
+        format=output.rsplit(".", 1)[-1],
+    )
+    keyframes = [int(seed) for seed in seeds.split(",")]
+    click.echo(f"Rendered {render_interpolation_video(G, options, keyframes, output)} frames to {output}")
+
+
+if __name__ == "__main__":
+    render()
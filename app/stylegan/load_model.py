@@ -1,3 +1,4 @@
+import hashlib
 import os
 import pathlib
 import pickle
@@ -11,6 +12,15 @@ from app.schemas.stylegan_models import Model
 sys.path.append(os.path.join(pathlib.Path().resolve(), "stylegan2_ada_pytorch"))
 
 
+def pkl_digest(folder_path: str, model: Model) -> str:
+    """Return a short digest of the model pkl file (derived data is only valid for its weights)."""
+    digest = hashlib.sha256()
+    with open(os.path.join(folder_path, model.filename), "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
 def load_model_from_pkl_stylegan2ada(folder_path: str, model: Model) -> Any:
     """Load a stylegan2ada model from a pkl file.
 
@@ -26,4 +36,8 @@ def load_model_from_pkl_stylegan2ada(folder_path: str, model: Model) -> Any:
     with open(os.path.join(folder_path, model.filename), "rb") as f:
         G = pickle.load(f)["G_ema"].to(device)
 
+    # The caches of mapped seeds and synthesis blocks are keyed by the weights (see app.stylegan.utils),
+    # so a replaced model file never hits the entries of its old weights.
+    G.cache_key = (model.filename, pkl_digest(folder_path, model))
+
     return G
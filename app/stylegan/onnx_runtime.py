@@ -0,0 +1,159 @@
+import glob
+import os
+from typing import Any
+
+import click
+import torch
+
+from app.core.config import ONNXRUNTIME_INTER_OP_THREADS, ONNXRUNTIME_INTRA_OP_THREADS
+from app.schemas.stylegan_models import Model, stylegan2ada_models
+from app.stylegan.load_model import load_model_from_pkl_stylegan2ada
+from app.stylegan.torchscript import (
+    FrozenMapping,
+    FrozenSynthesis,
+    TracedGenerator,
+    model_digest,
+)
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+ONNX_OPSET_VERSION = 12
+
+
+class OnnxGraph:
+    """An ONNX Runtime session that is callable with and returns torch tensors."""
+
+    def __init__(self, session: Any) -> None:
+        """Init a new ONNX graph.
+
+        Args:
+            session (Any): the ONNX Runtime inference session
+        """
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        (output,) = self.session.run(None, {self.input_name: x.detach().cpu().numpy()})
+        return torch.from_numpy(output)
+
+
+def onnx_filename(model: Model, network: str, digest: str) -> str:
+    """Return the filename of an ONNX graph, which is stored next to the model pkl file.
+
+    Args:
+        model (Model): the model
+        network (str): either mapping or synthesis
+        digest (str): the model digest
+
+    Returns:
+        str: the filename of the ONNX graph
+    """
+    stem = os.path.splitext(model.filename)[0]
+    return f"{stem}.{network}.{digest}.onnx"
+
+
+def create_session(path: str) -> Any:
+    """Create an ONNX Runtime session with the CPU execution provider.
+
+    Args:
+        path (str): the path to the ONNX graph
+
+    Returns:
+        Any: the inference session
+    """
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # ONNX Runtime would use all cores in every worker, so 0 uses the torch threads of the worker.
+    options.intra_op_num_threads = ONNXRUNTIME_INTRA_OP_THREADS or torch.get_num_threads()
+    options.inter_op_num_threads = ONNXRUNTIME_INTER_OP_THREADS or torch.get_num_interop_threads()
+    return onnxruntime.InferenceSession(
+        path, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+def export_onnx_model(folder_path: str, model: Model) -> list:
+    """Export the mapping and synthesis networks of a model to ONNX with a dynamic batch size.
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model that should be exported
+
+    Returns:
+        list: the paths of the saved graphs
+    """
+    G = load_model_from_pkl_stylegan2ada(folder_path, model)
+    digest = model_digest(folder_path, model)
+    stem = os.path.splitext(model.filename)[0]
+
+    # Remove graphs of older weights or torch versions.
+    for path in glob.glob(os.path.join(folder_path, f"{stem}.*.onnx")):
+        if not path.endswith(f".{digest}.onnx"):
+            os.remove(path)
+
+    # The fused modulated convolution groups the batch into the convolution,
+    # which would freeze the batch size in the exported graph.
+    mapping = FrozenMapping(G.mapping).eval()
+    synthesis = FrozenSynthesis(G.synthesis, fused_modconv=False).eval()
+
+    paths = []
+    with torch.no_grad():
+        z = torch.randn([2, G.z_dim])
+        ws = G.mapping(z, None)
+        for network, module, example, input_name, output_name in [
+            ("mapping", mapping, z, "z", "w"),
+            ("synthesis", synthesis, ws, "ws", "image"),
+        ]:
+            path = os.path.join(folder_path, onnx_filename(model, network, digest))
+            torch.onnx.export(
+                module,
+                example,
+                path,
+                input_names=[input_name],
+                output_names=[output_name],
+                dynamic_axes={input_name: {0: "batch"}, output_name: {0: "batch"}},
+                opset_version=ONNX_OPSET_VERSION,
+            )
+            paths.append(path)
+    return paths
+
+
+def load_onnx_model(folder_path: str, model: Model, G: Any) -> Any:
+    """Wrap a loaded model with ONNX Runtime sessions if its graphs were exported.
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model
+        G (Any): the loaded eager stylegan2ada model
+
+    Returns:
+        Any: a traced generator or the eager model if ONNX Runtime or the graphs are not available
+    """
+    stem = os.path.splitext(model.filename)[0]
+    if onnxruntime is None or not glob.glob(
+        os.path.join(folder_path, f"{stem}.*.onnx")
+    ):
+        return G
+
+    digest = model_digest(folder_path, model)
+    paths = [
+        os.path.join(folder_path, onnx_filename(model, network, digest))
+        for network in ("mapping", "synthesis")
+    ]
+    if not all(os.path.exists(path) for path in paths):
+        return G
+    return TracedGenerator(G, *(OnnxGraph(create_session(path)) for path in paths))
+
+
+@click.command()
+def export() -> None:
+    """Export ONNX graphs for all stylegan2ada models."""
+    for model in stylegan2ada_models.models:
+        for path in export_onnx_model(stylegan2ada_models.path, model):
+            click.echo(path)
+
+
+if __name__ == "__main__":
+    export()
@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any
+
+import click
+import numpy as np
+import torch
+
+from app.schemas.stylegan_models import stylegan2ada_models
+from app.stylegan.load_model import load_model_from_pkl_stylegan2ada
+
+# The record_function scopes of the torch_utils ops (see misc.profiled_function) by their op.
+PROFILED_OPS = {
+    "upfirdn2d": ("_upfirdn2d_ref", "_upfirdn2d_cpu"),
+    "bias_act": ("_bias_act_ref", "_bias_act_cpu"),
+    "conv2d_resample": ("conv2d_resample",),
+    "modulated_conv2d": ("modulated_conv2d",),
+}
+
+
+def _profiled_blocks(G: Any) -> dict:
+    """Return the profiled networks and blocks of an eager generator by their name."""
+    blocks = {"mapping": G.mapping}
+    for res in G.synthesis.block_resolutions:
+        blocks[f"synthesis.b{res}"] = getattr(G.synthesis, f"b{res}")
+    return blocks
+
+
+def _layer_flops(module: torch.nn.Module, output: Any) -> int:
+    """Estimate the FLOPs (2 per multiply-add) of one call of a convolution or fully connected layer."""
+    if not isinstance(output, torch.Tensor):
+        return 0
+    weight = getattr(module, "weight", None)
+    if isinstance(weight, torch.Tensor) and weight.ndim == 4 and output.ndim == 4:
+        batch_size, _, height, width = output.shape
+        return 2 * batch_size * height * width * weight.numel()
+    if isinstance(weight, torch.Tensor) and weight.ndim == 2:
+        return 2 * output.shape[0] * weight.numel()
+    if hasattr(module, "in_features") and not any(True for _ in module.children()):
+        # Quantized linear layers store their weights packed.
+        return 2 * output.shape[0] * module.in_features * module.out_features
+    return 0
+
+
+def profile_synthesis(
+    G: Any, batch_size: int = 1, runs: int = 3, trace_path: str = None
+) -> dict:
+    """Profile the mapping and the synthesis blocks of a generator with the torch profiler.
+
+    Every network and synthesis block runs in its own record_function scope (added with module
+    hooks), next to the scopes of the torch_utils ops. The result breaks the CPU time, the
+    allocated memory and an estimate of the FLOPs down per block and per op.
+
+    Args:
+        G (Any): a loaded stylegan model on any backend (profiled with its eager modules)
+        batch_size (int, optional): the number of images per run. Defaults to 1.
+        runs (int, optional): the number of profiled runs (after one warmup run). Defaults to 3.
+        trace_path (str, optional): a path to save the Chrome trace (chrome://tracing) to. Defaults to None.
+
+    Returns:
+        dict: the per block and per op breakdown (times in milliseconds per run)
+    """
+    G = getattr(G, "eager", G)
+    blocks = _profiled_blocks(G)
+    z = torch.from_numpy(np.random.RandomState(0).randn(batch_size, G.z_dim))
+
+    # Open a record_function scope per block and count the FLOPs of its layers.
+    scopes = []
+    flops = defaultdict(int)
+
+    def enter_scope(name):
+        def hook(module, inputs):
+            scope = torch.autograd.profiler.record_function(name)
+            scope.__enter__()
+            scopes.append(scope)
+
+        return hook
+
+    def exit_scope(module, inputs, outputs):
+        scopes.pop().__exit__(None, None, None)
+
+    def count_flops(name):
+        def hook(module, inputs, outputs):
+            flops[name] += _layer_flops(module, outputs)
+
+        return hook
+
+    hooks = []
+    for name, block in blocks.items():
+        hooks.append(block.register_forward_pre_hook(enter_scope(name)))
+        hooks.append(block.register_forward_hook(exit_scope))
+        for module in block.modules():
+            hooks.append(module.register_forward_hook(count_flops(name)))
+
+    def run():
+        w = G.mapping(z, None, truncation_psi=1)
+        G.synthesis(w, noise_mode="const", force_fp32=True)
+
+    try:
+        with torch.no_grad():
+            run()
+            flops.clear()
+            with torch.autograd.profiler.profile(profile_memory=True) as prof:
+                start = time.perf_counter()
+                for _ in range(runs):
+                    run()
+                wall_time = time.perf_counter() - start
+    finally:
+        for hook in hooks:
+            hook.remove()
+
+    if trace_path:
+        prof.export_chrome_trace(trace_path)
+
+    events = {event.key: event for event in prof.key_averages()}
+
+    def summary(names):
+        matched = [events[name] for name in names if name in events]
+        return {
+            "calls": sum(event.count for event in matched) // runs,
+            "cpu_time_ms": sum(event.cpu_time_total for event in matched) / runs / 1000,
+            "self_cpu_time_ms": sum(event.self_cpu_time_total for event in matched) / runs / 1000,
+            "allocated_bytes": sum(event.cpu_memory_usage for event in matched) // runs,
+        }
+
+    return {
+        "batch_size": batch_size,
+        "runs": runs,
+        "wall_time_ms": wall_time / runs * 1000,
+        "blocks": [
+            dict(name=name, flops=flops[name] // runs, **summary([name])) for name in blocks
+        ],
+        "ops": [dict(name=op, **summary(names)) for op, names in PROFILED_OPS.items()],
+    }
+
+
+def profile_synthesis_with_trace(G: Any, batch_size: int = 1, runs: int = 3) -> dict:
+    """Profile a generator (see profile_synthesis) and add the Chrome trace events to the result.
+
+    Args:
+        G (Any): a loaded stylegan model
+        batch_size (int, optional): the number of images per run. Defaults to 1.
+        runs (int, optional): the number of profiled runs. Defaults to 3.
+
+    Returns:
+        dict: the per block and per op breakdown and the Chrome trace (chrome_trace)
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        trace_path = os.path.join(folder, "trace.json")
+        result = profile_synthesis(G, batch_size, runs, trace_path)
+        with open(trace_path) as f:
+            result["chrome_trace"] = json.load(f)
+    return result
+
+
+@click.command()
+@click.option("--model", "model_filename", default=None, help="The model pkl filename. Defaults to the first model.")
+@click.option("--batch-size", default=1, show_default=True, help="Images per run.")
+@click.option("--runs", default=3, show_default=True, help="Profiled runs.")
+@click.option("--trace", "trace_path", default="synthesis_trace.json", show_default=True, help="Chrome trace output path.")
+def profile(model_filename: str, batch_size: int, runs: int, trace_path: str) -> None:
+    """Profile the eager synthesis of a stylegan2ada model and print the breakdown as JSON."""
+    models = {model.filename: model for model in stylegan2ada_models.models}
+    model = models[model_filename] if model_filename else stylegan2ada_models.models[0]
+    G = load_model_from_pkl_stylegan2ada(stylegan2ada_models.path, model)
+    result = profile_synthesis(G, batch_size, runs, trace_path)
+    click.echo(json.dumps(dict(model=model.filename, **result), indent=2))
+
+
+if __name__ == "__main__":
+    profile()
@@ -10,6 +10,8 @@ import PIL.Image
 import torch
 import torch.nn.functional as F
 
+from app.core.config import VGG16_PATH
+
 
 def project(
     G: Any,
@@ -65,8 +67,7 @@ def project(
     }
 
     # Load VGG16 feature detector.
-    url = "vgg16.pt"
-    with open(url, "rb") as f:
+    with open(VGG16_PATH, "rb") as f:
         vgg16 = torch.jit.load(f).eval().to(device)
 
     # Features for target image.
@@ -171,7 +172,8 @@ def project_image_stylegan2ada(
     np.random.seed(seed)
     torch.manual_seed(seed)
 
-    G = model
+    # The projection needs autograd, which is only supported by the eager model.
+    G = getattr(model, "eager", model)
 
     # Load target image.
     bytes_io = BytesIO(image_blob)
@@ -0,0 +1,258 @@
+import copy
+import glob
+import os
+import warnings
+from typing import Any, Iterable
+
+import click
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from app.core.config import QUANTIZATION_MAX_LPIPS, QUANTIZATION_MIN_PSNR, VGG16_PATH
+from app.schemas.stylegan_models import Model, stylegan2ada_models
+from app.stylegan.load_model import load_model_from_pkl_stylegan2ada, pkl_digest
+from torch_utils.ops import bias_act  # Importable after app.stylegan.load_model.
+
+# The fixed seeds that the drift of a quantized model is measured on.
+DRIFT_SEEDS = tuple(range(16))
+
+
+def _per_channel_scale(weight: torch.Tensor) -> torch.Tensor:
+    """Return the symmetric int8 scale of every output channel (dim 0) of a weight."""
+    max_abs = weight.abs().reshape(weight.shape[0], -1).max(dim=1).values
+    return max_abs.clamp(min=1e-12) / 127
+
+
+class QuantizedFullyConnectedLayer(torch.nn.Module):
+    """A `FullyConnectedLayer` with per-channel int8 weights that runs dynamically quantized matmuls.
+
+    Calls that need gradients (e.g. the projection) use the dequantized weights instead.
+    """
+
+    def __init__(self, layer: torch.nn.Module) -> None:
+        """Init a new quantized layer.
+
+        Args:
+            layer (torch.nn.Module): the FullyConnectedLayer that should be quantized
+        """
+        super().__init__()
+        self.in_features = layer.in_features
+        self.out_features = layer.out_features
+        self.activation = layer.activation
+
+        weight = layer.weight.detach().to(torch.float32) * layer.weight_gain
+        scale = _per_channel_scale(weight)
+        qweight = torch.quantize_per_channel(
+            weight,
+            scale.to(torch.float64),
+            torch.zeros(self.out_features, dtype=torch.int64),
+            axis=0,
+            dtype=torch.qint8,
+        )
+        self.linear = torch.nn.quantized.dynamic.Linear(
+            self.in_features, self.out_features, bias_=False, dtype=torch.qint8
+        )
+        self.linear.set_weight_bias(qweight, None)
+
+        bias = None
+        if layer.bias is not None:
+            bias = layer.bias.detach().to(torch.float32) * layer.bias_gain
+        self.register_buffer("bias", bias)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = x.to(torch.float32)
+        if torch.is_grad_enabled() and x.requires_grad:
+            x = x.matmul(self.linear.weight().dequantize().t())
+        else:
+            x = self.linear(x)
+        return bias_act.bias_act(x, self.bias, act=self.activation)
+
+
+def quantize_synthesis_layer(layer: torch.nn.Module) -> None:
+    """Store the weight of a `SynthesisLayer` as per-channel int8 values (in place).
+
+    The modulated convolution runs straight from the int8 values: the modulation multiplies them
+    with the fp32 styles of every image (which builds the fp32 weights of the convolution, like it
+    does from fp32 weights), and the demodulation normalizes every output channel, which cancels
+    its scale. The scales are kept in `weight_scale` to dequantize the weight (`weight * weight_scale`).
+
+    Args:
+        layer (torch.nn.Module): the SynthesisLayer that should be quantized
+    """
+    weight = layer.weight.detach().to(torch.float32)
+    scale = _per_channel_scale(weight).reshape(-1, 1, 1, 1)
+    qweight = (weight / scale).round().clamp(-127, 127).to(torch.int8)
+    del layer.weight
+    layer.register_buffer("weight", qweight)
+    layer.register_buffer("weight_scale", scale)
+
+
+def quantize_generator(G: Any) -> Any:
+    """Quantize the weights of a stylegan2ada generator to per-channel int8 (in place).
+
+    The `FullyConnectedLayer`s (mapping network and style affines) are replaced with dynamically
+    quantized layers. The modulated convolutions keep their weights in int8 (see
+    quantize_synthesis_layer), so they take a quarter of the memory, but still convolve in fp32.
+
+    Args:
+        G (Any): a loaded stylegan2ada generator
+
+    Returns:
+        Any: the quantized generator
+    """
+    for parent in list(G.modules()):
+        for name, child in list(parent.named_children()):
+            if type(child).__name__ == "FullyConnectedLayer":
+                setattr(parent, name, QuantizedFullyConnectedLayer(child))
+
+    for module in G.modules():
+        if type(module).__name__ == "SynthesisLayer":
+            quantize_synthesis_layer(module)
+    # The int8 weights render different images, so they do not share cache entries with the fp32 weights.
+    G.cache_key = (*G.cache_key, "int8")
+    return G
+
+
+def _render(G: Any, seeds: Iterable[int], truncation_psi: float) -> torch.Tensor:
+    """Render the images of a list of seeds in [0, 255]."""
+    z = np.stack([np.random.RandomState(seed).randn(G.z_dim) for seed in seeds])
+    z = torch.from_numpy(z)
+    with torch.no_grad():
+        w = G.mapping(z, None, truncation_psi=truncation_psi, truncation_cutoff=8)
+        images = G.synthesis(w, noise_mode="const", force_fp32=True)
+    return (images * 127.5 + 128).clamp(0, 255)
+
+
+def measure_drift(
+    G_reference: Any,
+    G: Any,
+    seeds: Iterable[int] = DRIFT_SEEDS,
+    truncation_psi: float = 1,
+) -> dict:
+    """Measure the PSNR and LPIPS drift of a generator against a reference generator.
+
+    Args:
+        G_reference (Any): the fp32 reference generator
+        G (Any): the generator that should be measured (e.g. a quantized one)
+        seeds (Iterable[int], optional): the seeds of the compared images. Defaults to DRIFT_SEEDS.
+        truncation_psi (float, optional): the truncation value. Defaults to 1.
+
+    Returns:
+        dict: the mean and min PSNR (dB) and the mean and max LPIPS distance over the seeds
+    """
+    seeds = list(seeds)
+    reference = _render(G_reference, seeds, truncation_psi)
+    images = _render(G, seeds, truncation_psi)
+
+    mse = (reference - images).square().mean(dim=[1, 2, 3]).clamp(min=1e-10)
+    psnr = 10 * torch.log10(255 ** 2 / mse)
+
+    # The LPIPS features of the VGG16 network that is also used for the projection.
+    with open(VGG16_PATH, "rb") as f:
+        vgg16 = torch.jit.load(f).eval()
+    if reference.shape[2] > 256:
+        reference = F.interpolate(reference, size=(256, 256), mode="area")
+        images = F.interpolate(images, size=(256, 256), mode="area")
+    with torch.no_grad():
+        reference_features = vgg16(reference, resize_images=False, return_lpips=True)
+        features = vgg16(images, resize_images=False, return_lpips=True)
+    lpips = (reference_features - features).square().sum(dim=1)
+
+    return {
+        "psnr_mean": psnr.mean().item(),
+        "psnr_min": psnr.min().item(),
+        "lpips_mean": lpips.mean().item(),
+        "lpips_max": lpips.max().item(),
+    }
+
+
+def drift_within_budget(drift: dict) -> bool:
+    """Return whether a measured drift is within the configured drift budget."""
+    return (
+        drift["psnr_min"] >= QUANTIZATION_MIN_PSNR
+        and drift["lpips_max"] <= QUANTIZATION_MAX_LPIPS
+    )
+
+
+def quantized_filename(model: Model, digest: str) -> str:
+    """Return the filename of the int8 weights and their drift, which are stored next to the model pkl file.
+
+    Args:
+        model (Model): the model
+        digest (str): the digest of the model pkl file
+
+    Returns:
+        str: the filename of the int8 weights
+    """
+    stem = os.path.splitext(model.filename)[0]
+    return f"{stem}.int8.{digest}.pt"
+
+
+def export_quantized_model(folder_path: str, model: Model, seeds: Iterable[int] = DRIFT_SEEDS) -> dict:
+    """Quantize a model, measure its drift against the fp32 model and save both next to the model.
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model that should be exported
+        seeds (Iterable[int], optional): the seeds of the compared images. Defaults to DRIFT_SEEDS.
+
+    Returns:
+        dict: the measured drift
+    """
+    G = load_model_from_pkl_stylegan2ada(folder_path, model)
+    digest = pkl_digest(folder_path, model)
+    stem = os.path.splitext(model.filename)[0]
+
+    # Remove the int8 weights of older pkl files.
+    for path in glob.glob(os.path.join(folder_path, f"{stem}.int8.*.pt")):
+        os.remove(path)
+
+    G_quantized = quantize_generator(copy.deepcopy(G))
+    drift = measure_drift(G, G_quantized, seeds)
+    torch.save(
+        {"state_dict": G_quantized.state_dict(), "drift": drift},
+        os.path.join(folder_path, quantized_filename(model, digest)),
+    )
+    return drift
+
+
+def load_quantized_model(folder_path: str, model: Model, G: Any) -> Any:
+    """Quantize a loaded model with its exported int8 weights if their drift is within the drift budget.
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model
+        G (Any): the loaded fp32 stylegan2ada model
+
+    Returns:
+        Any: the quantized model or the fp32 model if it was not exported or the int8 weights were rejected
+    """
+    path = os.path.join(folder_path, quantized_filename(model, pkl_digest(folder_path, model)))
+    if not os.path.exists(path):
+        return G
+    exported = torch.load(path)
+    if not drift_within_budget(exported["drift"]):
+        warnings.warn(
+            f"The int8 model {model.filename} exceeds the drift budget ({exported['drift']}). Using fp32."
+        )
+        return G
+    G_quantized = quantize_generator(G)
+    G_quantized.load_state_dict(exported["state_dict"])
+    return G_quantized
+
+
+@click.command()
+@click.option(
+    "--seeds", default=len(DRIFT_SEEDS), show_default=True, help="Number of compared seeds."
+)
+def export(seeds: int) -> None:
+    """Export the int8 weights of all stylegan2ada models and print whether they pass the drift budget."""
+    for model in stylegan2ada_models.models:
+        drift = export_quantized_model(stylegan2ada_models.path, model, range(seeds))
+        status = "passed" if drift_within_budget(drift) else "rejected"
+        click.echo(f"{model.filename}: {status} {drift}")
+
+
+if __name__ == "__main__":
+    export()
@@ -1,7 +1,7 @@
 import os
 import re
 from io import BytesIO
-from typing import Any, List, Union
+from typing import Any, List, Tuple, Union
 
 import click
 import dnnlib
@@ -9,14 +9,25 @@ import numpy as np
 import PIL.Image
 import torch
 
+from app.core.config import STYLE_MIX_GRID_BATCH_SIZE
 from app.stylegan.utils import (
     load_vector_from_bytes,
     save_image_as_bytes,
     save_vector_as_bytes,
     seed_to_array_image,
+    seeds_to_untruncated_ws,
+    truncate_ws,
     w_vector_to_image,
+    ws_to_images,
 )
 
+# The style definitions Coarse, Middle, and Fine are taken from the official StyleGan paper. See https://arxiv.org/pdf/1812.04948.pdf page 4
+COL_STYLES = {
+    "Coarse": [x for x in range(0, 2)],
+    "Middle": [x for x in range(2, 6)],
+    "Fine": [x for x in range(6, 14)],
+}
+
 
 def style_mix_two_images_stylegan2ada(
     model: Any,
@@ -39,16 +50,10 @@ def style_mix_two_images_stylegan2ada(
     G = model
     truncation_psi = stylemix_options.truncation
     col_style_name = stylemix_options.styles
+    resolution = stylemix_options.resolution
     noise_mode = "const"
 
-    # The style definitions Coarse, Middle, and Fine are taken from the official StyleGan paper. See https://arxiv.org/pdf/1812.04948.pdf page 4
-    col_styles_dict = {
-        "Coarse": [x for x in range(0, 2)],
-        "Middle": [x for x in range(2, 6)],
-        "Fine": [x for x in range(6, 14)],
-    }
-
-    col_styles = col_styles_dict[col_style_name]
+    col_styles = COL_STYLES[col_style_name]
 
     if not (isinstance(row_image, bytes) and isinstance(col_image, bytes)):
 
@@ -77,7 +82,7 @@ def style_mix_two_images_stylegan2ada(
 
         # Generate images from seeds.
         for seed in all_seeds:
-            image, w = seed_to_array_image(G, seed, truncation_psi)
+            image, w = seed_to_array_image(G, seed, truncation_psi, resolution)
             raw_ws.append(w)
             seed_images.append(image)
 
@@ -155,7 +160,7 @@ def style_mix_two_images_stylegan2ada(
     w[col_styles] = w_dict[col_seed][col_styles]
     w = w[np.newaxis]
 
-    image = w_vector_to_image(G, w)
+    image = w_vector_to_image(G, w, resolution)
 
     result_image = save_image_as_bytes(image)
     result_vector = save_vector_as_bytes(w)
@@ -165,3 +170,76 @@ def style_mix_two_images_stylegan2ada(
         "row_image": (seed_row_image, w_row_blob),
         "col_image": (seed_col_image, w_col_blob),
     }
+
+
+def style_mix_grid_stylegan2ada(
+    model: Any,
+    stylemix_options,
+    row_images: List[Union[int, bytes]],
+    col_images: List[Union[int, bytes]],
+    batch_size: int = STYLE_MIX_GRID_BATCH_SIZE,
+) -> Tuple[bytes, dict]:
+    """Style mix every row image with every column image with a stylegan2ada model.
+
+    The seeds are mapped in one batch and all mixed feature vectors are built at once by masking
+    the column styles. The row images, the column images and the mixes are then synthesized in
+    batches of batch_size and tiled like the grid of the official style mixing script.
+
+    Args:
+        model (Any): a loaded stylegan2ada model
+        stylemix_options (StyleMixGrid): an object containing style mix grid options
+        row_images (List[Union[int, bytes]]): the row images as seeds or as bytes objects
+        col_images (List[Union[int, bytes]]): the column images as seeds or as bytes objects
+        batch_size (int, optional): the images per synthesis batch. Defaults to STYLE_MIX_GRID_BATCH_SIZE.
+
+    Returns:
+        Tuple[bytes, dict]: the grid image byte object (row images in the first column, column images in the first row) and a dict with the image byte object and the feature vector byte object of every mix (result_image_<row>_<column>)
+    """
+    G = model
+    with torch.no_grad():
+        seeds = [image for image in row_images + col_images if isinstance(image, int)]
+        seed_ws = {}
+        if seeds:
+            ws = truncate_ws(G, seeds_to_untruncated_ws(G, seeds), stylemix_options.truncation)
+            seed_ws = dict(zip(seeds, ws))
+
+        def image_w(image: Union[int, bytes]) -> torch.Tensor:
+            return seed_ws[image] if isinstance(image, int) else load_vector_from_bytes(image)[0]
+
+        row_ws = torch.stack([image_w(image) for image in row_images]).to(torch.float32)
+        col_ws = torch.stack([image_w(image) for image in col_images]).to(torch.float32)
+
+        # The mix of row r and column c takes the column styles from c and all other rows of W from r.
+        num_ws = row_ws.shape[1]
+        col_styles = torch.zeros(num_ws, dtype=torch.bool)
+        col_styles[[i for i in COL_STYLES[stylemix_options.styles] if i < num_ws]] = True
+        mix_ws = torch.where(
+            col_styles.reshape(1, 1, num_ws, 1), col_ws.unsqueeze(0), row_ws.unsqueeze(1)
+        ).reshape(-1, *row_ws.shape[1:])
+
+        rows, cols = len(row_ws), len(col_ws)
+        ws = torch.cat([row_ws, col_ws, mix_ws])
+        # The grid cell of every feature vector in ws.
+        cells = (
+            [(row, 0) for row in range(1, rows + 1)]
+            + [(0, col) for col in range(1, cols + 1)]
+            + [(row, col) for row in range(1, rows + 1) for col in range(1, cols + 1)]
+        )
+        grid = None
+        result = {}
+        for start in range(0, len(ws), batch_size):
+            images = ws_to_images(G, ws[start : start + batch_size], stylemix_options.resolution)
+            images = images.cpu().numpy()
+            if grid is None:
+                height, width = images.shape[1:3]
+                grid = np.zeros(((rows + 1) * height, (cols + 1) * width, 3), dtype=np.uint8)
+            for i, image in enumerate(images, start):
+                row, col = cells[i]
+                grid[row * height : (row + 1) * height, col * width : (col + 1) * width] = image
+                if row and col:
+                    # A slice is cloned, so only its own vector is saved (not the storage of the batch).
+                    result[f"result_image_{row - 1}_{col - 1}"] = (
+                        save_image_as_bytes(image),
+                        save_vector_as_bytes(ws[i : i + 1].clone()),
+                    )
+    return save_image_as_bytes(grid), result
@@ -0,0 +1,386 @@
+import glob
+import hashlib
+import os
+import re
+from typing import Any, Callable, Dict, Iterable
+
+import click
+import torch
+
+from app.schemas.stylegan_models import Model, stylegan2ada_models
+from app.stylegan.load_model import load_model_from_pkl_stylegan2ada
+
+# Bump this when the traced graph changes so that stale caches are not loaded.
+TRACE_FORMAT_VERSION = 2
+
+
+class FrozenMapping(torch.nn.Module):
+    """The mapping network with the arguments frozen for tracing (untruncated, no labels)."""
+
+    def __init__(self, mapping: torch.nn.Module) -> None:
+        super().__init__()
+        self.mapping = mapping
+
+    def forward(self, z: torch.Tensor) -> torch.Tensor:
+        return self.mapping(z, None, truncation_psi=1)
+
+
+class FrozenSynthesis(torch.nn.Module):
+    """The synthesis network with the arguments frozen for tracing."""
+
+    def __init__(self, synthesis: torch.nn.Module, **synthesis_kwargs) -> None:
+        super().__init__()
+        self.synthesis = synthesis
+        self.synthesis_kwargs = synthesis_kwargs
+
+    def forward(self, ws: torch.Tensor) -> torch.Tensor:
+        return self.synthesis(
+            ws, noise_mode="const", force_fp32=True, **self.synthesis_kwargs
+        )
+
+
+class FrozenBlock(torch.nn.Module):
+    """A synthesis block with the arguments frozen for tracing.
+
+    The first block has no inputs except its W rows (its input is a learned constant).
+    """
+
+    def __init__(self, block: torch.nn.Module) -> None:
+        super().__init__()
+        self.block = block
+
+    def forward(self, *inputs: torch.Tensor) -> tuple:
+        x, img = inputs[:-1] or (None, None)
+        return self.block(x, img, inputs[-1], noise_mode="const", force_fp32=True)
+
+
+class TracedBlock:
+    """A drop-in replacement for a synthesis block call with `noise_mode='const'` and `force_fp32=True` that runs a traced graph."""
+
+    def __init__(self, graph: Callable) -> None:
+        """Init a new traced synthesis block.
+
+        Args:
+            graph (Callable): the traced block graph ((x, img,) ws -> x, img)
+        """
+        self.graph = graph
+
+    def __call__(self, x: torch.Tensor, img: torch.Tensor, ws: torch.Tensor) -> tuple:
+        if x is None:
+            return self.graph(ws)
+        return self.graph(x, img, ws)
+
+
+class BucketedGraph:
+    """Graphs that were traced for fixed batch sizes, callable with any batch size.
+
+    The batch is split into chunks of the largest bucket and every chunk is padded
+    (with copies of its last row) up to the smallest bucket that fits it.
+    """
+
+    def __init__(self, traced: Dict[int, Any]) -> None:
+        """Init a new bucketed graph.
+
+        Args:
+            traced (Dict[int, Any]): the traced graphs by their batch size
+        """
+        self.traced = traced
+        self.batch_sizes = sorted(traced)
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        outputs = []
+        for chunk in x.split(self.batch_sizes[-1]):
+            batch_size = len(chunk)
+            bucket = next(b for b in self.batch_sizes if b >= batch_size)
+            if bucket > batch_size:
+                padding = chunk[-1:].expand(bucket - batch_size, *chunk.shape[1:])
+                chunk = torch.cat([chunk, padding])
+            outputs.append(self.traced[bucket](chunk)[:batch_size])
+        return torch.cat(outputs)
+
+
+class TracedMapping:
+    """A drop-in replacement for `G.mapping` that runs a traced graph.
+
+    Truncation is applied outside of the graph (exactly like the eager network does it),
+    so that one graph serves every truncation value. Calls that the graph does not cover
+    (labels or additional arguments) fall back to the eager network.
+    """
+
+    def __init__(self, eager: torch.nn.Module, graph: Callable) -> None:
+        """Init a new traced mapping network.
+
+        Args:
+            eager (torch.nn.Module): the eager mapping network
+            graph (Callable): the traced mapping graph (z -> untruncated w)
+        """
+        self.eager = eager
+        self.graph = graph
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate attributes such as `w_avg` or `num_ws` to the eager network."""
+        if name == "eager":
+            raise AttributeError(name)
+        return getattr(self.eager, name)
+
+    def __call__(
+        self,
+        z: torch.Tensor,
+        c: torch.Tensor = None,
+        truncation_psi: float = 1,
+        truncation_cutoff: int = None,
+        **kwargs,
+    ) -> torch.Tensor:
+        if c is not None or kwargs:
+            return self.eager(z, c, truncation_psi, truncation_cutoff, **kwargs)
+
+        w = self.graph(z.to(torch.float32))
+
+        if truncation_psi != 1:
+            w_avg = self.eager.w_avg
+            if truncation_cutoff is None:
+                w = w_avg.lerp(w, truncation_psi)
+            else:
+                w[:, :truncation_cutoff] = w_avg.lerp(
+                    w[:, :truncation_cutoff], truncation_psi
+                )
+        return w
+
+
+class TracedSynthesis:
+    """A drop-in replacement for `G.synthesis` that runs a traced graph.
+
+    The graph is traced with `noise_mode='const'` and `force_fp32=True`. Other options
+    and calls that need gradients fall back to the eager network.
+
+    The blocks can be traced as well (for single feature vectors), so that synthesis can run
+    block by block and resume from the block checkpoints (see synthesize_blockwise).
+    """
+
+    def __init__(
+        self, eager: torch.nn.Module, graph: Callable, traced_blocks: Dict[int, TracedBlock] = None
+    ) -> None:
+        """Init a new traced synthesis network.
+
+        Args:
+            eager (torch.nn.Module): the eager synthesis network
+            graph (Callable): the traced synthesis graph (ws -> image)
+            traced_blocks (Dict[int, TracedBlock], optional): the traced blocks by their resolution (batch size 1). Defaults to None (no traced blocks).
+        """
+        self.eager = eager
+        self.graph = graph
+        self.traced_blocks = traced_blocks or {}
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate attributes such as `block_resolutions` to the eager network."""
+        if name == "eager":
+            raise AttributeError(name)
+        return getattr(self.eager, name)
+
+    def __call__(
+        self,
+        ws: torch.Tensor,
+        noise_mode: str = "random",
+        force_fp32: bool = False,
+        **kwargs,
+    ) -> torch.Tensor:
+        if (
+            noise_mode != "const"
+            or not force_fp32
+            or kwargs
+            or (torch.is_grad_enabled() and ws.requires_grad)
+        ):
+            return self.eager(ws, noise_mode=noise_mode, force_fp32=force_fp32, **kwargs)
+
+        return self.graph(ws.to(torch.float32))
+
+
+class TracedGenerator:
+    """A stylegan2ada generator whose mapping and synthesis networks run traced graphs.
+
+    The graphs can be any callables on tensors, e.g. TorchScript or ONNX Runtime graphs.
+
+    Every other attribute (e.g. `z_dim` or `img_resolution`) is taken from the eager generator,
+    which is available as `eager` for methods that need autograd (e.g. the projection).
+    """
+
+    def __init__(
+        self,
+        eager: torch.nn.Module,
+        mapping_graph: Callable,
+        synthesis_graph: Callable,
+        traced_blocks: Dict[int, TracedBlock] = None,
+    ) -> None:
+        """Init a new traced generator.
+
+        Args:
+            eager (torch.nn.Module): the eager stylegan2ada generator
+            mapping_graph (Callable): the traced mapping graph
+            synthesis_graph (Callable): the traced synthesis graph
+            traced_blocks (Dict[int, TracedBlock], optional): the traced synthesis blocks by their resolution. Defaults to None (no traced blocks).
+        """
+        self.eager = eager
+        self.mapping = TracedMapping(eager.mapping, mapping_graph)
+        self.synthesis = TracedSynthesis(eager.synthesis, synthesis_graph, traced_blocks)
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate all other attributes to the eager generator."""
+        if name == "eager":
+            raise AttributeError(name)
+        return getattr(self.eager, name)
+
+
+def model_digest(folder_path: str, model: Model) -> str:
+    """Return a digest of the model pkl file and the torch version.
+
+    Traced graphs are only valid for the exact weights and torch version they were exported with.
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model
+
+    Returns:
+        str: a short hex digest
+    """
+    digest = hashlib.sha256(f"{torch.__version__}:{TRACE_FORMAT_VERSION}".encode())
+    with open(os.path.join(folder_path, model.filename), "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def traced_filename(model: Model, network: str, batch_size: int, digest: str) -> str:
+    """Return the filename of a traced graph, which is stored next to the model pkl file.
+
+    Args:
+        model (Model): the model
+        network (str): either mapping, synthesis or a synthesis block (e.g. block64)
+        batch_size (int): the batch size the graph was traced with
+        digest (str): the model digest
+
+    Returns:
+        str: the filename of the traced graph
+    """
+    stem = os.path.splitext(model.filename)[0]
+    return f"{stem}.{network}.b{batch_size}.{digest}.pt"
+
+
+def export_traced_model(
+    folder_path: str, model: Model, batch_sizes: Iterable[int] = (1,)
+) -> list:
+    """Trace the mapping and synthesis networks of a model and save them next to the model.
+
+    The synthesis blocks are traced for batch size 1 as well (see TracedSynthesis).
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model that should be exported
+        batch_sizes (Iterable[int], optional): the batch size buckets. Defaults to (1,).
+
+    Returns:
+        list: the paths of the saved graphs
+    """
+    G = load_model_from_pkl_stylegan2ada(folder_path, model)
+    digest = model_digest(folder_path, model)
+    stem = os.path.splitext(model.filename)[0]
+
+    # Remove graphs of older weights or torch versions (other files of the model, e.g. its int8 weights, are kept).
+    matcher = re.compile(rf"{re.escape(stem)}\.(mapping|synthesis|block\d+)\.b\d+\.\w+\.pt$")
+    for path in glob.glob(os.path.join(folder_path, f"{stem}.*.pt")):
+        if matcher.match(os.path.basename(path)) and not path.endswith(f".{digest}.pt"):
+            os.remove(path)
+
+    paths = []
+    mapping = FrozenMapping(G.mapping).eval()
+    synthesis = FrozenSynthesis(G.synthesis).eval()
+    with torch.no_grad():
+        for batch_size in sorted(set(batch_sizes)):
+            z = torch.randn([batch_size, G.z_dim])
+            ws = G.mapping(z, None)
+            for network, module, example in [
+                ("mapping", mapping, z),
+                ("synthesis", synthesis, ws),
+            ]:
+                traced = torch.jit.trace(module, example, check_trace=False)
+                path = os.path.join(
+                    folder_path, traced_filename(model, network, batch_size, digest)
+                )
+                torch.jit.save(traced, path)
+                paths.append(path)
+
+        # The inputs of every block are the outputs of the previous one.
+        ws = G.mapping(torch.randn([1, G.z_dim]), None)
+        inputs = ()
+        w_idx = 0
+        for res in G.synthesis.block_resolutions:
+            block = getattr(G.synthesis, f"b{res}")
+            block_ws = ws.narrow(1, w_idx, block.num_conv + block.num_torgb)
+            frozen = FrozenBlock(block).eval()
+            traced = torch.jit.trace(frozen, inputs + (block_ws,), check_trace=False)
+            path = os.path.join(folder_path, traced_filename(model, f"block{res}", 1, digest))
+            torch.jit.save(traced, path)
+            paths.append(path)
+            inputs = frozen(*inputs, block_ws)
+            w_idx += block.num_conv
+    return paths
+
+
+def load_traced_model(folder_path: str, model: Model, G: Any) -> Any:
+    """Wrap a loaded model with its traced graphs if they were exported.
+
+    Args:
+        folder_path (str): the path to the model folder
+        model (Model): the model
+        G (Any): the loaded eager stylegan2ada model
+
+    Returns:
+        Any: a traced generator or the eager model if there are no (valid) traced graphs
+    """
+    stem = os.path.splitext(model.filename)[0]
+    if not glob.glob(os.path.join(folder_path, f"{stem}.*.pt")):
+        return G
+
+    digest = model_digest(folder_path, model)
+    matcher = re.compile(
+        rf"{re.escape(stem)}\.(?P<network>mapping|synthesis|block\d+)\.b(?P<batch>\d+)\.{digest}\.pt$"
+    )
+    traced = {"mapping": {}, "synthesis": {}}
+    traced_blocks = {}
+    for filename in os.listdir(folder_path):
+        if m := matcher.match(filename):
+            graph = torch.jit.load(os.path.join(folder_path, filename), map_location="cpu")
+            if m.group("network").startswith("block"):
+                traced_blocks[int(m.group("network")[len("block"):])] = TracedBlock(graph)
+            else:
+                traced[m.group("network")][int(m.group("batch"))] = graph
+
+    # Only use batch sizes that have both graphs.
+    batch_sizes = traced["mapping"].keys() & traced["synthesis"].keys()
+    if not batch_sizes:
+        return G
+    return TracedGenerator(
+        G,
+        BucketedGraph({b: traced["mapping"][b] for b in batch_sizes}),
+        BucketedGraph({b: traced["synthesis"][b] for b in batch_sizes}),
+        # Only complete sets of blocks are used.
+        traced_blocks if traced_blocks.keys() == set(G.synthesis.block_resolutions) else None,
+    )
+
+
+@click.command()
+@click.option(
+    "--batch-sizes",
+    default="1",
+    show_default=True,
+    help="Comma separated batch size buckets that graphs are traced for.",
+)
+def export(batch_sizes: str) -> None:
+    """Export traced graphs for all stylegan2ada models."""
+    buckets = [int(b) for b in batch_sizes.split(",")]
+    for model in stylegan2ada_models.models:
+        for path in export_traced_model(stylegan2ada_models.path, model, buckets):
+            click.echo(path)
+
+
+if __name__ == "__main__":
+    export()
@@ -1,49 +1,318 @@
+import hashlib
 from io import BytesIO
-from typing import Any
+from typing import Any, Sequence, Tuple, Union
 
 import numpy as np
 import PIL.Image
 import torch
 
+from app.core.cache import LRUCache
+from app.core.config import (
+    BLOCK_CACHE_MAX_BYTES,
+    BLOCK_CACHE_MAX_RESOLUTION,
+    LATENT_CACHE_MAX_ENTRIES,
+)
+from app.core.metrics import stage_latency
+from app.stylegan.torchscript import TracedSynthesis
 
-def seed_to_array_image(G, seed: int, truncation_psi: float) -> tuple:
+
+# Untruncated feature vectors by the model (its cache_key, see load_model_from_pkl_stylegan2ada) and the seed.
+latent_cache = LRUCache(max_entries=LATENT_CACHE_MAX_ENTRIES, name="latent")
+
+
+def seed_to_untruncated_w(G: Any, seed: int) -> torch.Tensor:
+    """Return the untruncated feature vector of a seed (cached per model and seed).
+
+    Args:
+        G (Any): a loaded stylegan model
+        seed (int): the seed
+
+    Returns:
+        torch.Tensor: the untruncated feature vector (must not be modified)
+    """
+    key = (G.cache_key, int(seed))
+    w = latent_cache.get(key)
+    if w is None:
+        device = torch.device("cpu")
+        z = torch.from_numpy(np.random.RandomState(int(seed)).randn(1, G.z_dim)).to(device)
+        with stage_latency.time("mapping"):
+            w = G.mapping(z, None, truncation_psi=1)
+        latent_cache.set(key, w)
+    return w
+
+
+def seeds_to_untruncated_ws(G: Any, seeds: Sequence[int]) -> torch.Tensor:
+    """Return the untruncated feature vectors of many seeds, the ones that are not cached mapped in one batch.
+
+    Args:
+        G (Any): a loaded stylegan model
+        seeds (Sequence[int]): the seeds
+
+    Returns:
+        torch.Tensor: the untruncated feature vectors [len(seeds), num_ws, w_dim] (see seed_to_untruncated_w)
+    """
+    ws = {int(seed): latent_cache.get((G.cache_key, int(seed))) for seed in seeds}
+    missing = [seed for seed, w in ws.items() if w is None]
+    if missing:
+        z = torch.from_numpy(
+            np.concatenate([np.random.RandomState(seed).randn(1, G.z_dim) for seed in missing])
+        )
+        with stage_latency.time("mapping"):
+            mapped = G.mapping(z, None, truncation_psi=1)
+        for i, seed in enumerate(missing):
+            # A slice is cloned, so the cache does not keep the storage of the batch.
+            ws[seed] = mapped[i : i + 1].clone()
+            latent_cache.set((G.cache_key, seed), ws[seed])
+    return torch.cat([ws[int(seed)] for seed in seeds])
+
+
+def truncate_w(
+    G: Any,
+    w: torch.Tensor,
+    truncation_psi: Union[float, Sequence[float]],
+    truncation_cutoff: int = 8,
+) -> torch.Tensor:
+    """Truncate an untruncated feature vector, exactly like the mapping network does it.
+
+    Truncation is a lerp of the first truncation_cutoff rows toward the average feature vector,
+    so many truncation values can be applied at once without running the mapping network.
+
+    Args:
+        G (Any): a loaded stylegan model
+        w (torch.Tensor): an untruncated feature vector [1, num_ws, w_dim]
+        truncation_psi (Union[float, Sequence[float]]): one or more truncation values
+        truncation_cutoff (int, optional): the number of truncated rows. Defaults to 8.
+
+    Returns:
+        torch.Tensor: the truncated feature vectors [len(truncation_psi), num_ws, w_dim]
+    """
+    psi = torch.as_tensor(truncation_psi, dtype=w.dtype).reshape(-1, 1, 1)
+    truncated = w.expand(len(psi), *w.shape[1:]).clone()
+    shape = truncated[:, :truncation_cutoff].shape
+    truncated[:, :truncation_cutoff] = G.mapping.w_avg.expand(shape).lerp(
+        w[:, :truncation_cutoff].expand(shape), psi.expand(shape)
+    )
+    return truncated
+
+
+def truncate_ws(
+    G: Any, ws: torch.Tensor, truncation_psi: float, truncation_cutoff: int = 8
+) -> torch.Tensor:
+    """Truncate a batch of untruncated feature vectors by the same truncation value (see truncate_w).
+
+    Args:
+        G (Any): a loaded stylegan model
+        ws (torch.Tensor): the untruncated feature vectors [batch_size, num_ws, w_dim]
+        truncation_psi (float): the truncation value
+        truncation_cutoff (int, optional): the number of truncated rows. Defaults to 8.
+
+    Returns:
+        torch.Tensor: the truncated feature vectors [batch_size, num_ws, w_dim]
+    """
+    truncated = ws.clone()
+    shape = truncated[:, :truncation_cutoff].shape
+    psi = torch.as_tensor(truncation_psi, dtype=ws.dtype).expand(shape)
+    truncated[:, :truncation_cutoff] = G.mapping.w_avg.expand(shape).lerp(
+        ws[:, :truncation_cutoff], psi
+    )
+    return truncated
+
+
+def seed_to_array_image(
+    G, seed: int, truncation_psi: float, resolution: int = None
+) -> tuple:
     """Generate an image array and a feature vector of the image from a seed.
 
     Args:
         G ([type]): a loaded stylegan model
         seed (int): the seed for the generation
         truncation_psi (float): the truncation value for the generation
+        resolution (int, optional): the resolution of a preview image. Defaults to None (full resolution).
 
     Returns:
         tuple: the image array and the feature vector tensor
     """
-    device = torch.device("cpu")
-
-    z = torch.from_numpy(np.random.RandomState(int(seed)).randn(1, G.z_dim)).to(device)
-    w = G.mapping(z, None, truncation_psi=truncation_psi, truncation_cutoff=8)
+    w = truncate_w(G, seed_to_untruncated_w(G, seed), truncation_psi)
 
-    image = w_vector_to_image(G, w)
+    image = w_vector_to_image(G, w, resolution)
 
     return image, w
 
 
-def w_vector_to_image(G: Any, w: torch.Tensor) -> np.ndarray:
+def seed_to_truncation_sweep(
+    G: Any, seed: int, truncation_psis: Sequence[float], resolution: int = None
+) -> np.ndarray:
+    """Generate the images of a seed for many truncation values in one batch (e.g. for slider previews).
+
+    Args:
+        G (Any): a loaded stylegan model
+        seed (int): the seed for the generation
+        truncation_psis (Sequence[float]): the truncation values
+        resolution (int, optional): the resolution of preview images. Defaults to None (full resolution).
+
+    Returns:
+        np.ndarray: the image arrays [len(truncation_psis), height, width, 3]
+    """
+    ws = truncate_w(G, seed_to_untruncated_w(G, seed), truncation_psis)
+    return ws_to_images(G, ws, resolution).cpu().numpy()
+
+
+def _checkpoint_size(checkpoint: tuple) -> int:
+    """Return the number of bytes of a synthesis block checkpoint (x, img)."""
+    return sum(t.element_size() * t.nelement() for t in checkpoint if t is not None)
+
+
+# Checkpoints (x, img) of the synthesis blocks by the model (its cache_key), the block resolution and the W rows they depend on.
+block_cache = LRUCache(
+    max_size=BLOCK_CACHE_MAX_BYTES, sizeof=_checkpoint_size, name="block"
+)
+
+
+def clear_model_caches(filename: str) -> None:
+    """Remove the mapped seeds and synthesis block checkpoints of all weights of a model file (e.g. when it is unloaded).
+
+    Args:
+        filename (str): the filename of the model
+    """
+    for cache in (latent_cache, block_cache):
+        cache.discard(lambda key: key[0][0] == filename)
+
+
+def synthesize_blockwise(
+    G: Any, w: torch.Tensor, resolution: int = None, cache: LRUCache = block_cache
+) -> torch.Tensor:
+    """Run the synthesis network block by block, optionally stopping at a lower resolution.
+
+    Every synthesis block outputs the image of its resolution (ToRGB skip output), so the
+    remaining blocks can be skipped for a preview. Every halved resolution saves about 4x compute.
+
+    The outputs of the low resolution blocks of single feature vectors are checkpointed in a
+    cache, keyed by the W rows that they depend on. Synthesis resumes from the deepest cached
+    block, so e.g. a Fine style mix of a recently rendered image only runs the tail of the network.
+    Single feature vectors run the traced blocks of TorchScript models.
+
+    Args:
+        G (Any): a loaded stylegan model
+        w (torch.Tensor): a feature vector
+        resolution (int, optional): the resolution of a preview, one of the block resolutions. Defaults to None (full resolution).
+        cache (LRUCache, optional): the checkpoint cache. Defaults to block_cache.
+
+    Returns:
+        torch.Tensor: the image tensor
+    """
+    synthesis = G.synthesis
+    ws = w.to(torch.float32)
+
+    # The blocks up to the requested resolution and the index of their first W row.
+    blocks = []
+    w_idx = 0
+    for res in synthesis.block_resolutions:
+        block = getattr(synthesis, f"b{res}")
+        blocks.append((res, block, w_idx))
+        if res == resolution:
+            break
+        w_idx += block.num_conv
+
+    # The cache keys of all blocks that are checkpointed (except the last one, which is the result).
+    keys = [None] * len(blocks)
+    if cache is not None and cache.max_size != 0 and len(ws) == 1 and not ws.requires_grad:
+        digest = hashlib.sha1()
+        rows_end = 0
+        for i, (res, block, w_idx) in enumerate(blocks[:-1]):
+            if res > BLOCK_CACHE_MAX_RESOLUTION:
+                break
+            block_rows_end = w_idx + block.num_conv + block.num_torgb
+            digest.update(ws[0, rows_end:block_rows_end].numpy().tobytes())
+            rows_end = block_rows_end
+            keys[i] = (G.cache_key, res, digest.hexdigest())
+
+    # Resume from the deepest cached block (the lookup counts as one cache hit or miss).
+    checkpointed = [i for i, key in enumerate(keys) if key is not None]
+    x = image = None
+    start = 0
+    for i in reversed(checkpointed):
+        if keys[i] in cache or i == checkpointed[0]:
+            checkpoint = cache.get(keys[i])
+            if checkpoint is not None:
+                x, image = checkpoint
+                start = i + 1
+            break
+
+    # Traced blocks are only available for single feature vectors without gradients (see TracedSynthesis).
+    traced_blocks = getattr(synthesis, "traced_blocks", {})
+    if len(ws) != 1 or (torch.is_grad_enabled() and ws.requires_grad):
+        traced_blocks = {}
+
+    for i in range(start, len(blocks)):
+        res, block, w_idx = blocks[i]
+        block_ws = ws.narrow(1, w_idx, block.num_conv + block.num_torgb)
+        if res in traced_blocks:
+            x, image = traced_blocks[res](x, image, block_ws)
+        else:
+            x, image = block(x, image, block_ws, noise_mode="const", force_fp32=True)
+        if keys[i] is not None:
+            cache.set(keys[i], (x, image))
+    return image
+
+
+def ws_to_images(G: Any, ws: torch.Tensor, resolution: int = None) -> torch.Tensor:
+    """Generate a batch of images from a batch of feature vectors.
+
+    Args:
+        G (Any): a loaded stylegan model
+        ws (torch.Tensor): the feature vectors [batch_size, num_ws, w_dim]
+        resolution (int, optional): the resolution of preview images. Defaults to None (full resolution).
+
+    Returns:
+        torch.Tensor: the uint8 images [batch_size, height, width, 3]
+    """
+    noise_mode = "const"
+    with stage_latency.time("synthesis"):
+        if (
+            (resolution and resolution < G.img_resolution)
+            or not isinstance(G.synthesis, TracedSynthesis)
+            or (len(ws) == 1 and G.synthesis.traced_blocks)
+        ):
+            # Eager models, previews and single images of models with traced blocks run block by block
+            # and use the checkpoint cache. Batches of traced models run the whole graph.
+            images = synthesize_blockwise(G, ws, resolution)
+        else:
+            images = G.synthesis(ws, noise_mode=noise_mode, force_fp32=True)
+    return (images.permute(0, 2, 3, 1) * 127.5 + 128).clamp(0, 255).to(torch.uint8)
+
+
+def w_vector_to_image(
+    G: Any, w: torch.Tensor, resolution: int = None
+) -> np.ndarray:
     """Generate an image array from a feature vector.
 
     Args:
         G (Any): a loaded stylegan model
         w (torch.Tensor): a feature vector
+        resolution (int, optional): the resolution of a preview image. Defaults to None (full resolution).
 
     Returns:
         np.ndarray: the image as a numpy array
     """
-    noise_mode = "const"
-    image = G.synthesis(w, noise_mode=noise_mode, force_fp32=True)
-    image = (image.permute(0, 2, 3, 1) * 127.5 + 128).clamp(0, 255).to(torch.uint8)
+    image = ws_to_images(G, w, resolution)
     image = image[0].cpu().numpy()
     return image
 
 
+def model_memory_bytes(G: Any) -> int:
+    """Return the number of bytes of the parameters and buffers of a loaded stylegan model.
+
+    Args:
+        G (Any): a loaded stylegan model on any backend (measured by its eager modules)
+
+    Returns:
+        int: the number of bytes
+    """
+    G = getattr(G, "eager", G)
+    tensors = list(G.parameters()) + list(G.buffers())
+    return sum(t.element_size() * t.nelement() for t in tensors)
+
+
 def save_image_as_bytes(image: np.ndarray) -> bytes:
     """Save an array image as bytes.
 
@@ -54,7 +323,8 @@ def save_image_as_bytes(image: np.ndarray) -> bytes:
         bytes: the image bytes object
     """
     buffer = BytesIO()
-    PIL.Image.fromarray(image, "RGB").save(buffer, format="JPEG")
+    with stage_latency.time("jpeg_encode"):
+        PIL.Image.fromarray(image, "RGB").save(buffer, format="JPEG")
     return buffer.getvalue()
 
 
@@ -83,3 +353,20 @@ def load_vector_from_bytes(bytes_vector: bytes) -> torch.Tensor:
     """
     buffer = BytesIO(bytes_vector)
     return torch.load(buffer)
+
+
+def mean_w(w: torch.Tensor) -> np.ndarray:
+    """Return the mean of the rows of a feature vector (the key of the similarity search).
+
+    Args:
+        w (torch.Tensor): a feature vector [1, num_ws, w_dim]
+
+    Returns:
+        np.ndarray: the mean vector [w_dim]
+    """
+    return w.detach().reshape(-1, w.shape[-1]).mean(0).cpu().numpy()
+
+
+def seed_to_mean_w(G: Any, seed: int, truncation_psi: float) -> np.ndarray:
+    """Return the mean of the rows of the truncated feature vector of a seed (see mean_w)."""
+    return mean_w(truncate_w(G, seed_to_untruncated_w(G, seed), truncation_psi))
@@ -0,0 +1,72 @@
+"""Compare the latency and the output of the inference backends.
+
+Run from the repository root after exporting the models, e.g.:
+
+    python -m app.stylegan.torchscript --batch-sizes 1,2,4
+    python -m app.stylegan.onnx_runtime
+    python -m benchmarks.compare_backends --batch-sizes 1,4
+"""
+import statistics
+import time
+
+import click
+import numpy as np
+import torch
+
+from app.schemas.stylegan_models import stylegan2ada_models
+from app.stylegan.backends import inference_backends, load_inference_model
+from app.stylegan.load_model import load_model_from_pkl_stylegan2ada
+
+
+def time_generation(G, z: torch.Tensor, truncation_psi: float, repeats: int) -> tuple:
+    """Time the mapping and synthesis of a batch of latents.
+
+    Args:
+        G (Any): a loaded stylegan model on any backend
+        z (torch.Tensor): the batch of latents
+        truncation_psi (float): the truncation value
+        repeats (int): the number of timed runs (after one warmup run)
+
+    Returns:
+        tuple: the latencies in seconds and the generated images
+    """
+    latencies = []
+    with torch.no_grad():
+        for i in range(repeats + 1):
+            start = time.perf_counter()
+            w = G.mapping(z, None, truncation_psi=truncation_psi, truncation_cutoff=8)
+            images = G.synthesis(w, noise_mode="const", force_fp32=True)
+            if i > 0:
+                latencies.append(time.perf_counter() - start)
+    return latencies, images
+
+
+@click.command()
+@click.option("--batch-sizes", default="1", show_default=True, help="Comma separated batch sizes.")
+@click.option("--repeats", default=10, show_default=True, help="Timed runs per batch size.")
+@click.option("--truncation", default=1.0, show_default=True, help="Truncation value.")
+def compare_backends(batch_sizes: str, repeats: int, truncation: float) -> None:
+    """Compare all inference backends against the eager model for every stylegan2ada model."""
+    folder_path = stylegan2ada_models.path
+    for model in stylegan2ada_models.models:
+        eager_G = load_model_from_pkl_stylegan2ada(folder_path, model)
+        for batch_size in [int(b) for b in batch_sizes.split(",")]:
+            z = torch.from_numpy(np.random.RandomState(0).randn(batch_size, eager_G.z_dim))
+            _, reference = time_generation(eager_G, z, truncation, 0)
+            for backend in inference_backends:
+                G = load_inference_model(folder_path, model, eager_G, backend)
+                if backend != "eager" and G is eager_G:
+                    click.echo(f"{model.filename} {backend:>12}: not available, skipped")
+                    continue
+                latencies, images = time_generation(G, z, truncation, repeats)
+                assert images.shape == reference.shape
+                click.echo(
+                    f"{model.filename} {backend:>12} batch {batch_size}: "
+                    f"median {statistics.median(latencies) * 1000:.1f} ms, "
+                    f"per image {statistics.median(latencies) * 1000 / batch_size:.1f} ms, "
+                    f"max abs diff {(images - reference).abs().max().item():.2e}"
+                )
+
+
+if __name__ == "__main__":
+    compare_backends()
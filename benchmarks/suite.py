@@ -0,0 +1,270 @@
+"""A reproducible inference benchmark suite over the bundled stylegan2ada model.
+
+Every case (mapping, synthesis, JPEG encoding, end-to-end generation and style mixing) is run for
+every combination of inference backend, number of threads and batch size. The results are saved
+as JSON together with a fingerprint of the environment, so runs can be compared, e.g.:
+
+    python -m benchmarks.suite run --output baseline.json
+    python -m benchmarks.suite run --output current.json
+    python -m benchmarks.suite compare baseline.json current.json
+
+The int8 backend covers the reduced precision inference. The memory of the weights of every
+backend (if it runs torch modules) is saved with its results.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Callable, List, Optional
+
+import click
+import numpy as np
+import torch
+
+from app.schemas.stylegan2ada import Generation, StyleMix
+from app.schemas.stylegan_models import Model
+from app.stylegan.backends import inference_backends, load_inference_model
+from app.stylegan.generation import generate_image_stylegan2ada
+from app.stylegan.load_model import load_model_from_pkl_stylegan2ada
+from app.stylegan.style_mixing import style_mix_two_images_stylegan2ada
+from app.stylegan.torchscript import model_digest
+from app.stylegan.utils import block_cache, latent_cache, save_image_as_bytes
+
+MODEL_FOLDER = "stylegan2_ada_models"
+MODEL = Model(img=31, res=256, fid=12, version="stylegan2_ada")
+
+# The cases that are run for every batch size (the others always generate one image).
+BATCHED_CASES = ("mapping", "synthesis")
+
+
+def environment_fingerprint() -> dict:
+    """Return the versions, the hardware and the thread configuration of this environment."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    cpu = platform.processor()
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo") as f:
+            names = [line.split(":", 1)[1].strip() for line in f if line.startswith("model name")]
+        cpu = names[0] if names else cpu
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu": cpu,
+        "cpu_count": os.cpu_count(),
+        "torch_parallel_info": torch.__config__.parallel_info(),
+        "model": MODEL.filename,
+        "model_digest": model_digest(MODEL_FOLDER, MODEL),
+    }
+
+
+def measure(fn: Callable[[], None], repeats: int, setup: Callable[[], None] = None) -> List[float]:
+    """Return the latencies in seconds of repeated calls of a function (after one warmup call).
+
+    Args:
+        fn (Callable[[], None]): the measured function
+        repeats (int): the number of measured calls
+        setup (Callable[[], None], optional): a function that runs untimed before every call. Defaults to None.
+
+    Returns:
+        List[float]: the latencies
+    """
+    latencies = []
+    with torch.no_grad():
+        for i in range(repeats + 1):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            if i > 0:
+                latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def weights_megabytes(G) -> Optional[float]:
+    """Return the memory of the weights and buffers of a model in MB (None if it is not a torch module, e.g. a traced graph)."""
+    if not isinstance(G, torch.nn.Module):
+        return None
+
+    def nbytes(value) -> int:
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        # The packed parameters of quantized layers are tuples of tensors.
+        if isinstance(value, (tuple, list)):
+            return sum(nbytes(v) for v in value)
+        return 0
+
+    return sum(nbytes(value) for value in G.state_dict().values()) / 2 ** 20
+
+
+def clear_caches() -> None:
+    """Clear the latent and block caches so that every call measures the uncached path."""
+    latent_cache.clear()
+    block_cache.clear()
+
+
+def benchmark_cases(G, batch_size: int) -> dict:
+    """Return the benchmarked functions of a model by their case name.
+
+    Args:
+        G (Any): a loaded stylegan model on any backend
+        batch_size (int): the batch size of the batched cases
+
+    Returns:
+        dict: the functions by case name
+    """
+    z = torch.from_numpy(np.random.RandomState(0).randn(batch_size, G.z_dim))
+    with torch.no_grad():
+        w = G.mapping(z, None, truncation_psi=1)
+    image = np.random.RandomState(0).randint(0, 256, (G.img_resolution, G.img_resolution, 3), np.uint8)
+    model = MODEL.dict()
+    generation = Generation(model=model, truncation=0.7, seed="1234")
+    stylemix = StyleMix(
+        model=model, row_image="1234", column_image="5678", styles="Middle", truncation=0.7
+    )
+    return {
+        "mapping": lambda: G.mapping(z, None, truncation_psi=0.7, truncation_cutoff=8),
+        "synthesis": lambda: G.synthesis(w, noise_mode="const", force_fp32=True),
+        "encode": lambda: save_image_as_bytes(image),
+        "generate": lambda: generate_image_stylegan2ada(G, generation),
+        "style_mix": lambda: style_mix_two_images_stylegan2ada(G, stylemix, 1234, 5678),
+    }
+
+
+def result_key(result: dict) -> tuple:
+    """Return the key that identifies the configuration of a result across runs."""
+    return (result["case"], result["backend"], result["threads"], result["batch_size"])
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> List[dict]:
+    """Return the configurations whose median latency regressed against a baseline.
+
+    Args:
+        baseline (dict): the baseline results
+        current (dict): the current results
+        threshold (float): the tolerated relative slowdown, e.g. 0.1 for 10%
+
+    Returns:
+        List[dict]: the regressed configurations with their baseline and current median latencies
+    """
+    baseline_results = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        reference = baseline_results.get(result_key(result))
+        if reference is None:
+            continue
+        slowdown = result["median_ms"] / reference["median_ms"] - 1
+        if slowdown > threshold:
+            regressions.append(
+                {
+                    "case": result["case"],
+                    "backend": result["backend"],
+                    "threads": result["threads"],
+                    "batch_size": result["batch_size"],
+                    "baseline_median_ms": reference["median_ms"],
+                    "median_ms": result["median_ms"],
+                    "slowdown": slowdown,
+                }
+            )
+    return regressions
+
+
+def _int_list(value: str) -> List[int]:
+    """Parse a comma separated list of ints."""
+    return [int(v) for v in value.split(",")]
+
+
+@click.group()
+def suite() -> None:
+    """Run and compare the inference benchmarks."""
+
+
+@suite.command()
+@click.option("--backends", default=",".join(inference_backends), show_default=True, help="Comma separated inference backends.")
+@click.option("--threads", default=str(torch.get_num_threads()), show_default=True, help="Comma separated torch thread counts.")
+@click.option("--batch-sizes", default="1,4", show_default=True, help="Comma separated batch sizes of the mapping and synthesis cases.")
+@click.option("--repeats", default=10, show_default=True, help="Measured runs per configuration.")
+@click.option("--output", default="benchmark_results.json", show_default=True, help="The JSON results file.")
+def run(backends: str, threads: str, batch_sizes: str, repeats: int, output: str) -> None:
+    """Benchmark all cases for every backend, thread count and batch size."""
+    torch.manual_seed(0)
+    eager_G = load_model_from_pkl_stylegan2ada(MODEL_FOLDER, MODEL)
+    results = []
+    for backend in backends.split(","):
+        G = load_inference_model(MODEL_FOLDER, MODEL, eager_G, backend)
+        if backend != "eager" and G is eager_G:
+            click.echo(f"{backend}: not available, skipped")
+            continue
+        weights_mb = weights_megabytes(G)
+        if weights_mb is not None:
+            click.echo(f"{backend}: weights {weights_mb:.1f} MB")
+        for num_threads in _int_list(threads):
+            torch.set_num_threads(num_threads)
+            for batch_size in _int_list(batch_sizes):
+                for case, fn in benchmark_cases(G, batch_size).items():
+                    if case not in BATCHED_CASES and batch_size != 1:
+                        continue
+                    latencies = measure(fn, repeats, setup=clear_caches)
+                    median = statistics.median(latencies)
+                    result = {
+                        "case": case,
+                        "backend": backend,
+                        "threads": num_threads,
+                        "batch_size": batch_size,
+                        "repeats": repeats,
+                        "median_ms": median * 1000,
+                        "p90_ms": float(np.percentile(latencies, 90)) * 1000,
+                        "min_ms": min(latencies) * 1000,
+                        "images_per_sec": batch_size / median,
+                        "weights_mb": weights_mb,
+                    }
+                    results.append(result)
+                    click.echo(
+                        f"{case:>10} {backend:>12} threads {num_threads:>2} batch {batch_size:>2}: "
+                        f"median {result['median_ms']:.1f} ms, {result['images_per_sec']:.1f} images/s"
+                    )
+
+    with open(output, "w") as f:
+        json.dump({"environment": environment_fingerprint(), "results": results}, f, indent=2)
+    click.echo(f"Saved {len(results)} results to {output}")
+
+
+@suite.command()
+@click.argument("baseline_path")
+@click.argument("current_path")
+@click.option("--threshold", default=0.1, show_default=True, help="Tolerated relative slowdown of the median latency.")
+def compare(baseline_path: str, current_path: str, threshold: float) -> None:
+    """Compare results against a baseline and exit with 1 if any configuration regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    for key in ["torch", "cpu", "cpu_count", "model_digest"]:
+        if baseline["environment"].get(key) != current["environment"].get(key):
+            click.echo(
+                f"Warning: the {key} differs ({baseline['environment'].get(key)} vs {current['environment'].get(key)})"
+            )
+
+    regressions = compare_results(baseline, current, threshold)
+    for regression in regressions:
+        click.echo(
+            f"REGRESSION {regression['case']} {regression['backend']} threads {regression['threads']} "
+            f"batch {regression['batch_size']}: {regression['baseline_median_ms']:.1f} ms -> "
+            f"{regression['median_ms']:.1f} ms (+{regression['slowdown']:.0%})"
+        )
+    if regressions:
+        raise SystemExit(1)
+    click.echo("No regressions.")
+
+
+if __name__ == "__main__":
+    suite()
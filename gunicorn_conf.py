@@ -0,0 +1,74 @@
+"""The gunicorn config of the Docker image (replaces the default config of the base image).
+
+The number of workers and the torch threads per worker are picked from the CPU topology and the
+cgroup quota (or a calibration of this machine shape, see app.core.autotune), so the workers do not
+oversubscribe the cores. WEB_CONCURRENCY still overrides the number of workers and
+ONNXRUNTIME_INTRA_OP_THREADS the threads of onnxruntime workers, the usable cores are then split by
+the other one.
+
+The workers share their metrics through METRICS_MULTIPROC_DIR (see app.core.metrics.Registry), so a
+scrape of /metrics returns the metrics of all workers.
+"""
+import os
+import shutil
+
+# Set before the app config is imported (and inherited by the workers).
+os.environ.setdefault("METRICS_MULTIPROC_DIR", "/tmp/cp-metrics")
+
+from app.core.autotune import (
+    apply_worker_config,
+    detect_topology,
+    load_config,
+    override_config,
+    worker_cpus,
+)
+from app.core.config import INFERENCE_BACKEND, ONNXRUNTIME_INTRA_OP_THREADS
+from app.core.metrics import mark_process_dead
+
+topology = detect_topology()
+worker_config = override_config(
+    topology,
+    load_config(topology),
+    workers=int(os.getenv("WEB_CONCURRENCY", "0")),
+    # 0 runs ONNX Runtime with the torch threads of the worker (see app.stylegan.onnx_runtime).
+    threads=ONNXRUNTIME_INTRA_OP_THREADS if INFERENCE_BACKEND == "onnxruntime" else 0,
+)
+# The pinning slots of the running workers (in the master process).
+busy_slots = set()
+
+workers = worker_config.workers
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.getenv("BIND") or f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '80')}"
+loglevel = os.getenv("LOG_LEVEL", "info")
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "120"))
+timeout = int(os.getenv("TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEP_ALIVE", "5"))
+errorlog = "-"
+accesslog = "-"
+
+
+def on_starting(server):
+    # The snapshots of the workers of an earlier run are removed.
+    shutil.rmtree(os.environ["METRICS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["METRICS_MULTIPROC_DIR"])
+    server.log.info(
+        f"{topology.shape}: {workers} workers x {worker_config.threads} threads"
+        f"{' (pinned)' if worker_config.pin else ''}"
+    )
+
+
+def pre_fork(server, worker):
+    # A respawned worker takes the cores of the worker it replaces (the first free slot).
+    worker.slot = next(slot for slot in range(len(busy_slots) + 1) if slot not in busy_slots)
+    busy_slots.add(worker.slot)
+
+
+def post_fork(server, worker):
+    cpus = worker_cpus(topology, worker_config, worker.slot) if worker_config.pin else None
+    apply_worker_config(worker_config, cpus)
+
+
+def child_exit(server, worker):
+    busy_slots.discard(worker.slot)
+    # The gauges of an exited worker are dropped, its counters still count.
+    mark_process_dead(worker.pid)
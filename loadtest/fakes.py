@@ -0,0 +1,127 @@
+"""Local stand-ins for the external services (Auth0 and Google Cloud Storage)."""
+import base64
+import threading
+import time
+import uuid
+from typing import Dict, List
+
+import rsa
+from google.api_core.exceptions import NotFound
+from jose import jwt
+
+
+def _base64url_uint(value: int) -> str:
+    """Encode an unsigned int as unpadded base64url (the JWK format of RSA parameters)."""
+    data = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+class LocalJWTIssuer:
+    """A local Auth0 tenant that signs RS256 access tokens and publishes its JWKS."""
+
+    def __init__(self, domain: str, audience: str, key_size: int = 2048) -> None:
+        """Init a new issuer with a fresh RSA key.
+
+        Args:
+            domain (str): the Auth0 domain (the issuer is https://{domain}/)
+            audience (str): the API audience of the tokens
+            key_size (int, optional): the RSA key size in bits. Defaults to 2048.
+        """
+        self.domain = domain
+        self.audience = audience
+        self.kid = uuid.uuid4().hex
+        public_key, private_key = rsa.newkeys(key_size)
+        self.private_key = private_key.save_pkcs1().decode()
+        self.jwks = {
+            "keys": [
+                {
+                    "kty": "RSA",
+                    "kid": self.kid,
+                    "use": "sig",
+                    "alg": "RS256",
+                    "n": _base64url_uint(public_key.n),
+                    "e": _base64url_uint(public_key.e),
+                }
+            ]
+        }
+
+    def issue_token(self, user_id: str, scopes: List[str] = ("use:all",), lifetime: int = 3600) -> str:
+        """Return a signed access token of a user.
+
+        Args:
+            user_id (str): the user id (sub claim)
+            scopes (List[str], optional): the scopes of the token. Defaults to ("use:all",).
+            lifetime (int, optional): the seconds until the token expires. Defaults to 3600.
+
+        Returns:
+            str: the token
+        """
+        now = int(time.time())
+        claims = {
+            "sub": user_id,
+            "iss": f"https://{self.domain}/",
+            "aud": self.audience,
+            "iat": now,
+            "exp": now + lifetime,
+            "scope": " ".join(scopes),
+        }
+        return jwt.encode(claims, self.private_key, algorithm="RS256", headers={"kid": self.kid})
+
+
+class FakeBlob:
+    """An in-memory google.cloud.storage.Blob."""
+
+    def __init__(self, bucket: "FakeBucket", name: str) -> None:
+        self.bucket = bucket
+        self.name = name
+
+    def upload_from_string(self, data: bytes, content_type: str = None) -> None:
+        self.bucket.client.simulate_latency()
+        with self.bucket.client.lock:
+            self.bucket.blobs[self.name] = bytes(data)
+
+    def download_as_bytes(self) -> bytes:
+        self.bucket.client.simulate_latency()
+        with self.bucket.client.lock:
+            if self.name not in self.bucket.blobs:
+                raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+            return self.bucket.blobs[self.name]
+
+    def delete(self) -> None:
+        self.bucket.client.simulate_latency()
+        with self.bucket.client.lock:
+            if self.bucket.blobs.pop(self.name, None) is None:
+                raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+
+
+class FakeBucket:
+    """An in-memory google.cloud.storage.Bucket."""
+
+    def __init__(self, client: "FakeStorageClient", name: str, blobs: Dict[str, bytes]) -> None:
+        self.client = client
+        self.name = name
+        self.blobs = blobs
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+
+class FakeStorageClient:
+    """An in-memory google.cloud.storage.Client whose buckets are shared by all instances.
+
+    Replace `app.db.google_cloud_storage.storage.Client` with it (the instances are created per call).
+    """
+
+    buckets: Dict[str, Dict[str, bytes]] = {}
+    lock = threading.Lock()
+    # The simulated round trip time of every blob operation in seconds.
+    latency = 0.0
+
+    def bucket(self, name: str) -> FakeBucket:
+        with self.lock:
+            blobs = self.buckets.setdefault(name, {})
+        return FakeBucket(self, name, blobs)
+
+    def simulate_latency(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
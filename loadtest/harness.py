@@ -0,0 +1,254 @@
+"""An end-to-end load test of the API with local stand-ins for Auth0 and Google Cloud Storage.
+
+The app runs in-process with uvicorn. Access tokens are signed by a local JWT issuer whose JWKS
+replaces the Auth0 keys of `app.core.auth0.auth` (so tokens are still verified), and
+`app/db/google_cloud_storage.py` uses an in-memory bucket store. MongoDB and Redis must run
+locally, like for the narrow integration tests, e.g.:
+
+    docker run -d -p 27017:27017 mongo
+    docker run -d -p 6379:6379 redis
+    python -m loadtest.harness --rps 1,2,4,8 --duration 30 --mix generate=4,stylemix=3,images=2,delete=1
+
+Every RPS step is an open-loop run (requests are sent on schedule, independent of the responses).
+The saturation point is the first step that misses the target throughput, the p99 latency SLO or
+the error budget.
+"""
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+from unittest import mock
+
+import click
+import numpy as np
+import requests
+
+from loadtest.fakes import FakeStorageClient, LocalJWTIssuer
+
+# The default environment of the app (set before the app is imported unless already set).
+LOADTEST_ENV = {
+    "AUTH0_DOMAIN": "loadtest.local",
+    "AUTH0_API": "https://loadtest.local/api",
+    "REDIS_URL": "redis://localhost:6379",
+    "REDIS_RATELIMIT_REQUESTS": "1000000",
+    "REDIS_RATELIMIT_PERIOD_MINUTES": "1",
+    "MONGO_URL": "mongodb://localhost:27017",
+    "MONGO_DB_NAME": "loadtest",
+    "MONGO_COLLECTION_NAME": "images",
+}
+
+MODEL = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
+
+
+def start_app(host: str, port: int, gcs_latency: float) -> tuple:
+    """Start the app with the local stand-ins in a background uvicorn server.
+
+    Args:
+        host (str): the host of the server
+        port (int): the port of the server
+        gcs_latency (float): the simulated latency of every GCS operation in seconds
+
+    Returns:
+        tuple: the server, its thread and the local JWT issuer
+    """
+    for key, value in LOADTEST_ENV.items():
+        os.environ.setdefault(key, value)
+
+    # The Auth0 client fetches its JWKS when it is created, so the fetch is stubbed for the import.
+    response = mock.Mock(**{"json.return_value": {"keys": []}})
+    with mock.patch("requests.get", return_value=response):
+        import uvicorn
+
+        from app.core.auth0 import auth
+        from app.main import app
+
+    issuer = LocalJWTIssuer(auth.domain, auth.audience)
+    auth.jwks = issuer.jwks
+
+    FakeStorageClient.latency = gcs_latency
+    patcher = mock.patch("app.db.google_cloud_storage.storage.Client", FakeStorageClient)
+    patcher.start()
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    # Signal handlers can only be installed in the main thread.
+    server.install_signal_handlers = lambda: None
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, issuer
+
+
+class LoadTestUser:
+    """A simulated user with an access token and the ids of their images."""
+
+    def __init__(self, base_url: str, token: str) -> None:
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.image_ids = []
+        self.lock = threading.Lock()
+
+    def _save_ids(self, response: requests.Response, keys: List[str]) -> None:
+        if response.ok:
+            with self.lock:
+                self.image_ids += [response.json()[key] for key in keys]
+
+    def generate(self) -> requests.Response:
+        data = {"model": MODEL, "truncation": 0.7, "seed": str(random.randint(0, 2 ** 32 - 1))}
+        response = self.session.post(f"{self.base_url}/api/v1/stylegan2ada/generate", json=data)
+        self._save_ids(response, ["result_image"])
+        return response
+
+    def stylemix(self) -> requests.Response:
+        with self.lock:
+            row_image = random.choice(self.image_ids) if self.image_ids else ""
+        data = {
+            "model": MODEL,
+            "row_image": row_image,
+            "column_image": "",
+            "styles": random.choice(["Coarse", "Middle", "Fine"]),
+            "truncation": 0.7,
+        }
+        response = self.session.post(f"{self.base_url}/api/v1/stylegan2ada/stylemix", json=data)
+        self._save_ids(response, ["result_image"])
+        return response
+
+    def images(self) -> requests.Response:
+        return self.session.get(f"{self.base_url}/api/v1/user/images")
+
+    def delete(self) -> requests.Response:
+        with self.lock:
+            id_list = [self.image_ids.pop()] if self.image_ids else []
+        return self.session.delete(
+            f"{self.base_url}/api/v1/user/images", json={"all_documents": False, "id_list": id_list}
+        )
+
+
+def run_step(users: List[LoadTestUser], mix: Dict[str, int], rps: float, duration: float, workers: int) -> dict:
+    """Send requests at a fixed rate for a duration and summarize the responses per endpoint.
+
+    Args:
+        users (List[LoadTestUser]): the simulated users (chosen at random per request)
+        mix (Dict[str, int]): the relative weights of the endpoints
+        rps (float): the target requests per second
+        duration (float): the duration in seconds
+        workers (int): the maximum number of concurrent requests
+
+    Returns:
+        dict: the achieved throughput, and the latency percentiles and error rate per endpoint
+    """
+    endpoints = list(mix)
+    weights = [mix[endpoint] for endpoint in endpoints]
+    samples = {endpoint: [] for endpoint in endpoints}
+    samples_lock = threading.Lock()
+
+    def send(endpoint: str, request: Callable[[], requests.Response]) -> None:
+        start = time.perf_counter()
+        try:
+            ok = request().status_code < 500
+        except requests.RequestException:
+            ok = False
+        with samples_lock:
+            samples[endpoint].append((time.perf_counter() - start, ok))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i in range(int(rps * duration)):
+            # Open loop: every request is sent at its scheduled time.
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            endpoint = random.choices(endpoints, weights)[0]
+            executor.submit(send, endpoint, getattr(random.choice(users), endpoint))
+    elapsed = time.perf_counter() - start
+
+    result = {"target_rps": rps, "endpoints": {}}
+    all_samples = []
+    for endpoint, endpoint_samples in samples.items():
+        all_samples += endpoint_samples
+        if not endpoint_samples:
+            continue
+        latencies = [latency for latency, _ in endpoint_samples]
+        result["endpoints"][endpoint] = {
+            "requests": len(endpoint_samples),
+            "error_rate": sum(not ok for _, ok in endpoint_samples) / len(endpoint_samples),
+            "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+            "p90_ms": float(np.percentile(latencies, 90)) * 1000,
+            "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        }
+    latencies = [latency for latency, _ in all_samples]
+    result["achieved_rps"] = len(all_samples) / elapsed
+    result["error_rate"] = sum(not ok for _, ok in all_samples) / max(len(all_samples), 1)
+    result["p99_ms"] = float(np.percentile(latencies, 99)) * 1000 if latencies else None
+    result["median_ms"] = statistics.median(latencies) * 1000 if latencies else None
+    return result
+
+
+def is_saturated(step: dict, p99_slo_ms: float, error_budget: float) -> bool:
+    """Return whether a step missed its target throughput, the p99 latency SLO or the error budget."""
+    return (
+        step["achieved_rps"] < 0.9 * step["target_rps"]
+        or step["p99_ms"] is None
+        or step["p99_ms"] > p99_slo_ms
+        or step["error_rate"] > error_budget
+    )
+
+
+@click.command()
+@click.option("--rps", default="1,2,4", show_default=True, help="Comma separated target requests per second (one step each).")
+@click.option("--duration", default=30.0, show_default=True, help="Seconds per step.")
+@click.option("--mix", default="generate=4,stylemix=3,images=2,delete=1", show_default=True, help="Relative endpoint weights.")
+@click.option("--users", default=10, show_default=True, help="Number of simulated users.")
+@click.option("--workers", default=64, show_default=True, help="Maximum concurrent requests.")
+@click.option("--gcs-latency-ms", default=20.0, show_default=True, help="Simulated latency of every GCS operation.")
+@click.option("--p99-slo-ms", default=2000.0, show_default=True, help="The p99 latency that marks saturation.")
+@click.option("--error-budget", default=0.01, show_default=True, help="The error rate that marks saturation.")
+@click.option("--port", default=8765, show_default=True, help="The port of the app.")
+@click.option("--output", default=None, help="A JSON file for the results.")
+def loadtest(rps, duration, mix, users, workers, gcs_latency_ms, p99_slo_ms, error_budget, port, output) -> None:
+    """Load test the API at increasing request rates and report its saturation point."""
+    mix = {name: int(weight) for name, weight in (item.split("=") for item in mix.split(","))}
+    server, thread, issuer = start_app("127.0.0.1", port, gcs_latency_ms / 1000)
+    base_url = f"http://127.0.0.1:{port}"
+    simulated_users = [
+        LoadTestUser(base_url, issuer.issue_token(f"loadtest|{i}")) for i in range(users)
+    ]
+
+    steps = []
+    saturation_rps = None
+    try:
+        for target_rps in [float(r) for r in rps.split(",")]:
+            step = run_step(simulated_users, mix, target_rps, duration, workers)
+            steps.append(step)
+            click.echo(
+                f"{target_rps:>6.1f} rps: achieved {step['achieved_rps']:.1f} rps, "
+                f"median {step['median_ms']:.0f} ms, p99 {step['p99_ms']:.0f} ms, errors {step['error_rate']:.1%}"
+            )
+            for endpoint, summary in step["endpoints"].items():
+                click.echo(
+                    f"    {endpoint:>9}: {summary['requests']} requests, p50 {summary['p50_ms']:.0f} ms, "
+                    f"p90 {summary['p90_ms']:.0f} ms, p99 {summary['p99_ms']:.0f} ms, errors {summary['error_rate']:.1%}"
+                )
+            if is_saturated(step, p99_slo_ms, error_budget):
+                saturation_rps = target_rps
+                break
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    if saturation_rps is None:
+        click.echo("Not saturated at the highest step.")
+    else:
+        click.echo(f"Saturated at {saturation_rps:.1f} rps.")
+    if output:
+        with open(output, "w") as f:
+            json.dump({"mix": mix, "saturation_rps": saturation_rps, "steps": steps}, f, indent=2)
+
+
+if __name__ == "__main__":
+    loadtest()
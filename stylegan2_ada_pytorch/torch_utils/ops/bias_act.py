@@ -50,6 +50,20 @@ def _init():
             warnings.warn('Failed to build CUDA kernels for bias_act. Falling back to slow reference implementation. Details:\n\n' + traceback.format_exc())
     return _plugin is not None
 
+_cpu_inited = False
+_cpu_plugin = None
+
+def _init_cpu():
+    global _cpu_inited, _cpu_plugin
+    if not _cpu_inited:
+        _cpu_inited = True
+        sources = [os.path.join(os.path.dirname(__file__), 'bias_act_cpu.cpp')]
+        try:
+            _cpu_plugin = custom_ops.get_plugin('bias_act_cpu_plugin', sources=sources, **custom_ops.cpu_build_kwargs())
+        except:
+            warnings.warn('Failed to build CPU kernels for bias_act. Falling back to slow reference implementation. Details:\n\n' + traceback.format_exc())
+    return _cpu_plugin is not None
+
 #----------------------------------------------------------------------------
 
 def bias_act(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=None, impl='cuda'):
@@ -78,6 +92,8 @@ def bias_act(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=None,
         clamp:  Clamp the output values to `[-clamp, +clamp]`, or `None` to disable
                 the clamping (default).
         impl:   Name of the implementation to use. Can be `"ref"` or `"cuda"` (default).
+                For CPU tensors, `"cuda"` selects the native CPU kernels when no
+                gradients are required.
 
     Returns:
         Tensor of the same shape and datatype as `x`.
@@ -86,8 +102,16 @@ def bias_act(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=None,
     assert impl in ['ref', 'cuda']
     if impl == 'cuda' and x.device.type == 'cuda' and _init():
         return _bias_act_cuda(dim=dim, act=act, alpha=alpha, gain=gain, clamp=clamp).apply(x, b)
+    if impl == 'cuda' and x.device.type == 'cpu' and not _requires_grad(x, b) and _init_cpu():
+        return _bias_act_cpu(x=x, b=b, dim=dim, act=act, alpha=alpha, gain=gain, clamp=clamp)
     return _bias_act_ref(x=x, b=b, dim=dim, act=act, alpha=alpha, gain=gain, clamp=clamp)
 
+def _requires_grad(x, b):
+    # The native CPU kernels are opaque to autograd and to the JIT tracer.
+    if torch.jit.is_tracing():
+        return True
+    return torch.is_grad_enabled() and (x.requires_grad or (b is not None and b.requires_grad))
+
 #----------------------------------------------------------------------------
 
 @misc.profiled_function
@@ -210,3 +234,29 @@ def _bias_act_cuda(dim=1, act='linear', alpha=None, gain=None, clamp=None):
     return BiasActCuda
 
 #----------------------------------------------------------------------------
+
+@misc.profiled_function
+def _bias_act_cpu(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=None):
+    """Fast CPU implementation of `bias_act()` using custom ops. Forward pass only.
+    """
+    # Parse arguments.
+    assert clamp is None or clamp >= 0
+    spec = activation_funcs[act]
+    alpha = float(alpha if alpha is not None else spec.def_alpha)
+    gain = float(gain if gain is not None else spec.def_gain)
+    clamp = float(clamp if clamp is not None else -1)
+    if b is not None:
+        assert isinstance(b, torch.Tensor) and b.ndim == 1
+        assert 0 <= dim < x.ndim
+        assert b.shape[0] == x.shape[dim]
+
+    # Nothing to do?
+    if act == 'linear' and gain == 1 and clamp < 0 and b is None:
+        return x
+
+    memory_format = torch.channels_last if x.ndim > 2 and x.stride()[1] == 1 else torch.contiguous_format
+    x = x.contiguous(memory_format=memory_format)
+    b = b.contiguous() if b is not None else _null_tensor
+    return _cpu_plugin.bias_act(x, b, dim, spec.cuda_idx, alpha, gain, clamp)
+
+#----------------------------------------------------------------------------
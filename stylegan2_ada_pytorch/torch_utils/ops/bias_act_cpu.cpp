@@ -0,0 +1,121 @@
+// CPU implementation of the fused bias_act() op (forward pass only).
+//
+// The kernel mirrors the CUDA version in bias_act.cu: the activation
+// indices match `activation_funcs[...].cuda_idx` in bias_act.py and the
+// per-element operation order (bias, activation, gain, clamp) matches the
+// reference implementation, so results are identical to `impl='ref'`.
+
+#include <torch/extension.h>
+#include <ATen/Parallel.h>
+#include <cmath>
+
+//------------------------------------------------------------------------
+// Activation functions.
+
+template <class T, int A> static inline T activate(T x, T alpha)
+{
+    if (A == 2) return (x > 0) ? x : (T)0;                                  // relu
+    if (A == 3) return (x > 0) ? x : x * alpha;                             // lrelu
+    if (A == 4) return std::tanh(x);                                        // tanh
+    if (A == 5) return (T)1 / ((T)1 + std::exp(-x));                        // sigmoid
+    if (A == 6) return (x > 0) ? x : std::expm1(x);                         // elu
+    if (A == 7) return (x > 0) ? (T)1.0507009873554804934193349852946 * x   // selu
+                               : (T)1.0507009873554804934193349852946 * (T)1.6732632423543772848170429916717 * std::expm1(x);
+    if (A == 8) return (x > (T)20) ? x : std::log1p(std::exp(x));           // softplus
+    if (A == 9) return ((T)1 / ((T)1 + std::exp(-x))) * x;                 // swish
+    return x;                                                               // linear
+}
+
+//------------------------------------------------------------------------
+// Kernel. `x` is viewed as [sizeX / (sizeB * stepB), sizeB, stepB] in memory
+// order, which holds for any non-overlapping and dense layout, so that each
+// run of `stepB` elements shares one bias value and vectorizes cleanly.
+
+template <class T, int A> static void bias_act_kernel(const T* x, const T* b, T* y, int64_t sizeX, int64_t sizeB, int64_t stepB, T alpha, T gain, T clamp)
+{
+    const int64_t numRuns = sizeX / stepB;
+    const int64_t grain = std::max<int64_t>(1, 32768 / stepB);
+    at::parallel_for(0, numRuns, grain, [&](int64_t begin, int64_t end)
+    {
+        for (int64_t run = begin; run < end; run++)
+        {
+            const T bias = (b) ? b[run % sizeB] : (T)0;
+            const T* xr = x + run * stepB;
+            T* yr = y + run * stepB;
+            #pragma omp simd
+            for (int64_t i = 0; i < stepB; i++)
+            {
+                T v = xr[i];
+                if (b)
+                    v = v + bias;
+                v = activate<T, A>(v, alpha);
+                if (gain != (T)1)
+                    v = v * gain;
+                if (clamp >= 0)
+                    v = (v < -clamp) ? -clamp : (v > clamp) ? clamp : v;
+                yr[i] = v;
+            }
+        }
+    });
+}
+
+template <class T> static void choose_bias_act_kernel(int act, const T* x, const T* b, T* y, int64_t sizeX, int64_t sizeB, int64_t stepB, T alpha, T gain, T clamp)
+{
+    switch (act)
+    {
+        case 1: bias_act_kernel<T, 1>(x, b, y, sizeX, sizeB, stepB, alpha, gain, clamp); break;
+        case 2: bias_act_kernel<T, 2>(x, b, y, sizeX, sizeB, stepB, alpha, gain, clamp); break;
+        case 3: bias_act_kernel<T, 3>(x, b, y, sizeX, sizeB, stepB, alpha, gain, clamp); break;
+        case 4: bias_act_kernel<T, 4>(x, b, y, sizeX, sizeB, stepB, alpha, gain, clamp); break;
+        case 5: bias_act_kernel<T, 5>(x, b, y, sizeX, sizeB, stepB, alpha, gain, clamp); break;
+        case 6: bias_act_kernel<T, 6>(x, b, y, sizeX, sizeB, stepB, alpha, gain, clamp); break;
+        case 7: bias_act_kernel<T, 7>(x, b, y, sizeX, sizeB, stepB, alpha, gain, clamp); break;
+        case 8: bias_act_kernel<T, 8>(x, b, y, sizeX, sizeB, stepB, alpha, gain, clamp); break;
+        case 9: bias_act_kernel<T, 9>(x, b, y, sizeX, sizeB, stepB, alpha, gain, clamp); break;
+        default: TORCH_CHECK(false, "no CPU kernel found for the specified activation func");
+    }
+}
+
+//------------------------------------------------------------------------
+
+static torch::Tensor bias_act(torch::Tensor x, torch::Tensor b, int dim, int act, float alpha, float gain, float clamp)
+{
+    // Validate arguments.
+    TORCH_CHECK(x.device().is_cpu(), "x must reside on CPU");
+    TORCH_CHECK(b.numel() == 0 || (b.dtype() == x.dtype() && b.device() == x.device()), "b must have the same dtype and device as x");
+    TORCH_CHECK(b.dim() == 1, "b must have rank 1");
+    TORCH_CHECK(b.numel() == 0 || (dim >= 0 && dim < x.dim()), "dim is out of bounds");
+    TORCH_CHECK(b.numel() == 0 || b.numel() == x.size(dim), "b has wrong number of elements");
+
+    // Validate layout.
+    TORCH_CHECK(x.is_non_overlapping_and_dense(), "x must be non-overlapping and dense");
+    TORCH_CHECK(b.is_contiguous(), "b must be contiguous");
+
+    // Create output tensor with the same layout as x.
+    torch::Tensor y = torch::empty_like(x);
+    if (x.numel() == 0)
+        return y;
+
+    int64_t sizeB = (b.numel()) ? b.numel() : 1;
+    int64_t stepB = (b.numel()) ? x.stride(dim) : x.numel();
+
+    AT_DISPATCH_FLOATING_TYPES(x.scalar_type(), "bias_act_cpu", [&]
+    {
+        choose_bias_act_kernel<scalar_t>(act,
+            x.data_ptr<scalar_t>(),
+            (b.numel()) ? b.data_ptr<scalar_t>() : NULL,
+            y.data_ptr<scalar_t>(),
+            x.numel(), sizeB, stepB,
+            (scalar_t)alpha, (scalar_t)gain, (scalar_t)clamp);
+    });
+    return y;
+}
+
+//------------------------------------------------------------------------
+
+PYBIND11_MODULE(TORCH_EXTENSION_NAME, m)
+{
+    m.def("bias_act", &bias_act);
+}
+
+//------------------------------------------------------------------------
@@ -34,6 +34,20 @@ def _init():
             warnings.warn('Failed to build CUDA kernels for upfirdn2d. Falling back to slow reference implementation. Details:\n\n' + traceback.format_exc())
     return _plugin is not None
 
+_cpu_inited = False
+_cpu_plugin = None
+
+def _init_cpu():
+    global _cpu_inited, _cpu_plugin
+    if not _cpu_inited:
+        _cpu_inited = True
+        sources = [os.path.join(os.path.dirname(__file__), 'upfirdn2d_cpu.cpp')]
+        try:
+            _cpu_plugin = custom_ops.get_plugin('upfirdn2d_cpu_plugin', sources=sources, **custom_ops.cpu_build_kwargs())
+        except:
+            warnings.warn('Failed to build CPU kernels for upfirdn2d. Falling back to slow reference implementation. Details:\n\n' + traceback.format_exc())
+    return _cpu_plugin is not None
+
 def _parse_scaling(scaling):
     if isinstance(scaling, int):
         scaling = [scaling, scaling]
@@ -153,6 +167,8 @@ def upfirdn2d(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1, impl='cu
         flip_filter: False = convolution, True = correlation (default: False).
         gain:        Overall scaling factor for signal magnitude (default: 1).
         impl:        Implementation to use. Can be `'ref'` or `'cuda'` (default: `'cuda'`).
+                     For CPU tensors, `'cuda'` selects the native CPU kernels when
+                     no gradients are required.
 
     Returns:
         Tensor of the shape `[batch_size, num_channels, out_height, out_width]`.
@@ -161,8 +177,16 @@ def upfirdn2d(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1, impl='cu
     assert impl in ['ref', 'cuda']
     if impl == 'cuda' and x.device.type == 'cuda' and _init():
         return _upfirdn2d_cuda(up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain).apply(x, f)
+    if impl == 'cuda' and x.device.type == 'cpu' and not _requires_grad(x) and _init_cpu():
+        return _upfirdn2d_cpu(x, f, up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain)
     return _upfirdn2d_ref(x, f, up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain)
 
+def _requires_grad(x):
+    # The native CPU kernels are opaque to autograd and to the JIT tracer.
+    if torch.jit.is_tracing():
+        return True
+    return torch.is_grad_enabled() and x.requires_grad
+
 #----------------------------------------------------------------------------
 
 @misc.profiled_function
@@ -269,6 +293,29 @@ def _upfirdn2d_cuda(up=1, down=1, padding=0, flip_filter=False, gain=1):
 
 #----------------------------------------------------------------------------
 
+@misc.profiled_function
+def _upfirdn2d_cpu(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1):
+    """Fast CPU implementation of `upfirdn2d()` using custom ops. Forward pass only.
+    """
+    # Validate arguments.
+    assert isinstance(x, torch.Tensor) and x.ndim == 4
+    if f is None:
+        f = torch.ones([1, 1], dtype=torch.float32, device=x.device)
+    assert isinstance(f, torch.Tensor) and f.ndim in [1, 2]
+    assert f.dtype == torch.float32 and not f.requires_grad
+    upx, upy = _parse_scaling(up)
+    downx, downy = _parse_scaling(down)
+    padx0, padx1, pady0, pady1 = _parse_padding(padding)
+
+    # Separable filters are applied as two 1D passes, like the CUDA version.
+    if f.ndim == 2:
+        return _cpu_plugin.upfirdn2d(x, f, upx, upy, downx, downy, padx0, padx1, pady0, pady1, flip_filter, gain)
+    x = _cpu_plugin.upfirdn2d(x, f.unsqueeze(0), upx, 1, downx, 1, padx0, padx1, 0, 0, flip_filter, np.sqrt(gain))
+    x = _cpu_plugin.upfirdn2d(x, f.unsqueeze(1), 1, upy, 1, downy, 0, 0, pady0, pady1, flip_filter, np.sqrt(gain))
+    return x
+
+#----------------------------------------------------------------------------
+
 def filter2d(x, f, padding=0, flip_filter=False, gain=1, impl='cuda'):
     r"""Filter a batch of 2D images using the given 2D FIR filter.
 
@@ -0,0 +1,133 @@
+// CPU implementation of the upfirdn2d() op (forward pass only).
+//
+// Instead of materializing the zero-stuffed and padded intermediate image
+// like the reference implementation, every output pixel only visits the
+// filter taps that land on actual input pixels. The arguments are identical
+// to the CUDA version in upfirdn2d.cpp.
+
+#include <torch/extension.h>
+#include <ATen/Parallel.h>
+#include <vector>
+
+//------------------------------------------------------------------------
+// Filter taps that contribute to one output coordinate: the first tap index
+// `k0` in the (flipped) filter, the corresponding input coordinate `i0`, and
+// the number of taps. Consecutive taps advance the filter by `up` and the
+// input by one.
+
+struct tap_range
+{
+    int k0;
+    int i0;
+    int count;
+};
+
+static std::vector<tap_range> compute_tap_ranges(int outSize, int inSize, int filterSize, int up, int down, int pad0)
+{
+    std::vector<tap_range> ranges(outSize);
+    for (int o = 0; o < outSize; o++)
+    {
+        int mid = o * down - pad0;                      // position in the upsampled + padded image
+        int start = (mid > 0) ? mid : 0;
+        int s = ((start + up - 1) / up) * up;           // first non-zero (upsampled) position
+        tap_range r;
+        r.k0 = s - mid;
+        r.i0 = s / up;
+        int numK = (r.k0 < filterSize) ? (filterSize - 1 - r.k0) / up + 1 : 0;
+        int numI = (r.i0 < inSize) ? inSize - r.i0 : 0;
+        r.count = (numK < numI) ? numK : numI;
+        ranges[o] = r;
+    }
+    return ranges;
+}
+
+//------------------------------------------------------------------------
+
+template <class T> static void upfirdn2d_kernel(
+    const T* x, const float* w, T* y,
+    int64_t numPlanes, int64_t channels, int64_t sN, int64_t sC, int64_t sH, int64_t sW,
+    int outH, int outW, int fw, int upx, int upy,
+    const std::vector<tap_range>& rx, const std::vector<tap_range>& ry)
+{
+    const int64_t numRows = numPlanes * outH;
+    const int64_t grain = std::max<int64_t>(1, 4096 / std::max(outW, 1));
+    at::parallel_for(0, numRows, grain, [&](int64_t begin, int64_t end)
+    {
+        for (int64_t row = begin; row < end; row++)
+        {
+            int64_t plane = row / outH;
+            int oy = (int)(row % outH);
+            const T* xp = x + (plane / channels) * sN + (plane % channels) * sC;
+            T* yp = y + row * outW;
+            const tap_range& ty = ry[oy];
+            for (int ox = 0; ox < outW; ox++)
+            {
+                const tap_range& tx = rx[ox];
+                T acc = 0;
+                for (int j = 0; j < ty.count; j++)
+                {
+                    const T* xr = xp + (ty.i0 + j) * sH + tx.i0 * sW;
+                    const float* wr = w + (ty.k0 + j * upy) * fw + tx.k0;
+                    for (int i = 0; i < tx.count; i++)
+                        acc += xr[i * sW] * (T)wr[i * upx];
+                }
+                yp[ox] = acc;
+            }
+        }
+    });
+}
+
+//------------------------------------------------------------------------
+
+static torch::Tensor upfirdn2d(torch::Tensor x, torch::Tensor f, int upx, int upy, int downx, int downy, int padx0, int padx1, int pady0, int pady1, bool flip, float gain)
+{
+    // Validate arguments.
+    TORCH_CHECK(x.device().is_cpu(), "x must reside on CPU");
+    TORCH_CHECK(f.device() == x.device(), "f must reside on the same device as x");
+    TORCH_CHECK(f.dtype() == torch::kFloat, "f must be float32");
+    TORCH_CHECK(x.dim() == 4, "x must be rank 4");
+    TORCH_CHECK(f.dim() == 2, "f must be rank 2");
+    TORCH_CHECK(f.size(0) >= 1 && f.size(1) >= 1, "f must be at least 1x1");
+    TORCH_CHECK(upx >= 1 && upy >= 1, "upsampling factor must be at least 1");
+    TORCH_CHECK(downx >= 1 && downy >= 1, "downsampling factor must be at least 1");
+
+    // Create output tensor.
+    int inW = (int)x.size(3);
+    int inH = (int)x.size(2);
+    int fw = (int)f.size(1);
+    int fh = (int)f.size(0);
+    int outW = (inW * upx + padx0 + padx1 - fw + downx) / downx;
+    int outH = (inH * upy + pady0 + pady1 - fh + downy) / downy;
+    TORCH_CHECK(outW >= 1 && outH >= 1, "output must be at least 1x1");
+    torch::Tensor y = torch::empty({x.size(0), x.size(1), outH, outW}, x.options());
+
+    // Setup filter: flip into correlation order and fold in the gain, which
+    // matches the reference implementation.
+    torch::Tensor fc = f.contiguous();
+    const float* fp = fc.data_ptr<float>();
+    std::vector<float> w(fh * fw);
+    for (int ky = 0; ky < fh; ky++)
+        for (int kx = 0; kx < fw; kx++)
+            w[ky * fw + kx] = fp[(flip ? ky : fh - 1 - ky) * fw + (flip ? kx : fw - 1 - kx)] * gain;
+
+    std::vector<tap_range> rx = compute_tap_ranges(outW, inW, fw, upx, downx, padx0);
+    std::vector<tap_range> ry = compute_tap_ranges(outH, inH, fh, upy, downy, pady0);
+
+    AT_DISPATCH_FLOATING_TYPES(x.scalar_type(), "upfirdn2d_cpu", [&]
+    {
+        upfirdn2d_kernel<scalar_t>(
+            x.data_ptr<scalar_t>(), w.data(), y.data_ptr<scalar_t>(),
+            x.size(0) * x.size(1), x.size(1), x.stride(0), x.stride(1), x.stride(2), x.stride(3),
+            outH, outW, fw, upx, upy, rx, ry);
+    });
+    return y;
+}
+
+//------------------------------------------------------------------------
+
+PYBIND11_MODULE(TORCH_EXTENSION_NAME, m)
+{
+    m.def("upfirdn2d", &upfirdn2d);
+}
+
+//------------------------------------------------------------------------
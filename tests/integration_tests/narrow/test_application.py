@@ -9,6 +9,7 @@ from pydantic import BaseModel
 from app.core.config import IMAGE_STORAGE_BASE_URL
 from app.db.mongodb import delete_all_user_images_from_mongodb
 from app.db.redisdb import get_redis_ratelimit_config
+from app.db.storage import storage_backend
 from app.schemas.stylegan2ada import Generation, StyleMix
 from app.schemas.stylegan_methods import StyleGanMethod
 from app.schemas.stylegan_models import Model
@@ -26,19 +27,11 @@ async def test_application_with_test_client_and_local_dbs(
     result = await delete_all_user_images_from_mongodb(mongodb.client, "007")
     result = await delete_all_user_images_from_mongodb(mongodb.client, "008")
 
-    # Stub upload to google cloud storage
-    def override_upload_blob_to_gcs(bucket_name, image, image_id: str = None):
-        if not image_id:
-            image_id = "this_is_hex_uid"
-        return image_id
+    # Stub the upload to the storage backend
+    mocker.patch.object(storage_backend, "upload")
 
-    mocker.patch(
-        "app.schemas.stylegan_user.upload_blob_to_gcs",
-        side_effect=override_upload_blob_to_gcs,
-    )
-
-    # Stub download from google cloud storage
-    def override_download_blob_from_gcs(bucket_name, image_id):
+    # Stub the download from the storage backend
+    def override_download(bucket_name, key):
         with open(
             "tests/unit_tests/test_stylegan/assertion_files/save_vector_as_bytes_assertion_result.txt",
             "rb",
@@ -46,10 +39,7 @@ async def test_application_with_test_client_and_local_dbs(
             w_bytes_value = f.read()
         return w_bytes_value
 
-    mocker.patch(
-        "app.schemas.stylegan_user.download_blob_from_gcs",
-        side_effect=override_download_blob_from_gcs,
-    )
+    mocker.patch.object(storage_backend, "download", side_effect=override_download)
 
     # Mock image data by freezing image creation time for easier assertion
     class ImageData(BaseModel):
@@ -64,9 +54,11 @@ async def test_application_with_test_client_and_local_dbs(
     mocker.patch("app.schemas.stylegan_user.ImageData", side_effect=return_image)
 
     # Create assertion response
-    stylegan2ada_models = os.listdir("stylegan2_ada_models/")
+    stylegan2ada_models = sorted(os.listdir("stylegan2_ada_models/"))
     stylegan2ada_models = [
-        Model.from_filename(x, "stylegan2_ada_models/") for x in stylegan2ada_models
+        Model.from_filename(x, "stylegan2_ada_models/")
+        for x in stylegan2ada_models
+        if x.endswith(".pkl")
     ]
 
     assertion_resp = {
@@ -5,7 +5,13 @@ import pytest
 from pydantic import BaseModel
 
 from app.core.config import REDIS_URL
-from app.db.redisdb import check_user_ratelimit, redisdb
+from app.db.redisdb import (
+    check_user_ratelimit,
+    get_user_images_from_redisdb,
+    invalidate_user_images_in_redisdb,
+    redisdb,
+    save_user_images_in_redisdb,
+)
 
 
 @pytest.mark.asyncio
@@ -41,3 +47,41 @@ async def test_redisdb():
     assert is_ratelimited == (MockAuth0User(id="222"), False)
 
     await redis_client.close()
+
+
+@pytest.mark.asyncio
+async def test_redisdb_user_images():
+    """Test the cache of the user image listings against a local instance of Redis."""
+    redis_client = aioredis.from_url(REDIS_URL)
+    await redis_client.delete("user_images:333")
+
+    async def get_listing():
+        return '[{"url": "url1"}]'
+
+    # Not cached
+    assert await get_user_images_from_redisdb(redis_client, "333") is None
+    listing = await save_user_images_in_redisdb(redis_client, "333", get_listing)
+    assert listing == '[{"url": "url1"}]'
+    assert await get_user_images_from_redisdb(redis_client, "333") == listing
+
+    # Pages are cached next to each other and expire together
+    assert await get_user_images_from_redisdb(redis_client, "333", 1, 10) is None
+    await save_user_images_in_redisdb(redis_client, "333", get_listing, 1, 10, ttl=100)
+    assert await get_user_images_from_redisdb(redis_client, "333", 1, 10) == listing
+    assert await get_user_images_from_redisdb(redis_client, "333") == listing
+    assert 100 < await redis_client.ttl("user_images:333")
+
+    # Invalidated
+    await invalidate_user_images_in_redisdb(redis_client, "333")
+    assert await get_user_images_from_redisdb(redis_client, "333") is None
+    assert await get_user_images_from_redisdb(redis_client, "333", 1, 10) is None
+
+    # Not cached if the images change while the listing is read
+    async def get_changing_listing():
+        await invalidate_user_images_in_redisdb(redis_client, "333")
+        return '[{"url": "url1"}]'
+
+    await save_user_images_in_redisdb(redis_client, "333", get_changing_listing)
+    assert await get_user_images_from_redisdb(redis_client, "333") is None
+
+    await redis_client.close()
@@ -0,0 +1,24 @@
+import uuid
+
+import pytest
+
+from app.db.storage import S3Storage
+
+
+def test_s3_storage():
+    """Test the S3 storage backend against a local MinIO instance (see the README)."""
+    storage = S3Storage("http://localhost:9000")
+    bucket = f"cp-testing-{uuid.uuid4().hex[:8]}"
+    storage.client.create_bucket(Bucket=bucket)
+    try:
+        storage.upload(bucket, "key1", b"image", "image/jpeg")
+        storage.upload(bucket, "key2", b"vector", "application/octet-stream")
+        assert storage.download(bucket, "key1") == b"image"
+        head = storage.client.head_object(Bucket=bucket, Key="key1")
+        assert head["ContentType"] == "image/jpeg"
+
+        storage.delete(bucket, ["key1", "key2", "missing"])
+        with pytest.raises(FileNotFoundError):
+            storage.download(bucket, "key1")
+    finally:
+        storage.client.delete_bucket(Bucket=bucket)
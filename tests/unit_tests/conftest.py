@@ -1,11 +1,14 @@
 import datetime
+import json
 
 import pytest
+from fastapi.encoders import jsonable_encoder
 from fastapi.testclient import TestClient
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 
 from app.core.auth0 import auth
+from app.core.config import IMAGE_STORAGE_BASE_URL
 from app.db.mongodb import mongodb
 from app.db.redisdb import check_user_ratelimit
 from app.main import get_app
@@ -65,19 +68,54 @@ def test_authenticated_client():
                 self.stylegan_method_options = stylegan_method_options
                 self.result = {}
 
-            def style_mix_images(self):
+            async def style_mix_images(self):
                 self.result = {
                     "result_image": "111111111111111",
                     "row_image": "2222222222222",
                     "col_image": "3333333333333",
                 }
 
-            def generate_image(self):
+            async def style_mix_grid(self):
+                self.result = {
+                    "result_image_0_0": "111111111111111",
+                    "result_image_0_1": "2222222222222",
+                    "image_keys": {"result_image_0_0": "1a1a1a", "result_image_0_1": "2b2b2b"},
+                }
+                return "5555555555555"
+
+            async def generate_image(self):
                 self.result = {"result_image": "111111111111111"}
 
+            async def truncation_sweep(self):
+                return {
+                    "result_image_0": "data:image/jpeg;base64,MTExMQ==",
+                    "result_image_1": "data:image/jpeg;base64,MjIyMg==",
+                }
+
+            async def check_edit_directions(self):
+                return ["direction"]
+
+            async def edit_image(self):
+                self.result = {
+                    "result_image_0": "111111111111111",
+                    "result_image_1": "2222222222222",
+                }
+
             async def save_user_images(self):
                 return self.result
 
+            async def render_interpolation_video(self):
+                return {"video_key": "4444444444444_mp4", "frames": 61}
+
+            async def find_similar_images(self):
+                return [
+                    {
+                        "id": "c31ad1323ed648feb93cd7398fcf1894",
+                        "image_key": "1111111111111111",
+                        "similarity": 0.9,
+                    }
+                ]
+
             async def get_user_images(self):
                 return [
                     ImageData(
@@ -122,6 +160,15 @@ def test_authenticated_client():
                     ),
                 ]
 
+            async def get_user_images_json(self, offset=0, limit=None):
+                images = (await self.get_user_images())[offset:]
+                return json.dumps(
+                    {
+                        "image_url_prefix": IMAGE_STORAGE_BASE_URL,
+                        "image_ids": jsonable_encoder(images[:limit]),
+                    }
+                )
+
             async def delete_user_images(self, deletion_options):
                 return True
 
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.admission import AdmissionController
+
+
+def test_estimated_wait():
+    """Unit test that the wait is only predicted once all slots are busy."""
+    controller = AdmissionController(concurrency=2, max_wait=10)
+    controller.running = 2
+    assert controller.estimated_wait() == 0
+
+    controller.service_time = 3
+    assert controller.estimated_wait() == 1.5
+    controller.queued = 3
+    assert controller.estimated_wait() == 6
+
+    controller.running = 1
+    assert controller.estimated_wait() == 0
+
+
+@pytest.mark.asyncio
+async def test_run():
+    """Unit test that admitted calls run in the threadpool and update the service time."""
+    controller = AdmissionController(concurrency=1, max_wait=10)
+    assert await controller.run(lambda x: x * 2, 21) == 42
+    assert controller.service_time is not None
+    assert controller.running == controller.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_run_rejects_when_busy():
+    """Unit test that calls are rejected with 503 and Retry-After if the predicted wait is too long."""
+    controller = AdmissionController(concurrency=1, max_wait=1)
+    controller.service_time = 2.5
+    release = asyncio.Event()
+
+    async def hold():
+        await controller._get_semaphore().acquire()
+        controller.running += 1
+        await release.wait()
+        controller.running -= 1
+        controller._get_semaphore().release()
+
+    task = asyncio.ensure_future(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as e:
+        await controller.run(lambda: None)
+    assert e.value.status_code == 503
+    assert e.value.headers["Retry-After"] == "3"
+    assert controller.rejected == 1
+
+    release.set()
+    await task
+    await controller.run(lambda: None)
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials, SecurityScopes
+from fastapi_auth0.auth import Auth0UnauthorizedException
+from jose import jwt
+
+from app.core.auth0 import CachedAuth0
+from app.core.config import AUTH0_JWKS_MIN_REFRESH_INTERVAL
+from loadtest.fakes import LocalJWTIssuer
+
+use_all = SecurityScopes(["use:all"])
+
+
+def bearer(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.fixture
+def issuer():
+    """Return a local JWT issuer."""
+    return LocalJWTIssuer("cp-test.eu.auth0.com", "https://cp-test/api", key_size=1024)
+
+
+@pytest.fixture
+def cached_auth(mocker, issuer):
+    """Return a CachedAuth0 client that trusts the local issuer."""
+    mocker.patch("requests.get", return_value=mocker.Mock(**{"json.return_value": issuer.jwks}))
+    return CachedAuth0(domain=issuer.domain, api_audience=issuer.audience)
+
+
+@pytest.mark.asyncio
+async def test_get_user_caches_verified_tokens(cached_auth, issuer, mocker):
+    """Unit test that a token is only verified once and its scopes are still checked."""
+    token = issuer.issue_token("auth0|007")
+    decode = mocker.spy(jwt, "decode")
+
+    user = await cached_auth.get_user(use_all, bearer(token))
+    assert user.id == "auth0|007"
+    assert await cached_auth.get_user(use_all, bearer(token)) is user
+    assert decode.call_count == 1
+
+    with pytest.raises(Auth0UnauthorizedException):
+        await cached_auth.get_user(SecurityScopes(["admin:profile"]), bearer(token))
+
+    # Tokens are verified again after they expired in the cache.
+    expires_at = jwt.get_unverified_claims(token)["exp"]
+    mocker.patch("app.core.auth0.time.time", return_value=expires_at + 1)
+    await cached_auth.get_user(use_all, bearer(token))
+    assert decode.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_get_user_refreshes_rotated_keys_once(cached_auth, mocker):
+    """Unit test that concurrent tokens of a rotated key share one JWKS fetch."""
+    rotated_issuer = LocalJWTIssuer(cached_auth.domain, cached_auth.audience, key_size=1024)
+    fetch = mocker.patch(
+        "requests.get", return_value=mocker.Mock(**{"json.return_value": rotated_issuer.jwks})
+    )
+    cached_auth.jwks_attempted_at -= AUTH0_JWKS_MIN_REFRESH_INTERVAL
+
+    tokens = [rotated_issuer.issue_token(f"auth0|{i}") for i in range(3)]
+    users = await asyncio.gather(*[cached_auth.get_user(use_all, bearer(token)) for token in tokens])
+    assert [user.id for user in users] == ["auth0|0", "auth0|1", "auth0|2"]
+    assert fetch.call_count == 1
@@ -0,0 +1,74 @@
+from app.core.autotune import (
+    CpuTopology,
+    WorkerConfig,
+    cpu_quota,
+    default_config,
+    load_config,
+    override_config,
+    physical_cores,
+    save_config,
+    worker_cpus,
+)
+
+
+def test_cpu_quota(tmpdir):
+    """Unit test reading the cgroup v2 and v1 CPU quotas."""
+    assert cpu_quota(str(tmpdir)) is None
+
+    tmpdir.mkdir("cpu").join("cpu.cfs_quota_us").write("150000\n")
+    tmpdir.join("cpu", "cpu.cfs_period_us").write("100000\n")
+    assert cpu_quota(str(tmpdir)) == 1.5
+
+    tmpdir.join("cpu.max").write("max 100000\n")
+    assert cpu_quota(str(tmpdir)) is None
+    tmpdir.join("cpu.max").write("400000 100000\n")
+    assert cpu_quota(str(tmpdir)) == 4
+
+
+def test_physical_cores(tmpdir):
+    """Unit test grouping hyperthreads by their physical core."""
+    for cpu, core in [(0, 0), (1, 1), (2, 0), (3, 1)]:
+        topology = tmpdir.mkdir(f"cpu{cpu}").mkdir("topology")
+        topology.join("physical_package_id").write("0\n")
+        topology.join("core_id").write(f"{core}\n")
+    assert physical_cores([0, 1, 2, 3], str(tmpdir)) == [[0, 2], [1, 3]]
+    # Unknown topologies count every CPU as a core.
+    assert physical_cores([4, 5], str(tmpdir)) == [[4], [5]]
+
+
+def test_default_config_and_pinning():
+    """Unit test that the workers use every usable core once."""
+    topology = CpuTopology(cpus=list(range(16)), cores=[[i, i + 8] for i in range(8)])
+    config = default_config(topology)
+    assert (config.workers, config.threads) == (2, 4)
+    assert worker_cpus(topology, config, 1) == [4, 12, 5, 13, 6, 14, 7, 15]
+
+    quota_topology = CpuTopology(cpus=topology.cpus, cores=topology.cores, quota=2.5)
+    config = default_config(quota_topology)
+    assert (config.workers, config.threads, config.pin) == (1, 2, False)
+
+
+def test_override_config():
+    """Unit test that fixed workers or threads split the usable cores by the other one."""
+    topology = CpuTopology(cpus=list(range(8)), cores=[[i] for i in range(8)])
+    config = WorkerConfig(workers=2, threads=4, pin=True, images_per_sec=10)
+    assert override_config(topology, config) == config
+
+    assert override_config(topology, config, workers=4) == WorkerConfig(workers=4, threads=2, pin=True)
+    assert override_config(topology, config, threads=1) == WorkerConfig(workers=8, threads=1, pin=True)
+    # Workers that share cores are not pinned.
+    oversubscribed = override_config(topology, config, workers=16)
+    assert (oversubscribed.workers, oversubscribed.threads, oversubscribed.pin) == (16, 1, False)
+
+
+def test_load_and_save_config(tmpdir):
+    """Unit test that calibrations are saved per machine shape."""
+    path = str(tmpdir.join("autotune.json"))
+    topology = CpuTopology(cpus=[0, 1, 2, 3], cores=[[0], [1], [2], [3]])
+    assert load_config(topology, path) == default_config(topology)
+
+    calibrated = WorkerConfig(workers=4, threads=1, images_per_sec=12.5)
+    save_config(topology, calibrated, path)
+    assert load_config(topology, path) == calibrated
+    other_topology = CpuTopology(cpus=[0, 1], cores=[[0], [1]])
+    assert load_config(other_topology, path) == default_config(other_topology)
@@ -0,0 +1,47 @@
+from app.core.cache import LRUCache
+
+
+def test_lru_cache_max_entries():
+    """Unit test the eviction of the least recently used entries."""
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.get("b", "default") == "default"
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_lru_cache_max_size():
+    """Unit test the eviction by the total size of the entries."""
+    cache = LRUCache(max_size=10, sizeof=len)
+    cache.set("a", "12345")
+    cache.set("b", "1234")
+    assert cache.size == 9
+
+    cache.set("c", "123")
+    assert "a" not in cache
+    assert cache.size == 7
+
+    # Replacing an entry updates the size
+    cache.set("b", "1")
+    assert cache.size == 4
+
+    # Entries larger than the maximum size are not cached
+    cache.set("d", "12345678901")
+    assert "d" not in cache
+
+    assert cache.pop("b") == "1"
+    assert cache.size == 3
+    cache.set("e", "1")
+    cache.discard(lambda key: key == "c")
+    assert "c" not in cache and "e" in cache
+    assert cache.size == 1
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.size == 0
@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.core.latent_index import LatentIndex
+
+
+def test_latent_index_search():
+    """Unit test the cosine similarity search."""
+    index = LatentIndex(dim=3)
+    index.add(["x", "y", "xy"], np.array([[1, 0, 0], [0, 2, 0], [1, 1, 0]]))
+    assert len(index) == 3
+
+    results = index.search(np.array([2, 0, 0]), 2)
+    assert [image_id for image_id, _ in results] == ["x", "xy"]
+    assert np.allclose([similarity for _, similarity in results], [1, np.sqrt(0.5)])
+
+    # The query image is not its own neighbour
+    assert [image_id for image_id, _ in index.search(index.vector("x"), 5, exclude="x")] == ["xy", "y"]
+    assert index.search(np.array([1, 0, 0]), 0) == []
+
+
+def test_latent_index_add_and_remove():
+    """Unit test the incremental inserts and deletes."""
+    index = LatentIndex(dim=2)
+    vectors = np.random.RandomState(0).randn(40, 2)
+    index.add([str(i) for i in range(40)], vectors)
+    # Ids that are already in the index are skipped
+    index.add(["0", "new", "new"], np.array([[0, 1], [1, 0], [0, 1]]))
+    assert len(index) == 41
+    assert np.allclose(index.vector("new"), [1, 0])
+
+    index.remove(["0", "5", "not in the index"])
+    assert len(index) == 39 and "5" not in index and index.vector("5") is None
+    # The moved rows keep their vectors
+    for image_id in index.ids:
+        expected = vectors[int(image_id)] if image_id != "new" else np.array([1, 0])
+        assert np.allclose(index.vector(image_id), expected / np.linalg.norm(expected), atol=1e-6)
+    assert "new" in {image_id for image_id, _ in index.search(np.array([1, 0]), 39)}
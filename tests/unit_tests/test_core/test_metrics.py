@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from app.core.metrics import Counter, Gauge, Histogram, Registry, mark_process_dead
+
+
+def test_histogram():
+    """Unit test that histogram observations are rendered as cumulative buckets."""
+    registry = Registry()
+    histogram = Histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1), registry=registry)
+    for value in [0.05, 0.5, 2]:
+        histogram.observe(value, "mapping")
+    with histogram.time("synthesis"):
+        pass
+
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{stage="mapping",le="0.1"} 1.0' in lines
+    assert 'latency_seconds_bucket{stage="mapping",le="1.0"} 2.0' in lines
+    assert 'latency_seconds_bucket{stage="mapping",le="+Inf"} 3.0' in lines
+    assert 'latency_seconds_sum{stage="mapping"} 2.55' in lines
+    assert 'latency_seconds_count{stage="mapping"} 3.0' in lines
+    assert 'latency_seconds_count{stage="synthesis"} 1.0' in lines
+
+
+def test_counter_and_gauge():
+    """Unit test counters, gauges and metrics that are read from a function."""
+    registry = Registry()
+    counter = Counter("images_total", "Images.", ("model",), registry=registry)
+    counter.inc(2, "img31res256fid12.pkl")
+    counter.inc(1, "img31res256fid12.pkl")
+    gauge = Gauge("queue_depth", "Queue depth.", registry=registry)
+    Counter("hits_total", "Hits.", ("cache",), function=lambda: {("block",): 7}, registry=registry)
+
+    with gauge.track_inprogress():
+        assert "queue_depth 1.0" in registry.render().splitlines()
+    lines = registry.render().splitlines()
+    assert "queue_depth 0.0" in lines
+    assert 'images_total{model="img31res256fid12.pkl"} 3.0' in lines
+    assert 'hits_total{cache="block"} 7.0' in lines
+
+    with pytest.raises(ValueError):
+        Gauge("queue_depth", "Duplicate.", registry=registry)
+
+
+def test_multiprocess_registry(tmp_path):
+    """Unit test that the metrics of all workers are merged and the gauges of exited workers are dropped."""
+    registries = []
+    for images in [1, 2]:
+        registry = Registry(str(tmp_path))
+        Counter("images_total", "Images.", registry=registry).inc(images)
+        Gauge("queue_depth", "Queue depth.", registry=registry).set(images)
+        registries.append(registry)
+    registries[0].write_snapshot(pid=1)
+
+    lines = registries[1].render().splitlines()
+    assert "images_total 3.0" in lines
+    assert 'queue_depth{worker="1"} 1.0' in lines
+    assert f'queue_depth{{worker="{os.getpid()}"}} 2.0' in lines
+
+    mark_process_dead(1, str(tmp_path))
+    lines = registries[1].render().splitlines()
+    assert "images_total 3.0" in lines
+    assert 'queue_depth{worker="1"} 1.0' not in lines
@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.model_catalog import CatalogSnapshot, ModelCatalog, load_replaced_model
+from app.schemas.stylegan2ada import StyleGan2ADA
+from app.schemas.stylegan_models import Model
+
+model_1 = Model(img=31, res=256, fid=12, version="stylegan2_ada")
+model_2 = Model(img=40, res=256, fid=10, version="stylegan2_ada")
+model_3 = Model(img=50, res=512, fid=8, version="stylegan2_ada")
+
+
+class MockModelCollection:
+    def __init__(self, models):
+        self.path = "stylegan2_ada_models/"
+        self.models = models
+        self.files = models
+
+    def create_models(self):
+        return self.files
+
+
+def test_catalog_snapshot_version():
+    """Unit test that the catalog version only depends on the advertised models."""
+    assert CatalogSnapshot([model_1]).etag == CatalogSnapshot([model_1.copy()]).etag
+    assert CatalogSnapshot([model_1]).etag != CatalogSnapshot([model_1, model_2]).etag
+
+
+@pytest.mark.asyncio
+async def test_reload(mocker):
+    """Unit test that new models are warmed before they are advertised and removed models are retired."""
+    warm = mocker.patch("app.core.model_catalog.run_in_threadpool")
+    clear_caches = mocker.patch("app.core.model_catalog.clear_model_caches")
+    unload_directions = mocker.patch("app.core.model_catalog.unload_edit_directions")
+    mocker.patch.dict(StyleGan2ADA.loaded_models, clear=True)
+    collection = MockModelCollection([model_1, model_2])
+    catalog = ModelCatalog(collection)
+    snapshot = catalog.snapshot
+
+    # Nothing changed
+    await catalog.reload()
+    assert catalog.snapshot is snapshot
+    warm.assert_not_called()
+
+    # model_3 is added and model_2 is removed
+    StyleGan2ADA.loaded_models[model_2.copy(update={"version": "StyleGan2ADA"})] = "G"
+    collection.files = [model_1, model_3]
+    await catalog.reload()
+    warm.assert_called_once_with(StyleGan2ADA, model_3, None)
+    assert collection.models == [model_1, model_3]
+    assert catalog.snapshot.models == [model_1, model_3]
+    assert catalog.snapshot.etag != snapshot.etag
+    assert StyleGan2ADA.loaded_models == {}
+    clear_caches.assert_called_once_with(model_2.filename)
+    unload_directions.assert_called_once_with(model_2.filename)
+
+
+def test_load_replaced_model(mocker):
+    """Unit test that only the new weights of a replaced pkl file are loaded."""
+    mocker.patch("app.core.model_catalog.pkl_digest", return_value="new")
+    load = mocker.patch("app.core.model_catalog.load_model_from_pkl_stylegan2ada", return_value="G")
+    mocker.patch(
+        "app.core.model_catalog.load_inference_model",
+        side_effect=lambda folder_path, model, G: f"inference {G}",
+    )
+    unchanged = SimpleNamespace(cache_key=(model_1.filename, "new"))
+    assert load_replaced_model("folder", model_1, unchanged) is None
+    load.assert_not_called()
+
+    replaced = SimpleNamespace(cache_key=(model_1.filename, "old"))
+    assert load_replaced_model("folder", model_1, replaced) == "inference G"
+    load.assert_called_once_with("folder", model_1)
+
+
+@pytest.mark.asyncio
+async def test_reload_replaced_model(mocker):
+    """Unit test that a model replaced under the same filename is swapped and its caches are cleared."""
+    load = mocker.patch("app.core.model_catalog.run_in_threadpool", return_value="new G")
+    clear_caches = mocker.patch("app.core.model_catalog.clear_model_caches")
+    unload_directions = mocker.patch("app.core.model_catalog.unload_edit_directions")
+    mocker.patch.dict(StyleGan2ADA.loaded_models, clear=True)
+    key = model_1.copy(update={"version": "StyleGan2ADA"})
+    StyleGan2ADA.loaded_models[key] = "G"
+    collection = MockModelCollection([model_1, model_2])
+    catalog = ModelCatalog(collection)
+    snapshot = catalog.snapshot
+
+    # Only the weights of changed files are compared.
+    await catalog.reload({model_2.filename})
+    load.assert_not_called()
+
+    await catalog.reload({model_1.filename})
+    load.assert_called_once_with(load_replaced_model, StyleGan2ADA.folder_path, model_1, "G")
+    assert StyleGan2ADA.loaded_models[key] == "new G"
+    assert catalog.snapshot is snapshot
+    clear_caches.assert_called_once_with(model_1.filename)
+    unload_directions.assert_called_once_with(model_1.filename)
+
+    # The weights did not change
+    load.return_value = None
+    clear_caches.reset_mock()
+    await catalog.reload()
+    assert StyleGan2ADA.loaded_models[key] == "new G"
+    clear_caches.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_reload_failed_warmup(mocker):
+    """Unit test that models that cannot be loaded (e.g. incomplete files) are not advertised."""
+    mocker.patch("app.core.model_catalog.run_in_threadpool", side_effect=EOFError("incomplete"))
+    collection = MockModelCollection([model_1])
+    catalog = ModelCatalog(collection)
+
+    collection.files = [model_1, model_2]
+    await catalog.reload()
+    assert collection.models == [model_1]
+    assert catalog.snapshot.models == [model_1]
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_do():
+    """Unit test that overlapping calls with the same key share one call."""
+    flights = SingleFlight()
+    calls = []
+
+    async def call(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(
+        flights.do("a", lambda: call(1)),
+        flights.do("a", lambda: call(2)),
+        flights.do("b", lambda: call(3)),
+    )
+    assert results == [1, 1, 3]
+    assert calls == [1, 3]
+    assert flights.coalesced == 1
+
+    # Finished calls are forgotten.
+    await asyncio.sleep(0)
+    assert len(flights) == 0
+    assert await flights.do("a", lambda: call(4)) == 4
+
+
+@pytest.mark.asyncio
+async def test_do_exception():
+    """Unit test that the exception of a shared call is raised for every caller."""
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    results = await asyncio.gather(
+        flights.do("a", fail), flights.do("a", fail), return_exceptions=True
+    )
+    assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+
+import pytest
+
+import app
+from app.core.cache import LRUCache
+from app.db.blob_storage import content_key, load_blob, release_blobs, save_blob, save_file_blob
+from tests.unit_tests.conftest import mongodb_client
+
+
+@pytest.mark.asyncio
+async def test_save_blob(mocker):
+    """Unit test that blobs are named by their content and only uploaded until an upload is done."""
+    mocker.patch("app.db.blob_storage.storage_backend")
+    mocker.patch(
+        "app.db.blob_storage.increment_blob_references_in_mongodb",
+        side_effect=[
+            {"refs": 1, "uploaded": False},
+            {"refs": 2, "uploaded": True},
+            # A count from before uploads were tracked
+            {"refs": 3},
+        ],
+    )
+    mark_uploaded = mocker.patch("app.db.blob_storage.mark_blob_uploaded_in_mongodb")
+
+    key = await save_blob(mongodb_client, "bucket", b"image", "image/jpeg")
+    assert key == content_key(b"image") == hashlib.sha256(b"image").hexdigest()
+    assert await save_blob(mongodb_client, "bucket", b"image", "image/jpeg") == key
+    assert await save_blob(mongodb_client, "bucket", b"image", "image/jpeg") == key
+    app.db.blob_storage.storage_backend.upload.assert_called_once_with(
+        "bucket", key, b"image", "image/jpeg"
+    )
+    mark_uploaded.assert_called_once_with(mongodb_client, "bucket", key)
+
+
+@pytest.mark.asyncio
+async def test_save_blob_not_uploaded(mocker):
+    """Unit test that a reference to a blob whose first upload is not done uploads it as well."""
+    mocker.patch("app.db.blob_storage.storage_backend")
+    mocker.patch(
+        "app.db.blob_storage.increment_blob_references_in_mongodb",
+        side_effect=[{"refs": 1, "uploaded": False}, {"refs": 2, "uploaded": False}],
+    )
+    mocker.patch("app.db.blob_storage.mark_blob_uploaded_in_mongodb")
+
+    await asyncio.gather(*[save_blob(mongodb_client, "bucket", b"image", "image/jpeg") for _ in range(2)])
+    assert app.db.blob_storage.storage_backend.upload.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_save_blob_deleting(mocker):
+    """Unit test that a blob that is being deleted is uploaded again after the deletion."""
+    mocker.patch("app.db.blob_storage.storage_backend")
+    mocker.patch(
+        "app.db.blob_storage.increment_blob_references_in_mongodb",
+        return_value={"refs": 1, "uploaded": False, "deleting": "now"},
+    )
+    get_reference = mocker.patch(
+        "app.db.blob_storage.get_blob_reference_from_mongodb",
+        side_effect=[{"refs": 1, "uploaded": False, "deleting": "now"}, {"refs": 1, "uploaded": False}],
+    )
+    mocker.patch("app.db.blob_storage.mark_blob_uploaded_in_mongodb")
+
+    await save_blob(mongodb_client, "bucket", b"image", "image/jpeg")
+    assert get_reference.call_count == 2
+    app.db.blob_storage.storage_backend.upload.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_save_blob_failed_upload(mocker):
+    """Unit test that the reference of a failed upload is released."""
+    mocker.patch("app.db.blob_storage.storage_backend.upload", side_effect=OSError)
+    mocker.patch(
+        "app.db.blob_storage.increment_blob_references_in_mongodb",
+        return_value={"refs": 1, "uploaded": False},
+    )
+    release = mocker.patch("app.db.blob_storage.release_blobs")
+
+    with pytest.raises(OSError):
+        await save_blob(mongodb_client, "bucket", b"image", "image/jpeg")
+    release.assert_called_once_with(mongodb_client, "bucket", [content_key(b"image")])
+
+
+@pytest.mark.asyncio
+async def test_save_file_blob(mocker, tmp_path):
+    """Unit test that files are named by their content and uploaded from their path."""
+    mocker.patch("app.db.blob_storage.storage_backend")
+    mocker.patch(
+        "app.db.blob_storage.increment_blob_references_in_mongodb",
+        return_value={"refs": 1, "uploaded": False},
+    )
+    mocker.patch("app.db.blob_storage.mark_blob_uploaded_in_mongodb")
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"video")
+
+    key = await save_file_blob(mongodb_client, "bucket", str(path), "video/mp4", suffix="_mp4")
+    assert key == content_key(b"video") + "_mp4"
+    app.db.blob_storage.storage_backend.upload_file.assert_called_once_with(
+        "bucket", key, str(path), "video/mp4"
+    )
+
+
+@pytest.mark.asyncio
+async def test_release_blobs(mocker):
+    """Unit test that only blobs without references are deleted."""
+    mocker.patch("app.db.blob_storage.storage_backend")
+    mocker.patch(
+        "app.db.blob_storage.decrement_blob_references_in_mongodb", side_effect=[2, 0, None, 0]
+    )
+    # The last blob is deleted by another caller
+    mocker.patch("app.db.blob_storage.start_blob_deletion_in_mongodb", side_effect=[True, False])
+    mocker.patch("app.db.blob_storage.delete_unreferenced_blob_from_mongodb", return_value=True)
+    blob_cache = mocker.patch("app.db.blob_storage.blob_cache", LRUCache())
+    blob_cache.set(("bucket", "shared"), b"shared")
+    blob_cache.set(("bucket", "unreferenced"), b"unreferenced")
+
+    await release_blobs(
+        mongodb_client, "bucket", ["shared", "unreferenced", "legacy_id", "deleted_elsewhere"]
+    )
+    app.db.blob_storage.storage_backend.delete.assert_called_once_with(
+        "bucket", ["legacy_id", "unreferenced"]
+    )
+    assert ("bucket", "shared") in blob_cache
+    assert ("bucket", "unreferenced") not in blob_cache
+
+
+@pytest.mark.asyncio
+async def test_release_blobs_referenced_again(mocker):
+    """Unit test that the deletion mark of a blob that was saved again during its deletion is removed."""
+    mocker.patch("app.db.blob_storage.storage_backend")
+    mocker.patch("app.db.blob_storage.decrement_blob_references_in_mongodb", return_value=0)
+    mocker.patch("app.db.blob_storage.start_blob_deletion_in_mongodb", return_value=True)
+    mocker.patch("app.db.blob_storage.delete_unreferenced_blob_from_mongodb", return_value=False)
+    end_deletion = mocker.patch("app.db.blob_storage.end_blob_deletion_in_mongodb")
+
+    await release_blobs(mongodb_client, "bucket", ["key"])
+    end_deletion.assert_called_once_with(mongodb_client, "bucket", "key")
+
+
+@pytest.mark.asyncio
+async def test_load_blob(mocker):
+    """Unit test that blobs are downloaded once and then served from the cache."""
+
+    def mock_download(bucket_name, key):
+        mock_download.calls.append(key)
+        return key.encode()
+
+    mock_download.calls = []
+    mocker.patch("app.db.blob_storage.storage_backend.download", side_effect=mock_download)
+    mocker.patch("app.db.blob_storage.blob_cache", LRUCache(max_size=100, sizeof=len))
+
+    # Concurrent loads share one download
+    assert await asyncio.gather(
+        load_blob("bucket", "vector1"), load_blob("bucket", "vector1"), load_blob("bucket", "vector2")
+    ) == [b"vector1", b"vector1", b"vector2"]
+    assert await load_blob("bucket", "vector1") == b"vector1"
+    assert mock_download.calls == ["vector1", "vector2"]
+
+
+@pytest.mark.asyncio
+async def test_load_blob_redis(mocker):
+    """Unit test that blobs are shared with the other workers through redis if it is enabled."""
+    mocker.patch("app.db.blob_storage.storage_backend.download", return_value=b"vector")
+    mocker.patch("app.db.blob_storage.blob_cache", LRUCache(max_size=0))
+    mocker.patch("app.db.blob_storage.BLOB_CACHE_REDIS_TTL", 60)
+    mocker.patch("app.db.blob_storage.redisdb.client", "redis_client")
+    mocker.patch("app.db.blob_storage.get_blob_from_redisdb", side_effect=[None, b"cached"])
+    mocker.patch("app.db.blob_storage.save_blob_in_redisdb")
+
+    assert await load_blob("bucket", "vector1") == b"vector"
+    app.db.blob_storage.save_blob_in_redisdb.assert_called_once_with(
+        "redis_client", "bucket", "vector1", b"vector"
+    )
+    assert await load_blob("bucket", "vector1") == b"cached"
+    app.db.blob_storage.storage_backend.download.assert_called_once()
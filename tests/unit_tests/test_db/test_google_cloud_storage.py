@@ -1,6 +1,15 @@
+import threading
 import uuid
 
-from app.db.google_cloud_storage import download_blob_from_gcs, upload_blob_to_gcs
+import pytest
+from google.api_core.exceptions import NotFound
+
+from app.db.google_cloud_storage import (
+    delete_blob_from_gcs,
+    download_blob_from_gcs,
+    get_storage_client,
+    upload_blob_to_gcs,
+)
 
 
 # Mock google cloud storage classes
@@ -17,6 +26,13 @@ class Blob:
     def download_as_bytes(self):
         return "bytes_image"
 
+    deleted = []
+
+    def delete(self):
+        if self.bucket_name == "missing":
+            raise NotFound("missing")
+        self.deleted.append(self.bucket_name)
+
 
 class Bucket:
     def __init__(self, bucket_name):
@@ -31,6 +47,26 @@ class Client:
         return Bucket(bucket_name)
 
 
+@pytest.fixture(autouse=True)
+def storage_clients(mocker):
+    """Start every test without the storage clients of the threads."""
+    mocker.patch("app.db.google_cloud_storage._local", threading.local())
+
+
+def test_get_storage_client(mocker):
+    """Unit test that every thread reuses its storage client."""
+    mocker.patch("app.db.google_cloud_storage.storage.Client", side_effect=Client)
+
+    client = get_storage_client()
+    assert get_storage_client() is client
+
+    other_clients = []
+    thread = threading.Thread(target=lambda: other_clients.append(get_storage_client()))
+    thread.start()
+    thread.join()
+    assert other_clients[0] is not client
+
+
 def test_upload_blob_to_gcs(mocker):
     """Unit test upload to google cloud storage."""
 
@@ -56,6 +92,11 @@ def test_download_blob_from_gcs(mocker):
     assert image_blob == "bytes_image"
 
 
-def test_delete_blob_from_gcs():
-    """Trivial code that does not need to be unit tested."""
-    pass
+def test_delete_blob_from_gcs(mocker):
+    """Unit test that deleting from google cloud storage skips missing blobs like the other backends."""
+
+    # Mock Client class
+    mocker.patch("app.db.google_cloud_storage.storage.Client", return_value=Client())
+
+    delete_blob_from_gcs("bucket_name", ["image_id", "missing", "other_image_id"])
+    assert Blob.deleted == ["image_id", "other_image_id"]
@@ -0,0 +1,45 @@
+import pytest
+
+import app
+from app.db.migrate_vectors import migrate_vectors
+from app.db.mongodb import get_images_with_vectors_from_mongodb, save_user_image_in_mongodb
+from app.schemas.mongodb import ImageData
+
+
+@pytest.mark.asyncio
+async def test_migrate_vectors(async_mongodb, mocker):
+    """Unit test that the vectors in the bucket are moved into the image documents and released."""
+
+    def mock_download(bucket_name, key):
+        if key == "missing":
+            raise FileNotFoundError(key)
+        return f"bytes of {key}".encode()
+
+    mocker.patch("app.db.migrate_vectors.storage_backend.download", side_effect=mock_download)
+    mocker.patch("app.db.migrate_vectors.release_blobs")
+    mocker.patch("app.db.migrate_vectors.create_image_indexes_in_mongodb")
+    images = [
+        ImageData(url="url1", auth0_id="007", method={}, vector_key="vector1"),
+        ImageData(url="url2", auth0_id="007", method={}),
+        ImageData(url="url3", auth0_id="007", method={}, vector_key="missing"),
+    ]
+    for image in images:
+        await save_user_image_in_mongodb(async_mongodb, image)
+    image = ImageData(url="url4", auth0_id="007", method={}, vector_in_document=True)
+    await save_user_image_in_mongodb(async_mongodb, image, b"vector4")
+
+    assert await migrate_vectors(async_mongodb, concurrency=2) == 2
+    migrated = await get_images_with_vectors_from_mongodb(
+        async_mongodb, "007", ["url1", "url2", "url3", "url4"]
+    )
+    assert {url: vector for url, (_, vector) in migrated.items()} == {
+        "url1": b"bytes of vector1",
+        "url2": b"bytes of url2",
+        "url3": None,
+        "url4": b"vector4",
+    }
+    assert app.db.migrate_vectors.release_blobs.call_count == 2
+
+    # Running it again only retries the missing vector
+    assert await migrate_vectors(async_mongodb) == 0
+    assert app.db.migrate_vectors.release_blobs.call_count == 2
@@ -5,12 +5,25 @@ import pytz
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from app.db.mongodb import (
+    decrement_blob_references_in_mongodb,
+    delete_all_user_assets_from_mongodb,
     delete_all_user_images_from_mongodb,
+    delete_unreferenced_blob_from_mongodb,
     delete_user_images_from_mongodb,
+    end_blob_deletion_in_mongodb,
+    get_blob_reference_from_mongodb,
+    get_images_with_vectors_from_mongodb,
+    get_user_image_keys_from_mongodb,
     get_user_images_from_mongodb,
+    increment_blob_references_in_mongodb,
+    mark_blob_uploaded_in_mongodb,
+    save_user_asset_in_mongodb,
     save_user_image_in_mongodb,
+    save_vector_in_mongodb,
+    start_blob_deletion_in_mongodb,
 )
 from app.schemas.mongodb import ImageData
+from app.schemas.stylegan_models import Model
 
 current_date = datetime.datetime(2020, 2, 2, 20, 20, 20)
 
@@ -56,6 +69,9 @@ async def test_mongodb_correct_cases(async_mongodb):
         ImageData(url="url1", auth0_id="007", creation_date=current_date, method={}),
         ImageData(url="url2", auth0_id="007", creation_date=current_date, method={}),
     ]
+    # Pages in the order the images were saved
+    images = await get_user_images_from_mongodb(async_mongodb, "007", offset=1, limit=1)
+    assert [image.url for image in images] == ["url2"]
 
     # Save image for different user
     image_data = {
@@ -135,3 +151,100 @@ async def test_mongodb_wrong_cases(async_mongodb):
     # Delete not existing image
     result = await delete_user_images_from_mongodb(async_mongodb, "007", ["url"])
     assert result.deleted_count == 0
+
+
+@pytest.mark.asyncio
+async def test_mongodb_blob_references(async_mongodb):
+    """Unit test the reference counts of content addressed blobs against a mocked instance of MongoDB."""
+    image = ImageData(url="url1", auth0_id="007", method={}, image_key="key", vector_key="vector")
+    await save_user_image_in_mongodb(async_mongodb, image)
+    images = await get_images_with_vectors_from_mongodb(async_mongodb, "007", ["url1", "url2"])
+    assert list(images) == ["url1"]
+    assert images["url1"][0].blob_keys == ("key", "vector")
+
+    # The first reference creates the count
+    reference = await increment_blob_references_in_mongodb(async_mongodb, "bucket", "key")
+    assert (reference["refs"], reference["uploaded"]) == (1, False)
+    await mark_blob_uploaded_in_mongodb(async_mongodb, "bucket", "key")
+    reference = await increment_blob_references_in_mongodb(async_mongodb, "bucket", "key")
+    assert (reference["refs"], reference["uploaded"]) == (2, True)
+    assert (await increment_blob_references_in_mongodb(async_mongodb, "other", "key"))["refs"] == 1
+
+    # Referenced blobs are not deleted
+    assert await decrement_blob_references_in_mongodb(async_mongodb, "bucket", "key") == 1
+    assert not await start_blob_deletion_in_mongodb(async_mongodb, "bucket", "key")
+    assert not await delete_unreferenced_blob_from_mongodb(async_mongodb, "bucket", "key")
+    assert await decrement_blob_references_in_mongodb(async_mongodb, "bucket", "key") == 0
+    assert await start_blob_deletion_in_mongodb(async_mongodb, "bucket", "key")
+    # Only one caller deletes a blob
+    assert not await start_blob_deletion_in_mongodb(async_mongodb, "bucket", "key")
+    reference = await get_blob_reference_from_mongodb(async_mongodb, "bucket", "key")
+    assert reference["uploaded"] is False and reference["deleting"]
+
+    # A new reference during the deletion keeps the count
+    await increment_blob_references_in_mongodb(async_mongodb, "bucket", "key")
+    assert not await delete_unreferenced_blob_from_mongodb(async_mongodb, "bucket", "key")
+    await end_blob_deletion_in_mongodb(async_mongodb, "bucket", "key")
+    assert "deleting" not in await get_blob_reference_from_mongodb(async_mongodb, "bucket", "key")
+    assert await decrement_blob_references_in_mongodb(async_mongodb, "bucket", "key") == 0
+    assert await delete_unreferenced_blob_from_mongodb(async_mongodb, "bucket", "key")
+    assert await get_blob_reference_from_mongodb(async_mongodb, "bucket", "key") is None
+
+    # Blobs without a count (named by their image id)
+    assert await decrement_blob_references_in_mongodb(async_mongodb, "bucket", "key") is None
+
+
+@pytest.mark.asyncio
+async def test_mongodb_user_image_keys(async_mongodb):
+    """Unit test the listing of the image ids of a user and a model against a mocked instance of MongoDB."""
+    model = Model(img=31, res=256, fid=12)
+    method = {"model": {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}}
+    other_method = {"model": {"img": 31, "res": 512, "fid": 12, "version": "stylegan2_ada"}}
+    await save_user_image_in_mongodb(async_mongodb, ImageData(url="url1", auth0_id="007", method=method, image_key="key1"))
+    await save_user_image_in_mongodb(async_mongodb, ImageData(url="url2", auth0_id="007", method=method))
+    await save_user_image_in_mongodb(async_mongodb, ImageData(url="url3", auth0_id="007", method=other_method))
+    await save_user_image_in_mongodb(async_mongodb, ImageData(url="url4", auth0_id="008", method=method))
+
+    assert await get_user_image_keys_from_mongodb(async_mongodb, "007", model) == {"url1": "key1", "url2": "url2"}
+
+
+@pytest.mark.asyncio
+async def test_mongodb_user_assets(async_mongodb):
+    """Unit test the blob references of a user outside of the gallery against a mocked instance of MongoDB."""
+    await save_user_asset_in_mongodb(async_mongodb, "007", "stylegan-images", "grid1")
+    await save_user_asset_in_mongodb(async_mongodb, "007", "stylegan-images", "grid2")
+    await save_user_asset_in_mongodb(async_mongodb, "007", "stylegan-videos", "video1_mp4")
+    await save_user_asset_in_mongodb(async_mongodb, "008", "stylegan-images", "grid3")
+
+    assert await delete_all_user_assets_from_mongodb(async_mongodb, "007") == {
+        "stylegan-images": ["grid1", "grid2"],
+        "stylegan-videos": ["video1_mp4"],
+    }
+    assert await delete_all_user_assets_from_mongodb(async_mongodb, "007") == {}
+    assert await delete_all_user_assets_from_mongodb(async_mongodb, "008") == {"stylegan-images": ["grid3"]}
+
+
+@pytest.mark.asyncio
+async def test_mongodb_vectors(async_mongodb):
+    """Unit test feature vectors in the image documents against a mocked instance of MongoDB."""
+    image = ImageData(url="url1", auth0_id="007", method={}, vector_in_document=True)
+    await save_user_image_in_mongodb(async_mongodb, image, b"vector1")
+    await save_user_image_in_mongodb(async_mongodb, ImageData(url="url2", auth0_id="007", method={}))
+
+    # Vectors are only returned by the style mix lookup
+    images = await get_images_with_vectors_from_mongodb(async_mongodb, "007", ["url1", "url2", "url3"])
+    assert {url: (image.vector_in_document, vector) for url, (image, vector) in images.items()} == {
+        "url1": (True, b"vector1"),
+        "url2": (False, None),
+    }
+    # The images of other users are not found
+    assert await get_images_with_vectors_from_mongodb(async_mongodb, "008", ["url1", "url2"]) == {}
+    images = await get_user_images_from_mongodb(async_mongodb, "007")
+    assert [image.url for image in images] == ["url1", "url2"]
+
+    # Vectors are moved once
+    assert await save_vector_in_mongodb(async_mongodb, "url2", b"vector2")
+    assert not await save_vector_in_mongodb(async_mongodb, "url2", b"vector2")
+    assert not await save_vector_in_mongodb(async_mongodb, "url3", b"vector3")
+    images = await get_images_with_vectors_from_mongodb(async_mongodb, "007", ["url2"])
+    assert images["url2"][0].vector_in_document and images["url2"][1] == b"vector2"
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+from google.api_core.exceptions import NotFound
+
+from app.db.storage import GCSStorage, LocalStorage, create_storage_backend, parse_range
+
+
+def test_local_storage(tmp_path):
+    """Unit test that local blobs are saved in sharded directories and can be replaced and deleted."""
+    storage = LocalStorage(str(tmp_path))
+    key = "abcdef0123"
+
+    storage.upload("bucket", key, b"image", "image/jpeg")
+    assert storage.path("bucket", key) == os.path.join(str(tmp_path), "bucket", "ab", "cd", key)
+    assert storage.download("bucket", key) == b"image"
+
+    # Replaced atomically, without leftover temporary files
+    storage.upload("bucket", key, b"new image", "image/jpeg")
+    assert storage.download("bucket", key) == b"new image"
+    assert os.listdir(os.path.join(str(tmp_path), "bucket", "ab", "cd")) == [key]
+
+    # Files are copied
+    source = tmp_path / "video.mp4"
+    source.write_bytes(b"video")
+    storage.upload_file("bucket", "video_mp4", str(source), "video/mp4")
+    assert storage.download("bucket", "video_mp4") == b"video"
+
+    # Deleting a missing blob is not an error
+    storage.delete("bucket", [key, "missing"])
+    with pytest.raises(FileNotFoundError):
+        storage.download("bucket", key)
+
+
+def test_local_storage_invalid_names(tmp_path):
+    """Unit test that blob names cannot escape the storage directory."""
+    storage = LocalStorage(str(tmp_path))
+    for bucket, key in [("bucket", "../../etc/passwd"), ("..", "key"), ("bucket", "")]:
+        with pytest.raises(ValueError):
+            storage.path(bucket, key)
+
+
+def test_parse_range():
+    """Unit test the byte ranges of a 1000 byte file."""
+    assert parse_range(None, 1000) is None
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=900-5000", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=-5000", 1000) == (0, 999)
+    # Multiple and malformed ranges serve the whole file
+    assert parse_range("bytes=0-1,5-6", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+    for unsatisfiable in ["bytes=1000-", "bytes=5-4", "bytes=-0"]:
+        with pytest.raises(ValueError):
+            parse_range(unsatisfiable, 1000)
+
+
+def test_gcs_storage_not_found(mocker):
+    """Unit test that missing GCS blobs raise FileNotFoundError like the other backends."""
+    mocker.patch("app.db.storage.download_blob_from_gcs", side_effect=NotFound("missing"))
+
+    with pytest.raises(FileNotFoundError):
+        GCSStorage().download("bucket", "key")
+
+
+def test_create_storage_backend(tmp_path, mocker):
+    """Unit test the selection of the storage backend."""
+    mocker.patch("app.db.storage.LOCAL_STORAGE_PATH", str(tmp_path))
+
+    assert isinstance(create_storage_backend("gcs"), GCSStorage)
+    local_storage = create_storage_backend("local")
+    assert isinstance(local_storage, LocalStorage) and local_storage.root == str(tmp_path)
+    with pytest.raises(ValueError):
+        create_storage_backend("ftp")
@@ -0,0 +1,50 @@
+import pytest
+
+from app.db.storage import LocalStorage
+
+url = "/api/v1/images/"
+key = "0123456789abcdef"
+
+
+@pytest.fixture
+def local_storage(tmp_path, mocker):
+    """Return a local storage with an image of 1000 bytes that is served by the images route."""
+    storage = LocalStorage(str(tmp_path))
+    storage.upload("stylegan-images", key, bytes(range(250)) * 4, "image/jpeg")
+    mocker.patch("app.api.routes.images.storage_backend", storage)
+    return storage
+
+
+def test_get_image(test_client, local_storage):
+    client, app = test_client
+
+    resp = client.get(url + key)
+    assert resp.status_code == 200
+    assert resp.content == bytes(range(250)) * 4
+    assert resp.headers["content-type"] == "image/jpeg"
+    assert resp.headers["accept-ranges"] == "bytes"
+    assert resp.headers["etag"] == f'"{key}"'
+
+
+def test_get_image_range(test_client, local_storage):
+    client, app = test_client
+
+    resp = client.get(url + key, headers={"Range": "bytes=250-259"})
+    assert resp.status_code == 206
+    assert resp.content == bytes(range(10))
+    assert resp.headers["content-range"] == "bytes 250-259/1000"
+
+    resp = client.get(url + key, headers={"Range": "bytes=-5"})
+    assert resp.status_code == 206
+    assert resp.content == bytes(range(245, 250))
+
+    resp = client.get(url + key, headers={"Range": "bytes=1000-"})
+    assert resp.status_code == 416
+    assert resp.headers["content-range"] == "bytes */1000"
+
+
+def test_get_image_not_found(test_client, local_storage):
+    client, app = test_client
+
+    assert client.get(url + "missing").status_code == 404
+    assert client.get(url + "..%2F..%2Fsecret").status_code == 404
@@ -0,0 +1,16 @@
+from app.schemas.stylegan2ada import StyleGan2ADA
+
+url = "/metrics"
+
+
+def test_get_metrics(test_client, mocker):
+    client, app = test_client
+    mocker.patch.dict(StyleGan2ADA.loaded_models, clear=True)
+
+    client.get("/api/v1/models")
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert "# TYPE cp_stage_latency_seconds histogram" in resp.text
+    assert 'cp_cache_hits_total{cache="block"}' in resp.text
+    assert 'cp_request_latency_seconds_count{method="GET",endpoint="get_stylegan_models"}' in resp.text
@@ -1,8 +1,12 @@
 import json
 
+from fastapi import HTTPException
+
+from app.core.admission import run_inference as app_run_inference
 from app.db.redisdb import check_user_ratelimit
-from app.schemas.stylegan2ada import generation_method, stylemix_method
-from app.schemas.stylegan_models import stylegan2ada_models
+from app.core.model_catalog import CatalogSnapshot, stylegan2ada_catalog
+from app.schemas.stylegan_models import Model, stylegan2ada_models
+from app.schemas.stylegan_user import StyleGanUser
 
 # STYLE MIX
 stylemix_url = "/api/v1/stylegan2ada/stylemix"
@@ -136,6 +140,42 @@ def test_style_mix_images_stylegan2ada_authenticated_right_payload(
     }
 
 
+# STYLE MIX GRID
+stylemix_grid_url = "/api/v1/stylegan2ada/stylemix/grid"
+
+
+def test_style_mix_grid_stylegan2ada_unauthenticated(test_client):
+    """Unit test unauthenticated request."""
+    client, app = test_client
+
+    resp = client.post(stylemix_grid_url)
+    assert resp.status_code == 403
+    assert resp.json() == {"detail": "Missing bearer token"}
+
+
+def test_style_mix_grid_stylegan2ada_authenticated(test_authenticated_client):
+    """Unit test an authenticated request with wrong and right payloads."""
+    client, app = test_authenticated_client
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"row_images":[],"column_images":["456"],"styles":"Middle","truncation":1}'
+    resp = client.post(stylemix_grid_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 422
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"row_images":["123"],"column_images":["456","789"],"styles":"Middle","truncation":1}'
+    resp = client.post(stylemix_grid_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "result_image_0_0": "111111111111111",
+        "result_image_0_1": "2222222222222",
+        "image_keys": {
+            "result_image_0_0": "1a1a1a",
+            "result_image_0_1": "2b2b2b",
+            "grid_image": "5555555555555",
+        },
+        "url_prefix": "https://images.webdesigan.com/",
+    }
+
+
 # Generation
 generation_url = "/api/v1/stylegan2ada/generate"
 
@@ -268,6 +308,167 @@ def test_generate_image_stylegan2ada_authenticated_right_payload(
     }
 
 
+# EDIT
+edit_url = "/api/v1/stylegan2ada/edit"
+
+
+def test_edit_image_stylegan2ada_unauthenticated(test_client):
+    """Unit test unauthenticated request."""
+    client, app = test_client
+
+    resp = client.post(edit_url)
+    assert resp.status_code == 403
+    assert resp.json() == {"detail": "Missing bearer token"}
+
+
+def test_edit_image_stylegan2ada_authenticated(test_authenticated_client):
+    """Unit test an authenticated request with wrong and right payloads."""
+    client, app = test_authenticated_client
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"image":"123","direction":0,"strengths":[20]}'
+    resp = client.post(edit_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 422
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"image":"123","direction":0,"strengths":[-1,1],"layers":[0,4]}'
+    resp = client.post(edit_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "result_image_0": "111111111111111",
+        "result_image_1": "2222222222222",
+        "url_prefix": "https://images.webdesigan.com/",
+    }
+
+
+def test_edit_image_stylegan2ada_without_directions(test_authenticated_client):
+    """Unit test that edits of models without the direction are rejected before the rate limit is charged."""
+    client, app = test_authenticated_client
+    mock_user_class = app.dependency_overrides[StyleGanUser.get_class]()
+
+    class MockUserWithoutDirections(mock_user_class):
+        async def check_edit_directions(self):
+            raise HTTPException(status_code=404, detail="There are no edit directions for this model.")
+
+    charged = []
+
+    def override_check_user_ratelimit():
+        charged.append(True)
+        return ("007", False)
+
+    app.dependency_overrides[StyleGanUser.get_class] = MockUserWithoutDirections.get_class
+    app.dependency_overrides[check_user_ratelimit] = override_check_user_ratelimit
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"image":"123","direction":0,"strengths":[1]}'
+    resp = client.post(edit_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 404
+    assert charged == []
+
+    app.dependency_overrides[StyleGanUser.get_class] = mock_user_class.get_class
+
+
+# TRUNCATION SWEEP
+truncation_url = "/api/v1/stylegan2ada/truncation"
+
+
+def test_truncation_sweep_stylegan2ada_unauthenticated(test_client):
+    """Unit test unauthenticated request."""
+    client, app = test_client
+
+    resp = client.post(truncation_url)
+    assert resp.status_code == 403
+    assert resp.json() == {"detail": "Missing bearer token"}
+
+
+def test_truncation_sweep_stylegan2ada_authenticated(test_authenticated_client):
+    """Unit test an authenticated request with wrong and right payloads."""
+    client, app = test_authenticated_client
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"seed":"123","truncations":[5]}'
+    resp = client.post(truncation_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 422
+
+    # Previews are not charged against the rate limit.
+    def override_check_user_ratelimit():
+        return ("007", True)
+
+    app.dependency_overrides[check_user_ratelimit] = override_check_user_ratelimit
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"seed":"123","truncations":[0.5,1],"resolution":64}'
+    resp = client.post(truncation_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "result_image_0": "data:image/jpeg;base64,MTExMQ==",
+        "result_image_1": "data:image/jpeg;base64,MjIyMg==",
+    }
+
+    def override_check_user_ratelimit():
+        return ("007", False)
+
+    app.dependency_overrides[check_user_ratelimit] = override_check_user_ratelimit
+
+
+# INTERPOLATION
+interpolate_url = "/api/v1/stylegan2ada/interpolate"
+
+
+def test_interpolate_stylegan2ada_unauthenticated(test_client):
+    """Unit test unauthenticated request."""
+    client, app = test_client
+
+    resp = client.post(interpolate_url)
+    assert resp.status_code == 403
+    assert resp.json() == {"detail": "Missing bearer token"}
+
+
+def test_interpolate_stylegan2ada_authenticated(test_authenticated_client):
+    """Unit test an authenticated request with wrong and right payloads."""
+    client, app = test_authenticated_client
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"keyframes":["123"]}'
+    resp = client.post(interpolate_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 422
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"keyframes":["123","456","789"],"space":"z"}'
+    resp = client.post(interpolate_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 200
+    assert resp.json() == {"video_key": "4444444444444_mp4", "frames": 61, "url_prefix": "/api/v1/videos/"}
+
+
+# SIMILARITY SEARCH
+similar_url = "/api/v1/stylegan2ada/similar"
+
+
+def test_find_similar_images_stylegan2ada_unauthenticated(test_client):
+    """Unit test unauthenticated request."""
+    client, app = test_client
+
+    resp = client.post(similar_url)
+    assert resp.status_code == 403
+    assert resp.json() == {"detail": "Missing bearer token"}
+
+
+def test_find_similar_images_stylegan2ada_authenticated(test_authenticated_client):
+    """Unit test an authenticated request with wrong and right payloads."""
+    client, app = test_authenticated_client
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"image":"Wrong"}'
+    resp = client.post(similar_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 422
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"image":"123","k":5}'
+    resp = client.post(similar_url, headers={"Content-Type": "application/json"}, data=data)
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "images": [
+            {
+                "id": "c31ad1323ed648feb93cd7398fcf1894",
+                "image_key": "1111111111111111",
+                "similarity": 0.9,
+            }
+        ],
+        "url_prefix": "https://images.webdesigan.com/",
+    }
+
+
 # Methods
 methods_url = "/api/v1/stylegan2ada/methods"
 
@@ -281,25 +482,67 @@ def test_get_stylegan2ada_methods_unauthenticated(test_client):
     assert resp.json() == {"detail": "Missing bearer token"}
 
 
-def test_get_stylegan2ada_methods_authenticated(test_authenticated_client):
-    """Unit test an authenticated request."""
+def test_get_stylegan2ada_methods_authenticated(test_authenticated_client, mocker):
+    """Unit test an authenticated request and its revalidation with the ETag."""
     client, app = test_authenticated_client
+    model = Model(img=31, res=256, fid=12, version="stylegan2_ada")
+    mocker.patch.object(stylegan2ada_catalog, "snapshot", CatalogSnapshot([model]))
 
-    generation_method_json = "{'name': 'Generate', 'description': 'Generate random images or from a certain seed.', 'method_options': (Dropdown(type='dropdown', name='Model', place=1, options=(Model(img=31, res=256, fid=12, version='stylegan2_ada'),), default=0), Slider(type='slider', name='Truncation', place=2, max=2, min=-2, step=0.1, default=1.0), Text(type='text', name='Seed', place=3, default=''))}"
-    stylemix_method_json = "{'name': 'StyleMix', 'description': 'Style mix different images.', 'method_options': (Dropdown(type='dropdown', name='Model', place=1, options=(Model(img=31, res=256, fid=12, version='stylegan2_ada'),), default=0), SeedOrImage(type='seed_or_image', name='Row_Image', place=2, default=''), SeedOrImage(type='seed_or_image', name='Column_Image', place=3, default=''), Dropdown(type='dropdown', name='Styles', place=4, options=('Coarse', 'Middle', 'Fine'), default=1), Slider(type='slider', name='Truncation', place=5, max=2, min=-2, step=0.1, default=1.0))}"
+    resp = client.get(methods_url)
+    assert resp.status_code == 200
+    methods = resp.json()
+    assert methods["generation_method"]["name"] == "Generate"
+    assert methods["generation_method"]["method_options"][0]["options"] == [model.dict()]
+    assert methods["stylemix_method"]["name"] == "StyleMix"
+    assert methods["stylemix_method"]["method_options"][0]["options"] == [model.dict()]
+    # Both methods advertise the preview resolutions up to the model resolution (None, the default).
+    for method in ("generation_method", "stylemix_method"):
+        resolution = methods[method]["method_options"][-1]
+        assert resolution["name"] == "Resolution"
+        assert resolution["options"] == [None, 4, 8, 16, 32, 64, 128, 256]
+        assert resolution["options"][resolution["default"]] is None
+
+    etag = resp.headers["ETag"]
+    resp = client.get(methods_url, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+
+    # A new catalog version is served again
+    mocker.patch.object(stylegan2ada_catalog, "snapshot", CatalogSnapshot([]))
+    resp = client.get(methods_url, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
 
-    def override_generation_method():
-        return generation_method_json
 
-    def override_stylemix_method():
-        return stylemix_method_json
+# PROFILE
+profile_url = "/api/v1/stylegan2ada/profile"
 
-    app.dependency_overrides[generation_method] = override_generation_method
-    app.dependency_overrides[stylemix_method] = override_stylemix_method
 
-    resp = client.get(methods_url)
+def test_profile_stylegan2ada_unauthenticated(test_client):
+    """Unit test unauthenticated request."""
+    client, app = test_client
+
+    resp = client.post(profile_url)
+    assert resp.status_code == 403
+    assert resp.json() == {"detail": "Missing bearer token"}
+
+
+def test_profile_stylegan2ada_authenticated(test_authenticated_client, mocker):
+    """Unit test an authenticated request with the right payload."""
+    client, app = test_authenticated_client
+    mocker.patch("app.schemas.stylegan2ada.StyleGan2ADA._load_model", return_value="G")
+    run_inference = mocker.patch(
+        "app.api.routes.stylegan2ada.run_inference", side_effect=app_run_inference
+    )
+    profile = mocker.patch(
+        "app.api.routes.stylegan2ada.profile_synthesis_with_trace",
+        return_value={"blocks": [], "ops": [], "chrome_trace": []},
+    )
+
+    data = '{"model":{"img":31,"res":256,"fid":12,"version":"stylegan2_ada"},"batch_size":2,"runs":1}'
+    resp = client.post(profile_url, headers={"Content-Type": "application/json"}, data=data)
     assert resp.status_code == 200
-    assert resp.json() == {
-        "generation_method": generation_method_json,
-        "stylemix_method": stylemix_method_json,
-    }
+    assert resp.json() == {"blocks": [], "ops": [], "chrome_trace": []}
+    profile.assert_called_once_with("G", 2, 1)
+    # The profile runs behind the admission controller
+    assert run_inference.call_count == 1
@@ -1,4 +1,5 @@
-from app.schemas.stylegan_models import stylegan2ada_models
+from app.core.model_catalog import CatalogSnapshot, stylegan2ada_catalog
+from app.schemas.stylegan_models import Model
 
 url = "/api/v1/models"
 
@@ -11,16 +12,14 @@ def test_get_stylegan_models_unauthenticated(test_client):
     assert resp.json() == {"detail": "Missing bearer token"}
 
 
-def test_get_stylegan_models_authenticated(test_authenticated_client):
+def test_get_stylegan_models_authenticated(test_authenticated_client, mocker):
     client, app = test_authenticated_client
 
-    def override_stylegan2_ada_models():
-        return [
-            {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"},
-            {"img": 20, "res": 512, "fid": 2, "version": "stylegan2"},
-        ]
-
-    app.dependency_overrides[stylegan2ada_models] = override_stylegan2_ada_models
+    models = [
+        Model(**{"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}),
+        Model(**{"img": 20, "res": 512, "fid": 2, "version": "stylegan2"}),
+    ]
+    mocker.patch.object(stylegan2ada_catalog, "snapshot", CatalogSnapshot(models))
 
     resp = client.get(url)
     assert resp.status_code == 200
@@ -35,3 +34,7 @@ def test_get_stylegan_models_authenticated(test_authenticated_client):
             }
         ]
     }
+
+    # Not modified for the same catalog version
+    resp = client.get(url, headers={"If-None-Match": resp.headers["ETag"]})
+    assert resp.status_code == 304
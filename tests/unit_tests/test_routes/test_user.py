@@ -1,7 +1,6 @@
 import datetime
 
 from app.schemas.mongodb import ImageData
-from app.schemas.stylegan2ada import generation_method, stylemix_method
 from app.schemas.stylegan_models import stylegan2ada_models
 
 user_url = "/api/v1/user/images"
@@ -42,6 +41,9 @@ def test_get_user_images_authenticated_right_payload(test_authenticated_client):
                     "styles": "Middle",
                     "truncation": 1.0,
                 },
+                "image_key": None,
+                "vector_key": None,
+                "vector_in_document": False,
             },
             {
                 "url": "3bf5df238b3741559d9e3806c97f2d33",
@@ -60,11 +62,28 @@ def test_get_user_images_authenticated_right_payload(test_authenticated_client):
                     "styles": "Middle",
                     "truncation": 1.0,
                 },
+                "image_key": None,
+                "vector_key": None,
+                "vector_in_document": False,
             },
         ],
     }
 
 
+def test_get_user_images_page(test_authenticated_client):
+    """Unit test an authenticated request of a page of the user images."""
+    client, app = test_authenticated_client
+
+    resp = client.get(user_url, params={"offset": 1, "limit": 1})
+    assert resp.status_code == 200
+    assert [image["url"] for image in resp.json()["image_ids"]] == [
+        "3bf5df238b3741559d9e3806c97f2d33"
+    ]
+
+    resp = client.get(user_url, params={"limit": 0})
+    assert resp.status_code == 422
+
+
 def test_delete_user_images_with_list(test_authenticated_client):
     """Unit test an authenticated request that deletes a list of user image data."""
     client, app = test_authenticated_client
@@ -0,0 +1,29 @@
+from app.db.storage import LocalStorage
+
+url = "/api/v1/videos/"
+key = "0123456789abcdef_webm"
+
+
+def test_get_video(test_client, tmp_path, mocker):
+    client, app = test_client
+    storage = LocalStorage(str(tmp_path))
+    storage.upload("stylegan-videos", key, b"video", "video/webm")
+    mocker.patch("app.api.routes.videos.storage_backend", storage)
+
+    resp = client.get(url + key)
+    assert resp.status_code == 200
+    assert resp.content == b"video"
+    assert resp.headers["content-type"] == "video/webm"
+
+    resp = client.get(url + key, headers={"Range": "bytes=1-2"})
+    assert resp.status_code == 206
+    assert resp.content == b"id"
+
+
+def test_get_video_not_found(test_client, tmp_path, mocker):
+    client, app = test_client
+    mocker.patch("app.api.routes.videos.storage_backend", LocalStorage(str(tmp_path)))
+
+    assert client.get(url + "0123456789abcdef_mp4").status_code == 404
+    # Keys without a known format
+    assert client.get(url + "0123456789abcdef").status_code == 404
@@ -1,6 +1,6 @@
 import app
 import pytest
-from app.schemas.stylegan2ada import Generation, StyleGan2ADA, StyleMix
+from app.schemas.stylegan2ada import Edit, Generation, Interpolation, Profiling, SimilaritySearch, StyleGan2ADA, StyleMix, StyleMixGrid, TruncationSweep
 from app.schemas.stylegan_models import Model
 
 mock_model = Model(**{"img": 31, "res": 512, "fid": 12})
@@ -45,6 +45,10 @@ def test__load_model(mocker):
         "app.schemas.stylegan2ada.load_model_from_pkl_stylegan2ada",
         return_value="other_model",
     )
+    mocker.patch(
+        "app.schemas.stylegan2ada.load_inference_model",
+        side_effect=lambda folder_path, model, G: G,
+    )
     mock_stylegan2ada_model = StyleGan2ADA(
         model=mock_model, method_options={"method_option": "first_option"}
     )
@@ -67,6 +71,7 @@ def test__load_model(mocker):
     assert mock_stylegan2ada_model._load_model(other_model) == "other_model"
     assert mock_stylegan2ada_model.loaded_models[other_model] == "other_model"
     app.schemas.stylegan2ada.load_model_from_pkl_stylegan2ada.assert_called
+    app.schemas.stylegan2ada.load_inference_model.assert_called
 
 
 def test_generate(mocker):
@@ -101,6 +106,25 @@ def test_style_mix(mocker):
     )
 
 
+def test_style_mix_grid(mocker):
+    """Unit test the StyleGan2ADA style_mix_grid method."""
+    mocker.patch(
+        "app.schemas.stylegan2ada.StyleGan2ADA._load_model",
+        return_value="style_mix_model",
+    )
+    mocker.patch(
+        "app.schemas.stylegan2ada.style_mix_grid_stylegan2ada",
+        return_value=("grid", {"result_image_0_0": ("image", "vector")}),
+    )
+    mock_stylegan2ada_model = StyleGan2ADA(
+        model=mock_model, method_options={"method_option": "first_option"}
+    )
+    assert mock_stylegan2ada_model.style_mix_grid([1], [2]) == ("grid", {"result_image_0_0": ("image", "vector")})
+    app.schemas.stylegan2ada.style_mix_grid_stylegan2ada.assert_called_once_with(
+        "style_mix_model", {"method_option": "first_option"}, [1], [2]
+    )
+
+
 def test_generation_validation_name():
     """Unit test the validation of the name attribute."""
     mock_model = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
@@ -133,6 +157,19 @@ def test_generation_validation_seed():
         Generation(name="RandomString", model=mock_model, truncation=-4, seed="Hi, Frank")
 
 
+def test_generation_validation_resolution():
+    """Unit test the validation of the resolution attribute."""
+    mock_model = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
+    assert Generation(model=mock_model, truncation=1, seed="23").resolution is None
+    assert Generation(model=mock_model, truncation=1, seed="23", resolution=64).resolution == 64
+    with pytest.raises(ValueError):
+        Generation(model=mock_model, truncation=1, seed="23", resolution=100)
+    with pytest.raises(ValueError):
+        Generation(model=mock_model, truncation=1, seed="23", resolution=512)
+    with pytest.raises(ValueError):
+        Generation(model=mock_model, truncation=1, seed="23", resolution=2)
+
+
 def test_stylemix_validation_name():
     """Unit test the validation of the name attribute."""
     mock_model = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
@@ -182,4 +219,122 @@ def test_stylemix_validation_truncation():
     with pytest.raises(ValueError):
         StyleMix(name="RandomString", model=mock_model, row_image="1234", column_image="5678", styles="Middle", truncation=-2134)
     with pytest.raises(ValueError):
-        StyleMix(name="RandomString", model=mock_model, row_image="1234", column_image="5678", styles="Middle", truncation=897435987435)
\ No newline at end of file
+        StyleMix(name="RandomString", model=mock_model, row_image="1234", column_image="5678", styles="Middle", truncation=897435987435)
+
+
+def test_stylemix_validation_resolution():
+    """Unit test the validation of the resolution attribute."""
+    mock_model = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
+    assert StyleMix(model=mock_model, row_image="1234", column_image="5678", styles="Middle", truncation=1, resolution=128).resolution == 128
+    with pytest.raises(ValueError):
+        StyleMix(model=mock_model, row_image="1234", column_image="5678", styles="Middle", truncation=1, resolution=96)
+    with pytest.raises(ValueError):
+        StyleMix(model=mock_model, row_image="1234", column_image="5678", styles="Middle", truncation=1, resolution=1024)
+
+
+def test_edit_validation():
+    """Unit test the validation of the edit options."""
+    mock_model = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
+    edit = Edit(name="RandomString", model=mock_model, image="", direction=0, strengths=[-2, 0, 2], layers=(0, 14))
+    assert edit.name == "Edit" and edit.image.isdigit() and edit.truncation == 1
+    with pytest.raises(ValueError):
+        Edit(model=mock_model, image="Wrong", direction=0, strengths=[1])
+    with pytest.raises(ValueError):
+        Edit(model=mock_model, image="1234", direction=-1, strengths=[1])
+    with pytest.raises(ValueError):
+        Edit(model=mock_model, image="1234", direction=0, strengths=[])
+    with pytest.raises(ValueError):
+        Edit(model=mock_model, image="1234", direction=0, strengths=[11])
+    with pytest.raises(ValueError):
+        Edit(model=mock_model, image="1234", direction=0, strengths=[1] * 17)
+    # A 256 model has 14 rows
+    with pytest.raises(ValueError):
+        Edit(model=mock_model, image="1234", direction=0, strengths=[1], layers=(0, 15))
+    with pytest.raises(ValueError):
+        Edit(model=mock_model, image="1234", direction=0, strengths=[1], layers=(6, 6))
+
+
+def test_truncation_sweep_validation():
+    """Unit test the validation of the truncation sweep options."""
+    mock_model = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
+    sweep = TruncationSweep(name="RandomString", model=mock_model, seed="", truncations=[-1, 0, 1], resolution=64)
+    assert sweep.name == "TruncationSweep" and sweep.seed.isdigit()
+    with pytest.raises(ValueError):
+        TruncationSweep(model=mock_model, seed="Wrong", truncations=[1])
+    with pytest.raises(ValueError):
+        TruncationSweep(model=mock_model, seed="1234", truncations=[])
+    with pytest.raises(ValueError):
+        TruncationSweep(model=mock_model, seed="1234", truncations=[3])
+    with pytest.raises(ValueError):
+        TruncationSweep(model=mock_model, seed="1234", truncations=[1] * 17)
+    with pytest.raises(ValueError):
+        TruncationSweep(model=mock_model, seed="1234", truncations=[1], resolution=512)
+
+
+def test_stylemix_grid_validation():
+    """Unit test the validation of the style mix grid options."""
+    mock_model = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
+    image_id = "c31ad1323ed648feb93cd7398fcf1894"
+    grid = StyleMixGrid(name="RandomString", model=mock_model, row_images=["1", image_id], column_images=[""], styles="Fine", truncation=1)
+    assert grid.name == "StyleMixGrid"
+    assert grid.row_images == ["1", image_id]
+    assert grid.column_images[0].isdigit()
+    with pytest.raises(ValueError):
+        StyleMixGrid(model=mock_model, row_images=[], column_images=["1"], styles="Fine", truncation=1)
+    with pytest.raises(ValueError):
+        StyleMixGrid(model=mock_model, row_images=["1"] * 9, column_images=["1"], styles="Fine", truncation=1)
+    with pytest.raises(ValueError):
+        StyleMixGrid(model=mock_model, row_images=["1"], column_images=["Wrong"], styles="Fine", truncation=1)
+    with pytest.raises(ValueError):
+        StyleMixGrid(model=mock_model, row_images=["1"], column_images=["1"], styles="Wrong", truncation=1)
+    with pytest.raises(ValueError):
+        StyleMixGrid(model=mock_model, row_images=["1"], column_images=["1"], styles="Fine", truncation=3)
+
+
+def test_interpolation_validation():
+    """Unit test the validation of the interpolation options."""
+    mock_model = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
+    image_id = "c31ad1323ed648feb93cd7398fcf1894"
+    interpolation = Interpolation(model=mock_model, keyframes=["1", image_id])
+    assert (interpolation.space, interpolation.format, interpolation.frames_per_transition) == ("w", "mp4", 30)
+    assert Interpolation(model=mock_model, keyframes=["1", "2"], space="z", format="webm").space == "z"
+    with pytest.raises(ValueError):
+        Interpolation(model=mock_model, keyframes=["1"])
+    with pytest.raises(ValueError):
+        Interpolation(model=mock_model, keyframes=["1", "Wrong"])
+    # Only seeds have latents
+    with pytest.raises(ValueError):
+        Interpolation(model=mock_model, keyframes=["1", image_id], space="z")
+    # Too many frames
+    with pytest.raises(ValueError):
+        Interpolation(model=mock_model, keyframes=["1", "2", "3"], frames_per_transition=1000)
+    with pytest.raises(ValueError):
+        Interpolation(model=mock_model, keyframes=["1", "2"], format="gif")
+    with pytest.raises(ValueError):
+        Interpolation(model=mock_model, keyframes=["1", "2"], resolution=8)
+
+
+def test_similarity_search_validation():
+    """Unit test the validation of the similarity search options."""
+    mock_model = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
+    search = SimilaritySearch(model=mock_model, image="c31ad1323ed648feb93cd7398fcf1894")
+    assert (search.image, search.truncation, search.k) == ("c31ad1323ed648feb93cd7398fcf1894", 1, 10)
+    assert SimilaritySearch(model=mock_model, image="1234", k=100).image == "1234"
+    with pytest.raises(ValueError):
+        SimilaritySearch(model=mock_model, image="")
+    with pytest.raises(ValueError):
+        SimilaritySearch(model=mock_model, image="987324569723458")
+    with pytest.raises(ValueError):
+        SimilaritySearch(model=mock_model, image="1234", k=0)
+    with pytest.raises(ValueError):
+        SimilaritySearch(model=mock_model, image="1234", truncation=3)
+
+
+def test_profiling_validation():
+    """Unit test the validation of the profiling options."""
+    mock_model = {"img": 31, "res": 256, "fid": 12, "version": "stylegan2_ada"}
+    assert Profiling(model=mock_model).batch_size == 1
+    with pytest.raises(ValueError):
+        Profiling(model=mock_model, batch_size=0)
+    with pytest.raises(ValueError):
+        Profiling(model=mock_model, runs=11)
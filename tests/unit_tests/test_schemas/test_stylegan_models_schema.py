@@ -21,6 +21,7 @@ def test_modelcollection_class(tmpdir):
     temp_dir = tmpdir.mkdir("stylegan_models/")
     temp_dir.join("img31res256fid12.pkl").write("1")
     temp_dir.join("img19res512fid16.pkl").write("2")
+    temp_dir.join("img19res512fid16.synthesis.b1.0123456789abcdef.pt").write("3")
 
     test_models = ModelCollection(str(temp_dir) + "/")
 
@@ -1,15 +1,23 @@
+import asyncio
+import base64
+import json
+import time
 from typing import Optional
 from unittest.mock import call
 
+import numpy as np
 import pytest
+from fastapi import HTTPException
 from fastapi_auth0 import Auth0User
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 
 import app
-from app.schemas.mongodb import ImageData
+from app.core.config import IMAGE_STORAGE_BASE_URL
+from app.core.latent_index import latent_indexes
+from app.schemas.mongodb import DeletionOptions, ImageData
 from app.schemas.stylegan_models import Model, StyleGanModel
-from app.schemas.stylegan_user import StyleGanUser, download_blob_from_gcs
+from app.schemas.stylegan_user import StyleGanUser
 from tests.unit_tests.conftest import mongodb_client
 
 
@@ -25,13 +33,38 @@ class MockStyleGanVersion(StyleGanModel):
     def generate(self):
         return "generate image"
 
+    def truncation_sweep(self):
+        return {f"result_image_{i}": f"{self.method_options.seed} at {truncation}".encode() for i, truncation in enumerate(self.method_options.truncations)}
+
     def style_mix(self, row_image, column_image):
         return "stylemix " + row_image + " and " + column_image
 
+    def style_mix_grid(self, row_images, col_images):
+        return b"grid", {
+            f"result_image_{r}_{c}": (f"{row} and {col}", "vector")
+            for r, row in enumerate(row_images)
+            for c, col in enumerate(col_images)
+        }
+
+    def mean_w(self, seed):
+        return np.eye(512)[1]
+
+    def interpolate(self, keyframes, path):
+        with open(path, "wb") as f:
+            f.write(b"video of " + str(keyframes).encode())
+        return 61
+
+    def edit_directions(self):
+        return self.method_options.directions
+
+    def edit(self, image, directions):
+        return {f"result_image_{i}": (f"{image} + {strength}", "vector") for i, strength in enumerate(self.method_options.strengths)}
+
 
 class MockMethod(BaseModel):
     name: str = "Method"
     model: Optional[Model]
+    seed: Optional[str]
     row_image: Optional[str]
     column_image: Optional[str]
     styles: Optional[str]
@@ -41,6 +74,7 @@ class MockMethod(BaseModel):
 mock_method = MockMethod(
     **{
         "model": Model(**{"img": 31, "res": 512, "fid": 12, "version": "version"}),
+        "seed": "42",
         "row_image": "1234",
         "column_image": "5678",
         "styles": "Middle",
@@ -78,15 +112,11 @@ def test_styleganuser_get_class():
     assert StyleGanUser.get_class() == StyleGanUser
 
 
-def test_styleganuser_get_seed_or_image_vector(mocker):
+def test_styleganuser_get_seed():
     """Unit test the StyleGanUser static method."""
-    mocker.patch("app.schemas.stylegan_user.download_blob_from_gcs")
-
-    assert StyleGanUser.get_seed_or_image_vector("1234") == int(1234)
-    StyleGanUser.get_seed_or_image_vector("hexuid")
-    app.schemas.stylegan_user.download_blob_from_gcs.assert_called_once_with(
-        "stylegan-images-vectors", "hexuid"
-    )
+    assert StyleGanUser.get_seed("1234") == int(1234)
+    with pytest.raises(ValueError):
+        StyleGanUser.get_seed("hexuid")
 
 
 @pytest.mark.asyncio
@@ -99,52 +129,309 @@ async def test_get_user_images(mocker):
 
     await stylegan_user.get_user_images()
     app.schemas.stylegan_user.get_user_images_from_mongodb.assert_called_once_with(
-        mongodb_client, "007"
+        mongodb_client, "007", 0, None
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_user_images_json(mocker):
+    """Unit test that the StyleGanUser image listing pages are read from redis and only built on a miss."""
+    images = [ImageData(url="id1", auth0_id="007", method={})]
+    mocker.patch("app.schemas.stylegan_user.get_user_images_from_mongodb", return_value=images)
+    mocker.patch("app.schemas.stylegan_user.get_user_images_from_redisdb", return_value=None)
+    mocker.patch("app.schemas.stylegan_user.save_user_images_in_redisdb")
+    stylegan_user = StyleGanUser(mock_auth0_user, mongodb_client)
+
+    # Without redis
+    listing = await stylegan_user.get_user_images_json(10, 5)
+    assert json.loads(listing)["image_ids"][0]["url"] == "id1"
+    assert json.loads(listing)["image_url_prefix"] == IMAGE_STORAGE_BASE_URL
+    app.schemas.stylegan_user.get_user_images_from_mongodb.assert_called_with(
+        mongodb_client, "007", 10, 5
+    )
+
+    async def mock_save_user_images_in_redisdb(redis_client, auth0_id, get_listing, offset, limit):
+        assert (offset, limit) == (10, 5)
+        return await get_listing()
+
+    mocker.patch("app.schemas.stylegan_user.redisdb.client", "redis_client")
+    app.schemas.stylegan_user.save_user_images_in_redisdb.side_effect = (
+        mock_save_user_images_in_redisdb
+    )
+    assert await stylegan_user.get_user_images_json(10, 5) == listing
+    app.schemas.stylegan_user.get_user_images_from_redisdb.assert_called_with(
+        "redis_client", "007", 10, 5
     )
+    app.schemas.stylegan_user.save_user_images_in_redisdb.assert_called_once()
 
+    app.schemas.stylegan_user.get_user_images_from_redisdb.return_value = "cached"
+    assert await stylegan_user.get_user_images_json(10, 5) == "cached"
+    app.schemas.stylegan_user.save_user_images_in_redisdb.assert_called_once()
 
-def test_generate_image():
+
+@pytest.mark.asyncio
+async def test_generate_image():
     """Unit test the StyleGanUser generate_image method."""
     stylegan_user = StyleGanUser(
         mock_auth0_user, mongodb_client, MockStyleGanVersion, mock_method
     )
-    stylegan_user.generate_image()
+    await stylegan_user.generate_image()
     assert stylegan_user.result_images_dict == "generate image"
 
 
-def test_style_mix_images(mocker):
+@pytest.mark.asyncio
+async def test_truncation_sweep():
+    """Unit test the StyleGanUser truncation_sweep method."""
+    sweep_method = mock_method.copy(update={"seed": "1234", "truncations": [0.5, 1]})
+    stylegan_user = StyleGanUser(mock_auth0_user, mongodb_client, MockStyleGanVersion, sweep_method)
+    previews = await stylegan_user.truncation_sweep()
+    assert previews == {
+        "result_image_0": "data:image/jpeg;base64," + base64.b64encode(b"1234 at 0.5").decode(),
+        "result_image_1": "data:image/jpeg;base64," + base64.b64encode(b"1234 at 1").decode(),
+    }
+
+
+class MockSharedStyleGanVersion(MockStyleGanVersion):
+    calls = []
+
+    def generation_key(self, seed):
+        return ("generate", int(seed))
+
+    def generate(self, seed=None):
+        seed = self.method_options.seed if seed is None else seed
+        self.calls.append(seed)
+        # Long enough for the other requests to join the run.
+        time.sleep(0.2)
+        return {"result_image": (f"image {seed}", f"vector {seed}")}
+
+    def style_mix(self, row_image, column_image):
+        return {
+            "result_image": (f"mix {row_image} and {column_image}", "mix vector"),
+            "row_image": (None, None),
+            "col_image": (None, None),
+        }
+
+
+@pytest.mark.asyncio
+async def test_generate_image_coalesced():
+    """Unit test that concurrent identical generations and style mix seeds share one inference run."""
+    MockSharedStyleGanVersion.calls = []
+    generation_users = [
+        StyleGanUser(mock_auth0_user, mongodb_client, MockSharedStyleGanVersion, mock_method)
+        for _ in range(3)
+    ]
+    stylemix_method = mock_method.copy(update={"row_image": "42", "column_image": "42"})
+    stylemix_user = StyleGanUser(
+        mock_auth0_user, mongodb_client, MockSharedStyleGanVersion, stylemix_method
+    )
+
+    await asyncio.gather(
+        *[user.generate_image() for user in generation_users], stylemix_user.style_mix_images()
+    )
+    assert MockSharedStyleGanVersion.calls == ["42"]
+    for user in generation_users:
+        assert user.result_images_dict == {"result_image": ("image 42", "vector 42")}
+    assert stylemix_user.result_images_dict == {
+        "result_image": ("mix vector 42 and vector 42", "mix vector"),
+        "row_image": ("image 42", "vector 42"),
+        "col_image": ("image 42", "vector 42"),
+    }
+
+
+@pytest.mark.asyncio
+async def test_style_mix_images(mocker):
     """Unit test the StyleGanUser style_mix_images method."""
 
-    def mock_get_seed_or_image_vector(value):
+    def mock_get_seed(value):
         return value
 
-    mocker.patch(
-        "app.schemas.stylegan_user.StyleGanUser.get_seed_or_image_vector",
-        side_effect=mock_get_seed_or_image_vector,
-    )
+    mocker.patch("app.schemas.stylegan_user.StyleGanUser.get_seed", side_effect=mock_get_seed)
 
     stylegan_user = StyleGanUser(
         mock_auth0_user, mongodb_client, MockStyleGanVersion, mock_method
     )
 
-    stylegan_user.style_mix_images()
+    await stylegan_user.style_mix_images()
     assert stylegan_user.result_images_dict == "stylemix 1234 and 5678"
 
 
+@pytest.mark.asyncio
+async def test_style_mix_images_by_id(mocker):
+    """Unit test that both style mix images are looked up at once and their bucket vectors are loaded concurrently."""
+
+    async def mock_get_images_with_vectors_from_mongodb(mongodb, auth0_id, image_ids):
+        return {
+            image_id: (
+                ImageData(url=image_id, auth0_id="008", method={}, vector_key=f"vector_of_{image_id}"),
+                None,
+            )
+            for image_id in image_ids
+        }
+
+    async def mock_load_blob(bucket_name, key):
+        mock_load_blob.running += 1
+        mock_load_blob.max_running = max(mock_load_blob.max_running, mock_load_blob.running)
+        await asyncio.sleep(0.05)
+        mock_load_blob.running -= 1
+        return key
+
+    mock_load_blob.running = mock_load_blob.max_running = 0
+    mocker.patch(
+        "app.schemas.stylegan_user.get_images_with_vectors_from_mongodb",
+        side_effect=mock_get_images_with_vectors_from_mongodb,
+    )
+    mocker.patch("app.schemas.stylegan_user.load_blob", side_effect=mock_load_blob)
+
+    stylemix_method = mock_method.copy(update={"row_image": "row_id", "column_image": "col_id"})
+    stylegan_user = StyleGanUser(
+        mock_auth0_user, mongodb_client, MockStyleGanVersion, stylemix_method
+    )
+
+    await stylegan_user.style_mix_images()
+    assert stylegan_user.result_images_dict == "stylemix vector_of_row_id and vector_of_col_id"
+    app.schemas.stylegan_user.get_images_with_vectors_from_mongodb.assert_called_once_with(
+        mongodb_client, "007", ["row_id", "col_id"]
+    )
+    assert mock_load_blob.max_running == 2
+    app.schemas.stylegan_user.load_blob.assert_has_calls(
+        [
+            call("stylegan-images-vectors", "vector_of_row_id"),
+            call("stylegan-images-vectors", "vector_of_col_id"),
+        ]
+    )
+    assert set(stylegan_user.partner_images) == {"row_id", "col_id"}
+
+    # Vectors in the image documents are not loaded from the bucket
+    app.schemas.stylegan_user.get_images_with_vectors_from_mongodb.side_effect = None
+    app.schemas.stylegan_user.get_images_with_vectors_from_mongodb.return_value = {
+        image_id: (
+            ImageData(url=image_id, auth0_id="008", method={}, vector_in_document=True),
+            f"{image_id} vector",
+        )
+        for image_id in ["row_id", "col_id"]
+    }
+    await stylegan_user.style_mix_images()
+    assert stylegan_user.result_images_dict == "stylemix row_id vector and col_id vector"
+    assert app.schemas.stylegan_user.load_blob.call_count == 2
+
+    # Not existing images
+    app.schemas.stylegan_user.get_images_with_vectors_from_mongodb.return_value = {}
+    with pytest.raises(HTTPException):
+        await stylegan_user.style_mix_images()
+
+
+@pytest.mark.asyncio
+async def test_edit_image(mocker):
+    """Unit test the StyleGanUser edit_image method."""
+    edit_method = mock_method.copy(
+        update={"image": "1234", "direction": 1, "strengths": [-1, 1], "directions": ["d0", "d1"]}
+    )
+    stylegan_user = StyleGanUser(mock_auth0_user, mongodb_client, MockStyleGanVersion, edit_method)
+    await stylegan_user.edit_image()
+    assert stylegan_user.result_images_dict == {
+        "result_image_0": ("1234 + -1", "vector"),
+        "result_image_1": ("1234 + 1", "vector"),
+    }
+
+    # Directions that do not exist
+    stylegan_user.stylegan_method_options = edit_method.copy(update={"direction": 2})
+    with pytest.raises(HTTPException) as e:
+        await stylegan_user.edit_image()
+    assert e.value.status_code == 422
+    stylegan_user.stylegan_method_options = edit_method.copy(update={"directions": None})
+    with pytest.raises(HTTPException) as e:
+        await stylegan_user.edit_image()
+    assert e.value.status_code == 404
+
+    # Images that do not exist
+    mocker.patch("app.schemas.stylegan_user.get_images_with_vectors_from_mongodb", return_value={})
+    stylegan_user.stylegan_method_options = edit_method.copy(update={"image": "image_id"})
+    with pytest.raises(HTTPException) as e:
+        await stylegan_user.edit_image()
+    assert e.value.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_style_mix_grid(mocker):
+    """Unit test that StyleGanUser style_mix_grid mixes all rows and columns and saves the grid image for the user."""
+    mocker.patch("app.schemas.stylegan_user.save_blob", return_value="grid_key")
+    mocker.patch("app.schemas.stylegan_user.save_user_asset_in_mongodb")
+    grid_method = mock_method.copy(update={"row_images": ["1", "2"], "column_images": ["3"]})
+    stylegan_user = StyleGanUser(mock_auth0_user, mongodb_client, MockStyleGanVersion, grid_method)
+
+    assert await stylegan_user.style_mix_grid() == "grid_key"
+    assert stylegan_user.result_images_dict == {
+        "result_image_0_0": ("1 and 3", "vector"),
+        "result_image_1_0": ("2 and 3", "vector"),
+    }
+    app.schemas.stylegan_user.save_blob.assert_called_once_with(
+        mongodb_client, "stylegan-images", b"grid", "image/jpeg"
+    )
+    app.schemas.stylegan_user.save_user_asset_in_mongodb.assert_called_once_with(
+        mongodb_client, "007", "stylegan-images", "grid_key"
+    )
+
+    # The grid is released if it cannot be referenced by the user
+    mocker.patch("app.schemas.stylegan_user.save_user_asset_in_mongodb", side_effect=RuntimeError)
+    mocker.patch("app.schemas.stylegan_user.release_blobs")
+    with pytest.raises(RuntimeError):
+        await stylegan_user.style_mix_grid()
+    app.schemas.stylegan_user.release_blobs.assert_called_once_with(
+        mongodb_client, "stylegan-images", ["grid_key"]
+    )
+
+    # Images that do not exist
+    mocker.patch("app.schemas.stylegan_user.get_images_with_vectors_from_mongodb", return_value={})
+    stylegan_user.stylegan_method_options = grid_method.copy(update={"column_images": ["image_id"]})
+    with pytest.raises(HTTPException):
+        await stylegan_user.style_mix_grid()
+
+
+@pytest.mark.asyncio
+async def test_render_interpolation_video(mocker):
+    """Unit test that StyleGanUser render_interpolation_video saves the video from its file for the user and removes the file."""
+    uploads = []
+
+    def mock_save_file_blob(mongodb, bucket_name, path, content_type, suffix):
+        with open(path, "rb") as f:
+            uploads.append((bucket_name, f.read(), content_type))
+        return "video_key" + suffix
+
+    mocker.patch("app.schemas.stylegan_user.save_file_blob", side_effect=mock_save_file_blob)
+    mocker.patch("app.schemas.stylegan_user.save_user_asset_in_mongodb")
+    interpolation_method = mock_method.copy(update={"keyframes": ["1", "2"], "format": "webm"})
+    stylegan_user = StyleGanUser(mock_auth0_user, mongodb_client, MockStyleGanVersion, interpolation_method)
+
+    assert await stylegan_user.render_interpolation_video() == {"video_key": "video_key_webm", "frames": 61}
+    assert uploads == [("stylegan-videos", b"video of [1, 2]", "video/webm")]
+    app.schemas.stylegan_user.save_user_asset_in_mongodb.assert_called_once_with(
+        mongodb_client, "007", "stylegan-videos", "video_key_webm"
+    )
+
+    # Images that do not exist
+    mocker.patch("app.schemas.stylegan_user.get_images_with_vectors_from_mongodb", return_value={})
+    stylegan_user.stylegan_method_options = interpolation_method.copy(update={"keyframes": ["1", "image_id"]})
+    with pytest.raises(HTTPException):
+        await stylegan_user.render_interpolation_video()
+
+
 @pytest.mark.asyncio
 async def test_save_user_images(mocker):
     """Unit test the StyleGanUser save_user_images method."""
 
-    def mock_upload_blob_to_gcs(*values):
-        return "random_id_for_" + values[1]
+    def mock_save_blob(mongodb, bucket_name, blob, content_type):
+        return "key_for_" + blob
 
-    mocker.patch(
-        "app.schemas.stylegan_user.upload_blob_to_gcs",
-        side_effect=mock_upload_blob_to_gcs,
-    )
+    mocker.patch("app.schemas.stylegan_user.save_blob", side_effect=mock_save_blob)
     mocker.patch("app.schemas.stylegan_user.save_user_image_in_mongodb")
 
+    def mock_uuid4():
+        mock_uuid4.count += 1
+        return mocker.Mock(hex=f"image_id_{mock_uuid4.count}")
+
     # Case if style mix is executed with row and col images from seeds
+    mock_uuid4.count = 0
+    mocker.patch("app.schemas.stylegan_user.uuid.uuid4", side_effect=mock_uuid4)
     stylegan_user = StyleGanUser(
         mock_auth0_user, mongodb_client, MockStyleGanVersion, mock_method
     )
@@ -155,15 +442,27 @@ async def test_save_user_images(mocker):
     }
     result = await stylegan_user.save_user_images()
     assert result == {
-        "result_image": "random_id_for_result_image",
-        "row_image": "random_id_for_seed_row_image",
-        "col_image": "random_id_for_seed_col_image",
+        "result_image": "image_id_1",
+        "row_image": "image_id_2",
+        "col_image": "image_id_3",
+        "image_keys": {
+            "result_image": "key_for_result_image",
+            "row_image": "key_for_seed_row_image",
+            "col_image": "key_for_seed_col_image",
+        },
     }
+    saved_image = app.schemas.stylegan_user.save_user_image_in_mongodb.call_args_list[0][0][1]
+    assert saved_image.url == "image_id_1"
+    assert saved_image.blob_keys == ("key_for_result_image", "key_for_result_vector")
 
     # Case if style mix is executed with row and col images that are already in db
+    mock_uuid4.count = 0
     stylegan_user = StyleGanUser(
         mock_auth0_user, mongodb_client, MockStyleGanVersion, mock_method
     )
+    stylegan_user.partner_images["1234"] = ImageData(
+        url="1234", auth0_id="007", method={}, image_key="row_key", vector_key="row_vector_key"
+    )
     stylegan_user.result_images_dict = {
         "result_image": ("result_image", "result_vector"),
         "row_image": (None, None),
@@ -171,46 +470,175 @@ async def test_save_user_images(mocker):
     }
     result = await stylegan_user.save_user_images()
     assert result == {
-        "result_image": "random_id_for_result_image",
+        "result_image": "image_id_1",
         "row_image": "1234",
         "col_image": "5678",
+        "image_keys": {
+            "result_image": "key_for_result_image",
+            "row_image": "row_key",
+            "col_image": "5678",
+        },
     }
 
-    # Case if style mix is executed with row image that is already in db
-    stylegan_user = StyleGanUser(
-        mock_auth0_user, mongodb_client, MockStyleGanVersion, mock_method
-    )
+    # Case if generation is executed
+    mock_uuid4.count = 0
     stylegan_user.result_images_dict = {
-        "result_image": ("result_image", "result_vector"),
-        "row_image": (None, None),
-        "col_image": ("seed_col_image", "w_col_blob"),
+        "result_image": ("result_image", "result_vector")
     }
     result = await stylegan_user.save_user_images()
     assert result == {
-        "result_image": "random_id_for_result_image",
-        "row_image": "1234",
-        "col_image": "random_id_for_seed_col_image",
+        "result_image": "image_id_1",
+        "image_keys": {"result_image": "key_for_result_image"},
     }
 
-    # Case if style mix is executed with col image that is already in db
+
+@pytest.mark.asyncio
+async def test_save_user_images_vector_in_document(mocker):
+    """Unit test that StyleGanUser save_user_images saves vectors in the image documents with LATENT_STORE=mongodb."""
+
+    def mock_save_blob(mongodb, bucket_name, blob, content_type):
+        return "key_for_" + blob
+
+    mocker.patch("app.schemas.stylegan_user.LATENT_STORE", "mongodb")
+    mocker.patch("app.schemas.stylegan_user.save_blob", side_effect=mock_save_blob)
+    mocker.patch("app.schemas.stylegan_user.save_user_image_in_mongodb")
     stylegan_user = StyleGanUser(
         mock_auth0_user, mongodb_client, MockStyleGanVersion, mock_method
     )
-    stylegan_user.result_images_dict = {
-        "result_image": ("result_image", "result_vector"),
-        "row_image": ("seed_row_image", "w_row_blob"),
-        "col_image": (None, None),
-    }
-    result = await stylegan_user.save_user_images()
-    assert result == {
-        "result_image": "random_id_for_result_image",
-        "row_image": "random_id_for_seed_row_image",
-        "col_image": "5678",
-    }
+    stylegan_user.result_images_dict = {"result_image": ("result_image", "result_vector")}
 
-    # Case if generation is executed
-    stylegan_user.result_images_dict = {
-        "result_image": ("result_image", "result_vector")
-    }
     result = await stylegan_user.save_user_images()
-    assert result == {"result_image": "random_id_for_result_image"}
+    assert result["image_keys"] == {"result_image": "key_for_result_image"}
+    app.schemas.stylegan_user.save_blob.assert_called_once_with(
+        mongodb_client, "stylegan-images", "result_image", "image/jpeg"
+    )
+    _, saved_image, vector = app.schemas.stylegan_user.save_user_image_in_mongodb.call_args[0]
+    assert saved_image.vector_in_document and saved_image.image_key == "key_for_result_image"
+    assert vector == "result_vector"
+
+
+@pytest.mark.asyncio
+async def test_delete_user_images(mocker):
+    """Unit test that StyleGanUser delete_user_images only releases the blobs of the user images."""
+    images = [
+        ImageData(url="id1", auth0_id="007", method={}, image_key="key1", vector_key="vector1"),
+        ImageData(url="id2", auth0_id="007", method={}),
+    ]
+    mocker.patch("app.schemas.stylegan_user.get_user_images_from_mongodb", return_value=images)
+    mocker.patch("app.schemas.stylegan_user.delete_user_images_from_mongodb")
+    mocker.patch("app.schemas.stylegan_user.release_blobs")
+    stylegan_user = StyleGanUser(mock_auth0_user, mongodb_client)
+
+    await stylegan_user.delete_user_images(DeletionOptions.construct(all_documents=False, id_list=["id1"]))
+    app.schemas.stylegan_user.delete_user_images_from_mongodb.assert_called_once_with(
+        mongodb_client, "007", ["id1"]
+    )
+    assert app.schemas.stylegan_user.release_blobs.call_args_list == [
+        call(mongodb_client, "stylegan-images", ["key1"]),
+        call(mongodb_client, "stylegan-images-vectors", ["vector1"]),
+    ]
+
+    # Vectors in the image documents are deleted with them
+    images.append(
+        ImageData(url="id4", auth0_id="007", method={}, image_key="key4", vector_in_document=True)
+    )
+    app.schemas.stylegan_user.release_blobs.reset_mock()
+    await stylegan_user.delete_user_images(DeletionOptions.construct(all_documents=False, id_list=["id4"]))
+    assert app.schemas.stylegan_user.release_blobs.call_args_list == [
+        call(mongodb_client, "stylegan-images", ["key4"]),
+        call(mongodb_client, "stylegan-images-vectors", []),
+    ]
+
+    # Images of other users (or not existing ones) are not deleted
+    with pytest.raises(HTTPException):
+        await stylegan_user.delete_user_images(
+            DeletionOptions.construct(all_documents=False, id_list=["id1", "id3"])
+        )
+    assert app.schemas.stylegan_user.delete_user_images_from_mongodb.call_count == 1
+
+    # Deleting all images also releases the other blobs of the user
+    mocker.patch("app.schemas.stylegan_user.delete_all_user_images_from_mongodb")
+    mocker.patch(
+        "app.schemas.stylegan_user.delete_all_user_assets_from_mongodb",
+        return_value={"stylegan-images": ["grid_key"]},
+    )
+    app.schemas.stylegan_user.release_blobs.reset_mock()
+    await stylegan_user.delete_user_images(DeletionOptions.construct(all_documents=True, id_list=[]))
+    app.schemas.stylegan_user.delete_all_user_assets_from_mongodb.assert_called_once_with(mongodb_client, "007")
+    assert app.schemas.stylegan_user.release_blobs.call_args_list[-1] == call(
+        mongodb_client, "stylegan-images", ["grid_key"]
+    )
+
+
+@pytest.mark.asyncio
+async def test_find_similar_images(mocker):
+    """Unit test that StyleGanUser find_similar_images builds the index once and follows saves and deletes."""
+    latent_indexes.clear()
+    model = {"img": 31, "res": 512, "fid": 12, "version": "version"}
+    images = [
+        ImageData(url="id1", auth0_id="007", method={"model": model}, image_key="key1"),
+        ImageData(url="id2", auth0_id="007", method={"model": model}, image_key="key2"),
+        ImageData(url="id3", auth0_id="007", method={"model": {**model, "img": 1}}),
+    ]
+    mean_ws = {"vector1": np.eye(512)[0], "vector2": np.eye(512)[0] + np.eye(512)[1], "new vector": np.eye(512)[1]}
+
+    async def mock_get_images_with_vectors_from_mongodb(mongodb, auth0_id, image_ids):
+        return {
+            image.url: (image, None if image.url == "id1" else "vector2")
+            for image in images
+            if image.url in image_ids
+        }
+
+    async def mock_get_user_image_keys_from_mongodb(mongodb, auth0_id, model):
+        return {
+            image.url: image.blob_keys[0]
+            for image in images
+            if image.method["model"]["img"] == model.img
+        }
+
+    mocker.patch("app.schemas.stylegan_user.get_user_images_from_mongodb", return_value=images)
+    image_keys = mocker.patch(
+        "app.schemas.stylegan_user.get_user_image_keys_from_mongodb",
+        side_effect=mock_get_user_image_keys_from_mongodb,
+    )
+    mocker.patch(
+        "app.schemas.stylegan_user.get_images_with_vectors_from_mongodb",
+        side_effect=mock_get_images_with_vectors_from_mongodb,
+    )
+    mocker.patch("app.schemas.stylegan_user.load_blob", return_value="vector1")
+    mocker.patch(
+        "app.schemas.stylegan_user.vectors_to_mean_ws",
+        side_effect=lambda vectors: np.stack([mean_ws[vector] for vector in vectors]),
+    )
+
+    search_method = mock_method.copy(update={"image": "id1", "k": 10})
+    stylegan_user = StyleGanUser(mock_auth0_user, mongodb_client, MockStyleGanVersion, search_method)
+    result = await stylegan_user.find_similar_images()
+    # Only the other images of the same model are found
+    assert [(image["id"], image["image_key"]) for image in result] == [("id2", "key2")]
+    image_keys.assert_called_once_with(mongodb_client, "007", search_method.model)
+    assert np.isclose(result[0]["similarity"], np.sqrt(0.5))
+
+    # New images are added without loading the index again
+    mocker.patch("app.schemas.stylegan_user.save_blob", return_value="key4")
+    mocker.patch("app.schemas.stylegan_user.save_user_image_in_mongodb")
+    mocker.patch("app.schemas.stylegan_user.uuid.uuid4", return_value=mocker.Mock(hex="id4"))
+    stylegan_user.result_images_dict = {"result_image": ("image", "new vector")}
+    await stylegan_user.save_user_images()
+    images.append(ImageData(url="id4", auth0_id="007", method={"model": model}, image_key="key4"))
+    stylegan_user.stylegan_method_options = search_method.copy(update={"image": "1234"})
+    result = await stylegan_user.find_similar_images()
+    assert [image["id"] for image in result] == ["id4", "id2", "id1"]
+    assert app.schemas.stylegan_user.get_images_with_vectors_from_mongodb.call_count == 1
+
+    # Deleted images are removed from the index
+    mocker.patch("app.schemas.stylegan_user.delete_user_images_from_mongodb")
+    mocker.patch("app.schemas.stylegan_user.release_blobs")
+    await stylegan_user.delete_user_images(DeletionOptions.construct(all_documents=False, id_list=["id4"]))
+    assert "id4" not in latent_indexes.get(("007", mock_method.model.filename))
+
+    # Images of other users (or not existing ones) are not found
+    stylegan_user.stylegan_method_options = search_method.copy(update={"image": "other_id"})
+    with pytest.raises(HTTPException):
+        await stylegan_user.find_similar_images()
+    latent_indexes.clear()
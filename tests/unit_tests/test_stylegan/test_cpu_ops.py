@@ -0,0 +1,85 @@
+import pytest
+import torch
+
+import app.stylegan.load_model  # Adds the stylegan2_ada_pytorch folder to the path.
+from torch_utils.ops import bias_act, upfirdn2d
+
+
+@pytest.fixture(scope="module")
+def cpu_plugins():
+    """Skip the tests if the native CPU kernels can not be built on this machine."""
+    if not (bias_act._init_cpu() and upfirdn2d._init_cpu()):
+        pytest.skip("The native CPU kernels could not be built.")
+
+
+@pytest.mark.parametrize("act", ["linear", "relu", "lrelu", "tanh", "sigmoid", "swish"])
+def test_bias_act_cpu_matches_reference(cpu_plugins, act):
+    """Unit test the CPU bias_act kernel against the reference implementation."""
+    torch.manual_seed(0)
+    x = torch.randn([2, 8, 16, 16])
+    b = torch.randn([8])
+
+    for clamp in [None, 0.5]:
+        result = bias_act._bias_act_cpu(x, b, act=act, clamp=clamp)
+        reference = bias_act._bias_act_ref(x, b, act=act, clamp=clamp)
+        assert torch.allclose(result, reference, atol=1e-6)
+
+    # Channels last layout and bias along the last dimension
+    x_channels_last = x.contiguous(memory_format=torch.channels_last)
+    result = bias_act._bias_act_cpu(x_channels_last, b, act=act)
+    assert torch.allclose(result, bias_act._bias_act_ref(x, b, act=act), atol=1e-6)
+    b_last = torch.randn([16])
+    result = bias_act._bias_act_cpu(x, b_last, dim=3, act=act, gain=2)
+    reference = bias_act._bias_act_ref(x, b_last, dim=3, act=act, gain=2)
+    assert torch.allclose(result, reference, atol=1e-6)
+
+
+def test_bias_act_dispatch(cpu_plugins, mocker):
+    """Unit test that the CPU kernel is only used when no gradients are required."""
+    spy = mocker.spy(bias_act, "_bias_act_cpu")
+    x = torch.randn([2, 8])
+
+    bias_act.bias_act(x, act="lrelu")
+    assert spy.call_count == 1
+
+    bias_act.bias_act(x.requires_grad_(True), act="lrelu")
+    assert spy.call_count == 1
+
+    bias_act.bias_act(x, act="lrelu", impl="ref")
+    assert spy.call_count == 1
+
+
+@pytest.mark.parametrize(
+    "up, down, padding",
+    [(1, 1, 0), (2, 1, [2, 1, 2, 1]), (1, 2, [1, 1, 1, 1]), (2, 2, 1), (1, 1, [-1, 2, 0, -2])],
+)
+def test_upfirdn2d_cpu_matches_reference(cpu_plugins, up, down, padding):
+    """Unit test the CPU upfirdn2d kernel against the reference implementation."""
+    torch.manual_seed(0)
+    x = torch.randn([2, 3, 16, 12])
+
+    for f in [
+        upfirdn2d.setup_filter([1, 3, 3, 1]),
+        upfirdn2d.setup_filter([1, 2, 3, 4, 5, 6, 7, 8]),
+        upfirdn2d.setup_filter(torch.randn([3, 4]), normalize=False),
+        None,
+    ]:
+        for flip_filter in [False, True]:
+            kwargs = dict(up=up, down=down, padding=padding, flip_filter=flip_filter, gain=3)
+            result = upfirdn2d._upfirdn2d_cpu(x, f, **kwargs)
+            reference = upfirdn2d._upfirdn2d_ref(x, f, **kwargs)
+            assert result.shape == reference.shape
+            assert torch.allclose(result, reference, atol=1e-5)
+
+
+def test_upfirdn2d_dispatch(cpu_plugins, mocker):
+    """Unit test that the CPU kernel is only used when no gradients are required."""
+    spy = mocker.spy(upfirdn2d, "_upfirdn2d_cpu")
+    x = torch.randn([1, 1, 8, 8])
+    f = upfirdn2d.setup_filter([1, 3, 3, 1])
+
+    upfirdn2d.upsample2d(x, f)
+    assert spy.call_count == 1
+
+    upfirdn2d.upsample2d(x.requires_grad_(True), f)
+    assert spy.call_count == 1
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+import torch
+from pydantic import BaseModel
+
+from app.schemas.stylegan_models import Model
+from app.stylegan.editing import (
+    compute_edit_directions,
+    edit_image_stylegan2ada,
+    edit_w,
+    export_edit_directions,
+    load_edit_directions,
+    loaded_directions,
+    unload_edit_directions,
+)
+from app.stylegan.load_model import pkl_digest
+from app.stylegan.utils import load_vector_from_bytes, seed_to_untruncated_w, truncate_w
+
+mock_model = Model(img=31, res=256, fid=12)
+
+
+class MockEditOptions(BaseModel):
+    truncation: float = 1
+    direction: int = 0
+    strengths: list
+    layers: tuple = None
+    resolution: int = None
+
+
+@pytest.fixture(scope="module")
+def directions(G_model):
+    """Return edit directions from few samples."""
+    return compute_edit_directions(G_model, num_components=4, num_samples=2000, batch_size=500)
+
+
+def test_compute_edit_directions(G_model, directions):
+    """Unit test that the directions are orthonormal and sorted by their variance."""
+    assert directions.components.shape == (4, G_model.mapping.w_dim)
+    assert torch.allclose(directions.components @ directions.components.t(), torch.eye(4), atol=1e-4)
+    assert torch.all(directions.stds[:-1] >= directions.stds[1:])
+
+
+def test_edit_w(G_model, directions):
+    """Unit test that only the chosen rows are moved by the strengths."""
+    w = truncate_w(G_model, seed_to_untruncated_w(G_model, 1234), 1).detach()
+    ws = edit_w(w, directions, 1, [0, 2], layers=(2, 6))
+
+    assert ws.shape == (2, *w.shape[1:])
+    assert torch.equal(ws[0], w[0])
+    assert torch.equal(ws[1, :2], w[0, :2]) and torch.equal(ws[1, 6:], w[0, 6:])
+    offset = 2 * directions.stds[1] * directions.components[1]
+    assert torch.allclose(ws[1, 2:6] - w[0, 2:6], offset.expand(4, -1), atol=1e-5)
+
+
+def test_export_and_load_edit_directions(tmpdir):
+    """Unit test that exported directions are loaded for the same weights only."""
+    os.symlink(
+        os.path.abspath(os.path.join("stylegan2_ada_models", mock_model.filename)),
+        tmpdir.join(mock_model.filename),
+    )
+    digest = pkl_digest(str(tmpdir), mock_model)
+    loaded_directions.clear()
+    assert load_edit_directions(str(tmpdir), mock_model, digest) is None
+    assert loaded_directions == {}
+
+    path = export_edit_directions(str(tmpdir), mock_model, num_components=2, num_samples=100)
+    assert os.path.basename(path).startswith("img31res256fid12.directions.")
+    # Directions that are exported while the server runs are found, other weights have none.
+    assert len(load_edit_directions(str(tmpdir), mock_model, digest)) == 2
+    assert load_edit_directions(str(tmpdir), mock_model, "otherweights") is None
+    assert set(loaded_directions) == {(mock_model.filename, digest)}
+    unload_edit_directions(mock_model.filename)
+    assert loaded_directions == {}
+
+
+def test_edit_image_stylegan2ada(G_model, directions):
+    """Unit test that all strengths are rendered and saved with their feature vectors."""
+    result = edit_image_stylegan2ada(
+        G_model, MockEditOptions(strengths=[-1, 0, 1], resolution=16), directions, 1234
+    )
+    assert list(result) == ["result_image_0", "result_image_1", "result_image_2"]
+    w = truncate_w(G_model, seed_to_untruncated_w(G_model, 1234), 1)
+    assert torch.allclose(load_vector_from_bytes(result["result_image_1"][1]), w)
+
+    # A saved feature vector is edited like its seed
+    options = MockEditOptions(strengths=[0.5], resolution=16)
+    edited = edit_image_stylegan2ada(G_model, options, directions, result["result_image_1"][1])
+    assert edited == edit_image_stylegan2ada(G_model, options, directions, 1234)
@@ -1,14 +1,25 @@
 import json
 
+import numpy as np
 from pydantic import BaseModel
 
 import app
-from app.stylegan.generation import generate_image_stylegan2ada
+from app.stylegan.generation import (
+    generate_image_stylegan2ada,
+    truncation_sweep_stylegan2ada,
+)
 
 
 class MockGenerationOptions(BaseModel):
     truncation: float
     seed: str = None
+    resolution: int = None
+
+
+class MockTruncationSweep(BaseModel):
+    seed: str
+    truncations: list
+    resolution: int = None
 
 
 def test_generate_image_stylegan2ada_seed(G_model, mocker):
@@ -51,3 +62,18 @@ def test_generate_image_stylegan2ada_random(G_model, mocker):
     assert call_args[0][0] == G_model
     assert call_args[0][1] in range(0, 2 ** 32 - 1)
     assert call_args[0][2] == 0.0
+
+
+def test_truncation_sweep_stylegan2ada(G_model, mocker):
+    """Unit test that a truncation sweep returns the images of single generations."""
+    mocker.patch("app.stylegan.generation.save_image_as_bytes", side_effect=lambda image: image)
+    mock_options = MockTruncationSweep(seed="1234", truncations=[0, 1], resolution=64)
+
+    result_dict = truncation_sweep_stylegan2ada(G_model, mock_options)
+    assert list(result_dict) == ["result_image_0", "result_image_1"]
+
+    result_image = generate_image_stylegan2ada(
+        G_model, MockGenerationOptions(truncation=1, seed=1234, resolution=64)
+    )
+    image = result_image["result_image"][0]
+    assert np.abs(result_dict["result_image_1"].astype(int) - image.astype(int)).max() <= 1
@@ -0,0 +1,99 @@
+import threading
+
+import imageio_ffmpeg
+import numpy as np
+import pytest
+import torch
+from pydantic import BaseModel
+
+from app.stylegan.interpolation import (
+    FrameEncoder,
+    interpolation_ws,
+    render_interpolation_video,
+    slerp,
+)
+from app.stylegan.utils import save_vector_as_bytes, seed_to_untruncated_w, truncate_w
+
+
+class MockInterpolationOptions(BaseModel):
+    frames_per_transition: int = 4
+    fps: int = 10
+    format: str = "mp4"
+    space: str = "w"
+    truncation: float = 1
+    resolution: int = 16
+
+
+def test_slerp():
+    """Unit test that the interpolated vectors stay on the great circle."""
+    a = torch.tensor([[1.0, 0.0], [1.0, 0.0]])
+    b = torch.tensor([[0.0, 1.0], [2.0, 0.0]])
+    result = slerp(a, b, torch.tensor([0.5, 0.5]))
+    assert torch.allclose(result[0], torch.tensor([np.sqrt(0.5), np.sqrt(0.5)]).float())
+    # Parallel vectors are interpolated linearly
+    assert torch.allclose(result[1], torch.tensor([1.5, 0.0]))
+
+
+def test_interpolation_ws(G_model):
+    """Unit test that the frames start and end at the keyframes and come in batches."""
+    w = truncate_w(G_model, seed_to_untruncated_w(G_model, 1), 0.7).detach()
+    keyframes = [1, save_vector_as_bytes(w * 2), 3]
+
+    batches = list(interpolation_ws(G_model, keyframes, 4, 0.7, "w", batch_size=4))
+    assert [len(ws) for ws in batches] == [4, 4, 1]
+    ws = torch.cat(batches)
+    assert torch.allclose(ws[0], w[0])
+    assert torch.allclose(ws[4], w[0] * 2)
+    assert torch.allclose(ws[2], w[0] * 1.5)
+    assert torch.allclose(ws[8], truncate_w(G_model, seed_to_untruncated_w(G_model, 3), 0.7)[0])
+
+    ws = torch.cat(list(interpolation_ws(G_model, [1, 3], 2, 0.7, "z", batch_size=2)))
+    assert ws.shape[0] == 3
+    assert torch.allclose(ws[2], truncate_w(G_model, seed_to_untruncated_w(G_model, 3), 0.7)[0], atol=1e-5)
+    with pytest.raises(ValueError):
+        next(interpolation_ws(G_model, keyframes, 4, 0.7, "z"))
+
+
+def test_render_interpolation_video(G_model, tmp_path, mocker):
+    """Unit test that the frames are encoded on another thread into a video file."""
+    path = str(tmp_path / "video.mp4")
+    threads = []
+    write_frames = imageio_ffmpeg.write_frames
+
+    def mock_write_frames(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return write_frames(*args, **kwargs)
+
+    mocker.patch("app.stylegan.interpolation.imageio_ffmpeg.write_frames", side_effect=mock_write_frames)
+    frames = render_interpolation_video(G_model, MockInterpolationOptions(), [1, 2, 3], path)
+    assert frames == 9
+    assert threads and threads[0] is not threading.current_thread()
+    reader = imageio_ffmpeg.read_frames(path)
+    assert next(reader)["size"] == (16, 16)
+    assert sum(1 for _ in reader) == 9
+
+
+def test_frame_encoder_error(tmp_path):
+    """Unit test that an encoder error is raised and never blocks the synthesis."""
+    encoder = FrameEncoder(str(tmp_path / "missing" / "video.mp4"), (16, 16), 10, "mp4", max_pending=1)
+    with pytest.raises(Exception):
+        for _ in range(10):
+            encoder.write(np.zeros((4, 16, 16, 3), dtype=np.uint8))
+        encoder.close()
+
+
+def test_frame_encoder_finalize_error(tmp_path, monkeypatch):
+    """Unit test that an error when the video is finalized is raised after the end of the video was received."""
+
+    class MockWriter:
+        def send(self, frame):
+            pass
+
+        def close(self):
+            raise RuntimeError("ffmpeg returned a non-zero exit code")
+
+    monkeypatch.setattr(imageio_ffmpeg, "write_frames", lambda *args, **kwargs: MockWriter())
+    encoder = FrameEncoder(str(tmp_path / "video.mp4"), (16, 16), 10, "mp4", max_pending=1)
+    encoder.write(np.zeros((4, 16, 16, 3), dtype=np.uint8))
+    with pytest.raises(RuntimeError):
+        encoder.close()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 
-from app.stylegan.load_model import load_model_from_pkl_stylegan2ada
+from app.stylegan.load_model import load_model_from_pkl_stylegan2ada, pkl_digest
 
 
 def test_load_model_from_pkl_stylegan2ada():
@@ -14,3 +14,4 @@ def test_load_model_from_pkl_stylegan2ada():
     model = load_model_from_pkl_stylegan2ada("stylegan2_ada_models", mock_model)
     assert model.mapping._get_name() == "MappingNetwork"
     assert model.synthesis._get_name() == "SynthesisNetwork"
+    assert model.cache_key == ("img31res256fid12.pkl", pkl_digest("stylegan2_ada_models", mock_model))
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from app.schemas.stylegan_models import Model
+from app.stylegan.backends import load_inference_model
+from app.stylegan.onnx_runtime import export_onnx_model, load_onnx_model
+from app.stylegan.torchscript import TracedGenerator
+from app.stylegan.utils import seed_to_array_image
+
+mock_model = Model(img=31, res=256, fid=12)
+
+
+@pytest.fixture(scope="module")
+def onnx_folder(tmpdir_factory):
+    """Return a model folder with exported ONNX graphs."""
+    pytest.importorskip("onnxruntime")
+    folder = tmpdir_factory.mktemp("stylegan2_ada_models")
+    os.symlink(
+        os.path.abspath(os.path.join("stylegan2_ada_models", mock_model.filename)),
+        folder.join(mock_model.filename),
+    )
+    export_onnx_model(str(folder), mock_model)
+    return str(folder)
+
+
+def test_load_inference_model(G_model, tmpdir):
+    """Unit test the selection of the inference backend."""
+    assert load_inference_model(str(tmpdir), mock_model, G_model, "eager") is G_model
+    # Models that are not exported fall back to the eager model.
+    assert load_inference_model(str(tmpdir), mock_model, G_model, "onnxruntime") is G_model
+    with pytest.raises(ValueError):
+        load_inference_model(str(tmpdir), mock_model, G_model, "tensorflow")
+
+
+def test_onnx_model_parity(G_model, onnx_folder):
+    """Unit test that the ONNX graphs produce the same results as the eager model for any batch size."""
+    onnx_G = load_onnx_model(onnx_folder, mock_model, G_model)
+    assert isinstance(onnx_G, TracedGenerator)
+
+    for batch_size in [1, 3]:
+        z = torch.from_numpy(np.random.RandomState(1234).randn(batch_size, G_model.z_dim))
+        with torch.no_grad():
+            w = G_model.mapping(z, None, truncation_psi=0.5, truncation_cutoff=8)
+            onnx_w = onnx_G.mapping(z, None, truncation_psi=0.5, truncation_cutoff=8)
+            assert torch.allclose(onnx_w, w, atol=1e-4)
+
+            image = G_model.synthesis(w, noise_mode="const", force_fp32=True)
+            onnx_image = onnx_G.synthesis(w, noise_mode="const", force_fp32=True)
+            assert onnx_image.shape == image.shape
+            assert torch.allclose(onnx_image, image, atol=1e-2)
+
+    image, w = seed_to_array_image(G_model, 1234, 1)
+    onnx_image, onnx_w = seed_to_array_image(onnx_G, 1234, 1)
+    assert onnx_image.shape == image.shape
+    assert onnx_w.shape == w.shape
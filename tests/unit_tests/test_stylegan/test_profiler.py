@@ -0,0 +1,27 @@
+import json
+
+from app.stylegan.profiler import profile_synthesis
+
+
+def test_profile_synthesis(G_model, tmpdir):
+    """Unit test the per block breakdown and the Chrome trace of a profiling run."""
+    trace_path = str(tmpdir.join("trace.json"))
+    result = profile_synthesis(G_model, batch_size=2, runs=1, trace_path=trace_path)
+
+    block_names = [block["name"] for block in result["blocks"]]
+    assert block_names[0] == "mapping"
+    assert block_names[1:] == [f"synthesis.b{res}" for res in G_model.synthesis.block_resolutions]
+    for block in result["blocks"]:
+        assert block["calls"] == 1
+        assert block["cpu_time_ms"] > 0
+        assert block["flops"] > 0
+    # Every synthesis block doubles the resolution, so the later blocks need more FLOPs than b4.
+    assert result["blocks"][-1]["flops"] > result["blocks"][1]["flops"]
+
+    ops = {op["name"]: op for op in result["ops"]}
+    assert ops["bias_act"]["calls"] > 0
+    assert ops["upfirdn2d"]["calls"] > 0
+
+    with open(trace_path) as f:
+        trace = json.load(f)
+    assert any(event["name"] == "synthesis.b4" for event in trace)
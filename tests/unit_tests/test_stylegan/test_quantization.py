@@ -0,0 +1,115 @@
+import copy
+
+import pytest
+import torch
+
+from app.schemas.stylegan_models import Model
+from app.stylegan.quantization import (
+    QuantizedFullyConnectedLayer,
+    export_quantized_model,
+    load_quantized_model,
+    measure_drift,
+    quantize_generator,
+    quantize_synthesis_layer,
+    quantized_filename,
+)
+
+mock_model = Model(img=31, res=256, fid=12)
+
+
+@pytest.fixture(scope="module")
+def G_quantized(G_model):
+    """Return an int8 copy of the StyleGan2ADA model."""
+    return quantize_generator(copy.deepcopy(G_model))
+
+
+def test_quantize_generator(G_model, G_quantized):
+    """Unit test that the weights of the fully connected and modulated conv layers are quantized."""
+    module_names = [type(module).__name__ for module in G_quantized.modules()]
+    assert "FullyConnectedLayer" not in module_names
+    assert "QuantizedFullyConnectedLayer" in module_names
+
+    for module in G_quantized.modules():
+        if type(module).__name__ == "SynthesisLayer":
+            # The weights are stored in int8 with the scale of every output channel.
+            assert module.weight.dtype == torch.int8
+            assert "weight" not in dict(module.named_parameters())
+            assert module.weight_scale.shape == (module.weight.shape[0], 1, 1, 1)
+
+    # The original model is not changed.
+    assert type(G_model.mapping.fc0).__name__ == "FullyConnectedLayer"
+
+
+def test_quantized_fully_connected_layer(G_model):
+    """Unit test the quantized layer against the fp32 layer with and without gradients."""
+    layer = G_model.mapping.fc0
+    quantized_layer = QuantizedFullyConnectedLayer(layer)
+    x = torch.randn([4, layer.in_features])
+
+    with torch.no_grad():
+        assert torch.allclose(quantized_layer(x), layer(x), atol=5e-2)
+
+    x.requires_grad_(True)
+    quantized_layer(x).sum().backward()
+    assert x.grad is not None
+
+
+def test_quantized_synthesis_layer(G_model):
+    """Unit test that a modulated convolution runs from its int8 weights like from the dequantized weights."""
+    layer = copy.deepcopy(G_model.synthesis.b8.conv1)
+    quantize_synthesis_layer(layer)
+    dequantized_layer = copy.deepcopy(G_model.synthesis.b8.conv1)
+    dequantized_layer.weight.data = layer.weight.to(torch.float32) * layer.weight_scale
+    x = torch.randn([2, layer.affine.out_features, 8, 8])
+    w = torch.randn([2, layer.affine.in_features])
+
+    with torch.no_grad():
+        for fused_modconv in (True, False):
+            assert torch.allclose(
+                layer(x, w, noise_mode="const", fused_modconv=fused_modconv),
+                dequantized_layer(x, w, noise_mode="const", fused_modconv=fused_modconv),
+                atol=1e-3,
+            )
+
+
+def test_measure_drift(G_model, G_quantized):
+    """Unit test the drift measurement of the int8 model against the fp32 model."""
+    drift = measure_drift(G_model, G_quantized, seeds=[0, 1])
+    assert drift["psnr_min"] <= drift["psnr_mean"]
+    assert drift["lpips_mean"] <= drift["lpips_max"]
+    assert drift["psnr_min"] > 20
+
+    same_drift = measure_drift(G_model, G_model, seeds=[0])
+    assert same_drift["lpips_max"] == 0
+    assert same_drift["psnr_min"] > drift["psnr_min"]
+
+
+def test_load_quantized_model(G_model, G_quantized, tmpdir, mocker):
+    """Unit test that the exported int8 weights are only used within the drift budget."""
+    folder_path = str(tmpdir)
+    mocker.patch("app.stylegan.quantization.pkl_digest", return_value="digest")
+    mocker.patch(
+        "app.stylegan.quantization.load_model_from_pkl_stylegan2ada",
+        side_effect=lambda folder_path, model: copy.deepcopy(G_model),
+    )
+    # Models without exported int8 weights run in fp32.
+    assert load_quantized_model(folder_path, mock_model, G_model) is G_model
+
+    drift = {"psnr_mean": 40, "psnr_min": 35, "lpips_mean": 0.01, "lpips_max": 0.02}
+    measure_drift = mocker.patch("app.stylegan.quantization.measure_drift", return_value=drift)
+    assert export_quantized_model(folder_path, mock_model) == drift
+    assert tmpdir.join(quantized_filename(mock_model, "digest")).check()
+
+    # The drift is measured once at export time, not when a worker loads the model.
+    G = load_quantized_model(folder_path, mock_model, copy.deepcopy(G_model))
+    assert measure_drift.call_count == 1
+    assert type(G.mapping.fc0).__name__ == "QuantizedFullyConnectedLayer"
+    state_dict = G.state_dict()
+    for name, tensor in G_quantized.state_dict().items():
+        if isinstance(tensor, torch.Tensor) and (tensor.is_floating_point() or tensor.dtype == torch.int8):
+            assert torch.equal(state_dict[name], tensor)
+
+    # Reject the int8 model if it exceeds the drift budget
+    mocker.patch("app.stylegan.quantization.QUANTIZATION_MAX_LPIPS", 0.001)
+    with pytest.warns(UserWarning):
+        assert load_quantized_model(folder_path, mock_model, G_model) is G_model
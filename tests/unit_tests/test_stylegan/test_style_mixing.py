@@ -1,11 +1,23 @@
 import json
 
+import numpy as np
 import pytest
+import torch
 from pydantic import BaseModel
 
+import app.stylegan.style_mixing
 from app.stylegan.generation import generate_image_stylegan2ada
 from app.stylegan.load_model import load_model_from_pkl_stylegan2ada
-from app.stylegan.style_mixing import style_mix_two_images_stylegan2ada
+from app.stylegan.style_mixing import (
+    style_mix_grid_stylegan2ada,
+    style_mix_two_images_stylegan2ada,
+)
+from app.stylegan.utils import (
+    latent_cache,
+    save_vector_as_bytes,
+    seed_to_untruncated_w,
+    truncate_w,
+)
 
 
 # Module access to byte dict result of a generation process.
@@ -17,11 +29,13 @@ class ByteDict:
 class MockGenerationOptions(BaseModel):
     truncation: float
     seed: str = None
+    resolution: int = None
 
 
 class MockStyleMixOptions(BaseModel):
     truncation: float
     styles: str
+    resolution: int = None
 
 
 @pytest.fixture(scope="module")
@@ -218,3 +232,35 @@ def test_style_mix_two_images_stylegan2ada_mix_col_row(G_model, mock_saving):
     )
     assert result_stylemix_with_mixed_col_row["col_image"][0] == None
     assert result_stylemix_with_mixed_col_row["col_image"][1] == None
+
+
+def test_style_mix_grid_stylegan2ada(G_model, mock_saving, mocker):
+    """Unit test that a grid mixes every row with every column image in batches."""
+    latent_cache.clear()
+    mapping = mocker.spy(G_model.mapping, "forward")
+    synthesis = mocker.spy(app.stylegan.style_mixing, "ws_to_images")
+    row_w = truncate_w(G_model, seed_to_untruncated_w(G_model, 3), 0.5).detach()
+    col_w = truncate_w(G_model, seed_to_untruncated_w(G_model, 2), 0.7).detach()
+    mapping.reset_mock()
+
+    grid, result = style_mix_grid_stylegan2ada(
+        G_model,
+        MockStyleMixOptions(truncation=0.7, styles="Coarse", resolution=16),
+        [1, save_vector_as_bytes(row_w)],
+        [2, 4],
+        batch_size=3,
+    )
+    # The seeds that are not cached (1 and 4) are mapped at once, the 2 + 2 + 4 images are synthesized in batches of 3.
+    assert mapping.call_count == 1
+    assert [len(call.args[1]) for call in synthesis.call_args_list] == [3, 3, 2]
+    assert sorted(result) == ["result_image_0_0", "result_image_0_1", "result_image_1_0", "result_image_1_1"]
+
+    # The mix of the existing row image and the column seed 2
+    expected_w = row_w.clone()
+    expected_w[:, :2] = col_w[:, :2]
+    assert torch.allclose(torch.tensor(json.loads(result["result_image_1_0"][1])), expected_w, atol=1e-5)
+
+    grid = np.array(json.loads(grid))
+    assert grid.shape == (48, 48, 3)
+    assert not grid[:16, :16].any()
+    assert np.array_equal(grid[32:48, 16:32], np.array(json.loads(result["result_image_1_0"][0])))
@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from app.schemas.stylegan_models import Model
+from app.core.cache import LRUCache
+from app.stylegan.torchscript import (
+    BucketedGraph,
+    TracedGenerator,
+    export_traced_model,
+    load_traced_model,
+)
+from app.stylegan.utils import seed_to_array_image, synthesize_blockwise
+
+mock_model = Model(img=31, res=256, fid=12)
+
+
+@pytest.fixture(scope="module")
+def traced_folder(tmpdir_factory):
+    """Return a model folder with traced graphs for the batch sizes 1 and 2."""
+    folder = tmpdir_factory.mktemp("stylegan2_ada_models")
+    os.symlink(
+        os.path.abspath(os.path.join("stylegan2_ada_models", mock_model.filename)),
+        folder.join(mock_model.filename),
+    )
+    export_traced_model(str(folder), mock_model, batch_sizes=(1, 2))
+    return str(folder)
+
+
+def test_bucketed_graph():
+    """Unit test that batches are split and padded to the traced batch sizes."""
+    calls = []
+
+    def graph(x):
+        calls.append(len(x))
+        return x * 2
+
+    x = torch.arange(7.0).unsqueeze(1)
+    result = BucketedGraph({1: graph, 4: graph})(x)
+
+    assert torch.equal(result, x * 2)
+    assert calls == [4, 4]
+
+
+def test_load_traced_model_without_export(G_model, tmpdir):
+    """Unit test that the eager model is used if there are no traced graphs."""
+    assert load_traced_model(str(tmpdir), mock_model, G_model) is G_model
+
+
+def test_export_and_load_traced_model(G_model, traced_folder):
+    """Unit test the export and loading of traced graphs."""
+    # The mapping and synthesis graphs of both batch sizes and the 7 blocks of a 256 model
+    files = [f for f in os.listdir(traced_folder) if f.endswith(".pt")]
+    assert len(files) == 11
+
+    traced_G = load_traced_model(traced_folder, mock_model, G_model)
+    assert isinstance(traced_G, TracedGenerator)
+    assert traced_G.synthesis.graph.batch_sizes == [1, 2]
+    assert sorted(traced_G.synthesis.traced_blocks) == list(G_model.synthesis.block_resolutions)
+    assert traced_G.z_dim == G_model.z_dim
+    assert traced_G.mapping.num_ws == G_model.mapping.num_ws
+
+
+@pytest.mark.parametrize("truncation_psi", [1, 0.5, -1])
+def test_traced_model_parity(G_model, traced_folder, truncation_psi):
+    """Unit test that the traced graphs produce the same results as the eager model."""
+    traced_G = load_traced_model(traced_folder, mock_model, G_model)
+
+    # Batch size 3 is split into the buckets 2 and 1.
+    z = torch.from_numpy(np.random.RandomState(1234).randn(3, G_model.z_dim))
+    with torch.no_grad():
+        w = G_model.mapping(z, None, truncation_psi=truncation_psi, truncation_cutoff=8)
+        traced_w = traced_G.mapping(
+            z, None, truncation_psi=truncation_psi, truncation_cutoff=8
+        )
+        assert torch.allclose(traced_w, w, atol=1e-5)
+
+        image = G_model.synthesis(w, noise_mode="const", force_fp32=True)
+        traced_image = traced_G.synthesis(w, noise_mode="const", force_fp32=True)
+        assert torch.allclose(traced_image, image, atol=1e-3)
+
+    # Generated images do not differ by more than a rounding step.
+    image, _ = seed_to_array_image(G_model, 1234, truncation_psi)
+    traced_image, _ = seed_to_array_image(traced_G, 1234, truncation_psi)
+    assert np.abs(image.astype(int) - traced_image.astype(int)).max() <= 1
+
+
+def test_traced_blocks(G_model, traced_folder, mocker):
+    """Unit test that single images of traced models run the traced blocks and resume from the block cache."""
+    traced_G = load_traced_model(traced_folder, mock_model, G_model)
+    cache = LRUCache(max_size=1 << 30)
+    w = G_model.mapping(torch.from_numpy(np.random.RandomState(1).randn(1, G_model.z_dim)), None)
+    last_block = traced_G.synthesis.traced_blocks[256]
+    last_block.graph = mocker.MagicMock(wraps=last_block.graph)
+
+    with torch.no_grad():
+        image = G_model.synthesis(w, noise_mode="const", force_fp32=True)
+        traced_image = synthesize_blockwise(traced_G, w, cache=cache)
+        assert torch.allclose(traced_image, image, atol=1e-3)
+        assert last_block.graph.call_count == 1
+        assert len(cache) > 0
+
+        # The cached blocks are skipped
+        first_block = traced_G.synthesis.traced_blocks[4]
+        first_block.graph = mocker.MagicMock(wraps=first_block.graph)
+        assert torch.equal(synthesize_blockwise(traced_G, w, cache=cache), traced_image)
+        assert first_block.graph.call_count == 0
+
+
+def test_traced_model_fallback(G_model, traced_folder, mocker):
+    """Unit test that calls that are not covered by the traced graphs use the eager model."""
+    traced_G = load_traced_model(traced_folder, mock_model, G_model)
+    traced_G.synthesis.eager = mocker.MagicMock(wraps=G_model.synthesis)
+    spy = traced_G.synthesis.eager
+    ws = torch.zeros([1, G_model.mapping.num_ws, G_model.w_dim])
+
+    with torch.no_grad():
+        traced_G.synthesis(ws, noise_mode="const", force_fp32=True)
+        assert spy.call_count == 0
+        traced_G.synthesis(ws, noise_mode="random", force_fp32=True)
+        assert spy.call_count == 1
@@ -4,11 +4,20 @@ from io import BytesIO
 import numpy as np
 import torch
 
+from app.core.cache import LRUCache
 from app.stylegan.utils import (
+    clear_model_caches,
     load_vector_from_bytes,
     save_image_as_bytes,
     save_vector_as_bytes,
+    latent_cache,
     seed_to_array_image,
+    seed_to_truncation_sweep,
+    seed_to_untruncated_w,
+    seeds_to_untruncated_ws,
+    synthesize_blockwise,
+    truncate_w,
+    truncate_ws,
     w_vector_to_image,
 )
 
@@ -27,6 +36,83 @@ def test_seed_to_array_image(G_model):
     assert result_w.tolist() == assertion_result_dict["result_w"]
 
 
+def test_seed_to_untruncated_w(G_model, mocker):
+    """Unit test that untruncated feature vectors are cached per model and seed."""
+    latent_cache.clear()
+    spy = mocker.spy(G_model.mapping, "forward")
+
+    w = seed_to_untruncated_w(G_model, 1234)
+    assert seed_to_untruncated_w(G_model, 1234) is w
+    assert spy.call_count == 1
+    seed_to_untruncated_w(G_model, 4321)
+    assert spy.call_count == 2
+
+
+def test_clear_model_caches(G_model, mocker):
+    """Unit test that the cached seeds of replaced weights are not reused and are cleared with their model."""
+    latent_cache.clear()
+    seed_to_untruncated_w(G_model, 1234)
+    spy = mocker.spy(G_model.mapping, "forward")
+
+    # The same model object with other weights (e.g. a reloaded file) does not hit the old entries
+    mocker.patch.object(G_model, "cache_key", (G_model.cache_key[0], "other digest"))
+    seed_to_untruncated_w(G_model, 1234)
+    assert spy.call_count == 1
+    assert len(latent_cache) == 2
+
+    clear_model_caches(G_model.cache_key[0])
+    assert len(latent_cache) == 0
+
+
+def test_seeds_to_untruncated_ws(G_model, mocker):
+    """Unit test that the seeds that are not cached are mapped in one batch."""
+    latent_cache.clear()
+    w = seed_to_untruncated_w(G_model, 1234)
+    spy = mocker.spy(G_model.mapping, "forward")
+
+    ws = seeds_to_untruncated_ws(G_model, [4321, 1234, 5678, 4321])
+    assert ws.shape == (4,) + w.shape[1:]
+    assert spy.call_count == 1
+    assert torch.equal(ws[1:2], w)
+    assert torch.allclose(ws[0:1], seed_to_untruncated_w(G_model, 4321), atol=1e-6)
+    assert torch.equal(ws[0], ws[3])
+    assert spy.call_count == 1
+
+
+def test_truncate_ws(G_model):
+    """Unit test that a batch is truncated like its single feature vectors."""
+    ws = torch.cat([seed_to_untruncated_w(G_model, seed) for seed in (1, 2)])
+    truncated_ws = truncate_ws(G_model, ws, 0.7)
+    for i in range(2):
+        assert torch.allclose(truncated_ws[i : i + 1], truncate_w(G_model, ws[i : i + 1], 0.7))
+
+
+def test_truncate_w(G_model):
+    """Unit test that truncation matches the truncation of the mapping network."""
+    z = torch.from_numpy(np.random.RandomState(1234).randn(1, G_model.z_dim))
+    w = G_model.mapping(z, None)
+    truncation_psis = [-1.5, 0, 0.3, 0.7, 1, 2]
+
+    truncated_ws = truncate_w(G_model, w, truncation_psis)
+    assert truncated_ws.shape == (len(truncation_psis),) + w.shape[1:]
+    for truncated_w, truncation_psi in zip(truncated_ws, truncation_psis):
+        expected_w = G_model.mapping(
+            z, None, truncation_psi=truncation_psi, truncation_cutoff=8
+        )
+        assert torch.equal(truncated_w.unsqueeze(0), expected_w)
+
+    assert torch.equal(truncate_w(G_model, w, 1), w)
+
+
+def test_seed_to_truncation_sweep(G_model):
+    """Unit test the batched generation of many truncation values."""
+    images = seed_to_truncation_sweep(G_model, 1234, [0.5, 1.0], resolution=64)
+    assert images.shape == (2, 64, 64, 3)
+
+    image, w = seed_to_array_image(G_model, 1234, 0.5, resolution=64)
+    assert np.abs(images[0].astype(int) - image.astype(int)).max() <= 1
+
+
 def test_w_vector_to_image(G_model):
     """Unit test generation from feature vector w."""
     with open(
@@ -43,6 +129,55 @@ def test_w_vector_to_image(G_model):
     assert result_image.tolist() == assertion_result_dict["result_image"]
 
 
+def test_w_vector_to_image_preview(G_model):
+    """Unit test preview generation at lower resolutions."""
+    _, w = seed_to_array_image(G_model, 1234, 1.0)
+
+    for resolution in [4, 64, 128]:
+        result_image = w_vector_to_image(G_model, w, resolution)
+        assert result_image.shape == (resolution, resolution, 3)
+        assert result_image.dtype == np.uint8
+
+    # Running all blocks is the same as the full synthesis network.
+    with torch.no_grad():
+        preview = synthesize_blockwise(G_model, w, cache=None)
+        image = G_model.synthesis(w, noise_mode="const", force_fp32=True)
+    assert torch.equal(preview, image)
+
+    result_image, _ = seed_to_array_image(G_model, 1234, 1.0, resolution=32)
+    assert result_image.shape == (32, 32, 3)
+
+
+def test_synthesize_blockwise_cache(G_model, mocker):
+    """Unit test that synthesis resumes from the deepest cached block with the same W rows."""
+    cache = LRUCache(max_size=2 ** 30)
+    _, w = seed_to_array_image(G_model, 1234, 1.0)
+    _, other_w = seed_to_array_image(G_model, 4321, 1.0)
+
+    with torch.no_grad():
+        image = synthesize_blockwise(G_model, w, cache=cache)
+        assert len(cache) > 0
+
+        # Fine styles (rows 6 to 13) of another image
+        mixed_w = w.clone()
+        mixed_w[:, 6:] = other_w[:, 6:]
+        expected_image = synthesize_blockwise(G_model, mixed_w, cache=None)
+
+        spy = mocker.spy(G_model.synthesis.b4, "forward")
+        mixed_image = synthesize_blockwise(G_model, mixed_w, cache=cache)
+        assert spy.call_count == 0
+        assert torch.equal(mixed_image, expected_image)
+
+        # The same W only runs the blocks above the cached resolution.
+        assert torch.equal(synthesize_blockwise(G_model, w, cache=cache), image)
+        assert spy.call_count == 0
+
+        # Other W rows in the first block
+        other_image = synthesize_blockwise(G_model, other_w, cache=cache)
+        assert spy.call_count == 1
+        assert not torch.equal(other_image, image)
+
+
 def test_save_image_as_bytes():
     """Unit test image saving as a byte object."""
     with open(